@@ -1,100 +1,206 @@
+import asyncio
 import logging
 import os
-import subprocess
-import time
+import sys
 
 from pymavlink import mavutil
 
-from navigation.mission import disarm, land, return_to_launch
-from navigation.utils import BATTERY_THRESHOLD
+from flight_termination.usb_watcher import UsbWatcher
+from navigation.commands import (
+    disarm,
+    land,
+    return_to_launch,
+    wait_armed,
+    wait_for_message,
+    wait_landed,
+)
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.ipc_client import IpcError, get_client
+from navigation.utils import BATTERY_THRESHOLD, EXTENDED_SYS_STATE, SYS_STATUS
 
 logger = logging.getLogger()
 
+# Part of the description of the USB device whose loss terminates the flight, as shown by `lsusb`
+# (e.g. its `vendor:product` id).
 RC_OUTPUT = os.getenv("RC_OUTPUT")
 
+# Seconds to wait for the battery level when connecting to the autopilot directly.
+SYS_STATUS_TIMEOUT = 1
 
-def begin_flight_termination(autopilot):
+# Telemetry older than this (in seconds) is not trusted when deciding how to terminate the flight.
+TELEMETRY_MAX_AGE = 2
+
+# Seconds to wait for an EXTENDED_SYS_STATE when the telemetry doesn't tell whether the drone has
+# landed.
+LANDED_STATE_TIMEOUT = 1
+
+
+async def begin_flight_termination(autopilot, reason=None):
+    """Terminate the flight. `reason` is the error that triggered it, e.g. a `ConnectionError` for
+    a lost link or a `GeofenceBreachError` for a breached geofence.
+
+    It runs on the event loop with the receive loop of `autopilot`, which dispatches the ACKs and
+    telemetry it waits for.
+    """
     # TODO: See CONOPS for more flight termintaion instructions.
-    logger.info("Beginning flight termination...")
-    pre_flight_termination(autopilot)
+    if reason is not None:
+        logger.info(f"Beginning flight termination: {reason}")
+    else:
+        logger.info("Beginning flight termination...")
+    await pre_flight_termination(autopilot)
 
 
-def pre_flight_termination(autopilot):
-    terminate_flight(autopilot)
+async def pre_flight_termination(autopilot):
+    await terminate_flight(autopilot)
 
 
-def terminate_flight(autopilot):
-    connection = autopilot.conn
-    battery_remaining = autopilot.battery_remaining
-    landed = is_drone_landed(connection)
+async def terminate_flight(autopilot):
+    commands = autopilot.commands
+    battery_remaining = battery_remaining_from_telemetry(autopilot)
+    landed = is_drone_landed_from_telemetry(autopilot)
+    if landed is None:
+        landed = await is_drone_landed(autopilot)
 
     if landed:
-        if connection.motors_armed():
-            disarm(connection)
+        if autopilot.conn.motors_armed():
+            await disarm(commands)
+            await wait_armed(autopilot, False)
         else:
             logger.info("Already disarmed.")
     elif not battery_remaining or battery_remaining < BATTERY_THRESHOLD:
         # If battery_remaining hasn't been set yet (and hence is None), we are in an undefined
         # state. We could have just started the flight with 100% battery or we could have lost
         # and regained connection with battery level below our threshold. We assume the worst.
-        land(connection)
-        disarm(connection)
+        await land(commands)
+        try:
+            await wait_landed(autopilot)
+        except TimeoutError:
+            # Disarming in the air would drop the drone; leave it landing.
+            logger.error("The drone didn't report landing in time, not disarming it.")
+            return
+        await disarm(commands)
+        await wait_armed(autopilot, False)
     elif battery_remaining and battery_remaining >= BATTERY_THRESHOLD:
-        return_to_launch(connection)
-
+        await return_to_launch(commands)
+
+
+def battery_remaining_from_telemetry(autopilot):
+    """Return the battery level of the latest SYS_STATUS in the recorded telemetry, or
+    `autopilot.battery_remaining` if none was recorded. An old level is still used: the battery
+    only drains."""
+    sample = autopilot.telemetry.latest(SYS_STATUS)
+    if sample is None:
+        return autopilot.battery_remaining
+    return int(sample["battery_remaining"])
+
+
+def is_drone_landed_from_telemetry(autopilot):
+    """Check if the drone has landed using the recorded telemetry. Returns None if there is no
+    recent EXTENDED_SYS_STATE or the drone is in the middle of landing."""
+    sample = autopilot.telemetry.latest(EXTENDED_SYS_STATE, max_age=TELEMETRY_MAX_AGE)
+    if sample is None:
+        return None
+    landed_state = sample["landed_state"]
+    if landed_state == mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND:
+        return True
+    if landed_state in (
+        mavutil.mavlink.MAV_LANDED_STATE_IN_AIR,
+        mavutil.mavlink.MAV_LANDED_STATE_TAKEOFF,
+    ):
+        return False
+    return None
 
-def is_drone_landed(connection):
-    """Check if the drone has landed."""
-    landed = False
-    ext_sys_state = connection.recv_match(
-        type=["EXTENDED_SYS_STATE"],
-        blocking=True,
-        timeout=1,
-    )
 
-    if not ext_sys_state:
-        logger.info("Did not receive the message in time. Assume not landed.")
-    else:
-        landed_state = ext_sys_state.landed_state
-        landed = landed_state == mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND
-        if landed_state == mavutil.mavlink.MAV_LANDED_STATE_LANDING:
-            # The drone is currently landing. Wait till it has landed, then disarm.
-            logger.info("Drone landing...")
-            connection.recv_match(
-                type=["EXTENDED_SYS_STATE"],
-                condition=f"EXTENDED_SYS_STATE.landed_state == \
-                {mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND}",
-                blocking=True,
-            )
-            logger.info("Drone landed.")
-            landed = True
-    return landed
-
-
-def get_lsusb_output():
-    """Run the lsusb command and return its output."""
+async def is_drone_landed(autopilot):
+    """Check if the drone has landed from its next EXTENDED_SYS_STATE. If it is landing, wait till
+    it has landed."""
     try:
-        result = subprocess.run(["lsusb"], stdout=subprocess.PIPE, check=True)
-        return result.stdout.decode("utf-8")
-    except subprocess.CalledProcessError as e:
-        print(f"Error running lsusb: {e}")
-        return ""
-
-
-def is_usb_lost():
-    """Detect changes in the lsusb output and return whether there is a change."""
-    current_output = get_lsusb_output()
-    logger.info(current_output)
-    if current_output and RC_OUTPUT not in current_output:
+        ext_sys_state = await wait_for_message(
+            autopilot,
+            mavutil.mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE,
+            timeout=LANDED_STATE_TIMEOUT,
+        )
+    except TimeoutError:
+        logger.info("Did not receive the message in time. Assume not landed.")
+        return False
+
+    landed_state = ext_sys_state.landed_state
+    if landed_state == mavutil.mavlink.MAV_LANDED_STATE_LANDING:
+        logger.info("Drone landing...")
+        try:
+            await wait_landed(autopilot)
+        except TimeoutError:
+            logger.info("The drone didn't finish landing in time. Assume not landed.")
+            return False
+        logger.info("Drone landed.")
         return True
-    return False
+    return landed_state == mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND
+
+
+def is_usb_lost(watcher):
+    """Return whether the device watched by a `UsbWatcher` is unplugged, without waiting."""
+    return not watcher.scan()
+
+
+def request_flight_termination(reason):
+    """Have the server terminate the flight with its autopilot connection. If the server can't be
+    reached or its termination failed, connect to the autopilot and terminate it from here."""
+    try:
+        get_client().command("FT", text=reason)
+        return
+    except TimeoutError:
+        # The server accepted it and is still terminating (e.g. waiting to land).
+        logger.warning("The server is taking a long time to terminate the flight.")
+        return
+    except (OSError, IpcError) as e:
+        logger.error(f"The server couldn't terminate the flight ({e}), connecting directly.")
+    autopilot = connect_to_autopilot()
+    asyncio.run(terminate_directly(autopilot, reason))
+
+
+async def terminate_directly(autopilot, reason):
+    """Terminate the flight on a connection of our own, running its receive loop meanwhile."""
+    receive_task = asyncio.create_task(receive_msg_loop(autopilot))
+    try:
+        await begin_flight_termination(autopilot, reason)
+    finally:
+        receive_task.cancel()
+
+
+def connect_to_autopilot():
+    """Connect to the autopilot and read its battery level.
+
+    Raises:
+        ConnectionError: If the autopilot can't be connected to.
+    """
+    conn_string = os.getenv("AUTOPILOT_CONN_STRING")
+    autopilot = AutopilotConnectionWrapper(conn_string, os.getenv("AUTOPILOT_BAUDRATE"))
+    if not autopilot.conn:
+        raise ConnectionError(f"Couldn't connect to the autopilot on {conn_string}.")
+    sys_status = autopilot.conn.recv_match(
+        type=[SYS_STATUS], blocking=True, timeout=SYS_STATUS_TIMEOUT
+    )
+    if sys_status is not None:
+        autopilot.process_sys_status(sys_status)
+    return autopilot
 
 
 def main():
-    while True:
-        time.sleep(1)
-        if is_usb_lost():
-            begin_flight_termination(None)
+    if not RC_OUTPUT:
+        logger.error("RC_OUTPUT isn't set, there is no USB device to watch.")
+        sys.exit(1)
+    watcher = UsbWatcher(RC_OUTPUT)
+    try:
+        while True:
+            watcher.wait_for_loss()
+            logger.info(f"USB device {RC_OUTPUT} lost.")
+            request_flight_termination(f"USB device {RC_OUTPUT} lost")
+            # Terminate once per loss.
+            while not watcher.present:
+                watcher.wait()
+            logger.info(f"USB device {RC_OUTPUT} is back.")
+    finally:
+        watcher.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from pymavlink import mavutil
+
+from flight_termination.flight_termination import (
+    begin_flight_termination,
+    is_drone_landed_from_telemetry,
+)
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.simulator import SimulatedAutopilot
+from navigation.telemetry import TelemetryStore
+
+mavlink = mavutil.mavlink
+
+PORT = 14571
+
+
+class FakeAutopilot:
+    def __init__(self):
+        self.telemetry = TelemetryStore(capacity=4)
+
+    def set_landed_state(self, landed_state):
+        self.telemetry.record(mavlink.MAVLink_extended_sys_state_message(0, landed_state))
+
+
+class TestIsDroneLandedFromTelemetry(unittest.TestCase):
+    def test_no_telemetry(self):
+        autopilot = FakeAutopilot()
+        self.assertIsNone(is_drone_landed_from_telemetry(autopilot))
+
+    def test_on_ground(self):
+        autopilot = FakeAutopilot()
+        autopilot.set_landed_state(mavlink.MAV_LANDED_STATE_ON_GROUND)
+        self.assertTrue(is_drone_landed_from_telemetry(autopilot))
+
+    def test_in_air(self):
+        autopilot = FakeAutopilot()
+        autopilot.set_landed_state(mavlink.MAV_LANDED_STATE_IN_AIR)
+        self.assertFalse(is_drone_landed_from_telemetry(autopilot))
+
+    def test_landing_is_undecided(self):
+        autopilot = FakeAutopilot()
+        autopilot.set_landed_state(mavlink.MAV_LANDED_STATE_LANDING)
+        self.assertIsNone(is_drone_landed_from_telemetry(autopilot))
+
+
+class TestBeginFlightTermination(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.vehicle = SimulatedAutopilot(
+            f"udpout:127.0.0.1:{PORT}", heartbeat_rate_hz=10, telemetry_rate_hz=20
+        )
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle.start()
+        while self.autopilot_conn.telemetry.latest("EXTENDED_SYS_STATE") is None:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    def commands(self):
+        """The commands the vehicle received, leaving out stream rate requests."""
+        return [
+            msg.command
+            for msg in self.vehicle.commands
+            if msg.command != mavlink.MAV_CMD_SET_MESSAGE_INTERVAL
+        ]
+
+    async def test_returns_to_launch_with_enough_battery(self):
+        await asyncio.wait_for(begin_flight_termination(self.autopilot_conn, "test"), 5)
+        self.assertEqual(self.commands(), [mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH])
+
+    async def test_lands_then_disarms_on_low_battery(self):
+        self.vehicle.battery_remaining = 20
+        while self.autopilot_conn.telemetry.latest("SYS_STATUS")["battery_remaining"] != 20:
+            await asyncio.sleep(0.01)
+        termination = asyncio.create_task(begin_flight_termination(self.autopilot_conn))
+        while mavlink.MAV_CMD_NAV_LAND not in self.commands():
+            await asyncio.sleep(0.01)
+        # Not disarmed before it is on the ground.
+        await asyncio.sleep(0.2)
+        self.assertTrue(self.vehicle.armed)
+        self.vehicle.landed_state = mavlink.MAV_LANDED_STATE_ON_GROUND
+        await asyncio.wait_for(termination, 5)
+        self.assertEqual(
+            self.commands(), [mavlink.MAV_CMD_NAV_LAND, mavlink.MAV_CMD_COMPONENT_ARM_DISARM]
+        )
+        self.assertFalse(self.vehicle.armed)
+
+    async def test_disarms_on_the_ground(self):
+        self.vehicle.landed_state = mavlink.MAV_LANDED_STATE_ON_GROUND
+        while not is_drone_landed_from_telemetry(self.autopilot_conn):
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(begin_flight_termination(self.autopilot_conn), 5)
+        self.assertEqual(self.commands(), [mavlink.MAV_CMD_COMPONENT_ARM_DISARM])
+        self.assertFalse(self.vehicle.armed)
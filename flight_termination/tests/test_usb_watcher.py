@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flight_termination import flight_termination
+from flight_termination.usb_watcher import UsbWatcher, describe_device, read_usb_devices
+
+PIXHAWK = {"idVendor": "26ac", "idProduct": "0011", "manufacturer": "3D Robotics", "product": "PX4"}
+
+
+class FakeSysfs:
+    """A directory laid out like /sys/bus/usb/devices."""
+
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+
+    def plug(self, name, attributes):
+        os.mkdir(os.path.join(self.root, name))
+        for attribute, value in attributes.items():
+            with open(os.path.join(self.root, name, attribute), "w") as f:
+                f.write(f"{value}\n")
+
+    def unplug(self, name):
+        shutil.rmtree(os.path.join(self.root, name))
+
+    def cleanup(self):
+        self.directory.cleanup()
+
+
+class TestUsbWatcher(unittest.TestCase):
+    def setUp(self):
+        self.sysfs = FakeSysfs()
+        self.sysfs.plug("usb1", {"idVendor": "1d6b", "idProduct": "0002", "product": "Hub"})
+        self.sysfs.plug("1-1", PIXHAWK)
+        # An interface of the device, which isn't a device itself.
+        self.sysfs.plug("1-1:1.0", {"bInterfaceClass": "02"})
+
+    def tearDown(self):
+        self.sysfs.cleanup()
+
+    def test_read_devices(self):
+        devices = read_usb_devices(self.sysfs.root)
+        self.assertEqual(set(devices), {"usb1", "1-1"})
+        self.assertEqual(describe_device(devices["1-1"]), "26ac:0011 3D Robotics PX4")
+        self.assertEqual(read_usb_devices(os.path.join(self.sysfs.root, "missing")), {})
+
+    def test_loss_is_detected_from_events(self):
+        watcher = UsbWatcher("26ac:0011", self.sysfs.root)
+        self.addCleanup(watcher.close)
+        self.assertIsNotNone(watcher.events)
+        self.assertTrue(watcher.present)
+
+        lost = threading.Event()
+
+        def watch():
+            watcher.wait_for_loss()
+            lost.set()
+
+        thread = threading.Thread(target=watch)
+        thread.start()
+        unplugged = time.monotonic()
+        self.sysfs.unplug("1-1")
+        self.assertTrue(lost.wait(1))
+        # Much sooner than the periodic rescan.
+        self.assertLess(time.monotonic() - unplugged, 0.5)
+        thread.join()
+
+        self.sysfs.plug("1-1", PIXHAWK)
+        self.assertTrue(watcher.wait(timeout=1))
+
+    def test_rescans_without_events(self):
+        with mock.patch("flight_termination.usb_watcher._Inotify", side_effect=OSError("no")):
+            watcher = UsbWatcher("PX4", self.sysfs.root)
+        self.assertIsNone(watcher.events)
+        self.sysfs.unplug("1-1")
+        self.assertFalse(watcher.wait(timeout=0.01))
+
+    def test_absent_device_is_lost(self):
+        watcher = UsbWatcher("0483:5740", self.sysfs.root)
+        self.addCleanup(watcher.close)
+        self.assertFalse(watcher.present)
+        self.assertTrue(flight_termination.is_usb_lost(watcher))
+
+
+class TestRequestFlightTermination(unittest.TestCase):
+    def test_through_the_server(self):
+        client = mock.Mock()
+        with mock.patch.object(flight_termination, "get_client", return_value=client):
+            flight_termination.request_flight_termination("USB lost")
+        client.command.assert_called_once_with("FT", text="USB lost")
+
+    def test_directly_when_the_server_is_down(self):
+        client = mock.Mock()
+        client.command.side_effect = ConnectionRefusedError()
+        autopilot = object()
+        with mock.patch.object(
+            flight_termination, "get_client", return_value=client
+        ), mock.patch.object(
+            flight_termination, "connect_to_autopilot", return_value=autopilot
+        ), mock.patch.object(
+            flight_termination, "receive_msg_loop"
+        ) as receive, mock.patch.object(
+            flight_termination, "begin_flight_termination"
+        ) as terminate:
+            flight_termination.request_flight_termination("USB lost")
+        terminate.assert_awaited_once_with(autopilot, "USB lost")
+        # The connection is received on while the flight is terminated.
+        receive.assert_called_once_with(autopilot)
+
+
+if __name__ == "__main__":
+    unittest.main()
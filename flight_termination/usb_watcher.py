@@ -0,0 +1,180 @@
+"""Watches for a USB device being unplugged, without polling `lsusb`.
+
+The devices are read from sysfs (`/sys/bus/usb/devices`): every device directory has its
+`idVendor`, `idProduct`, `manufacturer` and `product` in files. The watcher rescans them when the
+kernel announces a device change on its netlink uevent socket. sysfs doesn't report changes
+through inotify, so other trees (e.g. a fake sysfs in tests) are watched with inotify instead.
+Either way, the devices are also rescanned every `RESCAN_INTERVAL` seconds in case an event is
+missed or neither event source can be opened.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import socket
+import time
+
+logger = logging.getLogger()
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+# Seconds between rescans when no event arrives.
+RESCAN_INTERVAL = 1.0
+
+# Netlink protocol of the kernel's device events, and its multicast group.
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_GROUP = 1
+# inotify events of a device directory appearing or disappearing.
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+DEVICE_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+# Attribute files read from each device directory.
+DEVICE_ATTRIBUTES = ("idVendor", "idProduct", "manufacturer", "product", "serial")
+
+
+def read_usb_devices(root=SYSFS_USB_DEVICES):
+    """Return the USB devices under `root`, as a dict of attributes per device directory name.
+
+    Interfaces (e.g. `1-1:1.0`) and anything else without an `idVendor` are skipped.
+    """
+    devices = {}
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return devices
+    for name in names:
+        attributes = {}
+        for attribute in DEVICE_ATTRIBUTES:
+            try:
+                with open(os.path.join(root, name, attribute)) as f:
+                    attributes[attribute] = f.read().strip()
+            except OSError:
+                pass
+        if "idVendor" in attributes:
+            devices[name] = attributes
+    return devices
+
+
+def describe_device(attributes):
+    """Describe a device as `lsusb` does, e.g. `0483:5740 STMicroelectronics Pixhawk`."""
+    parts = [f"{attributes.get('idVendor', '')}:{attributes.get('idProduct', '')}"]
+    parts.extend(attributes[key] for key in ("manufacturer", "product") if attributes.get(key))
+    return " ".join(parts)
+
+
+class _Inotify:
+    """The inotify calls of libc, which the standard library doesn't wrap."""
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), DEVICE_EVENTS) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Can't watch {path}")
+
+    def fileno(self):
+        return self.fd
+
+    def drain(self):
+        """Read the pending events. Returns whether there were any."""
+        events = False
+        while True:
+            try:
+                if not os.read(self.fd, 4096):
+                    return events
+            except BlockingIOError:
+                return events
+            events = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Uevents:
+    """The kernel's device events, keeping only those of USB devices."""
+
+    def __init__(self):
+        self.socket = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK, NETLINK_KOBJECT_UEVENT
+        )
+        try:
+            self.socket.bind((0, UEVENT_GROUP))
+        except OSError:
+            self.socket.close()
+            raise
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def drain(self):
+        events = False
+        while True:
+            try:
+                event = self.socket.recv(65536)
+            except BlockingIOError:
+                return events
+            if b"\0SUBSYSTEM=usb\0" in event:
+                events = True
+
+    def close(self):
+        self.socket.close()
+
+
+class UsbWatcher:
+    """Tracks whether a USB device whose `lsusb`-style description contains `match` is plugged in.
+
+    Args:
+        match (str): Part of the description of the device, e.g. its `vendor:product` id.
+        root (str): The directory of USB devices.
+    """
+
+    def __init__(self, match, root=SYSFS_USB_DEVICES):
+        self.match = match
+        self.root = root
+        self.events = self._open_events()
+        self.present = self.scan()
+
+    def _open_events(self):
+        try:
+            if os.path.realpath(self.root) == os.path.realpath(SYSFS_USB_DEVICES):
+                return _Uevents()
+            return _Inotify(self.root)
+        except OSError as e:
+            logger.warning(f"Can't watch {self.root} for events ({e}), rescanning it periodically.")
+            return None
+
+    def scan(self):
+        """Return whether the device is plugged in."""
+        return any(
+            self.match in describe_device(attributes)
+            for attributes in read_usb_devices(self.root).values()
+        )
+
+    def wait(self, timeout=RESCAN_INTERVAL):
+        """Wait up to `timeout` seconds for a device change and return whether the device is
+        plugged in afterwards."""
+        if self.events is None:
+            time.sleep(timeout)
+        else:
+            readable, _, _ = select.select([self.events], [], [], timeout)
+            if readable and not self.events.drain():
+                return self.present
+        self.present = self.scan()
+        return self.present
+
+    def wait_for_loss(self):
+        """Block until the device is unplugged, or return at once if it isn't plugged in."""
+        while self.present:
+            self.wait()
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
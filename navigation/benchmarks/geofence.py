@@ -0,0 +1,88 @@
+"""Measure geofence checks per second against polygons with thousands of vertices, comparing the
+grid index with testing every edge.
+
+Positions are drawn uniformly over an area a little larger than the polygon, so some are inside,
+some just outside and some far outside it. The full check also converts each position from
+latitude and longitude into the fence's local frame, as `GeofenceMonitor` does for every
+GLOBAL_POSITION_INT.
+
+Run with `python -m navigation.benchmarks.geofence`.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from navigation.geodesy import LocalFrame
+from navigation.geofence import Geofence, PolygonZone
+
+VERTEX_COUNTS = (100, 1000, 5000, 20000)
+# Radius (in metres) of the polygons.
+RADIUS = 2000
+CHECKS = 5000
+HOME = (43.4723, -80.5449)
+
+
+def star_polygon(vertex_count, radius, rng):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertex_count))
+    radii = radius * (1 + 0.3 * rng.uniform(-1, 1, vertex_count))
+    return np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+
+
+def checks_per_second(check, points):
+    start = time.perf_counter()
+    for east, north in points:
+        check(east, north)
+    return len(points) / (time.perf_counter() - start)
+
+
+def measure(vertex_count, checks, seed=0):
+    rng = np.random.default_rng(seed)
+    build_start = time.perf_counter()
+    zone = PolygonZone(star_polygon(vertex_count, RADIUS, rng))
+    build_time = time.perf_counter() - build_start
+    frame = LocalFrame(*HOME)
+    fence = Geofence(frame, [zone])
+
+    points = rng.uniform(-1.75 * RADIUS, 1.75 * RADIUS, (checks, 2))
+    lat, lon, _ = frame.geodetic(points[:, 0], points[:, 1])
+    positions = list(zip(lat.tolist(), lon.tolist()))
+    points = points.tolist()
+
+    # The exhaustive check is slow on large polygons, so it gets fewer points.
+    exhaustive_points = points[: max(checks // 10, 100)]
+    return {
+        "vertices": vertex_count,
+        "build_seconds": build_time,
+        "indexed_checks_per_second": checks_per_second(zone.check_horizontal, points),
+        "exhaustive_checks_per_second": checks_per_second(
+            zone.check_horizontal_exhaustive, exhaustive_points
+        ),
+        "full_checks_per_second": checks_per_second(fence.check, positions),
+    }
+
+
+def run(vertex_counts=VERTEX_COUNTS, checks=CHECKS):
+    return {f"{count} vertices": measure(count, checks) for count in vertex_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vertices", type=int, nargs="+", default=list(VERTEX_COUNTS))
+    parser.add_argument("--checks", type=int, default=CHECKS)
+    args = parser.parse_args()
+
+    results = run(args.vertices, args.checks)
+    print(f"{'polygon':<16}{'build s':>9}{'indexed/s':>11}{'exhaustive/s':>14}{'full/s':>9}")
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['build_seconds']:>9.2f}"
+            f"{result['indexed_checks_per_second']:>11.0f}"
+            f"{result['exhaustive_checks_per_second']:>14.0f}"
+            f"{result['full_checks_per_second']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
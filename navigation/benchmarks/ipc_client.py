@@ -0,0 +1,114 @@
+"""Measure requests per second through the IPC server with the pooled client, against opening a
+connection for every request as `scripts/client.py` does.
+
+The server runs in its own process and answers binary telemetry requests for the latest
+GLOBAL_POSITION_INT. The pooled client sends its requests either one at a time, waiting for each
+reply, or pipelined in batches.
+
+Run with `python -m navigation.benchmarks.ipc_client`.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+from pymavlink import mavutil
+
+from navigation import ipc_protocol as protocol
+from navigation.ipc import IpcServer, encode_frame, recv_frame
+from navigation.ipc_client import IpcClient
+from navigation.telemetry import TelemetryStore
+from navigation.utils import GLOBAL_POSITION_INT
+
+REQUESTS = 5000
+BATCH_SIZE = 32
+
+
+class Vehicle:
+    def __init__(self):
+        self.telemetry = TelemetryStore(capacity=16)
+        self.telemetry.record(
+            mavutil.mavlink.MAVLink_global_position_int_message(
+                0, 498000000, -971000000, 250000, 20000, 0, 0, 0, 9000
+            )
+        )
+
+
+def serve(path, ready):
+    vehicle = Vehicle()
+
+    async def main():
+        server = IpcServer(path, lambda request: protocol.handle_request(None, vehicle, request))
+        await server.start()
+        ready.set()
+        await server.run()
+
+    asyncio.run(main())
+
+
+def connection_per_request(path, requests):
+    for request_id in range(requests):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall(
+            encode_frame(protocol.encode_telemetry_request(request_id, GLOBAL_POSITION_INT))
+        )
+        recv_frame(sock)
+        sock.close()
+
+
+def pooled(path, requests):
+    client = IpcClient(path)
+    for _ in range(requests):
+        client.telemetry(GLOBAL_POSITION_INT)
+    client.close()
+
+
+def pipelined(path, requests):
+    client = IpcClient(path)
+    for _ in range(0, requests, BATCH_SIZE):
+        futures = [client.submit_telemetry(GLOBAL_POSITION_INT) for _ in range(BATCH_SIZE)]
+        for future in futures:
+            future.result()
+    client.close()
+
+
+def run(requests=REQUESTS):
+    modes = {
+        "connection per request": connection_per_request,
+        "pooled": pooled,
+        f"pipelined x{BATCH_SIZE}": pipelined,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "socket")
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=serve, args=(path, ready), daemon=True)
+        process.start()
+        try:
+            ready.wait(10)
+            for name, mode in modes.items():
+                start = time.perf_counter()
+                mode(path, requests)
+                results[name] = requests / (time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    args = parser.parse_args()
+
+    for name, rate in run(args.requests).items():
+        print(f"{name:<24}{rate:>9.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
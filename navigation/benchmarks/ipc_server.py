@@ -0,0 +1,128 @@
+"""Load test the IPC server with hundreds of concurrent local clients.
+
+The server runs in its own process with a handler that answers at once, like a STATS request, so
+what is measured is the server itself: framing, per-client tasks and the socket round trip. Each
+client connects, then sends its requests one after the other, waiting for each reply. Latency is
+measured by the clients; memory is the server process' resident set size (Linux only), idle and
+at its peak under load.
+
+Run with `python -m navigation.benchmarks.ipc_server`.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from navigation.ipc import IpcServer, encode_frame, read_frame
+
+CLIENT_COUNTS = (10, 100, 500)
+REQUESTS_PER_CLIENT = 50
+REQUEST = b"GOTO 49.8 -97.1 20"
+
+
+def serve(path, ready):
+    async def handle(request):
+        return b"OK done"
+
+    async def main():
+        server = IpcServer(path, handle)
+        await server.start()
+        ready.set()
+        await server.run()
+
+    asyncio.run(main())
+
+
+def memory_kib(pid):
+    """Return the current and peak resident set size of a process, in KiB."""
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(value.split()[0])
+    return values["VmRSS"], values["VmHWM"]
+
+
+async def client(path, requests, latencies, start):
+    reader, writer = await asyncio.open_unix_connection(path)
+    await start.wait()
+    frame = encode_frame(REQUEST)
+    for _ in range(requests):
+        sent = time.perf_counter()
+        writer.write(frame)
+        await read_frame(reader)
+        latencies.append(time.perf_counter() - sent)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load(path, clients, requests):
+    latencies = []
+    start = asyncio.Event()
+    tasks = [asyncio.create_task(client(path, requests, latencies, start)) for _ in range(clients)]
+    # Let every client connect before any sends, so they all run at the same time.
+    await asyncio.sleep(0.1 + clients * 0.001)
+    began = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - began
+
+
+def measure(clients, requests):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "socket")
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=serve, args=(path, ready), daemon=True)
+        process.start()
+        try:
+            ready.wait(10)
+            idle_kib, _ = memory_kib(process.pid)
+            latencies, duration = asyncio.run(load(path, clients, requests))
+            _, peak_kib = memory_kib(process.pid)
+        finally:
+            process.terminate()
+            process.join()
+    latencies = np.array(latencies) * 1000
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / duration,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "idle_rss_kib": idle_kib,
+        "peak_rss_kib": peak_kib,
+    }
+
+
+def run(client_counts=CLIENT_COUNTS, requests=REQUESTS_PER_CLIENT):
+    return {f"{count} clients": measure(count, requests) for count in client_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=list(CLIENT_COUNTS))
+    parser.add_argument("--requests", type=int, default=REQUESTS_PER_CLIENT)
+    args = parser.parse_args()
+
+    results = run(args.clients, args.requests)
+    print(
+        f"{'load':<13}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        f"{'idle KiB':>10}{'peak KiB':>10}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<13}{result['requests_per_second']:>9.0f}{result['p50_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['max_ms']:>9.2f}"
+            f"{result['idle_rss_kib']:>10}{result['peak_rss_kib']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Benchmark the navigation message path with synthetic or recorded MAVLink streams.
+
+Each stage is measured on its own:
+
+- `get_msg`: parsing frames from a UDP loopback connection.
+- `process_autopilot_msg`: dispatching decoded messages to the default handlers.
+- `update_current_position`: the GLOBAL_POSITION_INT handler alone.
+- `send_heartbeat_msg`: encoding and sending one heartbeat.
+- `receive_msg_loop`: the whole receive path, fed by a `ReplayReader`.
+- `heartbeat_loop`: the timing of the periodic heartbeat task.
+
+For each stage the throughput, the per-message latency percentiles and the memory allocated per
+message (from `tracemalloc`, in a separate pass so tracing doesn't skew the timings) are reported.
+Results can be saved as JSON and compared with an earlier run.
+
+Run with `python -m navigation.benchmarks.message_path [--recording flight.mavrec] [--output
+results.json] [--compare previous.json]`.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from pymavlink import mavutil
+
+from navigation.connection import (
+    AutopilotConnectionWrapper,
+    heartbeat_loop,
+    process_autopilot_msg,
+    receive_msg_loop,
+)
+from navigation.periodic import PeriodicScheduler
+from navigation.recorder import FlightLog, FlightRecorder, ReplayReader
+
+mavlink = mavutil.mavlink
+
+MESSAGE_COUNT = 20000
+# Frames sent per UDP datagram and datagrams sent before draining, to stay within socket buffers.
+FRAMES_PER_DATAGRAM = 20
+DATAGRAMS_PER_BURST = 20
+HEARTBEAT_RATE_HZ = 50
+HEARTBEAT_DURATION = 2.0
+PORT = 14640
+
+
+def synthetic_messages(count):
+    """A telemetry-like mix: a position, attitude and status message per heartbeat tenth."""
+    mav = mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    messages = []
+    for i in range(count):
+        kind = i % 10
+        if kind == 0:
+            message = mavlink.MAVLink_heartbeat_message(2, 12, 0, 0, 0, 3)
+        elif kind in (1, 4, 7):
+            message = mavlink.MAVLink_global_position_int_message(
+                i, 498135200 + i, -971203500 - i, 250000, 20000, 0, 0, 0, 0
+            )
+        elif kind in (2, 5, 8):
+            message = mavlink.MAVLink_attitude_message(i, 0.01, 0.02, 0.03, 0, 0, 0)
+        elif kind == 3:
+            message = mavlink.MAVLink_sys_status_message(
+                0, 0, 0, 500, 15800, 1200, 80, 0, 0, 0, 0, 0, 0
+            )
+        else:
+            message = mavlink.MAVLink_extended_sys_state_message(0, 2)
+        message.pack(mav)
+        messages.append(message)
+    return messages
+
+
+def recorded_messages(path, count=None):
+    log = FlightLog(path)
+    mav = mavlink.MAVLink(None)
+    try:
+        total = len(log) if count is None else min(count, len(log))
+        return [mav.decode(bytearray(log.frame(i))) for i in range(total)]
+    finally:
+        log.close()
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def summarize(latencies_ns, duration):
+    latencies_ns = sorted(latencies_ns)
+    return {
+        "messages": len(latencies_ns),
+        "messages_per_second": len(latencies_ns) / duration if duration else None,
+        "latency_p50_us": percentile(latencies_ns, 0.5) / 1000,
+        "latency_p99_us": percentile(latencies_ns, 0.99) / 1000,
+        "latency_max_us": latencies_ns[-1] / 1000,
+    }
+
+
+def measure_allocations(run, count):
+    """Run `run()` under tracemalloc and return the memory allocated per message."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "retained_bytes_per_message": (after - before) / count,
+        "peak_bytes_per_message": (peak - before) / count,
+    }
+
+
+def new_wrapper(port):
+    return AutopilotConnectionWrapper(f"udpin:127.0.0.1:{port}")
+
+
+def bench_get_msg(messages, port):
+    wrapper = new_wrapper(port)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    frames = [bytes(message.get_msgbuf()) for message in messages]
+    # Bursts of datagrams, each a list of (datagram, number of frames in it).
+    bursts = []
+    per_burst = FRAMES_PER_DATAGRAM * DATAGRAMS_PER_BURST
+    for first in range(0, len(frames), per_burst):
+        burst = []
+        for start in range(first, min(first + per_burst, len(frames)), FRAMES_PER_DATAGRAM):
+            chunk = frames[start:][:FRAMES_PER_DATAGRAM]
+            burst.append((b"".join(chunk), len(chunk)))
+        bursts.append(burst)
+
+    def run(latencies):
+        for burst in bursts:
+            sent = 0
+            for datagram, count in burst:
+                sender.sendto(datagram, ("127.0.0.1", port))
+                sent += count
+            received = 0
+            idle = 0
+            while idle < 100:
+                start = time.perf_counter_ns()
+                message = wrapper.get_msg()
+                if message is None:
+                    idle += 1
+                    continue
+                if latencies is not None:
+                    latencies.append(time.perf_counter_ns() - start)
+                received += 1
+                idle = 0
+                if received >= sent:
+                    break
+
+    try:
+        latencies = []
+        start = time.perf_counter()
+        run(latencies)
+        duration = time.perf_counter() - start
+        result = summarize(latencies, duration)
+        result.update(measure_allocations(lambda: run(None), len(messages)))
+    finally:
+        sender.close()
+        wrapper.conn.close()
+    return result
+
+
+def bench_sync(messages, func, port):
+    wrapper = new_wrapper(port)
+
+    def run(latencies):
+        for message in messages:
+            start = time.perf_counter_ns()
+            func(wrapper, message)
+            if latencies is not None:
+                latencies.append(time.perf_counter_ns() - start)
+
+    try:
+        latencies = []
+        start = time.perf_counter()
+        run(latencies)
+        duration = time.perf_counter() - start
+        result = summarize(latencies, duration)
+        result.update(measure_allocations(lambda: run(None), len(messages)))
+    finally:
+        wrapper.conn.close()
+    return result
+
+
+def bench_process_autopilot_msg(messages, port):
+    async def run_async(wrapper, latencies):
+        for message in messages:
+            start = time.perf_counter_ns()
+            await process_autopilot_msg(message, wrapper)
+            if latencies is not None:
+                latencies.append(time.perf_counter_ns() - start)
+
+    async def measure():
+        wrapper = new_wrapper(port)
+        try:
+            latencies = []
+            start = time.perf_counter()
+            await run_async(wrapper, latencies)
+            duration = time.perf_counter() - start
+            result = summarize(latencies, duration)
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            await run_async(wrapper, None)
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result["retained_bytes_per_message"] = (after - before) / len(messages)
+            result["peak_bytes_per_message"] = (peak - before) / len(messages)
+        finally:
+            wrapper.conn.close()
+        return result
+
+    return asyncio.run(measure())
+
+
+def bench_receive_loop(messages, port):
+    """The whole receive path, from frames in a recording to the handlers."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stream.mavrec")
+        recorder = FlightRecorder(path)
+        for i, message in enumerate(messages):
+            recorder.record(message, timestamp=i)
+        recorder.close()
+
+        async def replay():
+            wrapper = new_wrapper(port)
+            log = FlightLog(path)
+            try:
+                reader = ReplayReader(wrapper, log, speed=None)
+                start = time.perf_counter()
+                await receive_msg_loop(wrapper, reader)
+                return time.perf_counter() - start
+            finally:
+                log.close()
+                wrapper.conn.close()
+
+        duration = asyncio.run(replay())
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        asyncio.run(replay())
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "messages": len(messages),
+        "messages_per_second": len(messages) / duration,
+        "retained_bytes_per_message": (after - before) / len(messages),
+        "peak_bytes_per_message": (peak - before) / len(messages),
+    }
+
+
+def bench_heartbeat_loop(rate_hz, duration, port):
+    async def measure():
+        wrapper = new_wrapper(port)
+        scheduler = PeriodicScheduler()
+        try:
+            task = asyncio.create_task(heartbeat_loop(wrapper, scheduler, rate_hz))
+            await asyncio.sleep(duration)
+            stats = scheduler.stats()[0].to_dict()
+            task.cancel()
+        finally:
+            wrapper.conn.close()
+        return {
+            "rate_hz": rate_hz,
+            "runs": stats["runs"],
+            "skipped": stats["skipped"],
+            "jitter_mean_us": stats["mean_jitter"] * 1e6,
+            "jitter_p99_us": stats["p99_jitter"] * 1e6,
+            "jitter_max_us": stats["max_jitter"] * 1e6,
+        }
+
+    return asyncio.run(measure())
+
+
+def run(messages, port=PORT):
+    positions = [message for message in messages if message.get_type() == "GLOBAL_POSITION_INT"]
+    heartbeats = messages[: max(1, len(messages) // 10)]
+    return {
+        "get_msg": bench_get_msg(messages, port),
+        "process_autopilot_msg": bench_process_autopilot_msg(messages, port),
+        "update_current_position": bench_sync(
+            positions, lambda wrapper, message: wrapper.update_current_position(message), port
+        ),
+        "send_heartbeat_msg": bench_sync(
+            heartbeats, lambda wrapper, message: wrapper.send_heartbeat_msg(), port
+        ),
+        "receive_msg_loop": bench_receive_loop(messages, port),
+        "heartbeat_loop": bench_heartbeat_loop(HEARTBEAT_RATE_HZ, HEARTBEAT_DURATION, port),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, previous):
+    """Print the change in throughput of each stage relative to an earlier run."""
+    print(f"\n{'stage':<26}{'before':>12}{'after':>12}{'change':>9}")
+    for name, result in results["results"].items():
+        before = previous.get("results", {}).get(name, {}).get("messages_per_second")
+        after = result.get("messages_per_second")
+        if not before or not after:
+            continue
+        print(f"{name:<26}{before:>12.0f}{after:>12.0f}{100 * (after / before - 1):>8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=MESSAGE_COUNT)
+    parser.add_argument("--recording", help="A flight recording to use instead of synthetic data.")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--output", help="Save the results as JSON to this file.")
+    parser.add_argument("--compare", help="Compare against the JSON results of an earlier run.")
+    args = parser.parse_args()
+    # The handlers log at INFO level, which would dominate the measurements.
+    logging.disable(logging.INFO)
+
+    if args.recording:
+        messages = recorded_messages(args.recording, args.messages)
+        source = args.recording
+    else:
+        messages = synthetic_messages(args.messages)
+        source = "synthetic"
+    results = {
+        "environment": environment(),
+        "source": source,
+        "results": run(messages, args.port),
+    }
+
+    print(f"{'stage':<26}{'msgs/s':>12}{'p50 us':>9}{'p99 us':>9}{'max us':>10}{'B/msg':>8}")
+    for name, result in results["results"].items():
+        if "messages_per_second" not in result:
+            continue
+        latencies = "".join(
+            f"{result[key]:>{width}.1f}" if key in result else f"{'-':>{width}}"
+            for key, width in (("latency_p50_us", 9), ("latency_p99_us", 9), ("latency_max_us", 10))
+        )
+        print(
+            f"{name:<26}{result['messages_per_second']:>12.0f}{latencies}"
+            f"{result['peak_bytes_per_message']:>8.0f}"
+        )
+    heartbeat = results["results"]["heartbeat_loop"]
+    print(
+        f"heartbeat_loop @ {heartbeat['rate_hz']} Hz: {heartbeat['runs']} runs, "
+        f"{heartbeat['skipped']} skipped, jitter p99 {heartbeat['jitter_p99_us']:.0f} us, "
+        f"max {heartbeat['jitter_max_us']:.0f} us"
+    )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(results, json.load(previous))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Measure the memory, encode and send time of large missions, comparing a list of `MissionItem`s
+encoded one frame at a time with a `MissionBatch` encoded in bulk.
+
+Memory is what `tracemalloc` sees allocated while building the mission and its MISSION_ITEM_INT
+frames. Encode time covers building the frames only; send time covers stamping and writing every
+frame with `frames.send_frame`, as an upload does, so the two add up to the cost of serving the
+whole mission.
+
+Run with `python -m navigation.benchmarks.mission_batch`.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from pymavlink import mavutil
+
+from navigation import frames
+from navigation.mission import MissionItem
+from navigation.mission_batch import MissionBatch
+from navigation.mission_upload import EncodedMission
+
+ITEM_COUNTS = (1000, 10000)
+REPEATS = 3
+
+
+class Target:
+    target_system = 1
+    target_component = 1
+
+
+class NullFile:
+    """Discards what is sent, so only the cost of preparing the frames is measured."""
+
+    def write(self, data):
+        pass
+
+
+def positions(count):
+    return 49.8 + np.arange(count) * 1e-5, -97.1 - np.arange(count) * 1e-5
+
+
+def build_items(count):
+    lat, lon = positions(count)
+    return [
+        MissionItem(Target, seq=i, current=0, lat=lat_i, lon=lon_i, alt=20)
+        for i, (lat_i, lon_i) in enumerate(zip(lat.tolist(), lon.tolist()))
+    ]
+
+
+def build_batch(count):
+    lat, lon = positions(count)
+    return MissionBatch.waypoints(Target, lat, lon, 20)
+
+
+def measure(build, count, mav):
+    tracemalloc.start()
+    mission = build(count)
+    items_bytes = tracemalloc.get_traced_memory()[0]
+    encoded = EncodedMission(mav, mission)
+    total_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del encoded
+
+    encode_seconds = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        EncodedMission(mav, mission)
+        encode_seconds = min(encode_seconds, time.perf_counter() - start)
+
+    send_seconds = float("inf")
+    for _ in range(REPEATS):
+        encoded = EncodedMission(mav, mission)
+        start = time.perf_counter()
+        for seq in range(len(encoded)):
+            frames.send_frame(mav, encoded.frame(seq))
+        send_seconds = min(send_seconds, time.perf_counter() - start)
+    return {
+        "items_bytes": items_bytes,
+        "total_bytes": total_bytes,
+        "encode_seconds": encode_seconds,
+        "send_seconds": send_seconds,
+    }
+
+
+def run(item_counts=ITEM_COUNTS):
+    mav = mavutil.mavlink.MAVLink(NullFile(), srcSystem=255, srcComponent=190)
+    results = {}
+    for count in item_counts:
+        results[f"{count} items"] = {
+            "items": measure(build_items, count, mav),
+            "batch": measure(build_batch, count, mav),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+", default=list(ITEM_COUNTS))
+    args = parser.parse_args()
+
+    results = run(args.items)
+    print(
+        f"{'mission':<14}{'kind':<7}{'items KiB':>11}{'total KiB':>11}{'encode ms':>11}"
+        f"{'send ms':>11}"
+    )
+    for name, kinds in results.items():
+        for kind, result in kinds.items():
+            print(
+                f"{name:<14}{kind:<7}{result['items_bytes'] / 1024:>11.0f}"
+                f"{result['total_bytes'] / 1024:>11.0f}"
+                f"{result['encode_seconds'] * 1000:>11.1f}"
+                f"{result['send_seconds'] * 1000:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark mission upload against a simulated autopilot with configurable packet loss.
+
+Compares the blocking `navigation.mission.upload_mission` (lossless link only, since it has no
+retransmission and would hang on the first lost packet) against the asynchronous
+`MissionUploader`.
+
+Run with `python -m navigation.benchmarks.mission_upload`.
+"""
+
+import argparse
+import asyncio
+import time
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission import MissionItem, upload_mission
+from navigation.mission_upload import MissionUploader
+from navigation.simulator import SimulatedAutopilot
+
+ITEM_COUNTS = (100, 1000)
+LOSS_RATES = (0.0, 0.05, 0.2)
+PORT = 14610
+
+
+def make_mission(conn, count):
+    return [
+        MissionItem(conn, seq=i, current=0, lat=49.8 + i * 1e-5, lon=-97.1 - i * 1e-5, alt=20)
+        for i in range(count)
+    ]
+
+
+def measure_legacy(count, port):
+    autopilot = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{port}")
+    vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{port}", use_int_requests=False)
+    vehicle.start()
+    try:
+        autopilot.conn.wait_heartbeat(timeout=5)
+        mission = make_mission(autopilot.conn, count)
+        start = time.monotonic()
+        upload_mission(autopilot.conn, mission)
+        duration = time.monotonic() - start
+    finally:
+        vehicle.stop()
+        autopilot.conn.close()
+    return {"items": count, "duration": duration, "items_per_second": count / duration}
+
+
+async def measure_async(count, loss, port, seed=0):
+    autopilot = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{port}")
+    receive_task = asyncio.create_task(receive_msg_loop(autopilot))
+    vehicle = SimulatedAutopilot(
+        f"udpout:127.0.0.1:{port}", loss=loss, seed=seed, mission_timeout=0.05
+    )
+    vehicle.start()
+    try:
+        while autopilot.conn.target_system != vehicle.system_id:
+            await asyncio.sleep(0.01)
+        mission = make_mission(autopilot.conn, count)
+        uploader = MissionUploader(autopilot, timeout=0.1, retries=50)
+        result = await uploader.upload(mission)
+    finally:
+        receive_task.cancel()
+        vehicle.stop()
+        autopilot.conn.close()
+    return result.to_dict()
+
+
+def run(item_counts=ITEM_COUNTS, loss_rates=LOSS_RATES, port=PORT):
+    results = {}
+    for count in item_counts:
+        results[f"legacy/{count}/loss=0.0"] = measure_legacy(count, port)
+        for loss in loss_rates:
+            results[f"async/{count}/loss={loss}"] = asyncio.run(measure_async(count, loss, port))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+", default=list(ITEM_COUNTS))
+    parser.add_argument("--loss", type=float, nargs="+", default=list(LOSS_RATES))
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    results = run(args.items, args.loss, args.port)
+    print(f"{'upload':<28}{'items':>8}{'seconds':>10}{'items/s':>10}{'retransmits':>13}")
+    for name, result in results.items():
+        print(
+            f"{name:<28}{result['items']:>8}{result['duration']:>10.2f}"
+            f"{result['items_per_second']:>10.1f}{result.get('retransmits', 0):>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Load-test the `ConnectionManager` with many simulated vehicles on UDP loopback links.
+
+The simulated vehicles run in a separate process so the CPU time measured here is only that of the
+manager's event loop: receiving, dispatching and heartbeating for every vehicle.
+
+Run with `python -m navigation.benchmarks.multi_vehicle`.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from pymavlink import mavutil
+
+from navigation.connection_manager import ConnectionManager
+from navigation.simulator import SimulatedAutopilot
+
+VEHICLE_COUNTS = (1, 10, 25)
+TELEMETRY_RATE_HZ = 10
+DURATION = 5.0
+BASE_PORT = 14620
+
+
+def run_vehicles(count, base_port, telemetry_rate_hz, stop_event):
+    vehicles = [
+        SimulatedAutopilot(
+            f"udpout:127.0.0.1:{base_port + i}",
+            system_id=i + 1,
+            telemetry_rate_hz=telemetry_rate_hz,
+        )
+        for i in range(count)
+    ]
+    for vehicle in vehicles:
+        vehicle.start()
+    stop_event.wait()
+    for vehicle in vehicles:
+        vehicle.stop()
+
+
+async def measure(count, telemetry_rate_hz, duration, base_port):
+    manager = ConnectionManager()
+    received = [0]
+
+    def count_message(message):
+        received[0] += 1
+
+    for msg_id in (
+        mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT,
+        mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE,
+        mavutil.mavlink.MAVLINK_MSG_ID_SYS_STATUS,
+        mavutil.mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE,
+    ):
+        manager.dispatcher.subscribe(msg_id, count_message)
+
+    adds = [
+        asyncio.create_task(manager.add_vehicle(f"udpin:127.0.0.1:{base_port + i}"))
+        for i in range(count)
+    ]
+    # Let every connection bind its port before the vehicles start sending.
+    await asyncio.sleep(0.1)
+    stop_event = multiprocessing.Event()
+    sender = multiprocessing.Process(
+        target=run_vehicles, args=(count, base_port, telemetry_rate_hz, stop_event)
+    )
+    sender.start()
+    try:
+        await asyncio.gather(*adds)
+
+        received[0] = 0
+        cpu_start = time.process_time()
+        wall_start = time.monotonic()
+        await asyncio.sleep(duration)
+        cpu_time = time.process_time() - cpu_start
+        wall_time = time.monotonic() - wall_start
+        messages = received[0]
+
+        broadcast_start = time.monotonic()
+        acks = await manager.broadcast(mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, param7=10)
+        broadcast_time = time.monotonic() - broadcast_start
+    finally:
+        await manager.close()
+        stop_event.set()
+        sender.join()
+
+    return {
+        "vehicles": count,
+        "messages_per_second": messages / wall_time,
+        "cpu_percent": 100.0 * cpu_time / wall_time,
+        "cpu_percent_per_vehicle": 100.0 * cpu_time / wall_time / count,
+        "broadcast_ms": broadcast_time * 1000,
+        "broadcast_acked": sum(1 for ack in acks.values() if not isinstance(ack, Exception)),
+    }
+
+
+def run(
+    vehicle_counts=VEHICLE_COUNTS,
+    telemetry_rate_hz=TELEMETRY_RATE_HZ,
+    duration=DURATION,
+    base_port=BASE_PORT,
+):
+    results = {}
+    for count in vehicle_counts:
+        results[f"{count} vehicles"] = asyncio.run(
+            measure(count, telemetry_rate_hz, duration, base_port)
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vehicles", type=int, nargs="+", default=list(VEHICLE_COUNTS))
+    parser.add_argument("--rate", type=float, default=TELEMETRY_RATE_HZ)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--port", type=int, default=BASE_PORT)
+    args = parser.parse_args()
+    # Every vehicle logs its heartbeats, which would drown out the results.
+    logging.disable(logging.INFO)
+
+    results = run(args.vehicles, args.rate, args.duration, args.port)
+    print(f"{'fleet':<14}{'msgs/s':>10}{'cpu %':>8}{'cpu %/veh':>11}{'bcast ms':>10}{'acked':>7}")
+    for name, result in results.items():
+        print(
+            f"{name:<14}{result['messages_per_second']:>10.0f}{result['cpu_percent']:>8.1f}"
+            f"{result['cpu_percent_per_vehicle']:>11.2f}{result['broadcast_ms']:>10.1f}"
+            f"{result['broadcast_acked']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
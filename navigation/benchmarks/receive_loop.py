@@ -0,0 +1,130 @@
+"""Compare the latency and CPU cost of the old 10 ms polling receive loop against the event-driven
+`MavlinkReader` over a UDP loopback link.
+
+Run with `python -m navigation.benchmarks.receive_loop`.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper
+from navigation.reader import MavlinkReader
+
+RATES_HZ = (10, 100, 500)
+DURATION = 3.0
+PORT = 14600
+
+
+def send_messages(conn_string, rate_hz, duration):
+    """Send SYSTEM_TIME messages stamped with the monotonic send time at `rate_hz`."""
+    master = mavutil.mavlink_connection(conn_string)
+    period = 1.0 / rate_hz
+    start = time.monotonic()
+    deadline = start
+    while deadline - start < duration:
+        master.mav.system_time_send(time.monotonic_ns() // 1000, 0)
+        deadline += period
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    master.close()
+
+
+def record_latency(message, latencies):
+    if message.get_type() == "SYSTEM_TIME":
+        latencies.append(time.monotonic_ns() // 1000 - message.time_unix_usec)
+
+
+async def polling_loop(conn, latencies):
+    """The receive loop as it was before the event-driven reader."""
+    while True:
+        message = conn.get_msg()
+        if message:
+            record_latency(message, latencies)
+        else:
+            await asyncio.sleep(0.01)
+
+
+async def reader_loop(conn, latencies):
+    reader = MavlinkReader(conn)
+    reader.start()
+    try:
+        while True:
+            for message in await reader.read_batch():
+                record_latency(message, latencies)
+    finally:
+        reader.stop()
+
+
+async def measure(loop_func, rate_hz, duration, port):
+    conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{port}")
+    latencies = []
+    sender = multiprocessing.Process(
+        target=send_messages, args=(f"udpout:127.0.0.1:{port}", rate_hz, duration)
+    )
+    task = asyncio.create_task(loop_func(conn, latencies))
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    sender.start()
+    while sender.is_alive():
+        await asyncio.sleep(0.1)
+    # Give the receiver a moment to pick up the last messages.
+    await asyncio.sleep(0.05)
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.monotonic() - wall_start
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    conn.conn.close()
+    return summarize(latencies, cpu_time, wall_time)
+
+
+def summarize(latencies, cpu_time, wall_time):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"messages": 0, "cpu_percent": 100.0 * cpu_time / wall_time}
+    return {
+        "messages": len(latencies),
+        "latency_mean_us": statistics.fmean(latencies),
+        "latency_p50_us": latencies[len(latencies) // 2],
+        "latency_p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "latency_max_us": latencies[-1],
+        "cpu_percent": 100.0 * cpu_time / wall_time,
+    }
+
+
+def run(rates=RATES_HZ, duration=DURATION, port=PORT):
+    results = {}
+    for rate_hz in rates:
+        for name, loop_func in (("polling", polling_loop), ("reader", reader_loop)):
+            result = asyncio.run(measure(loop_func, rate_hz, duration, port))
+            results[f"{name}@{rate_hz}Hz"] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rates", type=int, nargs="+", default=list(RATES_HZ))
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    results = run(args.rates, args.duration, args.port)
+    print(f"{'loop':<16}{'msgs':>8}{'mean us':>12}{'p50 us':>10}{'p99 us':>10}{'cpu %':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['messages']:>8}{result.get('latency_mean_us', 0):>12.0f}"
+            f"{result.get('latency_p50_us', 0):>10}{result.get('latency_p99_us', 0):>10}"
+            f"{result['cpu_percent']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
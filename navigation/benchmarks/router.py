@@ -0,0 +1,189 @@
+"""Measure the forwarding latency and throughput of `ServerConnection` over UDP loopback links.
+
+The router runs in its own process between a simulated autopilot link and a simulated GCS link.
+It is compared against a naive forwarder that decodes every message with pymavlink and re-encodes
+it before sending it on.
+
+Run with `python -m navigation.benchmarks.router`.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import select
+import socket
+import statistics
+import struct
+import threading
+import time
+
+from pymavlink import mavutil
+
+from navigation import frames
+from navigation.connection import ServerConnection
+
+LATENCY_RATE_HZ = 1000
+LATENCY_DURATION = 3.0
+THROUGHPUT_FRAMES = 50000
+BASE_PORT = 14630
+
+_timestamp = struct.Struct("<Q")
+
+
+def run_router(autopilot_port, gcs_port, ready, stop):
+    async def serve():
+        router = ServerConnection()
+        router.add_link("autopilot", f"udpin:127.0.0.1:{autopilot_port}")
+        router.add_link("gcs", f"udpout:127.0.0.1:{gcs_port}")
+        router.start()
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        router.close()
+
+    asyncio.run(serve())
+
+
+def run_decoding_forwarder(autopilot_port, gcs_port, ready, stop):
+    """Forward by decoding every message and packing it again, as a pymavlink based forwarder
+    would."""
+    autopilot = mavutil.mavlink_connection(f"udpin:127.0.0.1:{autopilot_port}")
+    gcs = mavutil.mavlink_connection(f"udpout:127.0.0.1:{gcs_port}")
+    ready.set()
+    while not stop.is_set():
+        readable, _, _ = select.select([autopilot.fd], [], [], 0.05)
+        if not readable:
+            continue
+        while True:
+            message = autopilot.recv_msg()
+            if message is None:
+                break
+            gcs.write(message.pack(gcs.mav))
+    autopilot.close()
+    gcs.close()
+
+
+def system_time_frame(mav):
+    return frames.encode(mav, mavutil.mavlink.MAVLink_system_time_message(0, 0))
+
+
+def stamp(frame, sequence):
+    """Write the current monotonic time into the time_unix_usec field of a SYSTEM_TIME frame."""
+    _timestamp.pack_into(frame, frames.header_length(frame), time.monotonic_ns() // 1000)
+    frames.restamp(frame, sequence)
+
+
+def send_frames(port, count, rate_hz):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    frame = system_time_frame(mav)
+    period = 1.0 / rate_hz if rate_hz else 0.0
+    deadline = time.monotonic()
+    for i in range(count):
+        stamp(frame, i % 256)
+        sock.sendto(frame, ("127.0.0.1", port))
+        if period:
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+    sock.close()
+
+
+def receive_frames(sock, expected, idle_timeout=0.5):
+    latencies = []
+    first = last = None
+    sock.settimeout(idle_timeout)
+    while len(latencies) < expected:
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            break
+        now = time.monotonic_ns() // 1000
+        last = time.monotonic()
+        if first is None:
+            first = last
+        offset = 0
+        while offset < len(data):
+            length = frames.frame_length(data, offset)
+            sent = _timestamp.unpack_from(data, offset + frames.header_length(data[offset:]))[0]
+            latencies.append(now - sent)
+            offset += length
+    return latencies, first, last
+
+
+def measure(forwarder, count, rate_hz, base_port):
+    autopilot_port, gcs_port = base_port, base_port + 1
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(("127.0.0.1", gcs_port))
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=forwarder, args=(autopilot_port, gcs_port, ready, stop)
+    )
+    process.start()
+    try:
+        ready.wait(5)
+        sender = threading.Thread(target=send_frames, args=(autopilot_port, count, rate_hz))
+        sender.start()
+        latencies, first, last = receive_frames(receiver, count)
+        sender.join()
+    finally:
+        stop.set()
+        process.join()
+        receiver.close()
+    return summarize(latencies, count, first, last)
+
+
+def summarize(latencies, sent, first, last):
+    if not latencies:
+        return {"sent": sent, "received": 0}
+    latencies = sorted(latencies)
+    duration = last - first if last > first else float("nan")
+    return {
+        "sent": sent,
+        "received": len(latencies),
+        "frames_per_second": len(latencies) / duration,
+        "latency_p50_us": latencies[len(latencies) // 2],
+        "latency_p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "latency_mean_us": statistics.fmean(latencies),
+    }
+
+
+def run(
+    latency_rate_hz=LATENCY_RATE_HZ,
+    latency_duration=LATENCY_DURATION,
+    throughput_frames=THROUGHPUT_FRAMES,
+    base_port=BASE_PORT,
+):
+    results = {}
+    for name, forwarder in (("router", run_router), ("decoding", run_decoding_forwarder)):
+        count = int(latency_rate_hz * latency_duration)
+        results[f"{name}/latency@{latency_rate_hz}Hz"] = measure(
+            forwarder, count, latency_rate_hz, base_port
+        )
+        results[f"{name}/throughput"] = measure(forwarder, throughput_frames, 0, base_port)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=int, default=LATENCY_RATE_HZ)
+    parser.add_argument("--duration", type=float, default=LATENCY_DURATION)
+    parser.add_argument("--frames", type=int, default=THROUGHPUT_FRAMES)
+    parser.add_argument("--port", type=int, default=BASE_PORT)
+    args = parser.parse_args()
+
+    results = run(args.rate, args.duration, args.frames, args.port)
+    print(f"{'forwarder':<28}{'sent':>8}{'recv':>8}{'frames/s':>10}{'p50 us':>9}{'p99 us':>9}")
+    for name, result in results.items():
+        print(
+            f"{name:<28}{result['sent']:>8}{result['received']:>8}"
+            f"{result.get('frames_per_second', 0):>10.0f}{result.get('latency_p50_us', 0):>9}"
+            f"{result.get('latency_p99_us', 0):>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
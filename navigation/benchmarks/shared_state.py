@@ -0,0 +1,90 @@
+"""Measure the latency of reading the shared telemetry snapshot while the writer updates it.
+
+The writer runs in its own process and writes a snapshot at `--rate` Hz (200 by default), like the
+server's publisher. The reader reads it back to back and records how long each read took and how
+often it had to retry because it overlapped a write.
+
+Run with `python -m navigation.benchmarks.shared_state`.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from navigation.shared_state import STATE_FIELDS, TelemetryPublisher, TelemetryReader
+
+READS = 1000000
+WRITE_RATE_HZ = 200
+
+
+def write(name, rate_hz, ready, stop):
+    publisher = TelemetryPublisher(None, name)
+    ready.set()
+    period = 1 / rate_hz
+    deadline = time.monotonic()
+    value = 0.0
+    try:
+        while not stop.is_set():
+            value += 1
+            publisher.write((value,) * len(STATE_FIELDS))
+            deadline += period
+            time.sleep(max(0.0, deadline - time.monotonic()))
+    finally:
+        publisher.close()
+
+
+def percentile(samples, percent):
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+def run(reads=READS, rate_hz=WRITE_RATE_HZ):
+    name = f"benchmark_telemetry_{os.getpid()}"
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    writer = multiprocessing.Process(target=write, args=(name, rate_hz, ready, stop))
+    writer.start()
+    try:
+        ready.wait(10)
+        reader = TelemetryReader(name)
+        start_sequence = reader.sequence
+        latencies = [0] * reads
+        clock = time.perf_counter_ns
+        start = time.perf_counter()
+        for i in range(reads):
+            before = clock()
+            reader.read()
+            latencies[i] = clock() - before
+        elapsed = time.perf_counter() - start
+        writes = (reader.sequence - start_sequence) // 2
+        retries = reader.retries
+        reader.close()
+    finally:
+        stop.set()
+        writer.join()
+
+    latencies.sort()
+    return {
+        "reads": reads,
+        "writes": writes,
+        "retries": retries,
+        "reads_per_second": reads / elapsed,
+        "p50_us": percentile(latencies, 50) / 1000,
+        "p99_us": percentile(latencies, 99) / 1000,
+        "p99.9_us": percentile(latencies, 99.9) / 1000,
+        "max_us": latencies[-1] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reads", type=int, default=READS)
+    parser.add_argument("--rate", type=float, default=WRITE_RATE_HZ, help="Writes per second.")
+    args = parser.parse_args()
+
+    for name, value in run(args.reads, args.rate).items():
+        print(f"{name:<20}{value:>14.2f}" if isinstance(value, float) else f"{name:<20}{value:>14}")
+
+
+if __name__ == "__main__":
+    main()
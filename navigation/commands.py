@@ -0,0 +1,361 @@
+import asyncio
+import collections
+import logging
+import math
+import time
+
+from pymavlink import mavutil
+
+from .utils import ARM_STATE_TIMEOUT, COMMAND_ACK_TIMEOUT, COMMAND_MAX_RETRIES, LANDING_TIMEOUT
+
+logger = logging.getLogger()
+
+# Give up waiting on a command the autopilot reported as MAV_RESULT_IN_PROGRESS after this many
+# seconds without a further ACK.
+COMMAND_IN_PROGRESS_TIMEOUT = 10.0
+
+
+class CommandTimeoutError(TimeoutError):
+    pass
+
+
+class CommandStats:
+    """Round-trip latency counters for a single command id."""
+
+    def __init__(self, command):
+        self.command = command
+        self.acked = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = None
+
+    @property
+    def mean_latency(self):
+        if self.acked == 0:
+            return None
+        return self.total_latency / self.acked
+
+    def record(self, latency):
+        self.acked += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def to_dict(self):
+        return {
+            "command": self.command,
+            "acked": self.acked,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "mean_latency": self.mean_latency,
+            "max_latency": self.max_latency,
+            "last_latency": self.last_latency,
+        }
+
+
+class CommandTransaction:
+    """A COMMAND_LONG waiting for its COMMAND_ACK."""
+
+    def __init__(self, command, target_system, target_component, params, future):
+        self.command = command
+        self.target_system = target_system
+        self.target_component = target_component
+        self.params = params
+        self.future = future
+        self.confirmation = 0
+        self.first_sent_at = None
+        self.sent_at = None
+        self.timer = None
+        self.in_progress = False
+
+    @property
+    def key(self):
+        return (self.command, self.target_system)
+
+    def matches(self, ack):
+        if self.target_system not in (0, ack.get_srcSystem()):
+            return False
+        return self.target_component in (0, ack.get_srcComponent())
+
+
+class CommandManager:
+    """Sends COMMAND_LONGs and resolves them with the matching COMMAND_ACK.
+
+    ACKs are taken from the connection's dispatcher, so commands never compete with the receive loop
+    for messages. Each command gets a future; when no ACK arrives within `timeout` seconds the
+    command is resent with its `confirmation` field incremented, up to `retries` times. Commands
+    with different ids or targets can be in flight at the same time; identical commands to the same
+    target are acknowledged in the order they were sent.
+    """
+
+    def __init__(self, conn, timeout=COMMAND_ACK_TIMEOUT, retries=COMMAND_MAX_RETRIES):
+        self.conn = conn
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {}
+        self._pending = {}
+        conn.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_ACK, self.process_command_ack
+        )
+
+    @property
+    def in_flight(self):
+        return sum(len(transactions) for transactions in self._pending.values())
+
+    def send(
+        self,
+        command,
+        param1=0,
+        param2=0,
+        param3=0,
+        param4=0,
+        param5=0,
+        param6=0,
+        param7=0,
+        target_system=None,
+        target_component=None,
+    ):
+        """Send a COMMAND_LONG and return a future resolved with its COMMAND_ACK message.
+
+        The future raises `CommandTimeoutError` if no ACK arrives after all retries.
+        """
+        if target_system is None:
+            target_system = self.conn.conn.target_system
+        if target_component is None:
+            target_component = self.conn.conn.target_component
+        future = asyncio.get_running_loop().create_future()
+        transaction = CommandTransaction(
+            command,
+            target_system,
+            target_component,
+            (param1, param2, param3, param4, param5, param6, param7),
+            future,
+        )
+        self._pending.setdefault(transaction.key, collections.deque()).append(transaction)
+        self._transmit(transaction)
+        return future
+
+    async def command_long(self, command, *args, **kwargs):
+        """Send a COMMAND_LONG and wait for its COMMAND_ACK."""
+        return await self.send(command, *args, **kwargs)
+
+    def _get_stats(self, command):
+        stats = self.stats.get(command)
+        if stats is None:
+            stats = self.stats[command] = CommandStats(command)
+        return stats
+
+    def _transmit(self, transaction):
+        self.conn.conn.mav.command_long_send(
+            transaction.target_system,
+            transaction.target_component,
+            transaction.command,
+            transaction.confirmation,
+            *transaction.params,
+        )
+        transaction.sent_at = time.monotonic()
+        if transaction.first_sent_at is None:
+            transaction.first_sent_at = transaction.sent_at
+        self._arm_timer(transaction, self.timeout)
+
+    def _arm_timer(self, transaction, timeout):
+        if transaction.timer is not None:
+            transaction.timer.cancel()
+        transaction.timer = asyncio.get_running_loop().call_later(
+            timeout, self._on_timeout, transaction
+        )
+
+    def _remove(self, transaction):
+        transactions = self._pending.get(transaction.key)
+        if transactions is None:
+            return
+        transactions.remove(transaction)
+        if not transactions:
+            del self._pending[transaction.key]
+        if transaction.timer is not None:
+            transaction.timer.cancel()
+            transaction.timer = None
+
+    def _on_timeout(self, transaction):
+        transaction.timer = None
+        if transaction.future.cancelled():
+            self._remove(transaction)
+            return
+        stats = self._get_stats(transaction.command)
+        if transaction.in_progress or transaction.confirmation >= self.retries:
+            self._remove(transaction)
+            stats.timeouts += 1
+            transaction.future.set_exception(
+                CommandTimeoutError(
+                    f"No COMMAND_ACK for command {transaction.command} after "
+                    f"{transaction.confirmation + 1} attempt(s)."
+                )
+            )
+            return
+        transaction.confirmation += 1
+        stats.retries += 1
+        logger.info(
+            f"Resending command {transaction.command} "
+            f"(confirmation {transaction.confirmation})."
+        )
+        self._transmit(transaction)
+
+    def process_command_ack(self, ack):
+        transactions = self._pending.get((ack.command, ack.get_srcSystem()))
+        if transactions is None:
+            transactions = self._pending.get((ack.command, 0))
+        if transactions is None:
+            return
+        for transaction in transactions:
+            if transaction.matches(ack):
+                break
+        else:
+            return
+
+        if ack.result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+            # The command was accepted and is running; stop resending and wait for the final ACK.
+            transaction.in_progress = True
+            self._arm_timer(transaction, COMMAND_IN_PROGRESS_TIMEOUT)
+            return
+
+        self._remove(transaction)
+        latency = time.monotonic() - transaction.sent_at
+        self._get_stats(transaction.command).record(latency)
+        if transaction.confirmation == 0 and not transaction.in_progress:
+            # Only unambiguous samples: after a resend we can't tell which attempt was answered.
+            self.conn.link_quality.record_rtt(latency)
+        if not transaction.future.done():
+            transaction.future.set_result(ack)
+
+    def cancel_all(self):
+        """Cancel every command still waiting for an ACK."""
+        for transactions in list(self._pending.values()):
+            for transaction in list(transactions):
+                self._remove(transaction)
+                transaction.future.cancel()
+
+
+async def wait_for_message(conn, msg_id, predicate=None, timeout=COMMAND_ACK_TIMEOUT):
+    """Wait for the next message with id `msg_id` for which `predicate` is true, as dispatched by
+    the receive loop of `conn`.
+
+    Raises:
+        TimeoutError: If none arrives within `timeout` seconds.
+    """
+    future = asyncio.get_running_loop().create_future()
+
+    def match(message):
+        if not future.done() and (predicate is None or predicate(message)):
+            future.set_result(message)
+
+    conn.dispatcher.subscribe(msg_id, match)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"No matching message {msg_id} within {timeout} seconds.") from None
+    finally:
+        conn.dispatcher.unsubscribe(msg_id, match)
+
+
+async def wait_armed(conn, armed, timeout=ARM_STATE_TIMEOUT):
+    """Wait for the heartbeats of the vehicle to report it armed (or disarmed if `armed` is
+    False).
+
+    Raises:
+        TimeoutError: If it doesn't within `timeout` seconds.
+    """
+    mav = conn.conn
+    if mav.motors_armed() == armed:
+        return
+
+    def reached(heartbeat):
+        if heartbeat.get_srcSystem() != mav.target_system:
+            return False
+        if mav.target_component not in (0, heartbeat.get_srcComponent()):
+            return False
+        return bool(heartbeat.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED) == armed
+
+    await wait_for_message(conn, mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT, reached, timeout)
+
+
+async def wait_landed(conn, timeout=LANDING_TIMEOUT):
+    """Wait for EXTENDED_SYS_STATE to report the vehicle on the ground.
+
+    Raises:
+        TimeoutError: If it doesn't within `timeout` seconds.
+    """
+    await wait_for_message(
+        conn,
+        mavutil.mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE,
+        lambda message: message.landed_state == mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND,
+        timeout,
+    )
+
+
+async def arm(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, param1=1)
+    logger.info(ack)
+    return ack
+
+
+async def disarm(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, param1=0)
+    logger.info(ack)
+    return ack
+
+
+async def takeoff(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, param4=math.nan)
+    logger.info(ack)
+    return ack
+
+
+async def land(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_NAV_LAND)
+    logger.info(ack)
+    return ack
+
+
+async def start_mission(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_MISSION_START)
+    logger.info(ack)
+    return ack
+
+
+async def return_to_launch(commands: CommandManager):
+    ack = await commands.command_long(mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH)
+    logger.info(ack)
+    return ack
+
+
+async def simple_goto(commands: CommandManager, lat, lon, alt):
+    ack = await commands.command_long(
+        mavutil.mavlink.MAV_CMD_DO_REPOSITION,
+        param1=-1,
+        param2=mavutil.mavlink.MAV_DO_REPOSITION_FLAGS_CHANGE_MODE,
+        param3=1.00,
+        param4=math.nan,
+        param5=lat,
+        param6=lon,
+        param7=alt,
+    )
+    logger.info(ack)
+    return ack
+
+
+async def set_home(commands: CommandManager, lat, lon, alt, use_curr_location=False):
+    ack = await commands.command_long(
+        mavutil.mavlink.MAV_CMD_DO_SET_HOME,
+        param1=1 if use_curr_location else 0,
+        param2=math.nan,
+        param3=math.nan,
+        param4=math.nan,
+        param5=lat,
+        param6=lon,
+        param7=alt,
+    )
+    logger.info(ack)
+    return ack
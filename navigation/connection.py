@@ -5,30 +5,160 @@ from abc import ABC, abstractmethod
 
 from pymavlink import mavutil
 
+from . import frames
+from .commands import CommandManager
+from .dispatch import MessageDispatcher
+from .link_quality import LinkQualityMonitor
+from .periodic import run_periodic
+from .reader import MavlinkReader
+from .router import RouterLink
+from .stream_rates import StreamRateController
+from .telemetry import TelemetryStore
 from .utils import (
     ALT_SCALING_FACTOR,
     AUTOPILOT,
     AUTOPILOT_HEARTBEAT_TIMEOUT,
-    BAD_DATA,
-    COMMAND_ACK,
     GCS,
     GCS_HEARTBEAT_TIMEOUT,
-    GLOBAL_POSITION_INT,
-    HEARTBEAT,
     HEARTBEAT_SEND_RATE_HZ,
     LAT_LON_SCALING_FACTOR,
-    MISSION_ACK,
-    MISSION_ITEM_REACHED,
-    MISSION_REQUEST,
-    RC_CHANNELS,
-    SYS_STATUS,
 )
+from .watchdog import HeartbeatWatchdog
 
 logger = logging.getLogger()
 
+# Streams the default handlers consume, and the rate they are requested at when nothing else needs
+# them faster.
+DEFAULT_STREAMS = (
+    mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT,
+    mavutil.mavlink.MAVLINK_MSG_ID_SYS_STATUS,
+    mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE,
+    mavutil.mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE,
+)
+DEFAULT_STREAM_RATE_HZ = 1
+
 
 class ServerConnection:
-    pass
+    """Routes MAVLink traffic between the autopilot, ground control stations and local clients.
+
+    Frames are forwarded as the bytes they arrived as, without being decoded and re-encoded.
+    Routes are learned from the system and component ids of the frames seen on each link, and a
+    frame is forwarded following the MAVLink routing rules: broadcasts go to every other link,
+    addressed frames only to the link(s) their target was seen on. Frames for targets that
+    haven't been seen yet are dropped. Each link can filter the messages sent out on it.
+    """
+
+    def __init__(self):
+        self.links = []
+        # (system id, component id) -> the link it was last seen on.
+        self.routes = {}
+        self.forwarded = 0
+        self.unroutable = 0
+        self._loop = None
+
+    def add_link(
+        self, name, conn_string, baudrate=None, message_filter=None, verify_checksums=None
+    ):
+        """Open a link to route frames over.
+
+        Args:
+            name (str): Name of the link used in logs and stats, e.g. "autopilot" or "gcs".
+            conn_string (str): The mavutil connection string of the link.
+            baudrate (int or None): Baudrate of serial links.
+            message_filter (MessageFilter or None): Which messages may be sent out on the link.
+            verify_checksums (bool or None): Whether to verify the checksum of received frames.
+                Defaults to verifying them on every link but UDP ones.
+
+        Returns:
+            RouterLink: The new link.
+        """
+        conn = connection_to_mavlink_system(name, conn_string, baudrate)
+        if conn is None:
+            raise ConnectionError(f"Could not open the {name} link on {conn_string}.")
+        return self.add_connection(name, conn, message_filter, verify_checksums)
+
+    def add_connection(self, name, conn, message_filter=None, verify_checksums=None):
+        """Route frames over an already open connection."""
+        link = RouterLink(name, conn, message_filter, verify_checksums)
+        self.links.append(link)
+        if self._loop is not None:
+            self._register(link)
+        return link
+
+    def start(self):
+        """Start routing on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        for link in self.links:
+            self._register(link)
+
+    def stop(self):
+        if self._loop is not None:
+            for link in self.links:
+                if link.fd is not None:
+                    self._loop.remove_reader(link.fd)
+        self._loop = None
+
+    def close(self):
+        self.stop()
+        for link in self.links:
+            link.conn.close()
+
+    def _register(self, link):
+        if link.fd is None:
+            raise ConnectionError(f"The {link.name} link has no file descriptor to wait on.")
+        self._loop.add_reader(link.fd, self._on_readable, link)
+
+    def _on_readable(self, link):
+        try:
+            received = link.read_frames()
+        except OSError as e:
+            logger.error(f"Failed to read from the {link.name} link: {e}")
+            return
+        for frame in received:
+            self.route(frame, link)
+
+    def route(self, frame, incoming):
+        """Learn the route to the sender of `frame` and forward it to where it is addressed."""
+        source = frames.source(frame)
+        if self.routes.get(source) is not incoming:
+            if source not in self.routes:
+                logger.info(
+                    f"Learned route to {source[0]}/{source[1]} via the {incoming.name} link."
+                )
+            self.routes[source] = incoming
+            incoming.systems.add(source[0])
+
+        message_id = frames.msg_id(frame)
+        target_system, target_component = frames.target(frame)
+        if target_system == 0:
+            destinations = [link for link in self.links if link is not incoming]
+        else:
+            link = self.routes.get((target_system, target_component))
+            if target_component != 0 and link is not None:
+                destinations = [link] if link is not incoming else []
+            else:
+                destinations = [
+                    link
+                    for link in self.links
+                    if link is not incoming and target_system in link.systems
+                ]
+            if not destinations:
+                self.unroutable += 1
+                return
+
+        for link in destinations:
+            try:
+                if link.write(frame, message_id):
+                    self.forwarded += 1
+            except OSError as e:
+                logger.error(f"Failed to write to the {link.name} link: {e}")
+
+    def stats(self):
+        return {
+            "forwarded": self.forwarded,
+            "unroutable": self.unroutable,
+            "links": [link.stats() for link in self.links],
+        }
 
 
 class ClientConnectionWrapper(ABC):
@@ -41,12 +171,53 @@ class ClientConnectionWrapper(ABC):
         self.conn_string = conn_string
         self.baudrate = baudrate
         self.last_heartbeat = None
+        self.battery_remaining = None
         self.conn = None
+        self.telemetry = TelemetryStore()
+        self.dispatcher = MessageDispatcher()
+        self.link_quality = LinkQualityMonitor()
+        # A `FlightRecorder` recording every message the receive loop processes.
+        self.recorder = None
+        self.subscribe_default_handlers()
+        self.commands = CommandManager(self)
+        self.watchdog = HeartbeatWatchdog(self)
+        self.stream_rates = StreamRateController(self)
+        # Called with the new mavlink connection (or None while there is none) when it changes.
+        self.connection_listeners = []
+
+    def subscribe_default_handlers(self):
+        self.dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_BAD_DATA, self.process_bad_data)
+        self.dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT, self.process_heartbeat)
+        self.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, self.update_current_position
+        )
+        self.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_SYS_STATUS, self.process_sys_status
+        )
+        self.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_RC_CHANNELS, self.process_rc_channels
+        )
+        self.dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE, self.telemetry.record)
+        self.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE, self.telemetry.record
+        )
 
     @abstractmethod
     def reconnect(self):
         pass
 
+    def reopen(self):
+        """Close the mavlink connection and open a new one, moving its readers over to it."""
+        for listener in self.connection_listeners:
+            listener(None)
+        if self.conn is not None:
+            self.conn.close()
+        self.reconnect()
+        if self.conn is None:
+            raise ConnectionError(f"Could not reopen {self.conn_string}.")
+        for listener in self.connection_listeners:
+            listener(self.conn)
+
     def update_last_heartbeat(self):
         self.last_heartbeat = time.time()
         logger.info(
@@ -59,24 +230,7 @@ class ClientConnectionWrapper(ABC):
         self.longitude = message.lon / LAT_LON_SCALING_FACTOR
         self.altitude = message.alt / ALT_SCALING_FACTOR
         self.pos_last_set_time = time.time()
-
-    def retry_connection(self):
-        if self.conn:
-            msg = self.conn.recv_match(
-                type=[HEARTBEAT], blocking=True, timeout=self.heartbeat_timeout
-            )
-            if msg:
-                self.process_heartbeat(msg)
-                return
-        raise ConnectionError("Failed to re-establish the connection.")
-
-    def is_valid_connection(self):
-        """Check that we have received a heartbeat within the last `heartbeat_timeout`
-        seconds."""
-        current_time = time.time()
-        if (current_time - self.last_heartbeat) > self.heartbeat_timeout:
-            return False
-        return True
+        self.telemetry.record(message)
 
     def send_heartbeat_msg(self):
         logger.info("Heartbeat sent from companion computer.")
@@ -93,14 +247,16 @@ class ClientConnectionWrapper(ABC):
         pass
 
     def get_msg(self):
+        if self.conn is None:
+            return None
         msg = self.conn.recv_match()
         return msg
 
     def request_messages(self):
-        request_message_interval(self.conn, mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, 1)
-        request_message_interval(self.conn, mavutil.mavlink.MAVLINK_MSG_ID_SYS_STATUS, 1)
-        request_message_interval(self.conn, mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE, 1)
-        # request_message_interval(self.conn, mavutil.mavlink.MAVLINK_MSG_ID_RC_CHANNELS, 1)
+        """Declare the telemetry the default handlers need. The stream rates are set by
+        `stream_rates`, which raises them further as the mission phase requires."""
+        for msg_id in DEFAULT_STREAMS:
+            self.stream_rates.request("connection", msg_id, DEFAULT_STREAM_RATE_HZ)
 
     def process_heartbeat(self, heartbeat_message):
         if not heartbeat_message:
@@ -110,6 +266,17 @@ class ClientConnectionWrapper(ABC):
 
     def process_sys_status(self, sys_status):
         self.battery_remaining = sys_status.battery_remaining
+        self.telemetry.record(sys_status)
+
+    def process_rc_channels(self, message):
+        logger.info(f"Channel 1: {message.chan1_raw}")
+        logger.info(f"Channel 2: {message.chan2_raw}")
+        logger.info(f"Channel 3: {message.chan3_raw}")
+        logger.info(f"Channel 4: {message.chan4_raw}")
+
+    def process_bad_data(self, message):
+        if mavutil.all_printable(message.data):
+            logger.info(message.data)
 
 
 class AutopilotConnectionWrapper(ClientConnectionWrapper):
@@ -140,86 +307,59 @@ class GCSConnectionWrapper(ClientConnectionWrapper):
         self.conn = connection_to_gcs(self.conn_string, self.baudrate)
 
 
-async def heartbeat_loop(conn: ClientConnectionWrapper):
-    while True:
-        conn.send_heartbeat_msg()
-        await asyncio.sleep(HEARTBEAT_SEND_RATE_HZ)
+async def heartbeat_loop(
+    conn: ClientConnectionWrapper, scheduler=None, rate_hz=HEARTBEAT_SEND_RATE_HZ
+):
+    await run_periodic(
+        f"heartbeat {conn.conn_string}", conn.send_heartbeat_msg, rate_hz, scheduler=scheduler
+    )
 
 
-async def receive_msg_loop(conn: ClientConnectionWrapper):
-    while True:
-        message = conn.get_msg()
-        if message:
-            await process_autopilot_msg(message, conn)
-        else:
-            await asyncio.sleep(0.01)
+async def receive_msg_loop(conn: ClientConnectionWrapper, reader=None):
+    """Process the messages of `conn` as they arrive.
+
+    Args:
+        conn (ClientConnectionWrapper): The connection to receive on.
+        reader (object or None): Source of message batches, a `MavlinkReader` on `conn` by default.
+            The loop ends when the reader returns None (e.g. a `ReplayReader` at the end of a
+            recording).
+    """
+    if reader is None:
+        reader = MavlinkReader(conn)
+    reader.start()
+    try:
+        while True:
+            batch = await reader.read_batch()
+            if batch is None:
+                return
+            for message in batch:
+                await process_autopilot_msg(message, conn)
+    finally:
+        reader.stop()
 
 
 async def validate_connection_loop(conn: ClientConnectionWrapper):
-    while True:
-        if not conn.is_valid_connection():
-            logger.info(f"Failed to receive a heartbeat in {conn.heartbeat_timeout} seconds.")
-            conn.retry_connection()
-        logger.info("Connection still valid!")
-        await asyncio.sleep(HEARTBEAT_SEND_RATE_HZ)
+    """Watch the heartbeats of `conn`, reconnecting when they stop.
+
+    Raises:
+        ConnectionError: When the connection couldn't be re-established.
+    """
+    await conn.watchdog.run()
+
+
+async def stream_rate_loop(conn: ClientConnectionWrapper):
+    """Keep the telemetry stream rates of `conn` applied and check what is delivered."""
+    await conn.stream_rates.run()
 
 
 async def process_autopilot_msg(message, conn: ClientConnectionWrapper):
     # Validate message.
     if not message:
         return
-    message_type = message.get_type()
-    if message_type == BAD_DATA:
-        if mavutil.all_printable(message.data):
-            logger.info(message.data)
-
-    if message_type == HEARTBEAT:
-        conn.process_heartbeat(message)
-    elif message_type == GLOBAL_POSITION_INT:
-        conn.update_current_position(message)
-    elif message_type == SYS_STATUS:
-        conn.process_sys_status(message)
-    elif message_type == COMMAND_ACK:
-        pass
-    elif message_type == MISSION_ACK:
-        pass
-    elif message_type == MISSION_REQUEST:
-        pass
-    elif message_type == MISSION_ITEM_REACHED:
-        pass
-    elif message_type == RC_CHANNELS:
-        logger.info(f"Channel 1: {message.chan1_raw}")
-        logger.info(f"Channel 2: {message.chan2_raw}")
-        logger.info(f"Channel 3: {message.chan3_raw}")
-        logger.info(f"Channel 4: {message.chan4_raw}")
-
-
-def request_message_interval(
-    conn: mavutil.mavlink_connection, message_id: int, frequency_hz: float
-):
-    """
-    Request MAVLink message in a desired frequency,
-    documentation for SET_MESSAGE_INTERVAL:
-        https://mavlink.io/en/messages/common.html#MAV_CMD_SET_MESSAGE_INTERVAL
-
-    Args:
-        conn (mavutil.mavlink_connection): MAVLink connection object
-        message_id (int): MAVLink message ID
-        frequency_hz (float): Desired frequency in Hz
-    """
-    conn.mav.command_long_send(
-        conn.target_system,
-        conn.target_component,
-        mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL,
-        0,
-        message_id,
-        1e6 / frequency_hz,
-        0,
-        0,
-        0,
-        0,
-        0,
-    )
+    conn.link_quality.record(message)
+    if conn.recorder is not None:
+        conn.recorder.record(message)
+    await conn.dispatcher.dispatch(message)
 
 
 def connection_to_autopilot(conn_string, baudrate):
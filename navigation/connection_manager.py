@@ -0,0 +1,173 @@
+import asyncio
+import logging
+
+from pymavlink import mavutil
+
+from .connection import (
+    AutopilotConnectionWrapper,
+    heartbeat_loop,
+    receive_msg_loop,
+    validate_connection_loop,
+)
+from .dispatch import MessageDispatcher
+
+logger = logging.getLogger()
+
+# Seconds to wait for the first heartbeat of a newly added vehicle.
+VEHICLE_DISCOVERY_TIMEOUT = 10.0
+
+
+class VehicleLostError(ConnectionError):
+    pass
+
+
+class ManagedVehicle:
+    """A vehicle owned by a `ConnectionManager`: its connection wrapper and the tasks serving it."""
+
+    def __init__(self, system_id, wrapper):
+        self.system_id = system_id
+        self.wrapper = wrapper
+        self.tasks = []
+        self.lost = False
+
+    @property
+    def commands(self):
+        return self.wrapper.commands
+
+    @property
+    def telemetry(self):
+        return self.wrapper.telemetry
+
+
+class ConnectionManager:
+    """Owns the connections to several vehicles, keyed by MAVLink system id, on one event loop.
+
+    Every vehicle gets its own receive, heartbeat and validation tasks. Messages from all vehicles
+    are passed on to the shared `dispatcher` after the vehicle's own handlers have run, so a
+    subscriber there sees the traffic of the whole fleet and can tell vehicles apart with
+    `message.get_srcSystem()`.
+
+    A vehicle whose tasks fail (e.g. its link times out) is marked as lost and `on_vehicle_lost`
+    is called with its system id; the other vehicles are unaffected.
+
+    Args:
+        wrapper_class (type): `ClientConnectionWrapper` subclass used for new connections.
+        on_vehicle_lost (callable or None): Called with the system id of a lost vehicle.
+    """
+
+    def __init__(self, wrapper_class=AutopilotConnectionWrapper, on_vehicle_lost=None):
+        self.wrapper_class = wrapper_class
+        self.on_vehicle_lost = on_vehicle_lost
+        self.dispatcher = MessageDispatcher()
+        self.vehicles = {}
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def __contains__(self, system_id):
+        return system_id in self.vehicles
+
+    def __getitem__(self, system_id):
+        return self.vehicles[system_id]
+
+    async def add_vehicle(self, conn_string, baudrate=None, timeout=VEHICLE_DISCOVERY_TIMEOUT):
+        """Connect to a vehicle and wait for its first heartbeat to learn its system id.
+
+        Returns:
+            ManagedVehicle: The newly added vehicle.
+
+        Raises:
+            ConnectionError: If the connection couldn't be opened, no heartbeat arrived in
+                `timeout` seconds or a vehicle with the same system id is already managed.
+        """
+        wrapper = self.wrapper_class(conn_string, baudrate)
+        if wrapper.conn is None:
+            raise ConnectionError(f"Could not open {conn_string}.")
+        wrapper.dispatcher.parent = self.dispatcher
+
+        heartbeat = asyncio.get_running_loop().create_future()
+
+        def on_heartbeat(message):
+            if not heartbeat.done():
+                heartbeat.set_result(message)
+
+        heartbeat_id = mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT
+        wrapper.dispatcher.subscribe(heartbeat_id, on_heartbeat)
+        receive_task = asyncio.create_task(receive_msg_loop(wrapper))
+        try:
+            await asyncio.wait_for(heartbeat, timeout)
+        except asyncio.TimeoutError:
+            receive_task.cancel()
+            wrapper.conn.close()
+            raise ConnectionError(f"No heartbeat received on {conn_string} in {timeout} seconds.")
+        finally:
+            wrapper.dispatcher.unsubscribe(heartbeat_id, on_heartbeat)
+
+        system_id = wrapper.conn.target_system
+        if system_id in self.vehicles:
+            receive_task.cancel()
+            wrapper.conn.close()
+            raise ConnectionError(f"A vehicle with system id {system_id} is already connected.")
+
+        vehicle = ManagedVehicle(system_id, wrapper)
+        vehicle.tasks = [
+            receive_task,
+            asyncio.create_task(heartbeat_loop(wrapper)),
+            asyncio.create_task(validate_connection_loop(wrapper)),
+        ]
+        for task in vehicle.tasks:
+            task.add_done_callback(lambda task, vehicle=vehicle: self._on_task_done(vehicle, task))
+        self.vehicles[system_id] = vehicle
+        logger.info(f"Vehicle {system_id} added on {conn_string}.")
+        return vehicle
+
+    async def remove_vehicle(self, system_id):
+        """Stop serving a vehicle and close its connection."""
+        vehicle = self.vehicles.pop(system_id)
+        for task in vehicle.tasks:
+            task.cancel()
+        await asyncio.gather(*vehicle.tasks, return_exceptions=True)
+        vehicle.wrapper.commands.cancel_all()
+        vehicle.wrapper.conn.close()
+        logger.info(f"Vehicle {system_id} removed.")
+
+    async def close(self):
+        """Remove every vehicle."""
+        for system_id in list(self.vehicles):
+            await self.remove_vehicle(system_id)
+
+    async def broadcast(self, command, system_ids=None, **params):
+        """Send the same COMMAND_LONG to several vehicles concurrently.
+
+        Args:
+            command (int): The MAV_CMD to send.
+            system_ids (iterable or None): The vehicles to command. None commands every vehicle
+                that isn't lost.
+            **params: `param1` to `param7` of the command.
+
+        Returns:
+            dict: The COMMAND_ACK, or the exception raised waiting for it, by system id.
+        """
+        if system_ids is None:
+            system_ids = [sid for sid, vehicle in self.vehicles.items() if not vehicle.lost]
+        else:
+            system_ids = list(system_ids)
+        results = await asyncio.gather(
+            *(self.vehicles[sid].commands.command_long(command, **params) for sid in system_ids),
+            return_exceptions=True,
+        )
+        return dict(zip(system_ids, results))
+
+    def _on_task_done(self, vehicle, task):
+        if task.cancelled() or vehicle.lost:
+            return
+        error = task.exception()
+        if error is None:
+            error = VehicleLostError(f"A task of vehicle {vehicle.system_id} stopped.")
+        vehicle.lost = True
+        logger.error(f"Lost vehicle {vehicle.system_id}: {error}")
+        for other in vehicle.tasks:
+            other.cancel()
+        vehicle.wrapper.commands.cancel_all()
+        if self.on_vehicle_lost is not None:
+            self.on_vehicle_lost(vehicle.system_id)
@@ -0,0 +1,132 @@
+import inspect
+import logging
+import time
+
+logger = logging.getLogger()
+
+# A handler taking longer than this (in seconds) to process a single message is reported, since at
+# high telemetry rates it will hold up every other message behind it.
+SLOW_HANDLER_THRESHOLD = 0.005
+
+
+class HandlerStats:
+    """Timing counters for a single subscribed handler."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.slow_calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def mean_time(self):
+        if self.calls == 0:
+            return 0.0
+        return self.total_time / self.calls
+
+    def record(self, elapsed, slow_threshold):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if elapsed > slow_threshold:
+            self.slow_calls += 1
+            return True
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "slow_calls": self.slow_calls,
+            "total_time": self.total_time,
+            "mean_time": self.mean_time,
+            "max_time": self.max_time,
+        }
+
+
+class Subscription:
+    def __init__(self, msg_id, handler):
+        self.msg_id = msg_id
+        self.handler = handler
+        self.is_async = inspect.iscoroutinefunction(handler)
+        name = getattr(handler, "__qualname__", repr(handler))
+        self.stats = HandlerStats(f"{name}[{msg_id}]")
+
+
+class MessageDispatcher:
+    """Routes MAVLink messages to the handlers subscribed to their numeric message id.
+
+    Handlers may be plain functions or coroutine functions and are called with the message as their
+    only argument, in the order they subscribed. Messages nobody subscribed to are dropped after a
+    single dictionary lookup.
+
+    If a `parent` dispatcher is given, every message is passed on to it after the local handlers
+    have run, which lets several connections share one dispatch path.
+    """
+
+    def __init__(self, slow_handler_threshold=SLOW_HANDLER_THRESHOLD, parent=None):
+        self.slow_handler_threshold = slow_handler_threshold
+        self.parent = parent
+        self._subscriptions = {}
+        self.dispatched = 0
+        self.dropped = 0
+
+    def subscribe(self, msg_id, handler):
+        """Subscribe `handler` to messages with id `msg_id` (e.g.
+        `mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT`)."""
+        subscription = Subscription(msg_id, handler)
+        # Subscriptions are replaced rather than mutated so a dispatch in progress is unaffected.
+        subscriptions = self._subscriptions.get(msg_id, ())
+        self._subscriptions[msg_id] = subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, msg_id, handler):
+        subscriptions = self._subscriptions.get(msg_id, ())
+        remaining = tuple(sub for sub in subscriptions if sub.handler != handler)
+        if remaining:
+            self._subscriptions[msg_id] = remaining
+        else:
+            self._subscriptions.pop(msg_id, None)
+
+    def is_subscribed(self, msg_id):
+        return msg_id in self._subscriptions
+
+    async def dispatch(self, message):
+        subscriptions = self._subscriptions.get(message.get_msgId())
+        if subscriptions is not None:
+            self.dispatched += 1
+            await self._call_handlers(subscriptions, message)
+        elif self.parent is None:
+            self.dropped += 1
+            return
+        if self.parent is not None:
+            await self.parent.dispatch(message)
+
+    async def _call_handlers(self, subscriptions, message):
+        for subscription in subscriptions:
+            start = time.perf_counter()
+            try:
+                result = subscription.handler(message)
+                if subscription.is_async:
+                    await result
+            except Exception:
+                subscription.stats.errors += 1
+                logger.exception(f"Handler {subscription.stats.name} failed.")
+            elapsed = time.perf_counter() - start
+            if subscription.stats.record(elapsed, self.slow_handler_threshold):
+                logger.warning(
+                    f"Handler {subscription.stats.name} took {elapsed * 1000:.1f} ms to process "
+                    f"a {message.get_type()} message."
+                )
+
+    def handler_stats(self):
+        """Return the timing counters of every subscribed handler."""
+        return [
+            subscription.stats
+            for subscriptions in self._subscriptions.values()
+            for subscription in subscriptions
+        ]
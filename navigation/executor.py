@@ -0,0 +1,409 @@
+"""Execute the commands other processes send to the server, most urgent first.
+
+Requests are parsed into `Command`s with a priority. Flight termination comes first: when it
+arrives, the command running is cancelled and every queued command is dropped, so nothing the
+vehicle was told before can delay or undo it. Commands with the same `coalesce_key` (e.g. two
+GOTOs) replace each other while they wait, since only the latest one still matters.
+
+Commands run one at a time on the event loop through the connection's `CommandManager` and
+`MissionUploader`, so they never block the MAVLink tasks. Only mission file loading, which
+blocks, runs in a worker thread.
+"""
+
+import asyncio
+import heapq
+import logging
+import math
+import time
+
+from pymavlink import mavutil
+
+from .commands import (
+    arm,
+    disarm,
+    land,
+    return_to_launch,
+    set_home,
+    simple_goto,
+    start_mission,
+    takeoff,
+)
+from .mission_batch import MissionBatch
+from .mission_loader import load_mission
+from .mission_upload import MissionUploader
+
+logger = logging.getLogger()
+
+mavlink = mavutil.mavlink
+
+PRIORITY_TERMINATION = 0
+PRIORITY_NAVIGATION = 1
+PRIORITY_MISSION = 2
+PRIORITIES = (PRIORITY_TERMINATION, PRIORITY_NAVIGATION, PRIORITY_MISSION)
+
+COMMAND_DONE = "done"
+COMMAND_FAILED = "failed"
+# Replaced by a newer command with the same coalesce key before it ran.
+COMMAND_SUPERSEDED = "superseded"
+# Dropped or cancelled because of a flight termination.
+COMMAND_PREEMPTED = "preempted"
+
+
+class CommandParseError(Exception):
+    pass
+
+
+class Command:
+    """A request to the server.
+
+    Attributes:
+        name (str): The command name, e.g. "GOTO".
+        priority (int): One of `PRIORITIES`; lower runs first.
+        args (tuple): The parsed arguments.
+        coalesce_key (str or None): Queued commands with the same key replace each other.
+        received_at (float): When it was received, on the monotonic clock.
+        status (str or None): How it ended, once it did.
+        detail: The COMMAND_ACK, upload result or error it ended with, or the name of the
+            MAV_RESULT the autopilot rejected it with.
+        done (Future or None): Resolved with the status when the command ends. Set when the
+            command is submitted.
+    """
+
+    def __init__(self, name, priority, args=(), coalesce_key=None):
+        self.name = name
+        self.priority = priority
+        self.args = args
+        self.coalesce_key = coalesce_key
+        self.received_at = time.monotonic()
+        self.started_at = None
+        self.status = None
+        self.detail = None
+        self.done = None
+
+    def __repr__(self):
+        args = " ".join(str(arg) for arg in self.args)
+        return f"{self.name} {args}".rstrip()
+
+    def finish(self, status, detail=None):
+        if self.status is not None:
+            return
+        self.status = status
+        self.detail = detail
+        if self.done is not None and not self.done.done():
+            self.done.set_result(status)
+
+
+def _floats(name, args, count):
+    if len(args) != count:
+        raise CommandParseError(f"{name} takes {count} arguments, got {len(args)}.")
+    try:
+        values = tuple(float(arg) for arg in args)
+    except ValueError:
+        raise CommandParseError(f"{name} takes numeric arguments, got {' '.join(args)!r}.")
+    if not all(math.isfinite(value) for value in values):
+        raise CommandParseError(f"{name} takes finite arguments, got {' '.join(args)!r}.")
+    return values
+
+
+def _no_args(name, args):
+    if args:
+        raise CommandParseError(f"{name} takes no arguments.")
+    return ()
+
+
+def _command_long_args(name, args):
+    if len(args) != 8:
+        raise CommandParseError(f"{name} takes a command id and 7 params, got {len(args)}.")
+    try:
+        command = int(args[0])
+        params = tuple(float(arg) for arg in args[1:])
+    except ValueError:
+        raise CommandParseError(f"{name} takes numeric arguments, got {' '.join(args)!r}.")
+    return (command, *params)
+
+
+# Name: (priority, coalesce key, argument parser).
+COMMAND_SPECS = {
+    "FT": (PRIORITY_TERMINATION, "terminate", lambda name, args: (" ".join(args),)),
+    "ARM": (PRIORITY_NAVIGATION, "arm", _no_args),
+    "DISARM": (PRIORITY_NAVIGATION, "arm", _no_args),
+    "TAKEOFF": (PRIORITY_NAVIGATION, None, _no_args),
+    "LAND": (PRIORITY_NAVIGATION, "return", _no_args),
+    "RTL": (PRIORITY_NAVIGATION, "return", _no_args),
+    "MISSION_START": (PRIORITY_NAVIGATION, None, _no_args),
+    "GOTO": (PRIORITY_NAVIGATION, "goto", lambda name, args: _floats(name, args, 3)),
+    "SET_HOME": (PRIORITY_NAVIGATION, "set_home", lambda name, args: _floats(name, args, 3)),
+    "COMMAND_LONG": (PRIORITY_NAVIGATION, None, _command_long_args),
+    "MISSION_PLAN": (PRIORITY_MISSION, "mission", lambda name, args: (" ".join(args),)),
+}
+
+
+def parse_command(data):
+    """Parse a request such as `GOTO 49.8 -97.1 20` or `FT WAYPOINT` into a `Command`.
+
+    Raises:
+        CommandParseError: If the request isn't a valid command.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        try:
+            data = bytes(data).decode()
+        except UnicodeDecodeError:
+            raise CommandParseError("A request must be text.")
+    words = data.split()
+    if not words:
+        raise CommandParseError("Empty request.")
+    name = words[0].upper()
+    spec = COMMAND_SPECS.get(name)
+    if spec is None:
+        raise CommandParseError(f"Unknown command {words[0]!r}.")
+    if name == "MISSION_PLAN" and len(words) < 2:
+        raise CommandParseError("MISSION_PLAN takes the path of a mission file.")
+    return make_command(name, spec[2](name, words[1:]))
+
+
+def make_command(name, args=()):
+    """Build a `Command` from arguments that are already parsed, e.g. decoded from a binary
+    request."""
+    spec = COMMAND_SPECS.get(name)
+    if spec is None:
+        raise CommandParseError(f"Unknown command {name!r}.")
+    priority, coalesce_key, _ = spec
+    return Command(name, priority, tuple(args), coalesce_key)
+
+
+def _result_name(result):
+    entry = mavlink.enums["MAV_RESULT"].get(result)
+    return entry.name if entry is not None else f"MAV_RESULT {result}"
+
+
+class PriorityStats:
+    """Queue depth and latency counters for one priority."""
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.depth = 0
+        self.max_depth = 0
+        self.submitted = 0
+        self.executed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.preempted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    @property
+    def mean_wait(self):
+        if self.executed == 0:
+            return None
+        return self.total_wait / self.executed
+
+    @property
+    def mean_run(self):
+        if self.executed == 0:
+            return None
+        return self.total_run / self.executed
+
+    def record(self, wait, run):
+        self.executed += 1
+        self.total_wait += wait
+        self.total_run += run
+        if wait > self.max_wait:
+            self.max_wait = wait
+        if run > self.max_run:
+            self.max_run = run
+
+    def to_dict(self):
+        return {
+            "priority": self.priority,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "executed": self.executed,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "preempted": self.preempted,
+            "mean_wait": self.mean_wait,
+            "max_wait": self.max_wait,
+            "mean_run": self.mean_run,
+            "max_run": self.max_run,
+        }
+
+
+class CommandExecutor:
+    """Runs submitted commands one at a time, by priority and then in the order they arrived.
+
+    Args:
+        conn (ClientConnectionWrapper): The autopilot connection.
+        terminate (callable): Coroutine function called with the connection and the reason (a str)
+            to terminate the flight, e.g. `begin_flight_termination`. It runs on the event loop and
+            must wait on the connection through its dispatcher, not by reading it.
+        uploader (MissionUploader or None): Uploads MISSION_PLAN missions. One is created if not
+            given.
+    """
+
+    def __init__(self, conn, terminate, uploader=None):
+        self.conn = conn
+        self.terminate = terminate
+        self.uploader = uploader
+        self.stats = {priority: PriorityStats(priority) for priority in PRIORITIES}
+        self._heap = []
+        self._counter = 0
+        self._coalesce = {}
+        self._running = None
+        self._running_task = None
+        self._wakeup = None
+
+    @property
+    def depth(self):
+        return sum(stats.depth for stats in self.stats.values())
+
+    @property
+    def running(self):
+        return self._running
+
+    def submit(self, command):
+        """Queue a command and return the future resolved with its status when it ends. Must be
+        called on the event loop; use `submit_threadsafe` from other threads."""
+        loop = asyncio.get_running_loop()
+        command.done = loop.create_future()
+        stats = self.stats[command.priority]
+        stats.submitted += 1
+
+        if command.priority == PRIORITY_TERMINATION:
+            self._preempt()
+        if command.coalesce_key is not None:
+            previous = self._coalesce.get(command.coalesce_key)
+            if previous is not None:
+                self._discard(previous, COMMAND_SUPERSEDED)
+                stats.coalesced += 1
+            self._coalesce[command.coalesce_key] = command
+
+        heapq.heappush(self._heap, (command.priority, self._counter, command))
+        self._counter += 1
+        stats.depth += 1
+        stats.max_depth = max(stats.max_depth, stats.depth)
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+        return command.done
+
+    def submit_threadsafe(self, loop, command):
+        """Queue a command from another thread."""
+        loop.call_soon_threadsafe(self.submit, command)
+
+    def metrics(self):
+        return {priority: stats.to_dict() for priority, stats in self.stats.items()}
+
+    async def run(self):
+        """Execute commands until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            command = self._pop()
+            if command is None:
+                self._wakeup = loop.create_future()
+                await self._wakeup
+                continue
+            await self._execute(command)
+
+    def _pop(self):
+        while self._heap:
+            _, _, command = heapq.heappop(self._heap)
+            if command.status is not None:
+                # Superseded or preempted while queued; already counted out of the depth.
+                continue
+            self.stats[command.priority].depth -= 1
+            if self._coalesce.get(command.coalesce_key) is command:
+                del self._coalesce[command.coalesce_key]
+            return command
+        return None
+
+    def _discard(self, command, status):
+        """End a queued command without running it."""
+        self.stats[command.priority].depth -= 1
+        command.finish(status)
+
+    def _preempt(self):
+        """Drop every queued command and cancel the one running, unless it is a termination."""
+        for _, _, command in self._heap:
+            if command.status is None and command.priority != PRIORITY_TERMINATION:
+                self._discard(command, COMMAND_PREEMPTED)
+                self.stats[command.priority].preempted += 1
+        self._heap = [entry for entry in self._heap if entry[2].status is None]
+        heapq.heapify(self._heap)
+        self._coalesce = {
+            key: command for key, command in self._coalesce.items() if command.status is None
+        }
+        running = self._running
+        if running is not None and running.priority != PRIORITY_TERMINATION:
+            logger.info(f"Flight termination pre-empts {running}.")
+            self.stats[running.priority].preempted += 1
+            running.finish(COMMAND_PREEMPTED)
+            self._running_task.cancel()
+
+    async def _execute(self, command):
+        command.started_at = time.monotonic()
+        self._running = command
+        self._running_task = asyncio.ensure_future(self._dispatch(command))
+        try:
+            detail = await self._running_task
+            if (
+                isinstance(detail, mavlink.MAVLink_command_ack_message)
+                and detail.result != mavlink.MAV_RESULT_ACCEPTED
+            ):
+                result = _result_name(detail.result)
+                logger.warning(f"Command {command} was rejected: {result}.")
+                self.stats[command.priority].failed += 1
+                command.finish(COMMAND_FAILED, result)
+            else:
+                command.finish(COMMAND_DONE, detail)
+        except asyncio.CancelledError:
+            if command.status is None:
+                # The executor itself was cancelled.
+                command.finish(COMMAND_PREEMPTED)
+                raise
+        except Exception as e:
+            logger.warning(f"Command {command} failed: {e!r}")
+            self.stats[command.priority].failed += 1
+            command.finish(COMMAND_FAILED, e)
+        finally:
+            self._running = None
+            self._running_task = None
+        ended_at = time.monotonic()
+        self.stats[command.priority].record(
+            command.started_at - command.received_at, ended_at - command.started_at
+        )
+        logger.info(f"Command {command}: {command.status}.")
+
+    async def _dispatch(self, command):
+        name = command.name
+        args = command.args
+        commands = self.conn.commands
+        loop = asyncio.get_running_loop()
+        if name == "FT":
+            reason = args[0] or "requested by a client"
+            return await self.terminate(self.conn, reason)
+        if name == "ARM":
+            return await arm(commands)
+        if name == "DISARM":
+            return await disarm(commands)
+        if name == "TAKEOFF":
+            return await takeoff(commands)
+        if name == "LAND":
+            return await land(commands)
+        if name == "RTL":
+            return await return_to_launch(commands)
+        if name == "MISSION_START":
+            return await start_mission(commands)
+        if name == "GOTO":
+            return await simple_goto(commands, *args)
+        if name == "SET_HOME":
+            return await set_home(commands, *args)
+        if name == "COMMAND_LONG":
+            return await commands.command_long(*args)
+        if name == "MISSION_PLAN":
+            mission = await loop.run_in_executor(None, load_mission, args[0])
+            if self.uploader is None:
+                self.uploader = MissionUploader(self.conn)
+            return await self.uploader.upload(MissionBatch.from_mission(self.conn.conn, mission))
+        raise CommandParseError(f"Unknown command {name!r}.")
@@ -0,0 +1,264 @@
+"""Helpers for working with raw MAVLink frames without decoding them into message objects."""
+
+import functools
+import re
+import struct
+
+import numpy as np
+from pymavlink import mavutil
+
+MAVLINK1_STX = 0xFE
+MAVLINK2_STX = 0xFD
+MAVLINK1_HEADER_LEN = 6
+MAVLINK2_HEADER_LEN = 10
+CHECKSUM_LEN = 2
+SIGNATURE_LEN = 13
+MAVLINK_IFLAG_SIGNED = 0x01
+
+_checksum = struct.Struct("<H")
+_format_token = re.compile(r"\d*[a-zA-Z?]")
+# NumPy types of the struct format characters used in MAVLink payloads.
+_numpy_types = {
+    "b": "i1",
+    "B": "u1",
+    "c": "S1",
+    "h": "<i2",
+    "H": "<u2",
+    "i": "<i4",
+    "I": "<u4",
+    "q": "<i8",
+    "Q": "<u8",
+    "f": "<f4",
+    "d": "<f8",
+}
+
+
+def header_length(frame):
+    return MAVLINK2_HEADER_LEN if frame[0] == MAVLINK2_STX else MAVLINK1_HEADER_LEN
+
+
+def frame_length(buf, offset=0):
+    """Return the total length of the frame starting at `buf[offset]`, or None if not enough of the
+    header is available yet to tell."""
+    if len(buf) - offset < 3:
+        return None
+    stx = buf[offset]
+    payload_length = buf[offset + 1]
+    if stx == MAVLINK2_STX:
+        length = MAVLINK2_HEADER_LEN + payload_length + CHECKSUM_LEN
+        if buf[offset + 2] & MAVLINK_IFLAG_SIGNED:
+            length += SIGNATURE_LEN
+        return length
+    return MAVLINK1_HEADER_LEN + payload_length + CHECKSUM_LEN
+
+
+def msg_id(frame):
+    if frame[0] == MAVLINK2_STX:
+        return frame[7] | frame[8] << 8 | frame[9] << 16
+    return frame[5]
+
+
+def seq(frame):
+    return frame[4] if frame[0] == MAVLINK2_STX else frame[2]
+
+
+def source(frame):
+    """Return the (system id, component id) of the sender of a frame."""
+    if frame[0] == MAVLINK2_STX:
+        return frame[5], frame[6]
+    return frame[3], frame[4]
+
+
+def payload(frame):
+    start = header_length(frame)
+    end = start + frame[1]
+    return frame[start:end]
+
+
+@functools.lru_cache(maxsize=None)
+def target_offsets(message_id):
+    """Return the payload offsets of the `target_system` and `target_component` fields of a
+    message (None for a field the message doesn't have), or None for unknown messages."""
+    message_class = mavutil.mavlink.mavlink_map.get(message_id)
+    if message_class is None:
+        return None
+    tokens = _format_token.findall(message_class.unpacker.format)
+    offsets = {}
+    for index, name in enumerate(message_class.ordered_fieldnames):
+        if name in ("target_system", "target_component"):
+            offsets[name] = struct.calcsize("<" + "".join(tokens[:index]))
+    return offsets.get("target_system"), offsets.get("target_component")
+
+
+def target(frame):
+    """Return the (system id, component id) a frame is addressed to. 0 means broadcast, which is
+    also what is returned for messages without a target or that aren't in the dialect."""
+    offsets = target_offsets(msg_id(frame))
+    if offsets is None:
+        return 0, 0
+    start = header_length(frame)
+    length = frame[1]
+    system_offset, component_offset = offsets
+    # MAVLink 2 trims trailing zero bytes from the payload, so a field past its end is 0.
+    system = 0
+    if system_offset is not None and system_offset < length:
+        system = frame[start + system_offset]
+    component = 0
+    if component_offset is not None and component_offset < length:
+        component = frame[start + component_offset]
+    return system, component
+
+
+def crc_extra(message_id):
+    return mavutil.mavlink.mavlink_map[message_id].crc_extra
+
+
+def checksum_valid(frame):
+    """Return whether the checksum of a frame matches its contents, or None if its message isn't in
+    the dialect: without the message's CRC extra byte the checksum can't be verified."""
+    message_class = mavutil.mavlink.mavlink_map.get(msg_id(frame))
+    if message_class is None:
+        return None
+    end = header_length(frame) + frame[1]
+    crc = mavutil.mavlink.x25crc(bytes(frame[1:end]))
+    crc.accumulate(bytes((message_class.crc_extra,)))
+    return crc.crc == _checksum.unpack_from(frame, end)[0]
+
+
+def encode(mav, message):
+    """Pack a message once into a frame that can be sent repeatedly with `send_frame`."""
+    return bytearray(message.pack(mav))
+
+
+def restamp(frame, sequence):
+    """Set the sequence number of an unsigned frame in place and recompute its checksum.
+
+    Raises:
+        ValueError: If the frame is signed, since its signature covers the sequence number.
+    """
+    if frame[0] == MAVLINK2_STX and frame[2] & MAVLINK_IFLAG_SIGNED:
+        raise ValueError("Signed frames can't be restamped.")
+    if frame[0] == MAVLINK2_STX:
+        frame[4] = sequence
+    else:
+        frame[2] = sequence
+    end = header_length(frame) + frame[1]
+    crc = mavutil.mavlink.x25crc(frame[1:end])
+    crc.accumulate(bytes((crc_extra(msg_id(frame)),)))
+    _checksum.pack_into(frame, end, crc.crc)
+    return frame
+
+
+def send_frame(mav, frame):
+    """Send a pre-encoded frame on a `MAVLink` instance, stamped with its next sequence number."""
+    restamp(frame, mav.seq)
+    mav.file.write(frame)
+    mav.seq = (mav.seq + 1) % 256
+    mav.total_packets_sent += 1
+    mav.total_bytes_sent += len(frame)
+
+
+@functools.lru_cache(maxsize=None)
+def payload_dtype(message_id):
+    """Return a NumPy structured dtype laid out exactly like the payload of a message, so an array
+    of it is an array of packed payloads."""
+    message_class = mavutil.mavlink.mavlink_map[message_id]
+    tokens = _format_token.findall(message_class.unpacker.format)
+    fields = []
+    for name, token in zip(message_class.ordered_fieldnames, tokens):
+        count = int(token[:-1] or 1)
+        kind = token[-1]
+        if kind == "s":
+            fields.append((name, f"S{count}"))
+        elif count > 1:
+            fields.append((name, _numpy_types[kind], (count,)))
+        else:
+            fields.append((name, _numpy_types[kind]))
+    return np.dtype(fields)
+
+
+def encode_batch(mav, message_id, payloads):
+    """Pack many messages of one type into frames at once, like `encode` does for one message.
+
+    The frames are built column by column over all messages together, so the cost per frame is a
+    few array operations rather than packing a message object. Their checksums are left at zero:
+    the frames are meant for `send_frame`, which stamps the sequence number and checksum of each
+    frame as it is sent.
+
+    Args:
+        mav (MAVLink): Provides the sequence number and source ids of the frames.
+        message_id (int): The message id.
+        payloads (array): The payloads, an array of `payload_dtype(message_id)`.
+
+    Returns:
+        FrameBatch: The frames.
+    """
+    if mav.signing.sign_outgoing:
+        raise ValueError("Signed frames can't be encoded in bulk.")
+    payloads = np.ascontiguousarray(payloads, dtype=payload_dtype(message_id))
+    count = len(payloads)
+    payload = payloads.view(np.uint8).reshape(count, payloads.dtype.itemsize)
+    payload_length = payload.shape[1]
+    if float(mavutil.mavlink.WIRE_PROTOCOL_VERSION) == 2.0:
+        header = [
+            MAVLINK2_STX,
+            payload_length,
+            0,
+            0,
+            mav.seq,
+            mav.srcSystem,
+            mav.srcComponent,
+            message_id & 0xFF,
+            message_id >> 8 & 0xFF,
+            message_id >> 16,
+        ]
+        # MAVLink 2 trims trailing zero bytes, leaving at least one.
+        nonzero = payload != 0
+        trailing_zeros = nonzero[:, ::-1].argmax(axis=1)
+        lengths = np.where(nonzero.any(axis=1), payload_length - trailing_zeros, 1)
+    else:
+        header = [
+            MAVLINK1_STX,
+            payload_length,
+            mav.seq,
+            mav.srcSystem,
+            mav.srcComponent,
+            message_id,
+        ]
+        lengths = np.full(count, payload_length)
+    start = len(header)
+    stop = start + payload_length
+    ends = start + lengths
+
+    matrix = np.zeros((count, stop + CHECKSUM_LEN), dtype=np.uint8)
+    matrix[:, :start] = header
+    matrix[:, 1] = lengths
+    matrix[:, start:stop] = payload
+
+    frame_lengths = ends + CHECKSUM_LEN
+    used = np.arange(matrix.shape[1]) < frame_lengths[:, None]
+    return FrameBatch(bytearray(matrix[used].tobytes()), np.cumsum(frame_lengths))
+
+
+class FrameBatch:
+    """Frames packed back to back in one buffer. Indexing returns a writable memoryview of a frame,
+    so `send_frame` restamps it in place, without keeping an object per frame alive."""
+
+    def __init__(self, buffer, ends):
+        self.buffer = memoryview(buffer)
+        self._offsets = np.concatenate([[0], ends]).tolist()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+        start, stop = self._offsets[index], self._offsets[index + 1]
+        return self.buffer[start:stop]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes
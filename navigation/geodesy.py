@@ -0,0 +1,291 @@
+"""Vectorized geodesy on the WGS84 ellipsoid.
+
+Every function takes scalars or NumPy arrays and broadcasts them against each other, so a whole
+mission or telemetry log is processed in one call. Latitudes and longitudes are in degrees, whatever
+their type; the degE7 integers of e.g. GLOBAL_POSITION_INT or MISSION_ITEM_INT are converted
+explicitly with `from_degE7` and `to_degE7`. Distances and local coordinates are in metres and
+bearings in degrees clockwise from true north, in [0, 360).
+"""
+
+import math
+
+import numpy as np
+
+from .utils import (
+    LAT_LON_SCALING_FACTOR,
+    MAX_LATITUDE,
+    MAX_LONGITUDE,
+    MIN_LATITUDE,
+    MIN_LONGITUDE,
+)
+
+# WGS84 semi-major axis (m) and flattening.
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+# First eccentricity squared.
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+# Mean radius (m) of the sphere used by `haversine`.
+EARTH_RADIUS = 6371008.8
+
+# Convergence threshold (in radians of longitude on the auxiliary sphere) of `vincenty`, about
+# 0.06 mm.
+VINCENTY_TOLERANCE = 1e-12
+VINCENTY_MAX_ITERATIONS = 200
+# Iterations of the latitude in `ecef_to_geodetic`. Three are below a micrometre at any altitude
+# an aircraft flies.
+ECEF_LATITUDE_ITERATIONS = 3
+
+
+def to_degrees(values):
+    """Return `values`, in degrees, as a float64 array."""
+    return np.asarray(values, dtype=np.float64)
+
+
+def from_degE7(values):
+    """Return degE7 values, e.g. the `lat`/`lon` of a MAVLink `*_INT` message, as a float64 array in
+    degrees."""
+    return np.asarray(values, dtype=np.float64) / LAT_LON_SCALING_FACTOR
+
+
+def to_degE7(values):
+    """Return degrees as an int32 degE7 array, as sent in MAVLink `*_INT` messages."""
+    return np.rint(to_degrees(values) * LAT_LON_SCALING_FACTOR).astype(np.int32)
+
+
+def valid_coordinates(lat, lon):
+    """Return a boolean array telling which positions are valid latitudes and longitudes. NaNs are
+    invalid."""
+    lat = to_degrees(lat)
+    lon = to_degrees(lon)
+    return (
+        (lat >= MIN_LATITUDE)
+        & (lat <= MAX_LATITUDE)
+        & (lon >= MIN_LONGITUDE)
+        & (lon <= MAX_LONGITUDE)
+    )
+
+
+def haversine(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS):
+    """Return the great-circle distance between two sets of positions on a sphere.
+
+    This is within about 0.5% of the ellipsoidal distance and several times faster than
+    `vincenty`, which makes it the right choice for comparisons and thresholds.
+    """
+    phi1 = np.radians(to_degrees(lat1))
+    phi2 = np.radians(to_degrees(lat2))
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(to_degrees(lon2) - to_degrees(lon1))
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty(
+    lat1, lon1, lat2, lon2, tolerance=VINCENTY_TOLERANCE, max_iterations=VINCENTY_MAX_ITERATIONS
+):
+    """Return the distance between two sets of positions on the WGS84 ellipsoid using Vincenty's
+    inverse formula, accurate to well under a millimetre.
+
+    All pairs are iterated together until every one has converged. Nearly antipodal pairs, for
+    which the formula doesn't converge, are NaN.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        to_degrees(lat1), to_degrees(lon1), to_degrees(lat2), to_degrees(lon2)
+    )
+    f = WGS84_F
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    big_l = np.radians(lon2 - lon1)
+
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(max_iterations):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            # Coincident points have sin_sigma == 0.
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha**2
+            # Points on the equator have cos2_alpha == 0.
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+            )
+            c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = big_l + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (2 * cos_2sigma_m**2 - 1))
+            )
+            converged = np.abs(lam - previous) <= tolerance
+            if converged.all():
+                break
+
+        u_sq = cos2_alpha * (WGS84_A**2 - WGS84_B**2) / WGS84_B**2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = (
+            big_b
+            * sin_sigma
+            * (
+                cos_2sigma_m
+                + big_b
+                / 4
+                * (
+                    cos_sigma * (2 * cos_2sigma_m**2 - 1)
+                    - big_b / 6 * cos_2sigma_m * (4 * sin_sigma**2 - 3) * (4 * cos_2sigma_m**2 - 3)
+                )
+            )
+        )
+        distance = WGS84_B * big_a * (sigma - delta_sigma)
+    return np.where(converged, distance, np.nan)
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Return the initial great-circle bearing from the first set of positions to the second."""
+    phi1 = np.radians(to_degrees(lat1))
+    phi2 = np.radians(to_degrees(lat2))
+    d_lambda = np.radians(to_degrees(lon2) - to_degrees(lon1))
+    y = np.sin(d_lambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(d_lambda)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def geodetic_to_ecef(lat, lon, alt=0.0):
+    """Return the Earth-centred, Earth-fixed (x, y, z) of positions with altitudes above the
+    ellipsoid."""
+    phi = np.radians(to_degrees(lat))
+    lam = np.radians(to_degrees(lon))
+    alt = np.asarray(alt, dtype=np.float64)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    # Prime vertical radius of curvature.
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_phi**2)
+    x = (n + alt) * cos_phi * np.cos(lam)
+    y = (n + alt) * cos_phi * np.sin(lam)
+    z = (n * (1 - WGS84_E2) + alt) * sin_phi
+    return x, y, z
+
+
+def ecef_to_geodetic(x, y, z):
+    """Return the (lat, lon, alt) of Earth-centred, Earth-fixed positions."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
+    p = np.hypot(x, y)
+    lam = np.arctan2(y, x)
+    phi = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(ECEF_LATITUDE_ITERATIONS):
+        sin_phi = np.sin(phi)
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_phi**2)
+        phi = np.arctan2(z + WGS84_E2 * n * sin_phi, p)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_phi**2)
+    # Near the poles the altitude is better conditioned from z.
+    alt = np.where(
+        np.abs(cos_phi) > 1e-6,
+        p / np.where(cos_phi == 0, 1.0, cos_phi) - n,
+        np.abs(z) - WGS84_B,
+    )
+    return np.degrees(phi), np.degrees(lam), alt
+
+
+def _enu_rotation(lat0, lon0):
+    phi = np.radians(to_degrees(lat0))
+    lam = np.radians(to_degrees(lon0))
+    return np.sin(phi), np.cos(phi), np.sin(lam), np.cos(lam)
+
+
+def geodetic_to_enu(lat, lon, alt, lat0, lon0, alt0=0.0):
+    """Return the local east, north, up coordinates of positions relative to an origin, e.g. the
+    home position.
+
+    Args:
+        lat, lon, alt: The positions.
+        lat0, lon0, alt0: The origin of the local frame.
+
+    Returns:
+        tuple: The (east, north, up) arrays in metres.
+    """
+    x, y, z = geodetic_to_ecef(lat, lon, alt)
+    x0, y0, z0 = geodetic_to_ecef(lat0, lon0, alt0)
+    dx, dy, dz = x - x0, y - y0, z - z0
+    sin_phi, cos_phi, sin_lam, cos_lam = _enu_rotation(lat0, lon0)
+    east = -sin_lam * dx + cos_lam * dy
+    north = -sin_phi * cos_lam * dx - sin_phi * sin_lam * dy + cos_phi * dz
+    up = cos_phi * cos_lam * dx + cos_phi * sin_lam * dy + sin_phi * dz
+    return east, north, up
+
+
+def enu_to_geodetic(east, north, up, lat0, lon0, alt0=0.0):
+    """Return the (lat, lon, alt) of local east, north, up coordinates relative to an origin."""
+    east = np.asarray(east, dtype=np.float64)
+    north = np.asarray(north, dtype=np.float64)
+    up = np.asarray(up, dtype=np.float64)
+    sin_phi, cos_phi, sin_lam, cos_lam = _enu_rotation(lat0, lon0)
+    dx = -sin_lam * east - sin_phi * cos_lam * north + cos_phi * cos_lam * up
+    dy = cos_lam * east - sin_phi * sin_lam * north + cos_phi * sin_lam * up
+    dz = cos_phi * north + sin_phi * up
+    x0, y0, z0 = geodetic_to_ecef(lat0, lon0, alt0)
+    return ecef_to_geodetic(x0 + dx, y0 + dy, z0 + dz)
+
+
+def geodetic_to_ned(lat, lon, alt, lat0, lon0, alt0=0.0):
+    """Return the local north, east, down coordinates of positions relative to an origin, the frame
+    MAVLink uses for LOCAL_POSITION_NED."""
+    east, north, up = geodetic_to_enu(lat, lon, alt, lat0, lon0, alt0)
+    return north, east, -up
+
+
+def ned_to_geodetic(north, east, down, lat0, lon0, alt0=0.0):
+    """Return the (lat, lon, alt) of local north, east, down coordinates relative to an origin."""
+    return enu_to_geodetic(east, north, -np.asarray(down, dtype=np.float64), lat0, lon0, alt0)
+
+
+class LocalFrame:
+    """A local east, north, up frame around a fixed origin (e.g. the home position).
+
+    The origin's ECEF position and rotation are computed once, so converting is cheaper than
+    `geodetic_to_enu`. `enu` converts arrays and `enu_point` converts a single position with plain
+    floats, which is several times faster than NumPy for one position per message.
+    """
+
+    def __init__(self, lat0, lon0, alt0=0.0):
+        self.lat0 = float(to_degrees(lat0))
+        self.lon0 = float(to_degrees(lon0))
+        self.alt0 = float(alt0)
+        phi = math.radians(self.lat0)
+        lam = math.radians(self.lon0)
+        self._sin_phi = math.sin(phi)
+        self._cos_phi = math.cos(phi)
+        self._sin_lam = math.sin(lam)
+        self._cos_lam = math.cos(lam)
+        self._origin = tuple(float(c) for c in geodetic_to_ecef(self.lat0, self.lon0, self.alt0))
+
+    def enu(self, lat, lon, alt=0.0):
+        """Return the (east, north, up) arrays of positions in this frame."""
+        return geodetic_to_enu(lat, lon, alt, self.lat0, self.lon0, self.alt0)
+
+    def enu_point(self, lat, lon, alt=0.0):
+        """Return the (east, north, up) of one position given in degrees."""
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        sin_phi = math.sin(phi)
+        cos_phi = math.cos(phi)
+        n = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_phi * sin_phi)
+        x0, y0, z0 = self._origin
+        dx = (n + alt) * cos_phi * math.cos(lam) - x0
+        dy = (n + alt) * cos_phi * math.sin(lam) - y0
+        dz = (n * (1 - WGS84_E2) + alt) * sin_phi - z0
+        east = -self._sin_lam * dx + self._cos_lam * dy
+        t = self._cos_lam * dx + self._sin_lam * dy
+        north = -self._sin_phi * t + self._cos_phi * dz
+        up = self._cos_phi * t + self._sin_phi * dz
+        return east, north, up
+
+    def geodetic(self, east, north, up=0.0):
+        """Return the (lat, lon, alt) of positions in this frame."""
+        return enu_to_geodetic(east, north, up, self.lat0, self.lon0, self.alt0)
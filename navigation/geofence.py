@@ -0,0 +1,475 @@
+"""Geofences made of inclusion and exclusion zones, checked against every position update.
+
+A fence is loaded from the `geoFence` section of a QGroundControl `.plan` file (or a JSON file
+holding just that section). Polygons and circles may additionally carry a `floor` and `ceiling` in
+metres above home, which turns them into prisms and cylinders.
+
+Zones are converted once into a local east, north, up frame around the fence origin and indexed
+on a uniform grid, so a check costs a handful of NumPy operations on the few edges near the vehicle
+no matter how many vertices the polygons have:
+
+- Containment counts crossings of a horizontal ray with the edges bucketed into the point's row
+  of the grid.
+- The distance to the nearest boundary is computed against the candidate edges precomputed for the
+  point's cell: every edge that can be the nearest one for some point in that cell.
+"""
+
+import asyncio
+import json
+import logging
+import math
+
+import numpy as np
+from pymavlink import mavutil
+
+from .geodesy import LocalFrame
+from .utils import ALT_SCALING_FACTOR, LAT_LON_SCALING_FACTOR
+
+logger = logging.getLogger()
+
+# Grid cells per polygon edge. Rows then hold about as many edges as the boundary crosses them.
+GRID_CELLS_PER_EDGE = 0.5
+# Maximum number of grid cells along either axis of a polygon.
+MAX_GRID_SIZE = 64
+# Fraction of a polygon's extent the grid reaches beyond it on every side, so that points just
+# outside are indexed too.
+GRID_MARGIN = 0.25
+
+
+class GeofenceError(Exception):
+    pass
+
+
+class GeofenceBreachError(Exception):
+    def __init__(self, result):
+        super().__init__(f"Geofence breached: {result}.")
+        self.result = result
+
+
+class GeofenceResult:
+    """The outcome of checking one position against a fence."""
+
+    __slots__ = ("breached", "distance", "zone")
+
+    def __init__(self, breached, distance, zone):
+        self.breached = breached
+        # Distance (in metres) to the nearest zone boundary, inf if the fence has no zones.
+        self.distance = distance
+        # The zone that was breached or, if none was, the zone with the nearest boundary.
+        self.zone = zone
+
+    def __repr__(self):
+        state = "breached" if self.breached else "clear"
+        return f"{state} {self.distance:.1f} m from {self.zone}"
+
+
+class Zone:
+    """Base class of the zones of a fence. `floor` and `ceiling` are in metres above home."""
+
+    def __init__(self, inclusion=True, floor=None, ceiling=None, name=None):
+        if floor is not None and ceiling is not None and floor >= ceiling:
+            raise GeofenceError(f"The floor of a zone must be below its ceiling ({floor}).")
+        self.inclusion = inclusion
+        self.floor = floor
+        self.ceiling = ceiling
+        self.name = name
+
+    def check(self, east, north, up):
+        """Return whether a point is inside the zone and its distance to the zone's boundary."""
+        inside, distance = self.check_horizontal(east, north)
+        if self.floor is None and self.ceiling is None:
+            return inside, distance
+        # Signed vertical distance to the nearest of the floor and the ceiling, negative outside.
+        vertical = math.inf
+        if self.floor is not None:
+            vertical = up - self.floor
+        if self.ceiling is not None:
+            vertical = min(vertical, self.ceiling - up)
+        if inside and vertical >= 0:
+            return True, min(distance, vertical)
+        if inside:
+            return False, -vertical
+        if vertical >= 0:
+            return False, distance
+        return False, math.hypot(distance, vertical)
+
+    def check_horizontal(self, east, north):
+        raise NotImplementedError
+
+    def __str__(self):
+        kind = "inclusion" if self.inclusion else "exclusion"
+        return self.name or f"{kind} {type(self).__name__}"
+
+
+class CircleZone(Zone):
+    def __init__(self, center, radius, inclusion=True, floor=None, ceiling=None, name=None):
+        super().__init__(inclusion, floor, ceiling, name)
+        if radius <= 0:
+            raise GeofenceError(f"The radius of a circle must be positive, got {radius}.")
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = float(radius)
+
+    def check_horizontal(self, east, north):
+        offset = math.hypot(east - self.center[0], north - self.center[1]) - self.radius
+        return offset <= 0, abs(offset)
+
+
+class PolygonZone(Zone):
+    """A polygon given by its vertices in the local frame, as an (N, 2) array of (east, north)."""
+
+    def __init__(self, vertices, inclusion=True, floor=None, ceiling=None, name=None):
+        super().__init__(inclusion, floor, ceiling, name)
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if len(vertices) > 1 and np.array_equal(vertices[0], vertices[-1]):
+            vertices = vertices[:-1]
+        if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 3:
+            raise GeofenceError("A polygon needs at least 3 vertices.")
+        self.vertices = vertices
+        x1 = vertices[:, 0]
+        y1 = vertices[:, 1]
+        x2 = np.roll(x1, -1)
+        y2 = np.roll(y1, -1)
+        self._x1 = x1
+        self._y1 = y1
+        self._x2 = x2
+        self._y2 = y2
+        self._dx = x2 - x1
+        self._dy = y2 - y1
+        length_sq = self._dx**2 + self._dy**2
+        # Degenerate edges (repeated vertices) are treated as points.
+        self._inv_length_sq = np.divide(
+            1.0, length_sq, out=np.zeros_like(length_sq), where=length_sq > 0
+        )
+        # Change of x per unit of y along each edge, 0 for horizontal edges, which never cross a
+        # horizontal ray.
+        self._x_per_y = np.divide(
+            self._dx, self._dy, out=np.zeros_like(self._dx), where=self._dy != 0
+        )
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def _build_grid(self):
+        low = self.vertices.min(axis=0)
+        high = self.vertices.max(axis=0)
+        extent = np.maximum(high - low, 1.0)
+        low = low - extent * GRID_MARGIN
+        extent = extent * (1 + 2 * GRID_MARGIN)
+        cells = max(1.0, len(self) * GRID_CELLS_PER_EDGE)
+        aspect = extent[0] / extent[1]
+        nx = int(np.clip(math.ceil(math.sqrt(cells * aspect)), 1, MAX_GRID_SIZE))
+        ny = int(np.clip(math.ceil(math.sqrt(cells / aspect)), 1, MAX_GRID_SIZE))
+        self._origin = low
+        self._shape = (nx, ny)
+        self._cell_size = extent / (nx, ny)
+        self._half_diagonal = float(np.hypot(*self._cell_size)) / 2
+        # The same as plain floats, which are faster to compute with one point at a time.
+        self._grid_bounds = (*low.tolist(), *self._cell_size.tolist())
+
+        # The cells covered by the bounding box of each edge, which contain the whole edge.
+        ix1, iy1 = self._cell_of(np.minimum(self._x1, self._x2), np.minimum(self._y1, self._y2))
+        ix2, iy2 = self._cell_of(np.maximum(self._x1, self._x2), np.maximum(self._y1, self._y2))
+        buckets = [[] for _ in range(nx * ny)]
+        rows = [[] for _ in range(ny)]
+        for edge, (a, b, c, d) in enumerate(zip(ix1.tolist(), iy1.tolist(), ix2, iy2)):
+            for iy in range(b, d + 1):
+                rows[iy].append(edge)
+                for ix in range(a, c + 1):
+                    buckets[iy * nx + ix].append(edge)
+        self._rows = [self._edge_slice(np.array(row, dtype=np.intp)) for row in rows]
+        buckets = [np.array(bucket, dtype=np.intp) for bucket in buckets]
+        self._candidates = self._build_candidates(buckets)
+
+    def _cell_of(self, x, y):
+        nx, ny = self._shape
+        ix = np.clip(((x - self._origin[0]) / self._cell_size[0]).astype(int), 0, nx - 1)
+        iy = np.clip(((y - self._origin[1]) / self._cell_size[1]).astype(int), 0, ny - 1)
+        return ix, iy
+
+    def _edge_slice(self, edges):
+        """Copy the data of the given edges into contiguous arrays for the checks."""
+        return (
+            self._x1[edges],
+            self._y1[edges],
+            self._dx[edges],
+            self._dy[edges],
+            self._y2[edges],
+            self._x_per_y[edges],
+            self._inv_length_sq[edges],
+        )
+
+    def _build_candidates(self, buckets):
+        nx, ny = self._shape
+        occupied = np.array([len(bucket) > 0 for bucket in buckets]).reshape(ny, nx)
+        # Chebyshev distance (in cells) from every cell to the nearest cell holding an edge.
+        first_ring = np.where(occupied, 0, -1)
+        ring = 0
+        while (first_ring < 0).any():
+            ring += 1
+            grown = occupied.copy()
+            grown[1:, :] |= occupied[:-1, :]
+            grown[:-1, :] |= occupied[1:, :]
+            grown[:, 1:] |= grown[:, :-1].copy()
+            grown[:, :-1] |= grown[:, 1:].copy()
+            first_ring[(first_ring < 0) & grown] = ring
+            occupied = grown
+
+        min_cell = float(self._cell_size.min())
+        candidates = []
+        for iy in range(ny):
+            for ix in range(nx):
+                cx, cy = self._origin + (np.array([ix, iy]) + 0.5) * self._cell_size
+                ring = int(first_ring[iy, ix])
+                found = []
+                best = math.inf
+                while True:
+                    cells = _ring_cells(ix, iy, ring, nx, ny)
+                    if not cells:
+                        break
+                    edges = np.concatenate([buckets[cell] for cell in cells])
+                    if len(edges):
+                        distances = np.sqrt(
+                            self._squared_distances(cx, cy, self._edge_slice(edges))
+                        )
+                        # No point in the cell is further than this from its nearest edge.
+                        best = min(best, float(distances.min()) + self._half_diagonal)
+                        found.append((edges, distances))
+                    # Edges in the rings further out are at least this far from the cell.
+                    if best <= ring * min_cell:
+                        break
+                    ring += 1
+                edges = np.concatenate([edges for edges, _ in found])
+                distances = np.concatenate([distances for _, distances in found])
+                edges = np.unique(edges[distances - self._half_diagonal <= best])
+                candidates.append(self._edge_slice(edges))
+        return candidates
+
+    @staticmethod
+    def _squared_distances(x, y, edges):
+        x1, y1, dx, dy, _, _, inv_length_sq = edges
+        px = x - x1
+        py = y - y1
+        # np.clip is several times slower than this on small arrays.
+        t = np.minimum(np.maximum((px * dx + py * dy) * inv_length_sq, 0.0), 1.0)
+        px -= t * dx
+        py -= t * dy
+        return px * px + py * py
+
+    def _in_grid(self, east, north):
+        x0, y0, width, height = self._grid_bounds
+        x = (east - x0) / width
+        y = (north - y0) / height
+        nx, ny = self._shape
+        if 0 <= x < nx and 0 <= y < ny:
+            return int(x), int(y)
+        return None
+
+    def check_horizontal(self, east, north):
+        cell = self._in_grid(east, north)
+        if cell is None:
+            # Far outside the polygon, where nothing is indexed.
+            edges = self._edge_slice(slice(None))
+            return False, math.sqrt(self._squared_distances(east, north, edges).min())
+        ix, iy = cell
+        x1, y1, _, _, y2, x_per_y, _ = self._rows[iy]
+        crossings = np.count_nonzero(
+            ((y1 > north) != (y2 > north)) & (x1 + (north - y1) * x_per_y > east)
+        )
+        candidates = self._candidates[iy * self._shape[0] + ix]
+        distance = math.sqrt(self._squared_distances(east, north, candidates).min())
+        return crossings % 2 == 1, distance
+
+    def check_horizontal_exhaustive(self, east, north):
+        """`check_horizontal` without the index, testing every edge."""
+        crossing = (self._y1 > north) != (self._y2 > north)
+        x = self._x1[crossing] + (north - self._y1[crossing]) * self._x_per_y[crossing]
+        distances = self._squared_distances(east, north, self._edge_slice(slice(None)))
+        return np.count_nonzero(x > east) % 2 == 1, math.sqrt(distances.min())
+
+
+def _ring_cells(ix, iy, ring, nx, ny):
+    """Return the flat indices of the grid cells at Chebyshev distance `ring` from (ix, iy)."""
+    if ring == 0:
+        return [iy * nx + ix]
+    cells = []
+    x_range = range(max(ix - ring, 0), min(ix + ring, nx - 1) + 1)
+    for y in (iy - ring, iy + ring):
+        if 0 <= y < ny:
+            cells.extend(y * nx + x for x in x_range)
+    for x in (ix - ring, ix + ring):
+        if 0 <= x < nx:
+            cells.extend(y * nx + x for y in range(max(iy - ring + 1, 0), min(iy + ring, ny)))
+    return cells
+
+
+class Geofence:
+    """A set of zones around an origin. A position is inside the fence when it is inside at least
+    one inclusion zone (if there are any) and outside every exclusion zone.
+
+    Args:
+        frame (LocalFrame): The local frame the zones are defined in.
+        zones (list of Zone): The zones, in the local frame.
+    """
+
+    def __init__(self, frame, zones):
+        self.frame = frame
+        self.zones = list(zones)
+        self.inclusions = [zone for zone in self.zones if zone.inclusion]
+        self.exclusions = [zone for zone in self.zones if not zone.inclusion]
+
+    def check(self, lat, lon, relative_alt=0.0):
+        """Check a position in degrees with its altitude above home in metres."""
+        east, north, _ = self.frame.enu_point(lat, lon)
+        return self.check_local(east, north, relative_alt)
+
+    def check_local(self, east, north, up=0.0):
+        """Check a position in the local frame."""
+        breached_zone = None
+        nearest_zone = None
+        nearest = math.inf
+        included = not self.inclusions
+        for zone in self.zones:
+            inside, distance = zone.check(east, north, up)
+            if distance < nearest:
+                nearest = distance
+                nearest_zone = zone
+            if zone.inclusion:
+                included = included or inside
+            elif inside and breached_zone is None:
+                breached_zone = zone
+        if not included and breached_zone is None:
+            # Outside every inclusion zone: the nearest one is the one to get back into.
+            breached_zone = min(self.inclusions, key=lambda zone: zone.check(east, north, up)[1])
+        if breached_zone is not None:
+            return GeofenceResult(True, nearest, breached_zone)
+        return GeofenceResult(False, nearest, nearest_zone)
+
+
+def load_geofence(path):
+    """Load a fence from the `geoFence` section of a QGroundControl `.plan` file, or from a JSON
+    file holding just that section.
+
+    The local frame is centred on `origin` ([lat, lon]) if the section has one, else on the
+    planned home position of the plan, else on the mean of all the zones' points.
+
+    Raises:
+        GeofenceError: If the file isn't a valid fence.
+    """
+    try:
+        with open(path) as fence_file:
+            data = json.load(fence_file)
+    except (OSError, ValueError) as e:
+        raise GeofenceError(f"Failed to read the geofence {path}: {e}") from e
+    fence = data.get("geoFence", data)
+    try:
+        return geofence_from_dict(fence, data.get("mission", {}).get("plannedHomePosition"))
+    except (KeyError, TypeError, IndexError, ValueError) as e:
+        raise GeofenceError(f"Invalid geofence {path}: {e!r}") from e
+
+
+def geofence_from_dict(fence, home=None):
+    polygons = fence.get("polygons", [])
+    circles = fence.get("circles", [])
+    origin = fence.get("origin") or home
+    if origin is None:
+        points = [point for polygon in polygons for point in polygon["polygon"]]
+        points += [circle["circle"]["center"] for circle in circles]
+        if not points:
+            raise GeofenceError("A geofence needs at least one zone.")
+        origin = np.mean(np.asarray(points, dtype=np.float64), axis=0)
+    frame = LocalFrame(origin[0], origin[1])
+
+    zones = []
+    for i, polygon in enumerate(polygons):
+        lat, lon = np.asarray(polygon["polygon"], dtype=np.float64).T
+        east, north, _ = frame.enu(lat, lon)
+        zones.append(
+            PolygonZone(
+                np.column_stack([east, north]),
+                polygon.get("inclusion", True),
+                polygon.get("floor"),
+                polygon.get("ceiling"),
+                polygon.get("name", f"polygon {i}"),
+            )
+        )
+    for i, circle in enumerate(circles):
+        lat, lon = circle["circle"]["center"]
+        east, north, _ = frame.enu_point(lat, lon)
+        zones.append(
+            CircleZone(
+                (east, north),
+                circle["circle"]["radius"],
+                circle.get("inclusion", True),
+                circle.get("floor"),
+                circle.get("ceiling"),
+                circle.get("name", f"circle {i}"),
+            )
+        )
+    return Geofence(frame, zones)
+
+
+class GeofenceMonitor:
+    """Checks every GLOBAL_POSITION_INT of a connection against a fence.
+
+    `run` raises `GeofenceBreachError` on the first breach, which is what flight termination waits
+    for, and `on_breach` is called with the `GeofenceResult` of every new breach.
+    """
+
+    def __init__(self, conn, fence, on_breach=None):
+        self.conn = conn
+        self.fence = fence
+        self.on_breach = on_breach
+        self.result = None
+        self.checks = 0
+        self.breaches = 0
+        self._breached = None
+
+    def start(self):
+        if self._breached is not None:
+            return
+        self._breached = asyncio.get_running_loop().create_future()
+        self.conn.dispatcher.subscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, self.process_position
+        )
+
+    def stop(self):
+        if self._breached is None:
+            return
+        self.conn.dispatcher.unsubscribe(
+            mavutil.mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, self.process_position
+        )
+        self._breached = None
+
+    async def run(self):
+        """Check positions until the fence is breached.
+
+        Raises:
+            GeofenceBreachError: When the fence is breached.
+        """
+        self.start()
+        try:
+            await asyncio.shield(self._breached)
+        finally:
+            self.stop()
+
+    def process_position(self, message):
+        was_breached = self.result is not None and self.result.breached
+        self.result = self.fence.check(
+            message.lat / LAT_LON_SCALING_FACTOR,
+            message.lon / LAT_LON_SCALING_FACTOR,
+            message.relative_alt / ALT_SCALING_FACTOR,
+        )
+        self.checks += 1
+        if not self.result.breached:
+            if was_breached:
+                logger.info(f"Back inside the geofence, {self.result}.")
+            return
+        if was_breached:
+            return
+        self.breaches += 1
+        logger.warning(f"Geofence breached: {self.result}.")
+        if self.on_breach is not None:
+            self.on_breach(self.result)
+        if self._breached is not None and not self._breached.done():
+            self._breached.set_exception(GeofenceBreachError(self.result))
@@ -0,0 +1,241 @@
+"""A UNIX domain socket server for requests from other processes on the companion computer.
+
+Every message in either direction is a frame: a 4-byte big-endian length followed by that many
+bytes. Each request frame gets exactly one reply frame, in the order the requests were sent.
+
+The server runs on the same event loop as the MAVLink tasks. Each client has at most
+`max_pending` requests being handled at a time; past that the server stops reading from it, so a
+client that sends faster than its requests are handled is held back by its own socket buffer
+instead of growing the server's memory. Replies are written with `drain()` for the same reason
+in the other direction.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+
+logger = logging.getLogger()
+
+# Path of the server's socket.
+SOCKET_PATH = "/tmp/umuas_socket"
+
+_length = struct.Struct(">I")
+HEADER_LENGTH = _length.size
+# Largest request or reply, in bytes.
+MAX_FRAME_LENGTH = 65536
+# Requests of one client handled at the same time before the server stops reading from it.
+MAX_PENDING_REQUESTS = 32
+# Connections waiting to be accepted. A client connecting past it fails rather than waits.
+LISTEN_BACKLOG = 1024
+# Bytes of replies buffered for a client before the server waits for it to read them.
+WRITE_BUFFER_LIMIT = 262144
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode_frame(payload):
+    """Prefix a payload with its length."""
+    if len(payload) > MAX_FRAME_LENGTH:
+        raise FrameError(f"A frame can't be longer than {MAX_FRAME_LENGTH} bytes.")
+    return _length.pack(len(payload)) + bytes(payload)
+
+
+async def read_frame(reader, max_length=MAX_FRAME_LENGTH):
+    """Read one frame from an `asyncio.StreamReader`. Returns None at the end of the stream.
+
+    Raises:
+        FrameError: If the frame is longer than `max_length` or the stream ends inside it.
+    """
+    try:
+        header = await reader.readexactly(HEADER_LENGTH)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise FrameError("The stream ended inside a frame header.") from e
+    (length,) = _length.unpack(header)
+    if length > max_length:
+        raise FrameError(f"Frame of {length} bytes is longer than {max_length} bytes.")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError as e:
+        raise FrameError("The stream ended inside a frame.") from e
+
+
+def recv_frame(sock, max_length=MAX_FRAME_LENGTH):
+    """Read one frame from a blocking socket. Returns None at the end of the stream."""
+    header = _recv_exactly(sock, HEADER_LENGTH)
+    if header is None:
+        return None
+    (length,) = _length.unpack(header)
+    if length > max_length:
+        raise FrameError(f"Frame of {length} bytes is longer than {max_length} bytes.")
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        raise FrameError("The stream ended inside a frame.")
+    return payload
+
+
+def _recv_exactly(sock, count):
+    buffer = bytearray(count)
+    view = memoryview(buffer)
+    received = 0
+    while received < count:
+        read = sock.recv_into(view[received:])
+        if read == 0:
+            if received == 0:
+                return None
+            raise FrameError("The stream ended inside a frame.")
+        received += read
+    return bytes(buffer)
+
+
+class IpcServer:
+    """Serves requests on a UNIX domain socket.
+
+    Args:
+        path (str): Path of the socket. An existing socket file there is replaced.
+        handler (callable): Coroutine function called with each request payload (bytes) that
+            returns the reply payload. An exception becomes an `ERR` reply.
+        max_pending (int): Requests of one client handled at the same time.
+        max_frame_length (int): Longest request accepted. A client sending a longer one is
+            disconnected.
+    """
+
+    def __init__(
+        self,
+        path,
+        handler,
+        max_pending=MAX_PENDING_REQUESTS,
+        max_frame_length=MAX_FRAME_LENGTH,
+    ):
+        self.path = path
+        self.handler = handler
+        self.max_pending = max_pending
+        self.max_frame_length = max_frame_length
+        self.clients = 0
+        self.max_clients = 0
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.protocol_errors = 0
+        self._server = None
+        self._client_tasks = set()
+
+    async def start(self):
+        remove_socket_file(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._serve_client,
+            self.path,
+            limit=self.max_frame_length + HEADER_LENGTH,
+            backlog=LISTEN_BACKLOG,
+        )
+        logger.info(f"Server started on path {self.path}.")
+
+    async def run(self):
+        """Serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            clients = list(self._client_tasks)
+            self.close()
+            await asyncio.gather(*clients, return_exceptions=True)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._client_tasks):
+            task.cancel()
+        remove_socket_file(self.path)
+
+    def stats(self):
+        return {
+            "clients": self.clients,
+            "max_clients": self.max_clients,
+            "connections": self.connections,
+            "requests": self.requests,
+            "errors": self.errors,
+            "protocol_errors": self.protocol_errors,
+        }
+
+    async def _serve_client(self, reader, writer):
+        self.clients += 1
+        self.connections += 1
+        self.max_clients = max(self.max_clients, self.clients)
+        self._client_tasks.add(asyncio.current_task())
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        # The requests being handled, in the order their replies are sent.
+        replies = asyncio.Queue()
+        pending = asyncio.Semaphore(self.max_pending)
+        reading = asyncio.create_task(self._read_requests(reader, replies, pending))
+        writing = asyncio.create_task(self._write_replies(replies, writer, pending))
+        try:
+            # Normally reading ends first, and writing once it has sent the last reply. If writing
+            # fails, reading may be stuck waiting for a pending request to end.
+            await asyncio.wait((reading, writing), return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            # The server is closing. Nothing awaits this task, so there is no one to tell.
+            pass
+        finally:
+            self.clients -= 1
+            self._client_tasks.discard(asyncio.current_task())
+            for task in (reading, writing):
+                task.cancel()
+            while not replies.empty():
+                task = replies.get_nowait()
+                if task is not None:
+                    task.cancel()
+            writer.close()
+            await asyncio.gather(reading, writing, return_exceptions=True)
+
+    async def _read_requests(self, reader, replies, pending):
+        try:
+            while True:
+                request = await read_frame(reader, self.max_frame_length)
+                if request is None:
+                    break
+                self.requests += 1
+                await pending.acquire()
+                replies.put_nowait(asyncio.create_task(self._handle(request)))
+        except FrameError as e:
+            self.protocol_errors += 1
+            logger.warning(f"Disconnecting client: {e}")
+        except ConnectionError:
+            pass
+        # Requests already read are still answered, since a client may only have shut down its
+        # sending side.
+        replies.put_nowait(None)
+
+    async def _handle(self, request):
+        try:
+            return await self.handler(request)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Request {bytes(request[:64])!r} failed: {e!r}")
+            return f"ERR {e}".encode()
+
+    async def _write_replies(self, replies, writer, pending):
+        while True:
+            task = await replies.get()
+            if task is None:
+                return
+            reply = await task
+            pending.release()
+            writer.write(encode_frame(reply))
+            await writer.drain()
+
+
+def remove_socket_file(path):
+    """Remove the socket file if it already exists."""
+    try:
+        os.unlink(path)
+    except OSError:
+        # If we encounter an error when attempting to delete the file and it still
+        # exists, raise the exception again.
+        if os.path.exists(path):
+            raise
@@ -0,0 +1,176 @@
+"""Client library for the IPC server, for the processes running next to it on the companion
+computer (object detection, mission scripts).
+
+A process keeps one connection to the server (see `get_client`) and pipelines its requests on
+it: each request gets an id and a future, a background thread reads the replies and resolves the
+future with the matching id. Any number of threads can have requests in flight at once, and no
+request pays for setting up a connection.
+"""
+
+import concurrent.futures
+import logging
+import os
+import socket
+import threading
+
+from . import ipc_protocol as protocol
+from .ipc import SOCKET_PATH, FrameError, encode_frame, recv_frame
+
+logger = logging.getLogger()
+
+# Seconds a blocking request waits for its reply.
+REQUEST_TIMEOUT = 30.0
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+class IpcError(Exception):
+    """A request was rejected or failed."""
+
+    def __init__(self, status, message):
+        super().__init__(message or f"Request failed with status {status}.")
+        self.status = status
+
+
+class IpcClient:
+    """A pipelined connection to the IPC server. It connects on the first request, and again on
+    the next request after the connection was lost.
+
+    Args:
+        path (str): Path of the server's socket.
+    """
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+        self._socket = None
+        self._pending = {}
+        self._next_id = 0
+        # Guards the socket, the pending requests and the next id. Never held while blocking on
+        # the socket, so the reader thread can always resolve replies.
+        self._lock = threading.Lock()
+        # Keeps the frames of concurrent requests from interleaving.
+        self._send_lock = threading.Lock()
+
+    def submit(self, build):
+        """Send a request and return a `concurrent.futures.Future` of its decoded reply.
+
+        Args:
+            build (callable): Called with the request id; returns the encoded request.
+        """
+        future = concurrent.futures.Future()
+        with self._send_lock:
+            with self._lock:
+                if self._socket is None:
+                    self._connect()
+                sock = self._socket
+                request_id = self._next_id
+                self._next_id = (self._next_id + 1) % (1 << 32)
+                self._pending[request_id] = future
+            try:
+                sock.sendall(encode_frame(build(request_id)))
+            except OSError as e:
+                self._disconnect(sock, e)
+                raise ConnectionError(f"Lost the connection to {self.path}: {e}") from e
+            except Exception:
+                with self._lock:
+                    self._pending.pop(request_id, None)
+                raise
+        return future
+
+    def submit_command(self, name, params=(), text="", mav_command=0):
+        return self.submit(
+            lambda request_id: protocol.encode_command(request_id, name, params, text, mav_command)
+        )
+
+    def submit_telemetry(self, topic):
+        return self.submit(lambda request_id: protocol.encode_telemetry_request(request_id, topic))
+
+    def command(self, name, *params, text="", mav_command=0, timeout=REQUEST_TIMEOUT):
+        """Run a command, e.g. `command("GOTO", lat, lon, alt)`, and wait for it to end.
+
+        Returns:
+            int: The status (`STATUS_DONE`, `STATUS_SUPERSEDED` or `STATUS_PREEMPTED`).
+
+        Raises:
+            IpcError: If the command was rejected or failed.
+        """
+        reply = self.submit_command(name, params, text, mav_command).result(timeout)
+        if reply.status in (protocol.STATUS_FAILED, protocol.STATUS_BAD_REQUEST):
+            raise IpcError(reply.status, reply.text)
+        return reply.status
+
+    def telemetry(self, topic, timeout=REQUEST_TIMEOUT):
+        """Return the latest sample of a telemetry topic (e.g. `GLOBAL_POSITION_INT`) as a dict
+        with its `age` in seconds, or None if the server has no sample."""
+        reply = self.submit_telemetry(topic).result(timeout)
+        if reply.message_type == protocol.MSG_REPLY:
+            if reply.status == protocol.STATUS_NO_DATA:
+                return None
+            raise IpcError(reply.status, reply.text)
+        sample = dict(zip(protocol.telemetry_fields(topic), reply.values.tolist()))
+        sample["age"] = reply.fields[1]
+        return sample
+
+    def close(self):
+        self._disconnect(self._socket, ConnectionError("The client was closed."))
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        threading.Thread(target=self._read_replies, args=(sock,), daemon=True).start()
+
+    def _disconnect(self, sock, error):
+        """Close a connection and fail the requests still waiting for a reply on it."""
+        with self._lock:
+            if sock is None or self._socket is not sock:
+                return
+            self._socket = None
+            pending = self._pending
+            self._pending = {}
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _read_replies(self, sock):
+        error = None
+        try:
+            while True:
+                frame = recv_frame(sock)
+                if frame is None:
+                    break
+                reply = protocol.decode(frame)
+                with self._lock:
+                    future = self._pending.pop(reply.request_id, None)
+                if future is None:
+                    logger.warning(f"Reply to unknown request {reply.request_id}.")
+                    continue
+                future.set_result(reply)
+        except (OSError, FrameError, protocol.ProtocolError) as e:
+            error = e
+        self._disconnect(sock, ConnectionError(f"Lost the connection to {self.path}: {error}"))
+
+
+def get_client(path=SOCKET_PATH):
+    """Return this process' client of the server at `path`, creating it the first time. A forked
+    child gets its own client rather than sharing its parent's socket."""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(path)
+        if client is None:
+            client = _clients[path] = IpcClient(path)
+        return client
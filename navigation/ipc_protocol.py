@@ -0,0 +1,280 @@
+"""The binary messages exchanged with the IPC server, inside the frames of `navigation.ipc`.
+
+Every message starts with an 8-byte header (`HEADER`): the protocol version, the message type,
+a status (replies only) and the request id the reply is for. The body has a fixed layout per
+message type, optionally followed by UTF-8 text:
+
+- COMMAND: `COMMAND_BODY` (command code, MAV_CMD id, 7 params), then text (the reason of a flight
+  termination or the path of a mission plan).
+- TELEMETRY_REQUEST: `TELEMETRY_REQUEST_BODY` (topic code).
+- TELEMETRY: `TELEMETRY_BODY` (topic code, sample age in seconds), then the sample's fields as
+  little-endian doubles, in the order of `telemetry.TELEMETRY_FIELDS`.
+- REPLY: text (what went wrong, if anything).
+
+Every field is little-endian. Messages are decoded from a `memoryview` of the frame without
+copying it: text and telemetry values stay views into the frame until they are used.
+
+A request whose first byte isn't `PROTOCOL_VERSION` is a text request (e.g. `GOTO 49.8 -97.1 20`),
+which the server still accepts.
+"""
+
+import asyncio
+import math
+import struct
+import time
+
+from .executor import (
+    COMMAND_DONE,
+    COMMAND_FAILED,
+    COMMAND_PREEMPTED,
+    COMMAND_SUPERSEDED,
+    CommandParseError,
+    make_command,
+    parse_command,
+)
+from .telemetry import TELEMETRY_FIELDS
+from .utils import ATTITUDE, EXTENDED_SYS_STATE, GLOBAL_POSITION_INT, SYS_STATUS
+
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct("<BBHI")
+COMMAND_BODY = struct.Struct("<HI7d")
+TELEMETRY_REQUEST_BODY = struct.Struct("<B")
+# The topic code is padded so the doubles that follow are 8-byte aligned.
+TELEMETRY_BODY = struct.Struct("<B7xd")
+
+MSG_COMMAND = 1
+MSG_TELEMETRY_REQUEST = 2
+MSG_TELEMETRY = 3
+MSG_REPLY = 4
+
+STATUS_DONE = 0
+STATUS_FAILED = 1
+STATUS_SUPERSEDED = 2
+STATUS_PREEMPTED = 3
+STATUS_BAD_REQUEST = 4
+# No recent sample of the requested telemetry.
+STATUS_NO_DATA = 5
+
+# Command codes, by executor command name. Codes are never reused.
+COMMAND_CODES = {
+    "FT": 1,
+    "ARM": 2,
+    "DISARM": 3,
+    "TAKEOFF": 4,
+    "LAND": 5,
+    "RTL": 6,
+    "MISSION_START": 7,
+    "GOTO": 8,
+    "SET_HOME": 9,
+    "COMMAND_LONG": 10,
+    "MISSION_PLAN": 11,
+}
+COMMAND_NAMES = {code: name for name, code in COMMAND_CODES.items()}
+# Commands whose arguments are the first 3 params (lat, lon, alt).
+POSITION_COMMANDS = ("GOTO", "SET_HOME")
+# Commands whose argument is the text.
+TEXT_COMMANDS = ("FT", "MISSION_PLAN")
+
+TOPIC_CODES = {
+    GLOBAL_POSITION_INT: 1,
+    ATTITUDE: 2,
+    SYS_STATUS: 3,
+    EXTENDED_SYS_STATE: 4,
+}
+TOPIC_NAMES = {code: name for name, code in TOPIC_CODES.items()}
+
+_STATUS_CODES = {
+    COMMAND_DONE: STATUS_DONE,
+    COMMAND_FAILED: STATUS_FAILED,
+    COMMAND_SUPERSEDED: STATUS_SUPERSEDED,
+    COMMAND_PREEMPTED: STATUS_PREEMPTED,
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Message:
+    """A decoded message. `body` is the rest of the frame after the fixed part of the body."""
+
+    __slots__ = ("message_type", "status", "request_id", "fields", "body")
+
+    def __init__(self, message_type, status, request_id, fields, body):
+        self.message_type = message_type
+        self.status = status
+        self.request_id = request_id
+        self.fields = fields
+        self.body = body
+
+    @property
+    def text(self):
+        return str(self.body, "utf-8")
+
+    @property
+    def values(self):
+        """The telemetry values of a TELEMETRY message, as a view of the frame."""
+        return self.body.cast("d")
+
+
+_BODIES = {
+    MSG_COMMAND: COMMAND_BODY,
+    MSG_TELEMETRY_REQUEST: TELEMETRY_REQUEST_BODY,
+    MSG_TELEMETRY: TELEMETRY_BODY,
+    MSG_REPLY: None,
+}
+
+
+def is_binary(frame):
+    return len(frame) > 0 and frame[0] == PROTOCOL_VERSION
+
+
+def decode(frame):
+    """Decode a message.
+
+    Raises:
+        ProtocolError: If it isn't a valid message of this protocol version.
+    """
+    view = memoryview(frame)
+    if len(view) < HEADER.size:
+        raise ProtocolError(f"A message is at least {HEADER.size} bytes, got {len(view)}.")
+    version, message_type, status, request_id = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}.")
+    if message_type not in _BODIES:
+        raise ProtocolError(f"Unknown message type {message_type}.")
+    body = _BODIES[message_type]
+    fields = ()
+    offset = HEADER.size
+    if body is not None:
+        if len(view) < offset + body.size:
+            raise ProtocolError(f"Message of type {message_type} is too short.")
+        fields = body.unpack_from(view, offset)
+        offset += body.size
+    return Message(message_type, status, request_id, fields, view[offset:])
+
+
+def _encode(message_type, request_id, status=0, body=None, fields=(), tail=b""):
+    header = HEADER.pack(PROTOCOL_VERSION, message_type, status, request_id)
+    if body is None:
+        return header + tail
+    return header + body.pack(*fields) + tail
+
+
+def encode_command(request_id, name, params=(), text="", mav_command=0):
+    """Encode a COMMAND message. `params` are up to 7 floats; missing ones are NaN."""
+    code = COMMAND_CODES.get(name)
+    if code is None:
+        raise ProtocolError(f"Unknown command {name!r}.")
+    if len(params) > 7:
+        raise ProtocolError("A command has at most 7 params.")
+    params = tuple(params) + (math.nan,) * (7 - len(params))
+    return _encode(
+        MSG_COMMAND,
+        request_id,
+        body=COMMAND_BODY,
+        fields=(code, mav_command, *params),
+        tail=text.encode(),
+    )
+
+
+def encode_telemetry_request(request_id, topic):
+    code = TOPIC_CODES.get(topic)
+    if code is None:
+        raise ProtocolError(f"Unknown telemetry topic {topic!r}.")
+    return _encode(MSG_TELEMETRY_REQUEST, request_id, body=TELEMETRY_REQUEST_BODY, fields=(code,))
+
+
+def encode_telemetry(request_id, topic, age, values):
+    tail = struct.pack(f"<{len(values)}d", *values)
+    return _encode(
+        MSG_TELEMETRY,
+        request_id,
+        body=TELEMETRY_BODY,
+        fields=(TOPIC_CODES[topic], age),
+        tail=tail,
+    )
+
+
+def encode_reply(request_id, status, text=""):
+    return _encode(MSG_REPLY, request_id, status, tail=text.encode())
+
+
+def command_args(message):
+    """Return the executor command name and arguments of a decoded COMMAND message.
+
+    Raises:
+        ProtocolError: If the command code or its arguments are invalid.
+    """
+    code, mav_command, *params = message.fields
+    name = COMMAND_NAMES.get(code)
+    if name is None:
+        raise ProtocolError(f"Unknown command code {code}.")
+    if name in POSITION_COMMANDS:
+        position = params[:3]
+        if not all(math.isfinite(value) for value in position):
+            raise ProtocolError(f"{name} needs a finite latitude, longitude and altitude.")
+        return name, tuple(position)
+    if name == "COMMAND_LONG":
+        return name, (mav_command, *params)
+    if name in TEXT_COMMANDS:
+        try:
+            text = message.text
+        except UnicodeDecodeError:
+            raise ProtocolError(f"The text of {name} must be UTF-8.")
+        if name == "MISSION_PLAN" and not text:
+            raise ProtocolError("MISSION_PLAN takes the path of a mission file.")
+        return name, (text,)
+    return name, ()
+
+
+def telemetry_fields(topic):
+    """Return the names of the values of a TELEMETRY message of `topic`."""
+    return tuple(name for name, _, _, _ in TELEMETRY_FIELDS[topic])
+
+
+async def handle_request(executor, conn, frame):
+    """Answer a binary or text request: run a command through the executor or read the latest
+    telemetry from the connection. Returns the reply.
+
+    Raises:
+        CommandParseError: If a text request isn't a valid command.
+    """
+    if not is_binary(frame):
+        command = parse_command(frame)
+        status = await asyncio.shield(executor.submit(command))
+        if status == COMMAND_FAILED:
+            return f"ERR {command.detail}".encode()
+        return f"OK {status}".encode()
+
+    try:
+        message = decode(frame)
+    except ProtocolError as e:
+        request_id = HEADER.unpack_from(frame)[3] if len(frame) >= HEADER.size else 0
+        return encode_reply(request_id, STATUS_BAD_REQUEST, str(e))
+    request_id = message.request_id
+    try:
+        if message.message_type == MSG_COMMAND:
+            command = make_command(*command_args(message))
+        elif message.message_type == MSG_TELEMETRY_REQUEST:
+            return _telemetry_reply(conn, request_id, message.fields[0])
+        else:
+            raise ProtocolError(f"Message type {message.message_type} isn't a request.")
+    except (ProtocolError, CommandParseError) as e:
+        return encode_reply(request_id, STATUS_BAD_REQUEST, str(e))
+    # A client going away doesn't cancel its command.
+    status = await asyncio.shield(executor.submit(command))
+    detail = str(command.detail) if status == COMMAND_FAILED else ""
+    return encode_reply(request_id, _STATUS_CODES[status], detail)
+
+
+def _telemetry_reply(conn, request_id, code):
+    topic = TOPIC_NAMES.get(code)
+    if topic is None:
+        raise ProtocolError(f"Unknown telemetry topic {code}.")
+    sample = conn.telemetry.latest(topic)
+    if sample is None:
+        return encode_reply(request_id, STATUS_NO_DATA)
+    values = [float(sample[name]) for name in telemetry_fields(topic)]
+    return encode_telemetry(request_id, topic, time.monotonic() - sample["time"], values)
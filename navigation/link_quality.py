@@ -0,0 +1,229 @@
+import bisect
+import math
+import time
+
+# Upper edges (in seconds) of the inter-arrival time histogram buckets. A final bucket holds
+# everything longer.
+INTER_ARRIVAL_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+# Length (in seconds) of the window over which rates are computed.
+RATE_WINDOW = 10
+# Weight of each new packet in the smoothed loss of a sender.
+LOSS_SMOOTHING = 0.05
+# Weights of new samples in the smoothed round-trip time and its variation (as used for TCP).
+RTT_SMOOTHING = 0.125
+RTT_VARIATION_SMOOTHING = 0.25
+# Thresholds above which a link counts as degraded.
+DEGRADED_LOSS = 0.1
+DEGRADED_RTT = 0.5
+# A sequence number jump larger than this is treated as a restarted sender, not lost packets.
+MAX_SEQ_GAP = 128
+
+
+class RateWindow:
+    """Counts events and bytes per second over the last `size` seconds in a fixed ring of
+    one-second buckets."""
+
+    def __init__(self, size=RATE_WINDOW):
+        self.size = size
+        self._seconds = [-1] * size
+        self._events = [0] * size
+        self._bytes = [0] * size
+
+    def add(self, now, events=1, nbytes=0):
+        second = int(now)
+        index = second % self.size
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._events[index] = 0
+            self._bytes[index] = 0
+        self._events[index] += events
+        self._bytes[index] += nbytes
+
+    def totals(self, now):
+        """Return the (events, bytes) of the complete seconds in the window."""
+        current = int(now)
+        events = 0
+        nbytes = 0
+        for second, count, size in zip(self._seconds, self._events, self._bytes):
+            if current - self.size < second < current:
+                events += count
+                nbytes += size
+        return events, nbytes
+
+    def rates(self, now):
+        """Return the (events, bytes) per second over the window."""
+        events, nbytes = self.totals(now)
+        span = self.size - 1
+        return events / span, nbytes / span
+
+
+class SenderStats:
+    """Packet loss of one MAVLink sender (system id and component id), from its sequence
+    numbers."""
+
+    def __init__(self, system_id, component_id):
+        self.system_id = system_id
+        self.component_id = component_id
+        self.received = 0
+        self.lost = 0
+        self.restarts = 0
+        self.smoothed_loss = 0.0
+        self.last_seq = None
+
+    @property
+    def loss(self):
+        total = self.received + self.lost
+        if total == 0:
+            return 0.0
+        return self.lost / total
+
+    def record(self, seq):
+        """Record a packet with sequence number `seq` and return how many packets were lost
+        before it."""
+        self.received += 1
+        lost = 0
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq - 1) & 0xFF
+            if gap > MAX_SEQ_GAP:
+                # A duplicate, a reordered packet or a restarted sender.
+                self.restarts += 1
+            else:
+                lost = gap
+        self.last_seq = seq
+        self.lost += lost
+        # Equivalent to applying the smoothing to each of the lost packets and then this one.
+        keep = (1 - LOSS_SMOOTHING) ** (lost + 1)
+        self.smoothed_loss = self.smoothed_loss * keep + (1 - keep) * lost / (lost + 1)
+        return lost
+
+    def to_dict(self):
+        return {
+            "system_id": self.system_id,
+            "component_id": self.component_id,
+            "received": self.received,
+            "lost": self.lost,
+            "loss": self.loss,
+            "smoothed_loss": self.smoothed_loss,
+            "restarts": self.restarts,
+        }
+
+
+class InterArrivalStats:
+    """Histogram of the times between consecutive messages of one type."""
+
+    def __init__(self, msg_type):
+        self.msg_type = msg_type
+        self.count = 0
+        self.last_time = None
+        self.max_interval = 0.0
+        self.total_interval = 0.0
+        self.histogram = [0] * (len(INTER_ARRIVAL_BUCKETS) + 1)
+
+    @property
+    def mean_interval(self):
+        if self.count < 2:
+            return None
+        return self.total_interval / (self.count - 1)
+
+    def record(self, now):
+        self.count += 1
+        if self.last_time is not None:
+            interval = now - self.last_time
+            self.total_interval += interval
+            if interval > self.max_interval:
+                self.max_interval = interval
+            self.histogram[bisect.bisect_left(INTER_ARRIVAL_BUCKETS, interval)] += 1
+        self.last_time = now
+
+    def to_dict(self):
+        return {
+            "type": self.msg_type,
+            "count": self.count,
+            "mean_interval": self.mean_interval,
+            "max_interval": self.max_interval,
+            "histogram": dict(zip(INTER_ARRIVAL_BUCKETS + (math.inf,), self.histogram)),
+        }
+
+
+class LinkQualityMonitor:
+    """Keeps constant-size statistics on the health of a MAVLink link.
+
+    Packet loss is derived from the sequence numbers of each sender, the distribution of the
+    times between messages is kept per message type, throughput over the last `RATE_WINDOW`
+    seconds and a smoothed round-trip time from command acknowledgements. Memory grows only with the
+    number of senders and message types seen, never with the number of messages.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.senders = {}
+        self.message_types = {}
+        self.window = RateWindow()
+        self.loss_window = RateWindow()
+        self.bad_data = 0
+        self.srtt = None
+        self.rtt_variation = None
+        self.rtt_samples = 0
+
+    def record(self, message, now=None):
+        if now is None:
+            now = self.clock()
+        msg_id = message.get_msgId()
+        self.window.add(now, 1, len(message.get_msgbuf()))
+        if msg_id < 0:
+            self.bad_data += 1
+            return
+
+        key = (message.get_srcSystem(), message.get_srcComponent())
+        sender = self.senders.get(key)
+        if sender is None:
+            sender = self.senders[key] = SenderStats(*key)
+        lost = sender.record(message.get_seq())
+        self.loss_window.add(now, 1, lost)
+
+        stats = self.message_types.get(msg_id)
+        if stats is None:
+            stats = self.message_types[msg_id] = InterArrivalStats(message.get_type())
+        stats.record(now)
+
+    def record_rtt(self, rtt):
+        """Add a round-trip time sample, e.g. from a COMMAND_LONG and its COMMAND_ACK."""
+        self.rtt_samples += 1
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rtt_variation = rtt / 2
+            return
+        self.rtt_variation += RTT_VARIATION_SMOOTHING * (abs(self.srtt - rtt) - self.rtt_variation)
+        self.srtt += RTT_SMOOTHING * (rtt - self.srtt)
+
+    def recent_loss(self, now=None):
+        """Return the fraction of packets lost over the rate window."""
+        if now is None:
+            now = self.clock()
+        received, lost = self.loss_window.totals(now)
+        if received + lost == 0:
+            return 0.0
+        return lost / (received + lost)
+
+    def is_degraded(self, now=None):
+        if self.recent_loss(now) > DEGRADED_LOSS:
+            return True
+        return self.srtt is not None and self.srtt > DEGRADED_RTT
+
+    def snapshot(self, now=None):
+        """Return all statistics as a dictionary."""
+        if now is None:
+            now = self.clock()
+        messages_per_second, bytes_per_second = self.window.rates(now)
+        return {
+            "messages_per_second": messages_per_second,
+            "bytes_per_second": bytes_per_second,
+            "recent_loss": self.recent_loss(now),
+            "degraded": self.is_degraded(now),
+            "bad_data": self.bad_data,
+            "srtt": self.srtt,
+            "rtt_variation": self.rtt_variation,
+            "rtt_samples": self.rtt_samples,
+            "senders": [sender.to_dict() for sender in self.senders.values()],
+            "message_types": [stats.to_dict() for stats in self.message_types.values()],
+        }
@@ -4,12 +4,43 @@ import time
 
 from pymavlink import mavutil, mavwp
 
-from .utils import COMMAND_ACK, MISSION_ACK, MISSION_REQUEST
+from .utils import (
+    ARM_STATE_TIMEOUT,
+    COMMAND_ACK,
+    COMMAND_ACK_TIMEOUT,
+    EXTENDED_SYS_STATE,
+    HEARTBEAT,
+    HOME_POSITION_TIMEOUT,
+    LANDING_TIMEOUT,
+    MISSION_ACK,
+    MISSION_ITEM_TIMEOUT,
+    MISSION_MAX_RETRIES,
+    MISSION_REQUEST,
+    build_message,
+)
 
 logger = logging.getLogger()
 
 
 class MissionItem:
+    __slots__ = (
+        "target_system",
+        "target_component",
+        "seq",
+        "frame",
+        "command",
+        "current",
+        "autocontinue",
+        "param1",
+        "param2",
+        "param3",
+        "param4",
+        "x",
+        "y",
+        "z",
+        "mission_type",
+    )
+
     def __init__(
         self,
         conn,
@@ -62,23 +93,38 @@ class MissionItem:
 
 
 def upload_mission(conn, waypoints: list[MissionItem]):
+    """Upload a mission one item at a time, on a connection no receive loop is reading from.
+
+    Returns:
+        bool: Whether the autopilot acknowledged the mission.
+    """
     waypoint_loader = mavwp.MAVWPLoader()
     for waypoint in waypoints:
-        waypoint_loader.add(mavutil.mavlink.MAVLink_mission_item_message(*waypoint.to_list))
+        waypoint_loader.add(
+            build_message(mavutil.mavlink.MAVLink_mission_item_message, *waypoint.to_list)
+        )
 
     # Send the number of mission items to the flight controller.
     conn.waypoint_count_send(waypoint_loader.count())
+    timeout = MISSION_ITEM_TIMEOUT * MISSION_MAX_RETRIES
 
     # Send waypoint to the flight controller.
     for _ in range(waypoint_loader.count()):
-        msg = conn.recv_match(type=[MISSION_REQUEST], blocking=True)
+        msg = conn.recv_match(type=[MISSION_REQUEST], blocking=True, timeout=timeout)
+        if msg is None:
+            logger.warning(f"No MISSION_REQUEST received within {timeout} seconds.")
+            return False
         conn.mav.send(waypoint_loader.wp(msg.seq))
         logger.info(f"Sending waypoint: {msg.seq}/{waypoint_loader.count()-1}.")
 
-    msg = conn.recv_match(type=[MISSION_ACK], blocking=True)
+    msg = conn.recv_match(type=[MISSION_ACK], blocking=True, timeout=timeout)
+    if msg is None:
+        logger.warning(f"No MISSION_ACK received within {timeout} seconds.")
+        return False
     logger.info(msg)
 
     logger.info("Mission acknowledgement received.")
+    return True
 
 
 def set_home(conn, lat, lon, alt, use_curr_location=False):
@@ -101,9 +147,11 @@ def set_home(conn, lat, lon, alt, use_curr_location=False):
         alt,
     )
     # Wait for command acknowledgment before proceeding.
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_DO_SET_HOME)
     logger.info(msg)
-    msg = conn.recv_match(type=["HOME_POSITION"], blocking=True)
+    msg = conn.recv_match(type=["HOME_POSITION"], blocking=True, timeout=HOME_POSITION_TIMEOUT)
+    if msg is None:
+        logger.warning(f"No HOME_POSITION received within {HOME_POSITION_TIMEOUT} seconds.")
     logger.info(msg)
 
     # Wait for a couple seconds after setting the home location.
@@ -137,6 +185,45 @@ def command_long_send(
     )
 
 
+def wait_command_ack(conn, command, timeout=COMMAND_ACK_TIMEOUT):
+    """Wait up to `timeout` seconds for the COMMAND_ACK of `command`.
+
+    Only use this on connections that no receive loop is reading from; otherwise use
+    `navigation.commands.CommandManager`, which takes ACKs from the shared receive loop.
+
+    Returns:
+        The COMMAND_ACK message, or None if none arrived in time.
+    """
+    msg = conn.recv_match(
+        type=[COMMAND_ACK],
+        condition=f"COMMAND_ACK.command == {command}",
+        blocking=True,
+        timeout=timeout,
+    )
+    if msg is None:
+        logger.warning(f"No COMMAND_ACK received for command {command} within {timeout} seconds.")
+    return msg
+
+
+def wait_armed(conn, armed, timeout=ARM_STATE_TIMEOUT):
+    """Wait up to `timeout` seconds for the heartbeats of the vehicle to report it armed (or
+    disarmed if `armed` is False). Like `wait_command_ack`, only for connections that no receive
+    loop is reading from.
+
+    Returns:
+        bool: Whether the vehicle reached that state in time.
+    """
+    deadline = time.monotonic() + timeout
+    while conn.motors_armed() != armed:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            state = "armed" if armed else "disarmed"
+            logger.warning(f"The vehicle didn't report being {state} within {timeout} seconds.")
+            return False
+        conn.recv_match(type=[HEARTBEAT], blocking=True, timeout=remaining)
+    return True
+
+
 def simple_goto(conn, lat, lon, alt):
     conn.mav.command_long_send(
         conn.target_system,
@@ -151,7 +238,7 @@ def simple_goto(conn, lat, lon, alt):
         lon,
         alt,
     )
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_DO_REPOSITION)
     logger.info(msg)
     logger.info("Simple goto...")
 
@@ -172,8 +259,8 @@ def arm(conn):
     )
     # Wait until arming confirmed (can manually check with master.motors_armed()).
     logger.info("Waiting for the vehicle to arm...")
-    conn.motors_armed_wait()
-    logger.info("Armed!")
+    if wait_armed(conn, True):
+        logger.info("Armed!")
 
 
 def disarm(conn):
@@ -192,8 +279,8 @@ def disarm(conn):
     )
     # Wait until disarming confirmed.
     logger.info("Waiting for the vehicle to disarm...")
-    conn.motors_disarmed_wait()
-    logger.info("Disarmed!")
+    if wait_armed(conn, False):
+        logger.info("Disarmed!")
 
 
 def takeoff(conn):
@@ -210,7 +297,7 @@ def takeoff(conn):
         0,
         0,
     )
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF)
     logger.info(msg)
     logger.info("Taking off!")
 
@@ -229,7 +316,7 @@ def start_mission(conn):
         0,
         0,
     )
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_MISSION_START)
     logger.info(msg)
     logger.info("Started the mission!")
 
@@ -248,7 +335,7 @@ def return_to_launch(conn):
         0,
         0,
     )
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH)
     logger.info(msg)
     logger.info("Returning to launch point...")
 
@@ -267,14 +354,18 @@ def land(conn):
         0,
         0,
     )
-    msg = conn.recv_match(type=[COMMAND_ACK], blocking=True)
+    msg = wait_command_ack(conn, mavutil.mavlink.MAV_CMD_NAV_LAND)
     logger.info(msg)
     logger.info("Drone landing...")
+    on_ground = mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND
     message = conn.recv_match(
-        type=["EXTENDED_SYS_STATE"],
-        condition=f"EXTENDED_SYS_STATE.landed_state == \
-            {mavutil.mavlink.MAV_LANDED_STATE_ON_GROUND}",
+        type=[EXTENDED_SYS_STATE],
+        condition=f"EXTENDED_SYS_STATE.landed_state == {on_ground}",
         blocking=True,
+        timeout=LANDING_TIMEOUT,
     )
+    if message is None:
+        logger.warning(f"The vehicle didn't report landing within {LANDING_TIMEOUT} seconds.")
+        return
     logger.info(message)
     logger.info("Landed!")
@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+from pymavlink import mavutil
+
+from . import frames, geodesy
+from .mission_loader import GLOBAL_FRAMES
+from .utils import LAT_LON_SCALING_FACTOR, build_message
+
+mavlink = mavutil.mavlink
+
+MISSION_ITEM_INT_DTYPE = frames.payload_dtype(mavlink.MAVLINK_MSG_ID_MISSION_ITEM_INT)
+
+
+class MissionBatch:
+    """A whole mission stored as NumPy columns rather than one `MissionItem` per item.
+
+    The columns are a structured array laid out exactly like the MISSION_ITEM_INT payload
+    (`payloads`), so the items take 37 bytes each and encoding them is a copy into
+    `frames.encode_batch`. Positions are in degE7, as on the wire. A `MissionBatch` can be passed
+    anywhere a list of `MissionItem`s is uploaded or synced.
+
+    Args:
+        count (int): Number of items. They start out as waypoints at (0, 0) with the same defaults
+            as `MissionItem`.
+        target_system (int): System id of the autopilot.
+        target_component (int): Component id of the autopilot.
+        mission_type (int): MAV_MISSION_TYPE of the items.
+    """
+
+    def __init__(
+        self,
+        count,
+        target_system=0,
+        target_component=0,
+        mission_type=mavlink.MAV_MISSION_TYPE_MISSION,
+    ):
+        payloads = np.zeros(count, dtype=MISSION_ITEM_INT_DTYPE)
+        payloads["target_system"] = target_system
+        payloads["target_component"] = target_component
+        payloads["seq"] = np.arange(count)
+        payloads["frame"] = mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+        payloads["command"] = mavlink.MAV_CMD_NAV_WAYPOINT
+        payloads["autocontinue"] = 1
+        payloads["param2"] = 1.0
+        payloads["param3"] = 20.0
+        payloads["param4"] = math.nan
+        # Only dialects with MAVLink 2 extensions have it.
+        if "mission_type" in MISSION_ITEM_INT_DTYPE.names:
+            payloads["mission_type"] = mission_type
+        self.payloads = payloads
+        self.mission_type = mission_type
+
+    def __len__(self):
+        return len(self.payloads)
+
+    @property
+    def nbytes(self):
+        return self.payloads.nbytes
+
+    @classmethod
+    def waypoints(
+        cls,
+        conn,
+        lat,
+        lon,
+        alt,
+        hold_time=0.0,
+        accept_radius=1.0,
+        pass_radius=20.0,
+        degE7=False,
+    ):
+        """Build a mission of waypoints from arrays of positions.
+
+        Args:
+            conn: The mavlink connection the mission is for.
+            degE7 (bool): Whether `lat` and `lon` are already in degE7 rather than in degrees.
+        """
+        lat = np.asarray(lat)
+        batch = cls(len(lat), conn.target_system, conn.target_component)
+        payloads = batch.payloads
+        if degE7:
+            payloads["x"] = lat
+            payloads["y"] = lon
+        else:
+            payloads["x"] = geodesy.to_degE7(lat)
+            payloads["y"] = geodesy.to_degE7(lon)
+        payloads["z"] = alt
+        payloads["param1"] = hold_time
+        payloads["param2"] = accept_radius
+        payloads["param3"] = pass_radius
+        return batch
+
+    @classmethod
+    def from_items(cls, items):
+        """Build a batch from `MissionItem`s."""
+        items = list(items)
+        batch = cls(len(items), mission_type=items[0].mission_type if items else 0)
+        for name in MISSION_ITEM_INT_DTYPE.names:
+            values = [getattr(item, name) for item in items]
+            if name in ("x", "y"):
+                values = geodesy.to_degE7(values)
+            batch.payloads[name] = values
+        return batch
+
+    @classmethod
+    def from_mission(cls, conn, mission):
+        """Build a batch from a `mission_loader.Mission`.
+
+        x and y are a latitude and longitude, scaled to degE7, only in `GLOBAL_FRAMES`; in any
+        other frame they are param5 and param6 and are sent as they are. NaN is sent as 0.
+        """
+        items = mission.items
+        batch = cls(len(items), conn.target_system, conn.target_component)
+        for name in ("command", "frame", "autocontinue", "param1", "param2", "param3", "param4"):
+            batch.payloads[name] = items[name]
+        batch.payloads["x"] = _int_coordinates(items["x"], items["frame"])
+        batch.payloads["y"] = _int_coordinates(items["y"], items["frame"])
+        batch.payloads["z"] = items["z"]
+        return batch
+
+    def mission_item_int_message(self, seq):
+        return build_message(
+            mavlink.MAVLink_mission_item_int_message, *self._fields(seq), self.mission_type
+        )
+
+    def mission_item_message(self, seq):
+        """Build the legacy float MISSION_ITEM message of item `seq`."""
+        fields = self._fields(seq)
+        if fields[3] in GLOBAL_FRAMES:
+            fields[11] /= LAT_LON_SCALING_FACTOR
+            fields[12] /= LAT_LON_SCALING_FACTOR
+        return build_message(mavlink.MAVLink_mission_item_message, *fields, self.mission_type)
+
+    def _fields(self, seq):
+        """Return the fields of item `seq` in the order of the message constructors."""
+        item = self.payloads[seq]
+        return [
+            int(item["target_system"]),
+            int(item["target_component"]),
+            int(item["seq"]),
+            int(item["frame"]),
+            int(item["command"]),
+            int(item["current"]),
+            int(item["autocontinue"]),
+            float(item["param1"]),
+            float(item["param2"]),
+            float(item["param3"]),
+            float(item["param4"]),
+            int(item["x"]),
+            int(item["y"]),
+            float(item["z"]),
+        ]
+
+    def int_frames(self, mav, first=0, last=None):
+        """Return the MISSION_ITEM_INT frames of items `first` to `last` (inclusive), packed in
+        one go."""
+        if last is None:
+            last = len(self) - 1
+        stop = last + 1
+        payloads = self.payloads[first:stop]
+        return frames.encode_batch(mav, mavlink.MAVLINK_MSG_ID_MISSION_ITEM_INT, payloads)
+
+
+def _int_coordinates(values, frame):
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    coordinates = np.rint(values).astype(np.int32)
+    global_frame = np.isin(frame, GLOBAL_FRAMES)
+    coordinates[global_frame] = geodesy.to_degE7(values[global_frame])
+    return coordinates
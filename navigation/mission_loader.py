@@ -0,0 +1,384 @@
+"""Load missions from CSV, QGroundControl `.plan` and `.waypoints` files.
+
+Every format is compiled into the same NumPy structured array of mission items (`MISSION_DTYPE`),
+with the line (or, for `.plan` files, the item number) each item came from. Lines that can't be
+parsed and items with invalid coordinates are reported in `Mission.errors` and left out, rather
+than failing the whole mission.
+
+Compiled missions are cached in `cache_dir` under the SHA-256 of the file's content and the format
+it is parsed as, so loading a large mission again only costs hashing the file and reading the
+cached array.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+from pymavlink import mavutil
+
+from . import geodesy
+from .mission import MissionItem
+from .utils import get_nav_dir
+
+logger = logging.getLogger()
+
+mavlink = mavutil.mavlink
+
+# Bump when the compiled format changes, so stale cache entries are ignored.
+COMPILED_VERSION = 1
+MISSION_CACHE_DIR = os.path.join(get_nav_dir(), "mission_cache")
+# Bytes read at a time when hashing a mission file.
+READ_CHUNK_SIZE = 1 << 20
+
+PLAN_EXTENSION = ".plan"
+WAYPOINTS_EXTENSION = ".waypoints"
+WAYPOINTS_HEADER = "QGC WPL"
+
+# The formats a mission file can be parsed as.
+FORMAT_PLAN = "plan"
+FORMAT_WAYPOINTS = "waypoints"
+FORMAT_CSV = "csv"
+
+# Frames in which x and y of a navigation command are a latitude and longitude.
+GLOBAL_FRAMES = (
+    mavlink.MAV_FRAME_GLOBAL,
+    mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+    mavlink.MAV_FRAME_GLOBAL_INT,
+    mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT_INT,
+    mavlink.MAV_FRAME_GLOBAL_TERRAIN_ALT,
+    mavlink.MAV_FRAME_GLOBAL_TERRAIN_ALT_INT,
+)
+
+MISSION_DTYPE = np.dtype(
+    [
+        ("command", "<u2"),
+        ("frame", "u1"),
+        ("autocontinue", "u1"),
+        ("param1", "<f4"),
+        ("param2", "<f4"),
+        ("param3", "<f4"),
+        ("param4", "<f4"),
+        ("x", "<f8"),
+        ("y", "<f8"),
+        ("z", "<f8"),
+        # Line of the file (or item of a .plan file) the item was loaded from.
+        ("line", "<u4"),
+    ]
+)
+
+
+class MissionFileError(Exception):
+    pass
+
+
+class MissionLineError:
+    """A line of a mission file that was left out of the mission."""
+
+    __slots__ = ("line", "message")
+
+    def __init__(self, line, message):
+        self.line = line
+        self.message = message
+
+    def __eq__(self, other):
+        return (self.line, self.message) == (other.line, other.message)
+
+    def __repr__(self):
+        return f"line {self.line}: {self.message}"
+
+
+class Mission:
+    """A compiled mission.
+
+    Attributes:
+        items (array): The mission items, a structured array of `MISSION_DTYPE`.
+        errors (list of MissionLineError): The lines that were left out.
+        home (tuple or None): The (lat, lon, alt) of the planned home position, if the file has
+            one.
+        cached (bool): Whether the mission was loaded from the cache.
+    """
+
+    def __init__(self, items, errors=(), home=None, cached=False):
+        self.items = items
+        self.errors = list(errors)
+        self.home = home
+        self.cached = cached
+
+    def __len__(self):
+        return len(self.items)
+
+    def mission_items(self, conn, first_seq=0):
+        """Return the items as `MissionItem`s with consecutive sequence numbers, ready for
+        `upload_mission`."""
+        items = []
+        for seq, row in enumerate(self.items.tolist(), first_seq):
+            command, frame, autocontinue, param1, param2, param3, param4, x, y, z, _ = row
+            item = MissionItem(conn, seq, 0, x, y, z, autocontinue, param1, param2, param3)
+            item.command = command
+            item.frame = frame
+            item.param4 = param4
+            items.append(item)
+        return items
+
+
+def load_mission(path, cache_dir=MISSION_CACHE_DIR):
+    """Load a mission file, from the cache if it was compiled before.
+
+    The format is chosen by the file's extension: `.plan` for QGroundControl plans,
+    `.waypoints` (or a file starting with the `QGC WPL` header) for waypoint files, and CSV
+    with one `lat,lon,alt` waypoint per line otherwise.
+
+    Args:
+        path (str): The mission file.
+        cache_dir (str or None): Directory of the compiled mission cache. None disables it.
+
+    Raises:
+        MissionFileError: If the file can't be read or isn't a mission at all.
+    """
+    try:
+        mission_format = _mission_format(path)
+        digest = _hash_file(path)
+    except OSError as e:
+        raise MissionFileError(f"Failed to read the mission {path}: {e}") from e
+
+    cache_path = None
+    if cache_dir is not None:
+        # The same content parsed as another format is another mission.
+        cache_path = os.path.join(cache_dir, f"{digest}.{mission_format}.v{COMPILED_VERSION}.npz")
+        mission = _read_cache(cache_path)
+        if mission is not None:
+            return mission
+
+    try:
+        mission = parse_mission(path)
+    except OSError as e:
+        raise MissionFileError(f"Failed to read the mission {path}: {e}") from e
+    for error in mission.errors:
+        logger.warning(f"{path}, {error}")
+    if cache_path is not None:
+        _write_cache(cache_path, mission)
+    return mission
+
+
+def parse_mission(path):
+    """Parse a mission file without the cache."""
+    mission_format = _mission_format(path)
+    if mission_format == FORMAT_PLAN:
+        with open(path) as plan_file:
+            try:
+                plan = json.load(plan_file)
+            except ValueError as e:
+                raise MissionFileError(f"{path} is not a valid plan: {e}") from e
+        rows, errors, home = parse_plan(plan)
+    else:
+        with open(path, newline="") as mission_file:
+            if mission_format == FORMAT_WAYPOINTS:
+                rows, errors, home = parse_waypoints(mission_file)
+            else:
+                rows, errors, home = parse_csv(mission_file)
+    items, invalid = _compile(rows)
+    return Mission(items, sorted(errors + invalid, key=lambda error: error.line), home)
+
+
+def _mission_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == PLAN_EXTENSION:
+        return FORMAT_PLAN
+    if extension == WAYPOINTS_EXTENSION:
+        return FORMAT_WAYPOINTS
+    with open(path, newline="") as mission_file:
+        if mission_file.readline().startswith(WAYPOINTS_HEADER):
+            return FORMAT_WAYPOINTS
+    return FORMAT_CSV
+
+
+def _waypoint(lat, lon, alt, line):
+    return (
+        mavlink.MAV_CMD_NAV_WAYPOINT,
+        mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+        1,
+        0.0,
+        0.0,
+        0.0,
+        np.nan,
+        lat,
+        lon,
+        alt,
+        line,
+    )
+
+
+def parse_csv(lines):
+    """Parse `lat,lon,alt` lines. Blank lines, comments (`#`) and a header line are skipped.
+
+    Returns:
+        tuple: The item rows, the line errors and the home position (always None).
+    """
+    rows = []
+    errors = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(",")
+        if len(fields) != 3:
+            errors.append(MissionLineError(number, f"expected lat,lon,alt, got {line!r}"))
+            continue
+        try:
+            lat, lon, alt = (float(field) for field in fields)
+        except ValueError:
+            if number == 1:
+                # A header.
+                continue
+            errors.append(MissionLineError(number, f"invalid number in {line!r}"))
+            continue
+        rows.append(_waypoint(lat, lon, alt, number))
+    return rows, errors, None
+
+
+def parse_waypoints(lines):
+    """Parse a QGroundControl/Mission Planner `.waypoints` file (`QGC WPL 110`). Item 0 is the
+    home position.
+
+    Returns:
+        tuple: The item rows, the line errors and the home position.
+    """
+    rows = []
+    errors = []
+    home = None
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if number == 1:
+            if not line.startswith(WAYPOINTS_HEADER):
+                errors.append(MissionLineError(number, f"expected a {WAYPOINTS_HEADER} header"))
+            continue
+        fields = line.split("\t")
+        if len(fields) != 12:
+            errors.append(MissionLineError(number, f"expected 12 fields, got {len(fields)}"))
+            continue
+        try:
+            index, _, frame, command = (int(field) for field in fields[:4])
+            params = [float(field) for field in fields[4:11]]
+            autocontinue = int(fields[11])
+        except ValueError:
+            errors.append(MissionLineError(number, f"invalid number in {line!r}"))
+            continue
+        if index == 0 and home is None:
+            home = tuple(params[4:7])
+            continue
+        rows.append((command, frame, autocontinue, *params, number))
+    return rows, errors, home
+
+
+def parse_plan(plan):
+    """Parse the mission of a QGroundControl `.plan` document. Complex items (e.g. surveys) are
+    expanded into the simple items QGroundControl generated for them. Errors refer to the
+    position of the item in the mission, starting from 1.
+
+    Returns:
+        tuple: The item rows, the item errors and the home position.
+    """
+    if not isinstance(plan, dict) or not isinstance(plan.get("mission"), dict):
+        raise MissionFileError("A plan needs a mission section.")
+    mission = plan["mission"]
+    home = mission.get("plannedHomePosition")
+    home = tuple(home) if home else None
+    rows = []
+    errors = []
+    for number, item in enumerate(mission.get("items", []), 1):
+        simple_items = [item]
+        if item.get("type") == "ComplexItem":
+            simple_items = item.get("TransectStyleComplexItem", {}).get("Items", [])
+            if not simple_items:
+                errors.append(MissionLineError(number, "complex item without generated items"))
+        for simple_item in simple_items:
+            try:
+                params = [
+                    np.nan if param is None else float(param) for param in simple_item["params"]
+                ]
+                if len(params) != 7:
+                    raise ValueError(f"expected 7 params, got {len(params)}")
+                rows.append(
+                    (
+                        int(simple_item["command"]),
+                        int(simple_item["frame"]),
+                        int(simple_item.get("autoContinue", True)),
+                        *params,
+                        number,
+                    )
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(MissionLineError(number, f"invalid item: {e!r}"))
+    return rows, errors, home
+
+
+def _compile(rows):
+    """Build the item array from parsed rows, leaving out items with invalid coordinates."""
+    items = np.array(rows, dtype=MISSION_DTYPE) if rows else np.empty(0, dtype=MISSION_DTYPE)
+    positional = (items["command"] < mavlink.MAV_CMD_NAV_LAST) & np.isin(
+        items["frame"], GLOBAL_FRAMES
+    )
+    invalid = positional & ~geodesy.valid_coordinates(items["x"], items["y"])
+    invalid |= positional & ~np.isfinite(items["z"])
+    errors = [
+        MissionLineError(int(line), f"invalid coordinates {x}, {y}, {z}")
+        for line, x, y, z in items[invalid][["line", "x", "y", "z"]].tolist()
+    ]
+    return items[~invalid], errors
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as mission_file:
+        while True:
+            chunk = mission_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path):
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            items = cached["items"]
+            errors = [
+                MissionLineError(int(line), str(message))
+                for line, message in zip(cached["error_lines"], cached["error_messages"])
+            ]
+            home = tuple(cached["home"].tolist()) or None
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring the unreadable mission cache {cache_path}: {e}")
+        return None
+    if items.dtype != MISSION_DTYPE:
+        return None
+    return Mission(items, errors, home, cached=True)
+
+
+def _write_cache(cache_path, mission):
+    cache_dir = os.path.dirname(cache_path)
+    temp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file first so a concurrent load never sees half a file.
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as cache_file:
+            np.savez(
+                cache_file,
+                items=mission.items,
+                error_lines=np.array([error.line for error in mission.errors], dtype="<u4"),
+                error_messages=np.array([error.message for error in mission.errors], dtype=str),
+                home=np.array(mission.home or (), dtype="<f8"),
+            )
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to cache the compiled mission in {cache_path}: {e}")
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
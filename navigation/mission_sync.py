@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import struct
+
+from pymavlink import mavutil
+
+from .mission_batch import MissionBatch
+from .mission_upload import MissionUploader, MissionUploadError
+from .utils import (
+    LAT_LON_SCALING_FACTOR,
+    MISSION_ITEM_TIMEOUT,
+    MISSION_MAX_RETRIES,
+    build_message,
+)
+
+logger = logging.getLogger()
+
+_float32 = struct.Struct("<f")
+
+SYNC_UNCHANGED = "unchanged"
+SYNC_PARTIAL = "partial"
+SYNC_FULL = "full"
+
+
+def _f32(value):
+    # Compare floats the way they go over the wire (float32), which also makes NaN equal to NaN.
+    return _float32.pack(value)
+
+
+def item_key(frame, command, autocontinue, param1, param2, param3, param4, x, y, z):
+    """A comparable key of everything that defines a mission item on the autopilot."""
+    return (
+        frame,
+        command,
+        autocontinue,
+        _f32(param1),
+        _f32(param2),
+        _f32(param3),
+        _f32(param4),
+        x,
+        y,
+        _f32(z),
+    )
+
+
+def mission_item_key(item):
+    """Key of a `MissionItem`."""
+    return item_key(
+        item.frame,
+        item.command,
+        item.autocontinue,
+        item.param1,
+        item.param2,
+        item.param3,
+        item.param4,
+        int(round(item.x * LAT_LON_SCALING_FACTOR)),
+        int(round(item.y * LAT_LON_SCALING_FACTOR)),
+        item.z,
+    )
+
+
+def item_keys(items):
+    """Keys of a list of `MissionItem`s or of a `MissionBatch`."""
+    if not isinstance(items, MissionBatch):
+        return [mission_item_key(item) for item in items]
+    payloads = items.payloads
+    columns = [
+        payloads[name].tolist()
+        for name in ("frame", "command", "autocontinue", "param1", "param2", "param3", "param4")
+    ]
+    return [
+        item_key(*fields, x, y, z)
+        for *fields, x, y, z in zip(
+            *columns, payloads["x"].tolist(), payloads["y"].tolist(), payloads["z"].tolist()
+        )
+    ]
+
+
+def message_key(msg):
+    """Key of a MISSION_ITEM_INT (or legacy MISSION_ITEM) message."""
+    x, y = msg.x, msg.y
+    if msg.get_msgId() == mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM:
+        x = int(round(x * LAT_LON_SCALING_FACTOR))
+        y = int(round(y * LAT_LON_SCALING_FACTOR))
+    return item_key(
+        msg.frame,
+        msg.command,
+        msg.autocontinue,
+        msg.param1,
+        msg.param2,
+        msg.param3,
+        msg.param4,
+        x,
+        y,
+        msg.z,
+    )
+
+
+def diff_range(current, desired):
+    """Return the (first, last) sequence numbers of the smallest range covering every difference
+    between two equally long lists of item keys, or None if they are equal."""
+    first = None
+    last = None
+    for seq, (current_key, desired_key) in enumerate(zip(current, desired)):
+        if current_key != desired_key:
+            if first is None:
+                first = seq
+            last = seq
+    if first is None:
+        return None
+    return first, last
+
+
+class SyncResult:
+    def __init__(self, mode, first=None, last=None, upload=None):
+        self.mode = mode
+        self.first = first
+        self.last = last
+        self.upload = upload
+
+    @property
+    def items_sent(self):
+        if self.first is None:
+            return 0
+        return self.last - self.first + 1
+
+
+class MissionSync:
+    """Keeps the mission on the autopilot in sync with a desired list of `MissionItem` objects (or
+    a `MissionBatch`).
+
+    The autopilot's mission is downloaded once and cached. After that, `sync` compares the desired
+    mission with the cache and only uploads the range of items that changed using
+    MISSION_WRITE_PARTIAL_LIST, falling back to a full upload when the number of items changes.
+    """
+
+    def __init__(
+        self,
+        conn,
+        uploader=None,
+        mission_type=mavutil.mavlink.MAV_MISSION_TYPE_MISSION,
+        timeout=MISSION_ITEM_TIMEOUT,
+        retries=MISSION_MAX_RETRIES,
+    ):
+        self.conn = conn
+        self.uploader = uploader if uploader is not None else MissionUploader(conn)
+        self.mission_type = mission_type
+        self.timeout = timeout
+        self.retries = retries
+        self.cached = None
+        self._waiting = None
+        dispatcher = conn.dispatcher
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_COUNT, self._on_count)
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM_INT, self._on_item)
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM, self._on_item)
+
+    def invalidate(self):
+        """Forget the cached mission, e.g. after it was changed by another system."""
+        self.cached = None
+
+    async def download(self):
+        """Download the mission from the autopilot and cache it.
+
+        Returns:
+            list: The keys (see `item_key`) of the downloaded mission items.
+        """
+        count = await self._request(
+            None, lambda: self._send(mavutil.mavlink.MAVLink_mission_request_list_message)
+        )
+        keys = []
+        for seq in range(count):
+            item = await self._request(
+                seq,
+                lambda seq=seq: self._send(
+                    mavutil.mavlink.MAVLink_mission_request_int_message, seq
+                ),
+            )
+            keys.append(message_key(item))
+        self._send(
+            mavutil.mavlink.MAVLink_mission_ack_message, mavutil.mavlink.MAV_MISSION_ACCEPTED
+        )
+        self.cached = keys
+        logger.info(f"Downloaded {count} mission items.")
+        return keys
+
+    async def sync(self, items):
+        """Make the mission on the autopilot match `items`, sending as little as possible.
+
+        Returns:
+            SyncResult: What had to be sent.
+        """
+        if self.cached is None:
+            await self.download()
+        desired = item_keys(items)
+
+        if len(desired) != len(self.cached):
+            self.cached = None
+            upload = await self.uploader.upload(items, self.mission_type)
+            self.cached = desired
+            return SyncResult(SYNC_FULL, 0, len(desired) - 1, upload)
+
+        changed = diff_range(self.cached, desired)
+        if changed is None:
+            return SyncResult(SYNC_UNCHANGED)
+        first, last = changed
+        try:
+            upload = await self.uploader.upload_partial(items, first, last, self.mission_type)
+        except MissionUploadError:
+            # We no longer know what the autopilot holds.
+            self.cached = None
+            raise
+        self.cached = desired
+        logger.info(f"Synced mission items {first} to {last}.")
+        return SyncResult(SYNC_PARTIAL, first, last, upload)
+
+    def _send(self, message_class, *args):
+        connection = self.conn.conn
+        connection.mav.send(
+            build_message(
+                message_class,
+                connection.target_system,
+                connection.target_component,
+                *args,
+                self.mission_type,
+            )
+        )
+
+    async def _request(self, seq, send):
+        """Send a request and wait for the MISSION_COUNT (`seq` is None) or the mission item `seq`
+        that answers it, resending it on timeout."""
+        if self._waiting is not None:
+            raise MissionUploadError("A mission download is already in progress.")
+        future = asyncio.get_running_loop().create_future()
+        self._waiting = (seq, future)
+        try:
+            for _ in range(self.retries + 1):
+                send()
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+            raise MissionUploadError("Mission download timed out.")
+        finally:
+            self._waiting = None
+
+    def _on_count(self, msg):
+        waiting = self._waiting
+        if waiting is None or waiting[0] is not None or waiting[1].done():
+            return
+        if getattr(msg, "mission_type", 0) != self.mission_type:
+            return
+        waiting[1].set_result(msg.count)
+
+    def _on_item(self, msg):
+        waiting = self._waiting
+        if waiting is None or waiting[0] != msg.seq or waiting[1].done():
+            return
+        waiting[1].set_result(msg)
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import time
+
+from pymavlink import mavutil
+
+from . import frames
+from .mission_batch import MissionBatch
+from .utils import (
+    LAT_LON_SCALING_FACTOR,
+    MISSION_ITEM_TIMEOUT,
+    MISSION_MAX_RETRIES,
+    build_message,
+)
+
+logger = logging.getLogger()
+
+
+class MissionUploadError(Exception):
+    pass
+
+
+class UploadResult:
+    def __init__(self, items, duration, requests, duplicates, retransmits):
+        self.items = items
+        self.duration = duration
+        self.requests = requests
+        self.duplicates = duplicates
+        self.retransmits = retransmits
+
+    @property
+    def items_per_second(self):
+        if self.duration == 0:
+            return 0.0
+        return self.items / self.duration
+
+    def to_dict(self):
+        return {
+            "items": self.items,
+            "duration": self.duration,
+            "items_per_second": self.items_per_second,
+            "requests": self.requests,
+            "duplicates": self.duplicates,
+            "retransmits": self.retransmits,
+        }
+
+
+def mission_item_int_message(item):
+    """Build the MISSION_ITEM_INT message for a `MissionItem`."""
+    return build_message(
+        mavutil.mavlink.MAVLink_mission_item_int_message,
+        item.target_system,
+        item.target_component,
+        item.seq,
+        item.frame,
+        item.command,
+        item.current,
+        item.autocontinue,
+        item.param1,
+        item.param2,
+        item.param3,
+        item.param4,
+        int(round(item.x * LAT_LON_SCALING_FACTOR)),
+        int(round(item.y * LAT_LON_SCALING_FACTOR)),
+        item.z,
+        item.mission_type,
+    )
+
+
+def mission_item_message(item):
+    """Build the legacy float MISSION_ITEM message for a `MissionItem`."""
+    return build_message(mavutil.mavlink.MAVLink_mission_item_message, *item.to_list)
+
+
+class EncodedMission:
+    """A mission pre-encoded into frames, ready to be sent in answer to MISSION_REQUEST_INT. Legacy
+    MISSION_ITEM frames are only encoded the first time a MISSION_REQUEST asks for them.
+
+    Only the items from `first` to `last` (inclusive) are encoded, which is all a partial upload
+    needs. The frames of a `MissionBatch` are encoded all at once.
+    """
+
+    def __init__(self, mav, items, first=0, last=None):
+        self.items = items if isinstance(items, MissionBatch) else list(items)
+        if last is None:
+            last = len(self.items) - 1
+        self.first = first
+        if isinstance(self.items, MissionBatch):
+            self.int_frames = self.items.int_frames(mav, first, last)
+        else:
+            self.int_frames = [
+                frames.encode(mav, mission_item_int_message(self.items[seq]))
+                for seq in range(first, last + 1)
+            ]
+        self.float_frames = [None] * len(self.items)
+        self._mav = mav
+
+    def __len__(self):
+        return len(self.items)
+
+    def frame(self, seq, use_int=True):
+        if use_int:
+            return self.int_frames[seq - self.first]
+        frame = self.float_frames[seq]
+        if frame is None:
+            if isinstance(self.items, MissionBatch):
+                message = self.items.mission_item_message(seq)
+            else:
+                message = mission_item_message(self.items[seq])
+            frame = self.float_frames[seq] = frames.encode(self._mav, message)
+        return frame
+
+
+class _Upload:
+    """State of the upload in progress."""
+
+    def __init__(self, mission, target_system, target_component, mission_type, first, last):
+        self.mission = mission
+        self.target_system = target_system
+        self.target_component = target_component
+        self.mission_type = mission_type
+        self.first = first
+        self.last = last
+        self.served = set()
+        self.requests = 0
+        self.duplicates = 0
+        self.retransmits = 0
+        self.last_seq = None
+        self.last_use_int = True
+        self.last_activity = time.monotonic()
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class MissionUploader:
+    """Uploads missions through the connection's receive loop.
+
+    MISSION_REQUEST_INT and legacy MISSION_REQUEST messages are answered straight from the
+    dispatcher with pre-encoded frames, so requests may arrive in any order, be repeated, or be
+    pipelined by the autopilot. If the autopilot goes silent for `timeout` seconds the last frame we
+    sent (MISSION_COUNT or the last requested item) is retransmitted, up to `retries` times in a
+    row.
+    """
+
+    def __init__(self, conn, timeout=MISSION_ITEM_TIMEOUT, retries=MISSION_MAX_RETRIES):
+        self.conn = conn
+        self.timeout = timeout
+        self.retries = retries
+        self._upload = None
+        dispatcher = conn.dispatcher
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_REQUEST_INT, self._on_request)
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_REQUEST, self._on_request)
+        dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ACK, self._on_ack)
+
+    @property
+    def busy(self):
+        return self._upload is not None
+
+    async def upload(self, items, mission_type=mavutil.mavlink.MAV_MISSION_TYPE_MISSION):
+        """Upload a full mission, replacing the one on the autopilot.
+
+        Args:
+            items (list[MissionItem], MissionBatch or EncodedMission): The mission items, in
+                sequence order.
+            mission_type (int): MAV_MISSION_TYPE of the mission.
+
+        Returns:
+            UploadResult: Statistics about the upload.
+        """
+        mission = self._encode(items, 0, len(items) - 1)
+        return await self._run(mission, mission_type, 0, len(mission) - 1, self._send_count)
+
+    async def upload_partial(
+        self, items, first, last, mission_type=mavutil.mavlink.MAV_MISSION_TYPE_MISSION
+    ):
+        """Replace items `first` to `last` (inclusive) of the mission on the autopilot using
+        MISSION_WRITE_PARTIAL_LIST. The length of the mission can't change.
+
+        Args:
+            items (list[MissionItem], MissionBatch or EncodedMission): The full mission, in
+                sequence order.
+            first (int): Sequence number of the first item to replace.
+            last (int): Sequence number of the last item to replace.
+            mission_type (int): MAV_MISSION_TYPE of the mission.
+
+        Returns:
+            UploadResult: Statistics about the upload.
+        """
+        mission = self._encode(items, first, last)
+        return await self._run(mission, mission_type, first, last, self._send_write_partial_list)
+
+    def _encode(self, items, first, last):
+        if isinstance(items, EncodedMission):
+            return items
+        return EncodedMission(self.conn.conn.mav, items, first, last)
+
+    async def _run(self, mission, mission_type, first, last, begin):
+        if self._upload is not None:
+            raise MissionUploadError("A mission upload is already in progress.")
+        connection = self.conn.conn
+        upload = _Upload(
+            mission,
+            connection.target_system,
+            connection.target_component,
+            mission_type,
+            first,
+            last,
+        )
+        self._upload = upload
+        start = time.monotonic()
+        try:
+            begin(upload)
+            silent_retries = 0
+            requests_seen = 0
+            while True:
+                remaining = upload.last_activity + self.timeout - time.monotonic()
+                if remaining > 0:
+                    try:
+                        result = await asyncio.wait_for(asyncio.shield(upload.done), remaining)
+                        break
+                    except asyncio.TimeoutError:
+                        continue
+                if upload.requests != requests_seen:
+                    # The autopilot made progress since our last retransmission.
+                    requests_seen = upload.requests
+                    silent_retries = 0
+                silent_retries += 1
+                if silent_retries > self.retries:
+                    raise MissionUploadError(
+                        f"Mission upload timed out after {self.retries} retransmissions."
+                    )
+                upload.retransmits += 1
+                upload.last_activity = time.monotonic()
+                if upload.last_seq is None:
+                    begin(upload)
+                else:
+                    self._send_item(upload, upload.last_seq, upload.last_use_int)
+        finally:
+            self._upload = None
+
+        if result != mavutil.mavlink.MAV_MISSION_ACCEPTED:
+            raise MissionUploadError(f"Mission rejected by the autopilot with result {result}.")
+        upload_result = UploadResult(
+            last - first + 1,
+            time.monotonic() - start,
+            upload.requests,
+            upload.duplicates,
+            upload.retransmits,
+        )
+        logger.info(
+            f"Uploaded {upload_result.items} mission items in {upload_result.duration:.2f} s "
+            f"({upload_result.items_per_second:.1f} items/s)."
+        )
+        return upload_result
+
+    def _send_count(self, upload):
+        self.conn.conn.mav.send(
+            build_message(
+                mavutil.mavlink.MAVLink_mission_count_message,
+                upload.target_system,
+                upload.target_component,
+                len(upload.mission),
+                upload.mission_type,
+            )
+        )
+
+    def _send_write_partial_list(self, upload):
+        self.conn.conn.mav.send(
+            build_message(
+                mavutil.mavlink.MAVLink_mission_write_partial_list_message,
+                upload.target_system,
+                upload.target_component,
+                upload.first,
+                upload.last,
+                upload.mission_type,
+            )
+        )
+
+    def _send_item(self, upload, seq, use_int):
+        frames.send_frame(self.conn.conn.mav, upload.mission.frame(seq, use_int))
+
+    @staticmethod
+    def _from_target(upload, message):
+        """Whether a message comes from the system (and component, if one is targeted) the mission
+        is uploaded to, rather than from another node on the link."""
+        if upload.target_system not in (0, message.get_srcSystem()):
+            return False
+        return upload.target_component in (0, message.get_srcComponent())
+
+    def _on_request(self, request):
+        upload = self._upload
+        if upload is None or getattr(request, "mission_type", 0) != upload.mission_type:
+            return
+        if not self._from_target(upload, request):
+            return
+        seq = request.seq
+        if seq < upload.first or seq > upload.last:
+            logger.warning(f"Autopilot requested mission item {seq} outside of the upload.")
+            return
+        upload.requests += 1
+        if seq in upload.served:
+            upload.duplicates += 1
+        else:
+            upload.served.add(seq)
+        upload.last_seq = seq
+        upload.last_use_int = (
+            request.get_msgId() == mavutil.mavlink.MAVLINK_MSG_ID_MISSION_REQUEST_INT
+        )
+        upload.last_activity = time.monotonic()
+        self._send_item(upload, seq, upload.last_use_int)
+
+    def _on_ack(self, ack):
+        upload = self._upload
+        if upload is None or upload.done.done():
+            return
+        if getattr(ack, "mission_type", 0) != upload.mission_type:
+            return
+        if not self._from_target(upload, ack):
+            return
+        upload.done.set_result(ack.type)
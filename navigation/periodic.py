@@ -0,0 +1,224 @@
+import asyncio
+import collections
+import inspect
+import logging
+import weakref
+
+logger = logging.getLogger()
+
+# What to do with the runs of a task that were missed because the event loop was busy.
+POLICY_SKIP = "skip"  # Drop them and carry on from the next deadline in the future.
+POLICY_CATCH_UP = "catch_up"  # Run them back to back, up to `max_catch_up` runs.
+
+# Maximum number of missed runs a catching up task makes up for before skipping the rest.
+MAX_CATCH_UP = 5
+# Number of recent jitter samples kept per task for percentiles.
+JITTER_HISTORY_SIZE = 1000
+
+_schedulers = weakref.WeakKeyDictionary()
+
+
+class PeriodicStats:
+    """Timing statistics of a periodic task.
+
+    Jitter is how late a run started relative to its deadline. An overrun is a run that took
+    longer than the task's period.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+        self.max_duration = 0.0
+        self.recent_jitter = collections.deque(maxlen=JITTER_HISTORY_SIZE)
+
+    @property
+    def mean_jitter(self):
+        if self.runs == 0:
+            return 0.0
+        return self.total_jitter / self.runs
+
+    def jitter_percentile(self, percentile):
+        if not self.recent_jitter:
+            return 0.0
+        samples = sorted(self.recent_jitter)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def record_run(self, jitter, duration, period):
+        self.runs += 1
+        self.total_jitter += jitter
+        self.recent_jitter.append(jitter)
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+        if duration > self.max_duration:
+            self.max_duration = duration
+        if duration > period:
+            self.overruns += 1
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "mean_jitter": self.mean_jitter,
+            "p99_jitter": self.jitter_percentile(99),
+            "max_jitter": self.max_jitter,
+            "max_duration": self.max_duration,
+        }
+
+
+class PeriodicTask:
+    def __init__(self, scheduler, name, callback, rate_hz, policy, max_catch_up):
+        if rate_hz <= 0:
+            raise ValueError(f"The rate of {name} must be positive, got {rate_hz}.")
+        if policy not in (POLICY_SKIP, POLICY_CATCH_UP):
+            raise ValueError(f"Unknown policy {policy!r}.")
+        self.scheduler = scheduler
+        self.name = name
+        self.callback = callback
+        self.period = 1.0 / rate_hz
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.is_async = inspect.iscoroutinefunction(callback)
+        self.stats = PeriodicStats(name)
+        self.deadline = None
+        self.done = scheduler.loop.create_future()
+        self._handle = None
+        self._running = None
+
+    async def wait(self):
+        """Wait until the task is cancelled or its callback raises, re-raising the exception."""
+        await asyncio.shield(self.done)
+
+    def cancel(self):
+        self.scheduler.remove(self)
+
+
+class PeriodicScheduler:
+    """Runs callbacks at fixed rates on one event loop.
+
+    Every task has an absolute deadline on the event loop's monotonic clock which advances by
+    exactly one period per run, so time spent in the callback or waiting for the loop does not
+    accumulate as drift. When runs are missed because the loop was busy, the task's policy decides
+    whether they are skipped or made up for.
+
+    Callbacks may be plain functions or coroutine functions. A coroutine still running at its next
+    deadline is not started twice; the run is counted as skipped. A callback that raises stops its
+    task, and the exception is raised from the task's `wait()`.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.tasks = {}
+
+    def add(self, name, callback, rate_hz, policy=POLICY_SKIP, max_catch_up=MAX_CATCH_UP):
+        """Run `callback` `rate_hz` times per second, starting now.
+
+        Returns:
+            PeriodicTask: The scheduled task.
+        """
+        if name in self.tasks:
+            raise ValueError(f"A periodic task named {name} is already scheduled.")
+        task = PeriodicTask(self, name, callback, rate_hz, policy, max_catch_up)
+        self.tasks[name] = task
+        task.deadline = self.loop.time()
+        task._handle = self.loop.call_at(task.deadline, self._fire, task)
+        return task
+
+    def remove(self, task):
+        if self.tasks.get(task.name) is task:
+            del self.tasks[task.name]
+        self._stop(task)
+        if not task.done.done():
+            task.done.set_result(None)
+
+    def stats(self):
+        return [task.stats for task in self.tasks.values()]
+
+    def _stop(self, task):
+        if task._handle is not None:
+            task._handle.cancel()
+            task._handle = None
+        if task._running is not None:
+            task._running.cancel()
+            task._running = None
+
+    def _fail(self, task, error):
+        logger.error(f"Periodic task {task.name} failed: {error!r}")
+        if self.tasks.get(task.name) is task:
+            del self.tasks[task.name]
+        self._stop(task)
+        if not task.done.done():
+            task.done.set_exception(error)
+
+    def _fire(self, task):
+        task._handle = None
+        start = self.loop.time()
+        jitter = start - task.deadline
+        if task._running is not None:
+            # The previous run of a coroutine hasn't finished yet.
+            task.stats.skipped += 1
+        elif task.is_async:
+            task._running = self.loop.create_task(task.callback())
+            task._running.add_done_callback(
+                lambda running: self._on_async_done(task, running, start, jitter)
+            )
+        else:
+            try:
+                task.callback()
+            except Exception as e:
+                self._fail(task, e)
+                return
+            task.stats.record_run(jitter, self.loop.time() - start, task.period)
+        self._schedule_next(task)
+
+    def _on_async_done(self, task, running, start, jitter):
+        if task._running is running:
+            task._running = None
+        if running.cancelled():
+            return
+        error = running.exception()
+        if error is not None:
+            self._fail(task, error)
+            return
+        task.stats.record_run(jitter, self.loop.time() - start, task.period)
+
+    def _schedule_next(self, task):
+        if task.done.done():
+            return
+        task.deadline += task.period
+        now = self.loop.time()
+        if task.deadline <= now:
+            behind = int((now - task.deadline) / task.period) + 1
+            if task.policy == POLICY_CATCH_UP:
+                # Make up for at most `max_catch_up` runs, starting with the oldest kept one.
+                behind = max(0, behind - task.max_catch_up)
+            if behind:
+                task.deadline += behind * task.period
+                task.stats.skipped += behind
+                logger.warning(f"Periodic task {task.name} skipped {behind} run(s).")
+        task._handle = self.loop.call_at(task.deadline, self._fire, task)
+
+
+def get_scheduler():
+    """Return the scheduler shared by everything running on the current event loop."""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = PeriodicScheduler(loop)
+    return scheduler
+
+
+async def run_periodic(name, callback, rate_hz, policy=POLICY_SKIP, scheduler=None):
+    """Run `callback` periodically until cancelled or until it raises."""
+    if scheduler is None:
+        scheduler = get_scheduler()
+    task = scheduler.add(name, callback, rate_hz, policy)
+    try:
+        await task.wait()
+    finally:
+        task.cancel()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+logger = logging.getLogger()
+
+# Upper bound on the number of messages drained in a single wake-up so a flood on one link cannot
+# starve the rest of the event loop.
+MAX_BATCH_SIZE = 256
+# Poll interval used when the underlying connection has no file descriptor (e.g. some serial
+# drivers), where we have to fall back to the old polling behaviour.
+POLL_INTERVAL = 0.01
+
+
+class MavlinkReader:
+    """An event-driven reader for a `ClientConnectionWrapper`.
+
+    Instead of polling `recv_match()` on a timer, the file descriptor of the MAVLink connection is
+    registered with the asyncio event loop. Whenever it becomes readable, every message that can be
+    parsed without blocking is drained and handed to the consumer as one batch. Once
+    `max_batch_size` messages are waiting, the reader stops draining until they are taken.
+    """
+
+    def __init__(self, conn, max_batch_size=MAX_BATCH_SIZE):
+        self.conn = conn
+        self.max_batch_size = max_batch_size
+        self._loop = None
+        self._fd = None
+        self._registered_conn = None
+        self._pending = []
+        self._paused = False
+        self._ready = asyncio.Event()
+
+    def start(self):
+        """Register the connection's file descriptor with the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._register()
+        listeners = getattr(self.conn, "connection_listeners", None)
+        if listeners is not None:
+            listeners.append(self._on_connection_changed)
+
+    def stop(self):
+        """Remove the connection's file descriptor from the event loop."""
+        listeners = getattr(self.conn, "connection_listeners", None)
+        if listeners is not None and self._on_connection_changed in listeners:
+            listeners.remove(self._on_connection_changed)
+        self._unregister()
+
+    def _on_connection_changed(self, connection):
+        self._unregister()
+        if connection is not None:
+            self._register()
+
+    async def read_batch(self):
+        """Wait until at least one message is available and return all pending messages."""
+        if self._registered_conn is not self.conn.conn:
+            # The wrapper reconnected and now owns a new mavlink connection.
+            self._unregister()
+            self._register()
+
+        if self._fd is None:
+            return await self._poll_batch()
+
+        await self._ready.wait()
+        batch = self._pending
+        self._pending = []
+        self._ready.clear()
+        if self._paused:
+            self._resume()
+        return batch
+
+    def _register(self):
+        connection = self.conn.conn
+        self._registered_conn = connection
+        self._fd = getattr(connection, "fd", None) if connection else None
+        if self._fd is None:
+            logger.info("Connection has no file descriptor, falling back to polling.")
+            return
+        self._paused = False
+        self._resume()
+
+    def _resume(self):
+        self._paused = False
+        self._loop.add_reader(self._fd, self._on_readable)
+        # Messages may already be sitting in the parser's buffer.
+        self._loop.call_soon(self._on_readable)
+
+    def _unregister(self):
+        if self._fd is not None and self._loop is not None:
+            self._loop.remove_reader(self._fd)
+        self._fd = None
+        self._registered_conn = None
+        self._paused = False
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            message = self.conn.get_msg()
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    def _on_readable(self):
+        if self._fd is None or self._paused:
+            return
+        batch = self._drain(self.max_batch_size - len(self._pending))
+        if batch:
+            self._pending.extend(batch)
+            self._ready.set()
+        if len(self._pending) >= self.max_batch_size:
+            # The batch is full; more frames may be buffered in the parser where the selector can't
+            # see them, so draining resumes once the batch is taken.
+            self._paused = True
+            self._loop.remove_reader(self._fd)
+
+    async def _poll_batch(self):
+        while self._fd is None:
+            batch = self._drain(self.max_batch_size)
+            if batch:
+                return batch
+            await asyncio.sleep(POLL_INTERVAL)
+        # The connection was replaced by one we can wait on.
+        return []
@@ -0,0 +1,323 @@
+"""A binary flight recorder for raw MAVLink frames and a replay source that feeds a recording back
+into `receive_msg_loop`.
+
+A recording is two append-only files. The log (e.g. `flight.mavrec`) holds a header followed by one
+record per frame: its monotonic receive time in nanoseconds, its length and its original bytes.
+The index next to it (`flight.mavrec.idx`) holds a fixed-size entry per frame with its offset in the
+log, its time and its message id, so it can be loaded as a NumPy array to find the frames of a
+given type or time range without reading the log.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+from pymavlink import mavutil
+
+from . import frames
+
+logger = logging.getLogger()
+
+LOG_MAGIC = b"MAVREC"
+LOG_VERSION = 1
+INDEX_SUFFIX = ".idx"
+# Seconds between flushes of the recorder's write buffers to disk.
+FLUSH_INTERVAL = 1.0
+# Maximum number of frames a replay hands to the receive loop at once.
+REPLAY_BATCH_SIZE = 256
+
+_log_header = struct.Struct("<6sH")
+_record_header = struct.Struct("<qH")
+_index_entry = struct.Struct("<QqI")
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("time", "<i8"), ("msg_id", "<u4")])
+
+
+class RecordingError(Exception):
+    pass
+
+
+class FlightRecorder:
+    """Appends every received MAVLink frame to a recording.
+
+    Set it as the `recorder` of a `ClientConnectionWrapper` to record everything its receive loop
+    processes.
+    """
+
+    def __init__(self, path, clock=time.monotonic_ns, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.clock = clock
+        self.flush_interval = flush_interval
+        new = not os.path.exists(path) or os.path.getsize(path) < _log_header.size
+        if new:
+            # Also discards a header cut short by a crash right after the recording was created.
+            open(path, "wb").close()
+            open(path + INDEX_SUFFIX, "wb").close()
+        else:
+            self._recover()
+        self._log = open(path, "ab")
+        self._index = open(path + INDEX_SUFFIX, "ab")
+        if new:
+            self._log.write(_log_header.pack(LOG_MAGIC, LOG_VERSION))
+        self._offset = self._log.tell()
+        self._last_flush = time.monotonic()
+        self.frames = 0
+        self.bytes = 0
+
+    def _recover(self):
+        """Prepare an existing recording for appending. If the recorder that wrote it crashed, the
+        log is cut back to its last complete record and the index is rewritten to match it, so the
+        new records follow on from readable ones."""
+        log = FlightLog(self.path)
+        try:
+            index, end = log.index, log.end
+        finally:
+            log.close()
+        if os.path.getsize(self.path) != end:
+            logger.warning(f"Discarding a partially written record at the end of {self.path}.")
+            os.truncate(self.path, end)
+        index_path = self.path + INDEX_SUFFIX
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        if index_size != index.nbytes:
+            index.tofile(index_path)
+
+    def record(self, message, timestamp=None):
+        """Record the frame a message was decoded from."""
+        msg_id = message.get_msgId()
+        if msg_id < 0:
+            # BAD_DATA isn't a frame.
+            return
+        self.record_frame(message.get_msgbuf(), msg_id, timestamp)
+
+    def record_frame(self, frame, msg_id, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+        self._log.write(_record_header.pack(timestamp, len(frame)))
+        self._log.write(frame)
+        self._index.write(_index_entry.pack(self._offset, timestamp, msg_id))
+        self._offset += _record_header.size + len(frame)
+        self.frames += 1
+        self.bytes += len(frame)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self):
+        self._log.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._log.close()
+        self._index.close()
+
+
+class FlightLog:
+    """A recording opened for reading. The log is memory-mapped, so frames are read from the page
+    cache on demand rather than loaded up front. `end` is the offset after the last complete record
+    in the log."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as log_file:
+            size = os.fstat(log_file.fileno()).st_size
+            if size < _log_header.size:
+                raise RecordingError(f"{path} is not a flight recording.")
+            self._mmap = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _log_header.unpack_from(self._mmap)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            self._mmap.close()
+            raise RecordingError(f"{path} is not a version {LOG_VERSION} flight recording.")
+        self.index = self._load_index()
+
+    def _load_index(self):
+        index_path = self.path + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            # A crash can leave a partially written last entry, which is ignored.
+            count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+        else:
+            index = np.empty(0, dtype=INDEX_DTYPE)
+        # Entries can outlive their records if the index reached the disk before the log did.
+        size = len(self._mmap)
+        index = index[: np.searchsorted(index["offset"], size - _record_header.size, side="right")]
+        offset = _log_header.size
+        if len(index):
+            last = int(index["offset"][-1])
+            offset = self._record_end(last)
+            if offset is None:
+                index = index[:-1]
+                offset = last
+        # Frames recorded after the index was last flushed (e.g. after a crash) are re-indexed from
+        # the log.
+        missing, self.end = self._scan(offset)
+        if missing:
+            logger.info(f"Indexed {len(missing)} frames missing from {index_path}.")
+            index = np.concatenate([index, np.array(missing, dtype=INDEX_DTYPE)])
+        return index
+
+    def _record_end(self, offset):
+        """Return the offset after the record at `offset`, or None if it was only partially
+        written."""
+        if offset + _record_header.size > len(self._mmap):
+            return None
+        _, length = _record_header.unpack_from(self._mmap, offset)
+        end = offset + _record_header.size + length
+        return end if end <= len(self._mmap) else None
+
+    def _scan(self, offset):
+        """Index the records from `offset` on. Returns the entries and the offset after the last
+        complete record."""
+        entries = []
+        while True:
+            end = self._record_end(offset)
+            if end is None:
+                return entries, offset
+            timestamp, _ = _record_header.unpack_from(self._mmap, offset)
+            start = offset + _record_header.size
+            entries.append((offset, timestamp, frames.msg_id(self._mmap[start:end])))
+            offset = end
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self._mmap.close()
+
+    @property
+    def start_time(self):
+        return int(self.index["time"][0]) if len(self.index) else None
+
+    @property
+    def end_time(self):
+        return int(self.index["time"][-1]) if len(self.index) else None
+
+    def frame(self, i):
+        """Return the bytes of frame `i` as a view of the memory-mapped log."""
+        offset = int(self.index["offset"][i])
+        _, length = _record_header.unpack_from(self._mmap, offset)
+        start = offset + _record_header.size
+        end = start + length
+        return memoryview(self._mmap)[start:end]
+
+    def seek(self, timestamp):
+        """Return the position of the first frame recorded at or after `timestamp` (in
+        nanoseconds)."""
+        return int(np.searchsorted(self.index["time"], timestamp, side="left"))
+
+    def select(self, msg_ids=None, start=None, end=None):
+        """Return the positions of the frames with the given message ids recorded in
+        [`start`, `end`) nanoseconds."""
+        first = self.seek(start) if start is not None else 0
+        last = self.seek(end) if end is not None else len(self.index)
+        positions = np.arange(first, last)
+        if msg_ids is not None:
+            wanted = np.isin(self.index["msg_id"][first:last], list(msg_ids))
+            positions = positions[wanted]
+        return positions
+
+    def message_counts(self):
+        """Return the number of frames recorded per message id."""
+        ids, counts = np.unique(self.index["msg_id"], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+
+class ReplayReader:
+    """Feeds the frames of a `FlightLog` to `receive_msg_loop` in place of a `MavlinkReader`.
+
+    Frames are replayed with their recorded spacing divided by `speed`; a `speed` of None replays
+    them as fast as the receive loop can take them. Each decoded message is posted to the
+    wrapper's mavlink connection, if it has one, so its state (e.g. `target_system`) follows the
+    recording like it would on a live link.
+
+    Args:
+        conn (ClientConnectionWrapper): The connection the replayed messages are processed for.
+        log (FlightLog): The recording.
+        speed (float or None): Replay speed relative to real time.
+        positions (array or None): The frames to replay, e.g. from `FlightLog.select`. Defaults to
+            all of them.
+    """
+
+    def __init__(self, conn, log, speed=1.0, positions=None, max_batch_size=REPLAY_BATCH_SIZE):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"The replay speed must be positive, got {speed}.")
+        self.conn = conn
+        self.log = log
+        self.speed = speed
+        self.positions = positions if positions is not None else np.arange(len(log))
+        self.max_batch_size = max_batch_size
+        self.mav = mavutil.mavlink.MAVLink(None)
+        self.replayed = 0
+        self.errors = 0
+        self._next = 0
+        self._loop = None
+        self._start_wall = None
+        self._start_time = None
+
+    @property
+    def done(self):
+        return self._next >= len(self.positions)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        pass
+
+    async def read_batch(self):
+        """Return the next frames that are due, or None once the recording is exhausted."""
+        if self.done:
+            return None
+        times = self.log.index["time"]
+        if self._start_wall is None:
+            self._start_wall = self._loop.time()
+            self._start_time = int(times[self.positions[0]])
+
+        if self.speed is None:
+            last = min(self._next + self.max_batch_size, len(self.positions))
+            # Let the rest of the loop run between batches.
+            await asyncio.sleep(0)
+        else:
+            due = self._due(int(times[self.positions[self._next]]))
+            delay = due - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Everything due by now goes out in one batch.
+            elapsed = (self._loop.time() - self._start_wall) * self.speed
+            limit = self._start_time + int(elapsed * 1e9)
+            last = self._next + 1
+            while (
+                last < len(self.positions)
+                and last - self._next < self.max_batch_size
+                and times[self.positions[last]] <= limit
+            ):
+                last += 1
+
+        batch = []
+        first = self._next
+        for position in self.positions[first:last]:
+            message = self._decode(self.log.frame(position))
+            if message is not None:
+                batch.append(message)
+        self._next = last
+        return batch
+
+    def _due(self, timestamp):
+        return self._start_wall + (timestamp - self._start_time) / 1e9 / self.speed
+
+    def _decode(self, frame):
+        try:
+            message = self.mav.decode(bytearray(frame))
+        except mavutil.mavlink.MAVError as e:
+            self.errors += 1
+            logger.warning(f"Skipping a frame that failed to decode: {e}")
+            return None
+        if self.conn.conn is not None:
+            self.conn.conn.post_message(message)
+        self.replayed += 1
+        return message
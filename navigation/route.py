@@ -0,0 +1,220 @@
+"""Plan the order in which a set of waypoints is visited, e.g. for the laps of task 1.
+
+The distances between all waypoints are computed at once with `geodesy.haversine`. A nearest
+neighbour tour is then improved with 2-opt (reversing a stretch of the route) and Or-opt (moving a
+run of up to `OR_OPT_MAX_SEGMENT` waypoints elsewhere) until neither finds an improvement or the
+time budget runs out. Both moves evaluate every position for a given stretch in one NumPy
+operation, so a few hundred waypoints take a fraction of a second.
+"""
+
+import time
+
+import numpy as np
+
+from . import geodesy
+from .mission import MissionItem
+
+# Seconds the improvement of a route may take.
+ROUTE_TIME_BUDGET = 0.5
+# Longest run of waypoints Or-opt moves at once.
+OR_OPT_MAX_SEGMENT = 3
+# Improvements (in metres) smaller than this are ignored, so rounding can't make the search cycle.
+MIN_IMPROVEMENT = 1e-6
+
+
+def distance_matrix(lat, lon):
+    """Return the matrix of the distances between every pair of positions."""
+    lat = geodesy.to_degrees(lat)
+    lon = geodesy.to_degrees(lon)
+    return geodesy.haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def tour_length(distances, tour):
+    """Return the length of a closed tour given as an array of node indices."""
+    return float(distances[tour, np.roll(tour, -1)].sum())
+
+
+def nearest_neighbour_tour(distances, start=0):
+    """Return the tour that always goes to the nearest node not visited yet."""
+    count = len(distances)
+    visited = np.zeros(count, dtype=bool)
+    tour = np.empty(count, dtype=np.intp)
+    node = start
+    for i in range(count):
+        tour[i] = node
+        visited[node] = True
+        if i + 1 < count:
+            remaining = np.where(visited, np.inf, distances[node])
+            node = int(remaining.argmin())
+    return tour
+
+
+def two_opt(distances, tour, end, deadline):
+    """Improve a closed tour by reversing stretches of it, in place. Only the nodes at positions
+    1 to `end` - 1 are moved. Returns whether the tour changed."""
+    count = len(tour)
+    changed = False
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, end - 1):
+            # Reversing tour[i:j + 1] replaces edges (a, b) and (c, d) with (a, c) and (b, d).
+            a = tour[i - 1]
+            b = tour[i]
+            j = np.arange(i + 1, end)
+            c = tour[j]
+            d = tour[(j + 1) % count]
+            gain = distances[a, b] + distances[c, d] - distances[a, c] - distances[b, d]
+            best = int(gain.argmax())
+            if gain[best] > MIN_IMPROVEMENT:
+                last = int(j[best]) + 1
+                tour[i:last] = tour[i:last][::-1].copy()
+                improved = changed = True
+    return changed
+
+
+def or_opt(distances, tour, end, deadline):
+    """Improve a closed tour by moving runs of up to `OR_OPT_MAX_SEGMENT` nodes, possibly reversed,
+    between two other nodes, in place. Only the nodes at positions 1 to `end` - 1 are moved.
+    Returns whether the tour changed."""
+    count = len(tour)
+    changed = False
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        for i in range(1, end - length + 1):
+            if time.monotonic() >= deadline:
+                return changed
+            stop = i + length
+            first = tour[i]
+            last = tour[stop - 1]
+            before = tour[i - 1]
+            after = tour[stop % count]
+            removed = distances[before, first] + distances[last, after] - distances[before, after]
+
+            # Insert between rest[p] and rest[p + 1] for every edge outside the run and not
+            # leading out of the movable part of the tour.
+            rest = np.concatenate([tour[:i], tour[stop:]])
+            p = np.arange(end - length)
+            u = rest[p]
+            v = rest[(p + 1) % len(rest)]
+            forward = distances[u, first] + distances[last, v] - distances[u, v]
+            backward = distances[u, last] + distances[first, v] - distances[u, v]
+            insert = np.minimum(forward, backward)
+            best = int(insert.argmin())
+            if removed - insert[best] > MIN_IMPROVEMENT:
+                segment = tour[i:stop].copy()
+                if backward[best] < forward[best]:
+                    segment = segment[::-1]
+                split = best + 1
+                tour[:] = np.concatenate([rest[:split], segment, rest[split:]])
+                changed = True
+    return changed
+
+
+class Route:
+    """The order in which to visit a set of waypoints.
+
+    Attributes:
+        order (array): Indices of the waypoints in the order they are visited.
+        length (float): Length of the route in metres, including the legs from and back to home.
+        initial_length (float): Length of the nearest neighbour route it was improved from.
+    """
+
+    def __init__(self, lat, lon, alt, order, length, initial_length, closed):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.order = order
+        self.length = length
+        self.initial_length = initial_length
+        self.closed = closed
+
+    def __len__(self):
+        return len(self.order)
+
+    def mission_items(self, conn, laps=1, first_seq=0, **item_args):
+        """Return the waypoints in route order as `MissionItem`s with consecutive sequence
+        numbers, ready for `upload_mission`.
+
+        Args:
+            conn: The mavlink connection the mission is for.
+            laps (int): Number of times the route is flown.
+            first_seq (int): Sequence number of the first item.
+            **item_args: Passed on to every `MissionItem` (e.g. `accept_radius`).
+        """
+        items = []
+        seq = first_seq
+        for _ in range(laps):
+            for i in self.order.tolist():
+                item = MissionItem(
+                    conn,
+                    seq=seq,
+                    current=0,
+                    lat=float(self.lat[i]),
+                    lon=float(self.lon[i]),
+                    alt=float(self.alt[i]),
+                    **item_args,
+                )
+                items.append(item)
+                seq += 1
+        return items
+
+
+def plan_route(lat, lon, alt, home=None, closed=True, time_budget=ROUTE_TIME_BUDGET, degE7=False):
+    """Find a short route through a set of waypoints.
+
+    Args:
+        lat, lon: The waypoints.
+        alt: Altitude of each waypoint, or one altitude for all of them.
+        home (tuple or None): The (lat, lon) the route starts from. The route then starts at the
+            waypoint that is best to go to first. Without it, it starts at the first waypoint.
+        closed (bool): Whether the route returns to its start (a lap) or ends at whichever
+            waypoint is best to end at.
+        time_budget (float): Seconds the improvement of the nearest neighbour route may take.
+        degE7 (bool): Whether `lat` and `lon` are in degE7, as in MISSION_ITEM_INT, rather than in
+            degrees. `home` is always in degrees.
+
+    Returns:
+        Route: The route.
+    """
+    deadline = time.monotonic() + time_budget
+    to_degrees = geodesy.from_degE7 if degE7 else geodesy.to_degrees
+    lat = to_degrees(lat).ravel()
+    lon = to_degrees(lon).ravel()
+    alt = np.broadcast_to(np.asarray(alt, dtype=np.float64), lat.shape)
+    if len(lat) != len(lon):
+        raise ValueError("There must be as many longitudes as latitudes.")
+    if not geodesy.valid_coordinates(lat, lon).all():
+        raise ValueError("The waypoints must have valid latitudes and longitudes.")
+    if len(lat) == 0:
+        return Route(lat, lon, alt, np.empty(0, dtype=np.intp), 0.0, 0.0, closed)
+
+    # Node 0 is where the route starts: home, or else the first waypoint.
+    if home is not None:
+        nodes_lat = np.concatenate([[geodesy.to_degrees(home[0])], lat])
+        nodes_lon = np.concatenate([[geodesy.to_degrees(home[1])], lon])
+    else:
+        nodes_lat = lat
+        nodes_lon = lon
+    distances = distance_matrix(nodes_lat, nodes_lon)
+    count = len(distances)
+    if not closed:
+        # An open route is a closed tour through an extra node at no distance from any other,
+        # kept at the end of the tour.
+        distances = np.pad(distances, ((0, 1), (0, 1)))
+    tour = nearest_neighbour_tour(distances[:count, :count])
+    if not closed:
+        tour = np.append(tour, count)
+    # Positions 1 to end - 1 may move: not the start, nor the extra node of an open route.
+    end = count
+    initial_length = tour_length(distances, tour)
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = two_opt(distances, tour, end, deadline)
+        improved = or_opt(distances, tour, end, deadline) or improved
+
+    length = tour_length(distances, tour)
+    order = tour[:count]
+    if home is not None:
+        order = order[1:] - 1
+    return Route(lat, lon, alt, order, length, initial_length, closed)
@@ -0,0 +1,128 @@
+"""Links and filters used by `ServerConnection` to route raw MAVLink frames."""
+
+import logging
+
+from pymavlink import mavutil
+
+from . import frames
+
+logger = logging.getLogger()
+
+# Maximum number of bytes read from a link in one go.
+READ_SIZE = 65536
+
+
+class MessageFilter:
+    """Decides which messages may be sent out on a link.
+
+    Args:
+        allow (iterable or None): Message ids that may pass. None allows every message that isn't
+            blocked.
+        block (iterable): Message ids that never pass.
+    """
+
+    def __init__(self, allow=None, block=()):
+        self.allow = frozenset(allow) if allow is not None else None
+        self.block = frozenset(block)
+
+    def accepts(self, message_id):
+        if message_id in self.block:
+            return False
+        return self.allow is None or message_id in self.allow
+
+
+class RouterLink:
+    """One link of the router, e.g. the serial line to the autopilot or the UDP port of a GCS.
+
+    Incoming bytes are split into frames without decoding them. When a read contains only whole
+    frames (always the case for UDP) the frames are memoryview slices of the received buffer, so
+    nothing is copied between receiving and forwarding them.
+
+    On byte streams (serial lines, TCP) a start byte can also turn up inside other data, so the
+    checksum of every frame is verified before it is accepted, resynchronising on the next byte if
+    it doesn't match. Frames of messages that aren't in the dialect can't be verified and are
+    forwarded as they were framed by their length, since a router must pass on messages it doesn't
+    know. UDP datagrams hold whole frames and are already checksummed by UDP, so links over UDP
+    skip the verification unless `verify_checksums` is set.
+    """
+
+    def __init__(self, name, conn, message_filter=None, verify_checksums=None):
+        self.name = name
+        self.conn = conn
+        self.filter = message_filter
+        if verify_checksums is None:
+            verify_checksums = not isinstance(conn, mavutil.mavudp)
+        self.verify_checksums = verify_checksums
+        # Systems whose messages arrived on this link.
+        self.systems = set()
+        self._partial = b""
+        self.frames_received = 0
+        self.frames_sent = 0
+        self.frames_filtered = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.bytes_discarded = 0
+
+    @property
+    def fd(self):
+        return getattr(self.conn, "fd", None)
+
+    def read_frames(self):
+        """Read what is available on the link and return the complete frames in it."""
+        data = self.conn.recv(READ_SIZE)
+        if not data:
+            return []
+        self.bytes_received += len(data)
+        if self._partial:
+            # A frame was split across reads; this is the only case where bytes are copied.
+            data = self._partial + data
+            self._partial = b""
+        return self._split(memoryview(data))
+
+    def _split(self, buf):
+        result = []
+        offset = 0
+        end = len(buf)
+        while offset < end:
+            stx = buf[offset]
+            if stx != frames.MAVLINK2_STX and stx != frames.MAVLINK1_STX:
+                # Resynchronise on the next start byte.
+                offset += 1
+                self.bytes_discarded += 1
+                continue
+            length = frames.frame_length(buf, offset)
+            if length is None or offset + length > end:
+                self._partial = bytes(buf[offset:])
+                break
+            frame_end = offset + length
+            frame = buf[offset:frame_end]
+            if self.verify_checksums and frames.checksum_valid(frame) is False:
+                # A start byte inside other data or a corrupted frame; resynchronise after it.
+                offset += 1
+                self.bytes_discarded += 1
+                continue
+            result.append(frame)
+            offset = frame_end
+        self.frames_received += len(result)
+        return result
+
+    def write(self, frame, message_id):
+        if self.filter is not None and not self.filter.accepts(message_id):
+            self.frames_filtered += 1
+            return False
+        self.conn.write(frame)
+        self.frames_sent += 1
+        self.bytes_sent += len(frame)
+        return True
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "systems": sorted(self.systems),
+            "frames_received": self.frames_received,
+            "frames_sent": self.frames_sent,
+            "frames_filtered": self.frames_filtered,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "bytes_discarded": self.bytes_discarded,
+        }
@@ -0,0 +1,211 @@
+"""The latest telemetry of the vehicle, published in shared memory for the other processes on the
+companion computer (object detection, mission scripts).
+
+The server writes a snapshot of the latest position, attitude, battery, landed state and link
+health into a `multiprocessing.shared_memory` block several times a second. Any process can read
+it without a system call or a round trip through the IPC server.
+
+The block is guarded by a sequence lock. The writer makes the sequence number odd, writes the
+snapshot, then makes it even again. A reader copies the snapshot between two reads of the
+sequence number and retries if the number changed or was odd, so it never returns a
+half-written snapshot and never blocks the writer. There is a single writer.
+
+Every field is a little-endian double (`STATE_FIELDS`), NaN until the server has a sample of it.
+Times are `time.monotonic()`, which is the same clock in every process.
+"""
+
+import math
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from .periodic import run_periodic
+from .telemetry import TELEMETRY_FIELDS
+from .utils import ATTITUDE, EXTENDED_SYS_STATE, GLOBAL_POSITION_INT, SYS_STATUS
+
+# Name of the shared memory block the server publishes to.
+SHARED_STATE_NAME = "umuas_telemetry"
+# Times per second the server publishes the snapshot.
+SHARED_STATE_RATE_HZ = 50
+# Seconds a reader retries a snapshot being written before giving up. A write takes microseconds,
+# so a snapshot still incomplete after this means the writer stopped in the middle of it.
+READ_TIMEOUT = 0.1
+
+LAYOUT_VERSION = 1
+
+# Snapshot sections, in order, and the telemetry they are copied from. Each section starts with
+# the time of its sample (e.g. `position_time`).
+SECTIONS = (
+    ("position", GLOBAL_POSITION_INT),
+    ("attitude", ATTITUDE),
+    ("battery", SYS_STATUS),
+    ("landed", EXTENDED_SYS_STATE),
+)
+# Link health: seconds since the last heartbeat, packet loss over the rate window, smoothed
+# round-trip time of commands, messages received per second and whether the link is degraded.
+LINK_FIELDS = (
+    "heartbeat_age",
+    "recent_loss",
+    "srtt",
+    "messages_per_second",
+    "degraded",
+)
+STATE_FIELDS = (
+    ("time",)
+    + tuple(
+        name
+        for section, message_type in SECTIONS
+        for name in (f"{section}_time",)
+        + tuple(field for field, _, _, _ in TELEMETRY_FIELDS[message_type])
+    )
+    + LINK_FIELDS
+)
+
+# Sequence number, layout version and number of fields.
+HEADER = struct.Struct("<QII")
+STATE = struct.Struct(f"<{len(STATE_FIELDS)}d")
+_sequence = struct.Struct("<Q")
+SHARED_STATE_SIZE = HEADER.size + STATE.size
+
+# Blocks published by this process.
+_published = set()
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class TelemetryPublisher:
+    """Creates the shared memory block and writes the telemetry of a connection into it.
+
+    Args:
+        conn (ClientConnectionWrapper): The connection whose telemetry is published.
+        name (str): Name of the shared memory block. A block left behind by a previous server
+            is replaced.
+    """
+
+    def __init__(self, conn, name=SHARED_STATE_NAME):
+        self.conn = conn
+        self.name = name
+        try:
+            self._memory = shared_memory.SharedMemory(name, create=True, size=SHARED_STATE_SIZE)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._memory = shared_memory.SharedMemory(name, create=True, size=SHARED_STATE_SIZE)
+        _published.add(name)
+        self._buffer = self._memory.buf
+        self.sequence = 0
+        HEADER.pack_into(self._buffer, 0, 0, LAYOUT_VERSION, len(STATE_FIELDS))
+        self.write((math.nan,) * len(STATE_FIELDS))
+
+    def write(self, values):
+        """Write a snapshot given its values in `STATE_FIELDS` order."""
+        buffer = self._buffer
+        _sequence.pack_into(buffer, 0, self.sequence + 1)
+        STATE.pack_into(buffer, HEADER.size, *values)
+        self.sequence += 2
+        _sequence.pack_into(buffer, 0, self.sequence)
+
+    def publish(self, now=None):
+        """Write a snapshot of the connection's latest telemetry."""
+        if now is None:
+            now = time.monotonic()
+        conn = self.conn
+        values = [now]
+        for _, message_type in SECTIONS:
+            sample = conn.telemetry.latest(message_type)
+            fields = TELEMETRY_FIELDS[message_type]
+            if sample is None:
+                values.extend((math.nan,) * (len(fields) + 1))
+                continue
+            values.append(float(sample["time"]))
+            values.extend(float(sample[name]) for name, _, _, _ in fields)
+
+        link = conn.link_quality
+        last_heartbeat = conn.last_heartbeat
+        values.append(math.nan if last_heartbeat is None else time.time() - last_heartbeat)
+        values.append(link.recent_loss(now))
+        values.append(math.nan if link.srtt is None else link.srtt)
+        values.append(link.window.rates(now)[0])
+        values.append(float(link.is_degraded(now)))
+        self.write(values)
+
+    async def run(self, rate_hz=SHARED_STATE_RATE_HZ):
+        await run_periodic(f"telemetry publisher {self.name}", self.publish, rate_hz)
+
+    def close(self):
+        """Release and remove the shared memory block."""
+        self._buffer = None
+        self._memory.close()
+        _published.discard(self.name)
+        try:
+            self._memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TelemetryReader:
+    """Reads the snapshots published by a `TelemetryPublisher`, from any process.
+
+    Args:
+        name (str): Name of the shared memory block.
+
+    Raises:
+        FileNotFoundError: If the server hasn't created the block.
+        SnapshotError: If the block was written by a server with another layout.
+    """
+
+    def __init__(self, name=SHARED_STATE_NAME):
+        self.name = name
+        self._memory = shared_memory.SharedMemory(name)
+        # Only the publisher removes the block; without this the resource tracker of a reading
+        # process would remove it when the process exits.
+        if name not in _published:
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+        self._buffer = self._memory.buf
+        self.retries = 0
+        _, version, count = HEADER.unpack_from(self._buffer)
+        if version != LAYOUT_VERSION or count != len(STATE_FIELDS):
+            self.close()
+            raise SnapshotError(
+                f"Shared state {name} has layout {version} with {count} fields, expected layout "
+                f"{LAYOUT_VERSION} with {len(STATE_FIELDS)}."
+            )
+
+    def read(self):
+        """Return a consistent snapshot as a tuple of values in `STATE_FIELDS` order.
+
+        Raises:
+            SnapshotError: If no complete snapshot could be read for `READ_TIMEOUT` seconds.
+        """
+        buffer = self._buffer
+        unpack_sequence = _sequence.unpack_from
+        deadline = None
+        while True:
+            (before,) = unpack_sequence(buffer)
+            if not before & 1:
+                values = STATE.unpack_from(buffer, HEADER.size)
+                if unpack_sequence(buffer)[0] == before:
+                    return values
+            self.retries += 1
+            if deadline is None:
+                deadline = time.monotonic() + READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                raise SnapshotError(f"No complete snapshot in {self.name} for {READ_TIMEOUT} s.")
+            # Let a writer in this process finish.
+            time.sleep(0)
+
+    def snapshot(self):
+        """Return a consistent snapshot as a dict keyed by `STATE_FIELDS`."""
+        return dict(zip(STATE_FIELDS, self.read()))
+
+    @property
+    def sequence(self):
+        """Number of snapshot writes so far, times two."""
+        return _sequence.unpack_from(self._buffer)[0]
+
+    def close(self):
+        self._buffer = None
+        self._memory.close()
@@ -0,0 +1,379 @@
+"""A minimal simulated autopilot for tests and benchmarks that need a MAVLink peer without SITL."""
+
+import logging
+import math
+import random
+import threading
+import time
+
+from pymavlink import mavutil
+
+from .utils import build_message
+
+logger = logging.getLogger()
+
+mavlink = mavutil.mavlink
+
+HOME_LAT = 49.81351997154947
+HOME_LON = -97.12035271466196
+
+# Messages streamed when a telemetry rate is given.
+TELEMETRY_MESSAGES = (
+    mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT,
+    mavlink.MAVLINK_MSG_ID_ATTITUDE,
+    mavlink.MAVLINK_MSG_ID_SYS_STATUS,
+    mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE,
+)
+
+
+class SimulatedAutopilot(threading.Thread):
+    """Speaks enough of the MAVLink command and mission protocols to exercise the companion
+    computer code over a real (loopback) link.
+
+    Args:
+        conn_string (str): Connection string of the simulated autopilot's end of the link, e.g.
+            "udpout:127.0.0.1:14540".
+        system_id (int): MAVLink system id of the simulated vehicle.
+        loss (float): Probability of dropping each received and each sent message.
+        seed (int or None): Seed of the random number generator used for packet loss.
+        mission_timeout (float): Seconds without a mission item before it is requested again.
+        use_int_requests (bool): Request mission items with MISSION_REQUEST_INT rather than the
+            legacy MISSION_REQUEST.
+        telemetry_rate_hz (float): Rate at which each of `TELEMETRY_MESSAGES` is streamed. 0 streams
+            nothing.
+        max_stream_rate_hz (float or None): Highest rate any message is streamed at, whatever is
+            requested with MAV_CMD_SET_MESSAGE_INTERVAL, like a bandwidth-limited autopilot.
+    """
+
+    def __init__(
+        self,
+        conn_string,
+        system_id=1,
+        component_id=1,
+        loss=0.0,
+        seed=None,
+        heartbeat_rate_hz=1,
+        mission_timeout=0.25,
+        use_int_requests=True,
+        telemetry_rate_hz=0,
+        max_stream_rate_hz=None,
+    ):
+        super().__init__(daemon=True)
+        self.master = mavutil.mavlink_connection(
+            conn_string, source_system=system_id, source_component=component_id
+        )
+        self.system_id = system_id
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.heartbeat_period = 1.0 / heartbeat_rate_hz
+        self.mission_timeout = mission_timeout
+        self.use_int_requests = use_int_requests
+        self.mission = []
+        self.commands = []
+        # MAV_CMD -> MAV_RESULT answered instead of accepting the command, e.g. to deny arming.
+        self.command_results = {}
+        # Streamed message id -> interval in seconds.
+        self.message_intervals = {}
+        self.max_stream_rate_hz = max_stream_rate_hz
+        if telemetry_rate_hz:
+            for msg_id in TELEMETRY_MESSAGES:
+                self.message_intervals[msg_id] = 1.0 / telemetry_rate_hz
+        self._next_stream = {}
+        self.start_time = time.monotonic()
+        self.relative_alt = 20.0
+        self.battery_remaining = 100.0
+        self.landed_state = mavlink.MAV_LANDED_STATE_IN_AIR
+        # Reported in the heartbeats. Set by MAV_CMD_COMPONENT_ARM_DISARM; MAV_CMD_NAV_LAND only
+        # moves `landed_state` to LANDING, touching down is up to the test.
+        self.armed = True
+        # Set to report zero ground speed, as if holding position.
+        self.holding = False
+        # Set to simulate a dead link: nothing is sent while it is True.
+        self.silent = False
+        self.received = 0
+        self.sent = 0
+        self.dropped = 0
+        self._receiving = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._running = True
+        # Send a heartbeat straight away (never dropped) so the other end learns our address.
+        self.send_heartbeat(lossy=False)
+        super().start()
+
+    def stop(self):
+        self._running = False
+        if self.is_alive():
+            self.join()
+        self.master.close()
+
+    def _lost(self):
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return True
+        return False
+
+    def send(self, message, lossy=True):
+        if self.silent or (lossy and self._lost()):
+            return
+        with self._lock:
+            self.master.mav.send(message)
+        self.sent += 1
+
+    def send_heartbeat(self, lossy=True):
+        self.send(
+            mavlink.MAVLink_heartbeat_message(
+                mavlink.MAV_TYPE_QUADROTOR,
+                mavlink.MAV_AUTOPILOT_PX4,
+                mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+                | (mavlink.MAV_MODE_FLAG_SAFETY_ARMED if self.armed else 0),
+                0,
+                mavlink.MAV_STATE_ACTIVE if self.armed else mavlink.MAV_STATE_STANDBY,
+                3,
+            ),
+            lossy,
+        )
+
+    def run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_period
+        while self._running:
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self.send_heartbeat()
+                next_heartbeat += self.heartbeat_period
+            self.on_tick(now)
+            self.stream_telemetry(now)
+            msg = self.master.recv_match(blocking=True, timeout=0.005)
+            if msg is None or self._lost():
+                continue
+            self.received += 1
+            handler = getattr(self, f"handle_{msg.get_type().lower()}", None)
+            if handler is not None:
+                handler(msg)
+
+    def on_tick(self, now):
+        receiving = self._receiving
+        if receiving is not None and now - receiving["last_activity"] > self.mission_timeout:
+            self._request_item(receiving["next"])
+
+    def stream_telemetry(self, now):
+        for msg_id, interval in self.message_intervals.items():
+            next_send = self._next_stream.get(msg_id, now)
+            if now < next_send:
+                continue
+            # Schedule from the previous deadline so the average rate is exact, but don't try to
+            # catch up after a stall.
+            self._next_stream[msg_id] = max(next_send + interval, now)
+            message = self.telemetry_message(msg_id, now)
+            if message is not None:
+                self.send(message)
+
+    def telemetry_message(self, msg_id, now):
+        elapsed = now - self.start_time
+        time_boot_ms = int(elapsed * 1000) & 0xFFFFFFFF
+        if msg_id == mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT:
+            # Fly a slow circle of roughly 50 m radius around home, at 5 m/s.
+            angle = elapsed * 0.1
+            lat = HOME_LAT + 0.00045 * math.cos(angle)
+            lon = HOME_LON + 0.0007 * math.sin(angle)
+            speed = 0 if self.holding else 500
+            return mavlink.MAVLink_global_position_int_message(
+                time_boot_ms,
+                int(lat * 1e7),
+                int(lon * 1e7),
+                int((230 + self.relative_alt) * 1000),
+                int(self.relative_alt * 1000),
+                int(-speed * math.sin(angle)),
+                int(speed * math.cos(angle)),
+                0,
+                int(math.degrees(angle) * 100) % 36000,
+            )
+        if msg_id == mavlink.MAVLINK_MSG_ID_ATTITUDE:
+            return mavlink.MAVLink_attitude_message(
+                time_boot_ms, 0.0, 0.0, elapsed * 0.1, 0, 0, 0.1
+            )
+        if msg_id == mavlink.MAVLINK_MSG_ID_SYS_STATUS:
+            return build_message(
+                mavlink.MAVLink_sys_status_message,
+                0,
+                0,
+                0,
+                0,
+                15800,
+                1200,
+                int(self.battery_remaining),
+                0,
+                0,
+                0,
+                0,
+                0,
+                0,
+            )
+        if msg_id == mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE:
+            return mavlink.MAVLink_extended_sys_state_message(0, self.landed_state)
+        return None
+
+    def handle_command_long(self, msg):
+        self.commands.append(msg)
+        result = self.command_results.get(msg.command, mavlink.MAV_RESULT_ACCEPTED)
+        if result == mavlink.MAV_RESULT_ACCEPTED:
+            if msg.command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+                result = self.set_message_interval(int(msg.param1), msg.param2)
+            elif msg.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+                self.armed = msg.param1 == 1
+            elif msg.command == mavlink.MAV_CMD_NAV_LAND:
+                self.landed_state = mavlink.MAV_LANDED_STATE_LANDING
+        self.send(
+            build_message(
+                mavlink.MAVLink_command_ack_message,
+                msg.command,
+                result,
+                0,
+                0,
+                msg.get_srcSystem(),
+                msg.get_srcComponent(),
+            )
+        )
+
+    def set_message_interval(self, msg_id, interval_us):
+        if msg_id not in TELEMETRY_MESSAGES:
+            return mavlink.MAV_RESULT_UNSUPPORTED
+        if interval_us < 0:
+            self.message_intervals.pop(msg_id, None)
+            return mavlink.MAV_RESULT_ACCEPTED
+        # An interval of 0 asks for the default rate, which we take to be 1 Hz.
+        interval = interval_us / 1e6 if interval_us > 0 else 1.0
+        if self.max_stream_rate_hz:
+            interval = max(interval, 1.0 / self.max_stream_rate_hz)
+        self.message_intervals[msg_id] = interval
+        self._next_stream.pop(msg_id, None)
+        return mavlink.MAV_RESULT_ACCEPTED
+
+    def handle_mission_clear_all(self, msg):
+        self.mission = []
+        self._send_mission_ack(msg, mavlink.MAV_MISSION_ACCEPTED)
+
+    def handle_mission_count(self, msg):
+        self._start_receiving(msg, [None] * msg.count, 0, msg.count - 1)
+
+    def handle_mission_write_partial_list(self, msg):
+        if not 0 <= msg.start_index <= msg.end_index < len(self.mission):
+            self._send_mission_ack(msg, mavlink.MAV_MISSION_ERROR)
+            return
+        self._start_receiving(msg, list(self.mission), msg.start_index, msg.end_index)
+
+    def _start_receiving(self, msg, items, first, last):
+        self._receiving = {
+            "items": items,
+            "last": last,
+            "next": first,
+            "mission_type": getattr(msg, "mission_type", 0),
+            "peer": (msg.get_srcSystem(), msg.get_srcComponent()),
+            "last_activity": 0.0,
+        }
+        if last < first:
+            self._finish_receiving()
+            return
+        self._request_item(first)
+
+    def handle_mission_request_list(self, msg):
+        self.send(
+            build_message(
+                mavlink.MAVLink_mission_count_message,
+                msg.get_srcSystem(),
+                msg.get_srcComponent(),
+                len(self.mission),
+                getattr(msg, "mission_type", 0),
+            )
+        )
+
+    def handle_mission_request_int(self, msg):
+        if msg.seq >= len(self.mission):
+            self._send_mission_ack(msg, mavlink.MAV_MISSION_INVALID_SEQUENCE)
+            return
+        item = self.mission[msg.seq]
+        x, y = item.x, item.y
+        if item.get_type() == "MISSION_ITEM":
+            x, y = int(round(x * 1e7)), int(round(y * 1e7))
+        self.send(
+            build_message(
+                mavlink.MAVLink_mission_item_int_message,
+                msg.get_srcSystem(),
+                msg.get_srcComponent(),
+                msg.seq,
+                item.frame,
+                item.command,
+                item.current,
+                item.autocontinue,
+                item.param1,
+                item.param2,
+                item.param3,
+                item.param4,
+                x,
+                y,
+                item.z,
+                getattr(msg, "mission_type", 0),
+            )
+        )
+
+    def handle_mission_item_int(self, msg):
+        receiving = self._receiving
+        if receiving is None:
+            if self.mission and msg.seq < len(self.mission):
+                # Our ACK was lost and the sender is retransmitting the last item.
+                self._send_mission_ack(msg, mavlink.MAV_MISSION_ACCEPTED)
+            return
+        if msg.seq != receiving["next"]:
+            # Out of sequence: ask for the one we want again.
+            self._request_item(receiving["next"])
+            return
+        receiving["items"][msg.seq] = msg
+        if msg.seq == receiving["last"]:
+            self._finish_receiving()
+        else:
+            self._request_item(msg.seq + 1)
+
+    handle_mission_item = handle_mission_item_int
+
+    def _request_item(self, seq):
+        receiving = self._receiving
+        receiving["next"] = seq
+        receiving["last_activity"] = time.monotonic()
+        target_system, target_component = receiving["peer"]
+        if self.use_int_requests:
+            request_class = mavlink.MAVLink_mission_request_int_message
+        else:
+            request_class = mavlink.MAVLink_mission_request_message
+        self.send(
+            build_message(
+                request_class, target_system, target_component, seq, receiving["mission_type"]
+            )
+        )
+
+    def _finish_receiving(self):
+        receiving = self._receiving
+        self._receiving = None
+        self.mission = receiving["items"]
+        target_system, target_component = receiving["peer"]
+        self.send(
+            build_message(
+                mavlink.MAVLink_mission_ack_message,
+                target_system,
+                target_component,
+                mavlink.MAV_MISSION_ACCEPTED,
+                receiving["mission_type"],
+            )
+        )
+
+    def _send_mission_ack(self, msg, result):
+        self.send(
+            build_message(
+                mavlink.MAVLink_mission_ack_message,
+                msg.get_srcSystem(),
+                msg.get_srcComponent(),
+                result,
+                getattr(msg, "mission_type", 0),
+            )
+        )
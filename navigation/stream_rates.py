@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import math
+
+from pymavlink import mavutil
+
+from .commands import CommandTimeoutError
+from .periodic import run_periodic
+
+logger = logging.getLogger()
+
+mavlink = mavutil.mavlink
+
+# Seconds between checks of the rates the autopilot actually delivers.
+DELIVERY_CHECK_INTERVAL = 2.0
+# A stream delivered at less than this fraction of its requested rate counts as under-delivered.
+DELIVERY_TOLERANCE = 0.8
+# Number of times an under-delivered stream is requested again before we settle for what we get.
+MAX_REREQUESTS = 3
+# Interval sent in SET_MESSAGE_INTERVAL to stop a stream.
+INTERVAL_DISABLED = -1
+# Ground speed (in m/s) below which a vehicle in the air is taken to be loitering.
+LOITER_SPEED = 1.0
+# Seconds the ground speed must stay below `LOITER_SPEED` before the loiter profile is applied.
+LOITER_DELAY = 5.0
+
+PHASE_CONSUMER = "mission_phase"
+
+PHASE_ON_GROUND = "on_ground"
+PHASE_TAKEOFF = "takeoff"
+PHASE_CRUISE = "cruise"
+PHASE_LOITER = "loiter"
+PHASE_LANDING = "landing"
+
+# The rates (in Hz) the flight itself needs in each mission phase. EXTENDED_SYS_STATE is always
+# kept on since the phase is derived from it.
+PHASE_PROFILES = {
+    PHASE_ON_GROUND: {
+        mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT: 1,
+        mavlink.MAVLINK_MSG_ID_ATTITUDE: 1,
+        mavlink.MAVLINK_MSG_ID_SYS_STATUS: 1,
+        mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE: 1,
+    },
+    PHASE_TAKEOFF: {
+        mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT: 10,
+        mavlink.MAVLINK_MSG_ID_ATTITUDE: 10,
+        mavlink.MAVLINK_MSG_ID_SYS_STATUS: 2,
+        mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE: 5,
+    },
+    PHASE_CRUISE: {
+        mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT: 5,
+        mavlink.MAVLINK_MSG_ID_ATTITUDE: 5,
+        mavlink.MAVLINK_MSG_ID_SYS_STATUS: 1,
+        mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE: 1,
+    },
+    PHASE_LOITER: {
+        mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT: 1,
+        mavlink.MAVLINK_MSG_ID_ATTITUDE: 1,
+        mavlink.MAVLINK_MSG_ID_SYS_STATUS: 1,
+        mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE: 1,
+    },
+    PHASE_LANDING: {
+        mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT: 20,
+        mavlink.MAVLINK_MSG_ID_ATTITUDE: 20,
+        mavlink.MAVLINK_MSG_ID_SYS_STATUS: 1,
+        mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE: 5,
+    },
+}
+
+# The phase followed for each landed state reported in EXTENDED_SYS_STATE.
+LANDED_STATE_PHASES = {
+    mavlink.MAV_LANDED_STATE_ON_GROUND: PHASE_ON_GROUND,
+    mavlink.MAV_LANDED_STATE_TAKEOFF: PHASE_TAKEOFF,
+    mavlink.MAV_LANDED_STATE_IN_AIR: PHASE_CRUISE,
+    mavlink.MAV_LANDED_STATE_LANDING: PHASE_LANDING,
+}
+
+
+class StreamState:
+    """What was requested for one message stream and what is actually delivered."""
+
+    def __init__(self, msg_id):
+        self.msg_id = msg_id
+        # The rate (in Hz) the autopilot acknowledged, None if nothing was requested.
+        self.requested = None
+        self.delivered = None
+        self.received = 0
+        # Loop time since which `received` is counted.
+        self.since = None
+        self.rerequests = 0
+        self.resend = False
+        self.under_delivered = False
+
+    def to_dict(self):
+        return {
+            "msg_id": self.msg_id,
+            "requested": self.requested,
+            "delivered": self.delivered,
+            "under_delivered": self.under_delivered,
+            "rerequests": self.rerequests,
+        }
+
+
+class StreamRateController:
+    """Decides the rate of every telemetry stream from what its consumers need.
+
+    Consumers declare the message types they need and the minimum rate for each with `request`.
+    The demands are combined by taking the highest rate per message type, and
+    MAV_CMD_SET_MESSAGE_INTERVAL is only sent for the streams whose combined rate changed; a stream
+    nobody needs any more is turned off. While running, the rate each stream is actually
+    delivered at is measured and streams that fall short are requested again.
+
+    The flight's own needs follow the mission phase: the profile in `PHASE_PROFILES` for the landed
+    state in EXTENDED_SYS_STATE is applied automatically, and a vehicle in the air whose ground
+    speed in GLOBAL_POSITION_INT stays below `LOITER_SPEED` for `loiter_delay` seconds is taken to
+    be loitering. A phase set explicitly with `set_phase` overrides both.
+
+    Nothing is sent to the autopilot until `run` is started; demands made before that are applied
+    when it starts.
+    """
+
+    def __init__(
+        self,
+        conn,
+        profiles=PHASE_PROFILES,
+        check_interval=DELIVERY_CHECK_INTERVAL,
+        loiter_delay=LOITER_DELAY,
+    ):
+        self.conn = conn
+        self.profiles = profiles
+        self.check_interval = check_interval
+        self.loiter_delay = loiter_delay
+        self.demands = {}
+        self.streams = {}
+        self.phase = None
+        self.phase_override = None
+        self.commands_sent = 0
+        self._apply_task = None
+        self._dirty = False
+        self._running = False
+        # Boot time (in ms) since which the ground speed has been below `LOITER_SPEED`.
+        self._slow_since = None
+        conn.dispatcher.subscribe(
+            mavlink.MAVLINK_MSG_ID_EXTENDED_SYS_STATE, self._on_extended_sys_state
+        )
+        conn.dispatcher.subscribe(
+            mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, self._on_global_position_int
+        )
+
+    def request(self, consumer, msg_id, rate_hz):
+        """Declare that `consumer` needs messages with id `msg_id` at `rate_hz` or more. A rate of
+        0 withdraws the demand."""
+        demands = self.demands.setdefault(consumer, {})
+        if rate_hz > 0:
+            demands[msg_id] = rate_hz
+        else:
+            demands.pop(msg_id, None)
+        if not demands:
+            del self.demands[consumer]
+        self._schedule_apply()
+
+    def release(self, consumer):
+        """Withdraw every demand of `consumer`."""
+        if self.demands.pop(consumer, None) is not None:
+            self._schedule_apply()
+
+    def set_phase(self, phase):
+        """Switch to the profile of `phase`, overriding the phase derived from the landed state
+        until `set_phase(None)` is called."""
+        self.phase_override = phase
+        self._enter_phase(phase)
+
+    def combined(self):
+        """Return the highest rate demanded for each message id."""
+        rates = {}
+        for demands in self.demands.values():
+            for msg_id, rate_hz in demands.items():
+                if rate_hz > rates.get(msg_id, 0):
+                    rates[msg_id] = rate_hz
+        return rates
+
+    async def apply(self):
+        """Send SET_MESSAGE_INTERVAL for every stream whose combined rate changed."""
+        rates = self.combined()
+        changes = []
+        for msg_id in set(rates) | set(self.streams):
+            stream = self._stream(msg_id)
+            rate_hz = rates.get(msg_id)
+            if stream.resend or (rate_hz or 0) != (stream.requested or 0):
+                changes.append((stream, rate_hz))
+        # One at a time: the ACKs of SET_MESSAGE_INTERVAL don't say which message they are for, so
+        # concurrent requests could be credited with each other's result.
+        for stream, rate_hz in changes:
+            await self._set_interval(stream, rate_hz)
+
+    async def run(self):
+        """Keep the requested rates applied and check the delivered rates until cancelled."""
+        self._running = True
+        self._schedule_apply()
+        try:
+            await run_periodic(
+                f"stream rates {self.conn.conn_string}",
+                self.check_delivery,
+                1.0 / self.check_interval,
+            )
+        finally:
+            self._running = False
+
+    def check_delivery(self):
+        """Measure the rate every stream was delivered at since the last check, requesting the
+        ones that fall short again."""
+        now = asyncio.get_running_loop().time()
+        rerequest = False
+        for stream in self.streams.values():
+            if stream.since is None or now - stream.since < self.check_interval / 2:
+                # Too soon after the rate changed to tell.
+                continue
+            stream.delivered = stream.received / (now - stream.since)
+            stream.received = 0
+            stream.since = now
+            if not stream.requested:
+                stream.under_delivered = False
+                continue
+            stream.under_delivered = stream.delivered < stream.requested * DELIVERY_TOLERANCE
+            if stream.under_delivered and stream.rerequests < MAX_REREQUESTS:
+                logger.warning(
+                    f"Message {stream.msg_id} delivered at {stream.delivered:.1f} Hz instead of "
+                    f"{stream.requested} Hz, requesting it again."
+                )
+                stream.rerequests += 1
+                stream.resend = True
+                rerequest = True
+        if rerequest:
+            self._schedule_apply()
+
+    def stats(self):
+        return [stream.to_dict() for stream in self.streams.values()]
+
+    def _stream(self, msg_id):
+        stream = self.streams.get(msg_id)
+        if stream is None:
+            stream = self.streams[msg_id] = StreamState(msg_id)
+            self.conn.dispatcher.subscribe(msg_id, lambda message: self._count(stream))
+        return stream
+
+    @staticmethod
+    def _count(stream):
+        stream.received += 1
+
+    async def _set_interval(self, stream, rate_hz):
+        interval = 1e6 / rate_hz if rate_hz else INTERVAL_DISABLED
+        self.commands_sent += 1
+        try:
+            ack = await self.conn.commands.command_long(
+                mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, param1=stream.msg_id, param2=interval
+            )
+        except CommandTimeoutError as e:
+            logger.error(f"Failed to set the interval of message {stream.msg_id}: {e}")
+            return
+        if ack.result != mavlink.MAV_RESULT_ACCEPTED:
+            logger.error(f"Setting the interval of message {stream.msg_id} returned {ack.result}.")
+            return
+        rate_hz = rate_hz or 0
+        if rate_hz != stream.requested:
+            stream.rerequests = 0
+            stream.received = 0
+            stream.since = asyncio.get_running_loop().time()
+        stream.requested = rate_hz
+        stream.resend = False
+        logger.info(f"Message {stream.msg_id} requested at {rate_hz} Hz.")
+
+    def _schedule_apply(self):
+        self._dirty = True
+        if not self._running:
+            # Applied once `run` starts.
+            return
+        if self._apply_task is None or self._apply_task.done():
+            self._apply_task = asyncio.get_running_loop().create_task(self._apply_pending())
+
+    async def _apply_pending(self):
+        while self._dirty:
+            # Yield first so several demands made together go out as one batch.
+            await asyncio.sleep(0)
+            self._dirty = False
+            await self.apply()
+
+    def _enter_phase(self, phase):
+        if phase == self.phase:
+            return
+        logger.info(f"Mission phase {self.phase} -> {phase}.")
+        self.phase = phase
+        self.demands.pop(PHASE_CONSUMER, None)
+        if phase is not None:
+            self.demands[PHASE_CONSUMER] = dict(self.profiles[phase])
+        self._schedule_apply()
+
+    def _on_extended_sys_state(self, message):
+        if self.phase_override is not None:
+            return
+        phase = LANDED_STATE_PHASES.get(message.landed_state)
+        if phase == PHASE_CRUISE and self.phase == PHASE_LOITER:
+            # Still in the air; the ground speed decides when the loiter ends.
+            return
+        if phase is not None:
+            self._enter_phase(phase)
+
+    def _on_global_position_int(self, message):
+        if self.phase_override is not None or self.phase not in (PHASE_CRUISE, PHASE_LOITER):
+            self._slow_since = None
+            return
+        # vx and vy are in cm/s.
+        if math.hypot(message.vx, message.vy) / 100 >= LOITER_SPEED:
+            self._slow_since = None
+            if self.phase == PHASE_LOITER:
+                self._enter_phase(PHASE_CRUISE)
+            return
+        if self._slow_since is None:
+            self._slow_since = message.time_boot_ms
+        elif message.time_boot_ms - self._slow_since >= self.loiter_delay * 1000:
+            self._enter_phase(PHASE_LOITER)
@@ -0,0 +1,210 @@
+import time
+
+import numpy as np
+
+from .utils import (
+    ALT_SCALING_FACTOR,
+    ATTITUDE,
+    EXTENDED_SYS_STATE,
+    GLOBAL_POSITION_INT,
+    LAT_LON_SCALING_FACTOR,
+    SYS_STATUS,
+)
+
+# Number of samples kept per message type. At 50 Hz this is a little under 3 minutes of history.
+TELEMETRY_HISTORY_SIZE = 8192
+
+# For every stored message type: (column name, message attribute, scale, dtype). The stored value is
+# `getattr(message, attribute) / scale`.
+TELEMETRY_FIELDS = {
+    GLOBAL_POSITION_INT: (
+        ("lat", "lat", LAT_LON_SCALING_FACTOR, "f8"),
+        ("lon", "lon", LAT_LON_SCALING_FACTOR, "f8"),
+        ("alt", "alt", ALT_SCALING_FACTOR, "f8"),
+        ("relative_alt", "relative_alt", ALT_SCALING_FACTOR, "f8"),
+        ("vx", "vx", 100.0, "f8"),
+        ("vy", "vy", 100.0, "f8"),
+        ("vz", "vz", 100.0, "f8"),
+        ("hdg", "hdg", 100.0, "f8"),
+    ),
+    ATTITUDE: (
+        ("roll", "roll", 1.0, "f8"),
+        ("pitch", "pitch", 1.0, "f8"),
+        ("yaw", "yaw", 1.0, "f8"),
+        ("rollspeed", "rollspeed", 1.0, "f8"),
+        ("pitchspeed", "pitchspeed", 1.0, "f8"),
+        ("yawspeed", "yawspeed", 1.0, "f8"),
+    ),
+    SYS_STATUS: (
+        ("voltage_battery", "voltage_battery", 1000.0, "f8"),
+        ("current_battery", "current_battery", 100.0, "f8"),
+        ("battery_remaining", "battery_remaining", 1.0, "f8"),
+        ("drop_rate_comm", "drop_rate_comm", 100.0, "f8"),
+    ),
+    EXTENDED_SYS_STATE: (
+        ("vtol_state", "vtol_state", 1, "i4"),
+        ("landed_state", "landed_state", 1, "i4"),
+    ),
+}
+
+
+class TelemetryBuffer:
+    """A fixed-size ring buffer of samples backed by a preallocated NumPy structured array.
+
+    Every sample has a `time` column holding a monotonic timestamp (`time.monotonic()`), which must
+    not decrease between appends. Appending writes into the preallocated columns in place, so no
+    arrays are allocated on the receive path.
+    """
+
+    def __init__(self, fields, capacity=TELEMETRY_HISTORY_SIZE):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.dtype = np.dtype([("time", "f8")] + [(name, dtype) for name, _, _, dtype in fields])
+        self._data = np.zeros(capacity, dtype=self.dtype)
+        self._times = self._data["time"]
+        # (column view, message attribute, scale) for each field, resolved once.
+        self._columns = tuple(
+            (self._data[name], attribute, scale) for name, attribute, scale, _ in self.fields
+        )
+        self._head = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, *values):
+        """Append a sample given its values in field order."""
+        head = self._head
+        self._times[head] = timestamp
+        for (column, _, _), value in zip(self._columns, values):
+            column[head] = value
+        self._advance()
+
+    def append_message(self, message, timestamp):
+        """Append a sample read directly from the attributes of a MAVLink message."""
+        head = self._head
+        self._times[head] = timestamp
+        for column, attribute, scale in self._columns:
+            column[head] = getattr(message, attribute) / scale
+        self._advance()
+
+    def _advance(self):
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    @property
+    def _start(self):
+        """Physical index of the oldest sample."""
+        return self._head if self._count == self.capacity else 0
+
+    def _search(self, timestamp, side):
+        """Binary search for `timestamp`, returning a logical index (0 is the oldest sample)."""
+        start = self._start
+        if start == 0:
+            return int(np.searchsorted(self._times[: self._count], timestamp, side=side))
+        older = self._times[start:]
+        index = int(np.searchsorted(older, timestamp, side=side))
+        if index < len(older):
+            return index
+        return len(older) + int(np.searchsorted(self._times[:start], timestamp, side=side))
+
+    def _take(self, lo, hi):
+        indices = (np.arange(lo, hi) + self._start) % self.capacity
+        return self._data[indices]
+
+    def latest(self):
+        """Return a copy of the most recent sample, or None if the buffer is empty."""
+        if self._count == 0:
+            return None
+        return self._data[(self._head - 1) % self.capacity].copy()
+
+    def window(self, t0, t1):
+        """Return the samples with `t0 <= time <= t1`, oldest first."""
+        lo = self._search(t0, "left")
+        hi = self._search(t1, "right")
+        return self._take(lo, max(lo, hi))
+
+    def interpolate(self, timestamp):
+        """Return a sample linearly interpolated at `timestamp`.
+
+        Floating point columns are interpolated between the samples either side of `timestamp`;
+        integer columns (states, enums) take the value of the earlier sample. Timestamps outside the
+        stored history are clamped to the oldest or newest sample. Returns None if the buffer is
+        empty.
+        """
+        if self._count == 0:
+            return None
+        index = self._search(timestamp, "right")
+        if index == 0:
+            return self._take(0, 1)[0]
+        if index == self._count:
+            return self.latest()
+        before, after = self._take(index - 1, index + 1)
+        fraction = (timestamp - before["time"]) / (after["time"] - before["time"])
+        sample = before.copy()
+        sample["time"] = timestamp
+        for name, _, _, dtype in self.fields:
+            if np.dtype(dtype).kind == "f":
+                sample[name] = before[name] + fraction * (after[name] - before[name])
+        return sample
+
+    def slope(self, field, duration, now=None):
+        """Return the least-squares rate of change of `field` per second over the last `duration`
+        seconds, or None if there are fewer than two samples in that window."""
+        if now is None:
+            now = time.monotonic()
+        samples = self.window(now - duration, now)
+        if len(samples) < 2:
+            return None
+        times = samples["time"] - samples["time"][0]
+        values = samples[field].astype("f8")
+        times_centered = times - times.mean()
+        denominator = np.dot(times_centered, times_centered)
+        if denominator == 0:
+            return None
+        return float(np.dot(times_centered, values - values.mean()) / denominator)
+
+
+class TelemetryStore:
+    """History of the telemetry received from a MAVLink system, one `TelemetryBuffer` per message
+    type in `TELEMETRY_FIELDS`."""
+
+    def __init__(self, capacity=TELEMETRY_HISTORY_SIZE):
+        self.buffers = {
+            message_type: TelemetryBuffer(fields, capacity)
+            for message_type, fields in TELEMETRY_FIELDS.items()
+        }
+
+    def __getitem__(self, message_type):
+        return self.buffers[message_type]
+
+    def record(self, message, timestamp=None):
+        """Store a message. Messages of types we don't keep history for are ignored."""
+        buffer = self.buffers.get(message.get_type())
+        if buffer is None:
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        buffer.append_message(message, timestamp)
+
+    def latest(self, message_type, max_age=None):
+        """Return the latest sample of `message_type`, or None if there is none or it is older than
+        `max_age` seconds."""
+        sample = self.buffers[message_type].latest()
+        if sample is None:
+            return None
+        if max_age is not None and time.monotonic() - sample["time"] > max_age:
+            return None
+        return sample
+
+    def descent_rate(self, duration, now=None):
+        """Metres per second the vehicle has been descending over the last `duration` seconds
+        (negative when climbing)."""
+        slope = self.buffers[GLOBAL_POSITION_INT].slope("relative_alt", duration, now)
+        return None if slope is None else -slope
+
+    def battery_slope(self, duration, now=None):
+        """Percent of battery per second gained (negative when draining) over the last `duration`
+        seconds."""
+        return self.buffers[SYS_STATUS].slope("battery_remaining", duration, now)
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.commands import CommandManager, CommandTimeoutError, wait_armed, wait_landed
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+
+mavlink = mavutil.mavlink
+
+
+class FakeVehicle(threading.Thread):
+    """Answers COMMAND_LONGs with a COMMAND_ACK, ignoring the first `drop` attempts of each
+    command."""
+
+    def __init__(self, conn_string, drop=0, respond=True):
+        super().__init__(daemon=True)
+        self.master = mavutil.mavlink_connection(
+            conn_string, source_system=1, source_component=1
+        )
+        self.drop = drop
+        self.respond = respond
+        self.received = []
+        self.running = True
+
+    def run(self):
+        while self.running:
+            msg = self.master.recv_match(type=["COMMAND_LONG"], blocking=True, timeout=0.05)
+            if msg is None:
+                continue
+            self.received.append(msg)
+            if self.respond and msg.confirmation >= self.drop:
+                self.master.mav.command_ack_send(msg.command, mavlink.MAV_RESULT_ACCEPTED)
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.master.close()
+
+
+class TestCommandManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper("udpin:127.0.0.1:14561")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+
+    async def asyncTearDown(self):
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    async def start_vehicle(self, **kwargs):
+        self.vehicle = FakeVehicle("udpout:127.0.0.1:14561", **kwargs)
+        self.vehicle.master.mav.heartbeat_send(
+            mavlink.MAV_TYPE_HEXAROTOR, mavlink.MAV_AUTOPILOT_PX4, 0, 0, 0
+        )
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+        self.vehicle.start()
+
+    async def test_command_resolved_by_ack(self):
+        await self.start_vehicle()
+        ack = await asyncio.wait_for(
+            self.autopilot_conn.commands.command_long(mavlink.MAV_CMD_NAV_TAKEOFF), timeout=2
+        )
+        self.assertEqual(ack.command, mavlink.MAV_CMD_NAV_TAKEOFF)
+        self.assertEqual(ack.result, mavlink.MAV_RESULT_ACCEPTED)
+        stats = self.autopilot_conn.commands.stats[mavlink.MAV_CMD_NAV_TAKEOFF]
+        self.assertEqual(stats.acked, 1)
+        self.assertIsNotNone(stats.last_latency)
+        self.assertEqual(self.autopilot_conn.link_quality.rtt_samples, 1)
+        self.assertEqual(self.autopilot_conn.commands.in_flight, 0)
+
+    async def test_many_commands_in_flight(self):
+        await self.start_vehicle()
+        commands = (
+            mavlink.MAV_CMD_NAV_TAKEOFF,
+            mavlink.MAV_CMD_MISSION_START,
+            mavlink.MAV_CMD_NAV_LAND,
+        )
+        futures = [self.autopilot_conn.commands.send(command) for command in commands]
+        self.assertEqual(self.autopilot_conn.commands.in_flight, 3)
+        acks = await asyncio.wait_for(asyncio.gather(*futures), timeout=2)
+        self.assertEqual([ack.command for ack in acks], list(commands))
+
+    async def test_resends_with_incremented_confirmation(self):
+        await self.start_vehicle(drop=2)
+        commands = CommandManager(self.autopilot_conn, timeout=0.1, retries=3)
+        ack = await asyncio.wait_for(
+            commands.command_long(mavlink.MAV_CMD_MISSION_START), timeout=2
+        )
+        self.assertEqual(ack.result, mavlink.MAV_RESULT_ACCEPTED)
+        self.assertEqual([msg.confirmation for msg in self.vehicle.received], [0, 1, 2])
+        self.assertEqual(commands.stats[mavlink.MAV_CMD_MISSION_START].retries, 2)
+
+    async def test_times_out_after_retries(self):
+        await self.start_vehicle(respond=False)
+        commands = CommandManager(self.autopilot_conn, timeout=0.05, retries=1)
+        with self.assertRaises(CommandTimeoutError):
+            await asyncio.wait_for(commands.command_long(mavlink.MAV_CMD_NAV_LAND), timeout=2)
+        self.assertEqual(commands.stats[mavlink.MAV_CMD_NAV_LAND].timeouts, 1)
+        self.assertEqual(commands.in_flight, 0)
+
+    async def test_waits_for_vehicle_state(self):
+        await self.start_vehicle()
+        master = self.vehicle.master
+        waiting = asyncio.create_task(wait_armed(self.autopilot_conn, True, timeout=2))
+        await asyncio.sleep(0.05)
+        master.mav.heartbeat_send(
+            mavlink.MAV_TYPE_HEXAROTOR,
+            mavlink.MAV_AUTOPILOT_PX4,
+            mavlink.MAV_MODE_FLAG_SAFETY_ARMED,
+            0,
+            0,
+        )
+        await waiting
+
+        waiting = asyncio.create_task(wait_landed(self.autopilot_conn, timeout=2))
+        await asyncio.sleep(0.05)
+        master.mav.extended_sys_state_send(0, mavlink.MAV_LANDED_STATE_LANDING)
+        master.mav.extended_sys_state_send(0, mavlink.MAV_LANDED_STATE_ON_GROUND)
+        await waiting
+        # The wait unsubscribed.
+        handlers = [stats.name for stats in self.autopilot_conn.dispatcher.handler_stats()]
+        self.assertFalse(any("wait_for_message" in name for name in handlers))
+
+    async def test_wait_times_out(self):
+        await self.start_vehicle()
+        with self.assertRaises(TimeoutError):
+            await wait_landed(self.autopilot_conn, timeout=0.05)
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection_manager import ConnectionManager
+from navigation.simulator import SimulatedAutopilot
+
+mavlink = mavutil.mavlink
+
+BASE_PORT = 14564
+VEHICLE_COUNT = 3
+
+
+class TestConnectionManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.lost = []
+        self.manager = ConnectionManager(on_vehicle_lost=self.lost.append)
+        self.vehicles = []
+        for i in range(VEHICLE_COUNT):
+            port = BASE_PORT + i
+            vehicle = SimulatedAutopilot(
+                f"udpout:127.0.0.1:{port}", system_id=i + 1, telemetry_rate_hz=20
+            )
+            self.vehicles.append(vehicle)
+            add = asyncio.create_task(self.manager.add_vehicle(f"udpin:127.0.0.1:{port}"))
+            await asyncio.sleep(0)
+            vehicle.start()
+            await asyncio.wait_for(add, timeout=5)
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        for vehicle in self.vehicles:
+            vehicle.stop()
+
+    async def test_vehicles_keyed_by_system_id(self):
+        self.assertEqual(sorted(self.manager.vehicles), [1, 2, 3])
+        for system_id, vehicle in self.manager.vehicles.items():
+            self.assertEqual(vehicle.wrapper.conn.target_system, system_id)
+
+    async def test_shared_dispatcher_sees_every_vehicle(self):
+        sources = set()
+        self.manager.dispatcher.subscribe(
+            mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT,
+            lambda message: sources.add(message.get_srcSystem()),
+        )
+        for _ in range(100):
+            if len(sources) == VEHICLE_COUNT:
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(sources, {1, 2, 3})
+        # The vehicle's own handlers still ran.
+        self.assertIsNotNone(self.manager[2].telemetry.latest("GLOBAL_POSITION_INT"))
+
+    async def test_broadcast(self):
+        acks = await asyncio.wait_for(
+            self.manager.broadcast(mavlink.MAV_CMD_NAV_TAKEOFF, param7=10), timeout=5
+        )
+        self.assertEqual(sorted(acks), [1, 2, 3])
+        for ack in acks.values():
+            self.assertEqual(ack.result, mavlink.MAV_RESULT_ACCEPTED)
+        for vehicle in self.vehicles:
+            self.assertEqual(vehicle.commands[-1].command, mavlink.MAV_CMD_NAV_TAKEOFF)
+
+    async def test_lost_vehicle_does_not_affect_others(self):
+        vehicle = self.manager[2]
+        # A failing task marks only its own vehicle as lost.
+        self.manager._on_task_done(vehicle, _failed_task(ConnectionError("link down")))
+        self.assertTrue(vehicle.lost)
+        self.assertEqual(self.lost, [2])
+        acks = await asyncio.wait_for(self.manager.broadcast(mavlink.MAV_CMD_NAV_LAND), timeout=5)
+        self.assertEqual(sorted(acks), [1, 3])
+
+
+def _failed_task(error):
+    future = asyncio.get_running_loop().create_future()
+    future.set_exception(error)
+    return future
@@ -0,0 +1,83 @@
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.dispatch import MessageDispatcher
+
+mavlink = mavutil.mavlink
+
+
+def heartbeat_msg():
+    return mavlink.MAVLink_heartbeat_message(
+        mavlink.MAV_TYPE_HEXAROTOR, mavlink.MAV_AUTOPILOT_PX4, 0, 0, 0, 3
+    )
+
+
+def sys_status_msg():
+    return mavlink.MAVLink_sys_status_message(0, 0, 0, 0, 12000, 0, 80, 0, 0, 0, 0, 0, 0)
+
+
+class TestMessageDispatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_dispatches_by_message_id(self):
+        dispatcher = MessageDispatcher()
+        heartbeats = []
+        statuses = []
+        dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, heartbeats.append)
+        dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_SYS_STATUS, statuses.append)
+
+        await dispatcher.dispatch(heartbeat_msg())
+        await dispatcher.dispatch(sys_status_msg())
+
+        self.assertEqual(len(heartbeats), 1)
+        self.assertEqual(len(statuses), 1)
+        self.assertEqual(statuses[0].battery_remaining, 80)
+
+    async def test_async_handlers_are_awaited(self):
+        dispatcher = MessageDispatcher()
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, handler)
+        await dispatcher.dispatch(heartbeat_msg())
+        self.assertEqual(len(received), 1)
+
+    async def test_unsubscribed_messages_are_dropped(self):
+        dispatcher = MessageDispatcher()
+        received = []
+        dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, received.append)
+        dispatcher.unsubscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, received.append)
+
+        await dispatcher.dispatch(heartbeat_msg())
+        await dispatcher.dispatch(sys_status_msg())
+
+        self.assertEqual(received, [])
+        self.assertEqual(dispatcher.dropped, 2)
+        self.assertFalse(dispatcher.is_subscribed(mavlink.MAVLINK_MSG_ID_HEARTBEAT))
+
+    async def test_handler_errors_do_not_stop_dispatch(self):
+        dispatcher = MessageDispatcher()
+        received = []
+
+        def failing_handler(message):
+            raise ValueError("bad handler")
+
+        failing = dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, failing_handler)
+        dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, received.append)
+        with self.assertLogs(level="ERROR"):
+            await dispatcher.dispatch(heartbeat_msg())
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(failing.stats.errors, 1)
+
+    async def test_slow_handlers_are_counted(self):
+        dispatcher = MessageDispatcher(slow_handler_threshold=0)
+        subscription = dispatcher.subscribe(mavlink.MAVLINK_MSG_ID_HEARTBEAT, lambda msg: None)
+
+        with self.assertLogs(level="WARNING"):
+            await dispatcher.dispatch(heartbeat_msg())
+
+        self.assertEqual(subscription.stats.calls, 1)
+        self.assertEqual(subscription.stats.slow_calls, 1)
+        self.assertIn(subscription.stats, dispatcher.handler_stats())
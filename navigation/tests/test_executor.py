@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.executor import (
+    COMMAND_DONE,
+    COMMAND_FAILED,
+    COMMAND_PREEMPTED,
+    COMMAND_SUPERSEDED,
+    PRIORITY_MISSION,
+    PRIORITY_NAVIGATION,
+    PRIORITY_TERMINATION,
+    CommandExecutor,
+    CommandParseError,
+    parse_command,
+)
+from navigation.simulator import SimulatedAutopilot
+
+mavlink = mavutil.mavlink
+
+PORT = 14573
+
+
+class FakeCommands:
+    """Records commands and acknowledges each once `release` is set."""
+
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def command_long(self, command, **params):
+        self.sent.append((command, params))
+        await self.release.wait()
+        return command
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commands = FakeCommands()
+
+
+class TestParseCommand(unittest.TestCase):
+    def test_parse(self):
+        command = parse_command(b"goto 49.8 -97.1 20")
+        self.assertEqual(command.name, "GOTO")
+        self.assertEqual(command.args, (49.8, -97.1, 20.0))
+        self.assertEqual(command.priority, PRIORITY_NAVIGATION)
+        self.assertEqual(command.coalesce_key, "goto")
+
+        command = parse_command(b"FT WAYPOINT")
+        self.assertEqual(command.priority, PRIORITY_TERMINATION)
+        self.assertEqual(command.args, ("WAYPOINT",))
+        self.assertEqual(parse_command("MISSION_PLAN a b.csv").args, ("a b.csv",))
+        self.assertEqual(parse_command("MISSION_PLAN a.csv").priority, PRIORITY_MISSION)
+
+    def test_invalid(self):
+        for request in (b"", b"JUMP", b"GOTO 1 2", b"GOTO 1 2 x", b"GOTO 1 2 nan", b"LAND now"):
+            with self.subTest(request=request):
+                with self.assertRaises(CommandParseError):
+                    parse_command(request)
+
+
+class TestCommandExecutor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.conn = FakeConnection()
+        self.terminated = []
+        self.executor = CommandExecutor(self.conn, self.terminate)
+        self.task = None
+
+    async def asyncTearDown(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def terminate(self, conn, reason):
+        self.terminated.append((threading.current_thread(), reason))
+
+    def start(self):
+        self.task = asyncio.create_task(self.executor.run())
+
+    async def test_runs_by_priority(self):
+        navigation = self.executor.submit(parse_command("LAND"))
+        termination = self.executor.submit(parse_command("FT WAYPOINT"))
+        self.start()
+        self.assertEqual(await asyncio.wait_for(termination, 1), COMMAND_DONE)
+        # Flight termination drops the queued navigation command.
+        self.assertEqual(await navigation, COMMAND_PREEMPTED)
+        self.assertEqual(self.conn.commands.sent, [])
+        self.assertEqual(len(self.terminated), 1)
+        thread, reason = self.terminated[0]
+        # On the event loop, not handing the connection to another thread.
+        self.assertIs(thread, threading.current_thread())
+        self.assertEqual(reason, "WAYPOINT")
+
+    async def test_termination_preempts_running_command(self):
+        self.conn.commands.release.clear()
+        self.start()
+        goto = self.executor.submit(parse_command("GOTO 49.8 -97.1 20"))
+        queued = self.executor.submit(parse_command("TAKEOFF"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.executor.running.name, "GOTO")
+        termination = self.executor.submit(parse_command("FT"))
+        self.assertEqual(await asyncio.wait_for(goto, 1), COMMAND_PREEMPTED)
+        self.assertEqual(await queued, COMMAND_PREEMPTED)
+        self.assertEqual(await asyncio.wait_for(termination, 1), COMMAND_DONE)
+        stats = self.executor.stats[PRIORITY_NAVIGATION]
+        self.assertEqual(stats.preempted, 2)
+        self.assertEqual(stats.depth, 0)
+
+    async def test_coalesces(self):
+        first = self.executor.submit(parse_command("GOTO 1 1 10"))
+        self.executor.submit(parse_command("ARM"))
+        last = self.executor.submit(parse_command("GOTO 2 2 10"))
+        self.assertEqual(self.executor.depth, 2)
+        self.assertEqual(await first, COMMAND_SUPERSEDED)
+        self.start()
+        self.assertEqual(await asyncio.wait_for(last, 1), COMMAND_DONE)
+        commands = [command for command, _ in self.conn.commands.sent]
+        self.assertEqual(
+            commands, [mavlink.MAV_CMD_COMPONENT_ARM_DISARM, mavlink.MAV_CMD_DO_REPOSITION]
+        )
+        self.assertEqual(self.conn.commands.sent[1][1]["param5"], 2.0)
+        stats = self.executor.metrics()[PRIORITY_NAVIGATION]
+        self.assertEqual(stats["coalesced"], 1)
+        self.assertEqual(stats["executed"], 2)
+        self.assertEqual(stats["max_depth"], 2)
+        self.assertEqual(stats["depth"], 0)
+        self.assertGreaterEqual(stats["max_wait"], 0)
+
+    async def test_failure(self):
+        self.start()
+        command = parse_command("MISSION_PLAN /nonexistent/mission.csv")
+        self.assertEqual(await asyncio.wait_for(self.executor.submit(command), 1), COMMAND_FAILED)
+        self.assertEqual(self.executor.stats[PRIORITY_MISSION].failed, 1)
+        # The executor keeps going.
+        land = self.executor.submit(parse_command("LAND"))
+        self.assertEqual(await asyncio.wait_for(land, 1), COMMAND_DONE)
+
+    async def test_submit_threadsafe(self):
+        self.start()
+        loop = asyncio.get_running_loop()
+        thread = threading.Thread(
+            target=self.executor.submit_threadsafe, args=(loop, parse_command("RTL"))
+        )
+        thread.start()
+        thread.join()
+        for _ in range(100):
+            if self.conn.commands.sent:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.conn.commands.sent[0][0], mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH)
+
+
+class TestCommandExecutorWithVehicle(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}")
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+        self.executor = CommandExecutor(self.autopilot_conn, None)
+        self.task = asyncio.create_task(self.executor.run())
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    async def test_denied_command_fails(self):
+        self.vehicle.command_results[mavlink.MAV_CMD_COMPONENT_ARM_DISARM] = (
+            mavlink.MAV_RESULT_DENIED
+        )
+        self.vehicle.armed = False
+        arm = parse_command("ARM")
+        self.assertEqual(await asyncio.wait_for(self.executor.submit(arm), 5), COMMAND_FAILED)
+        self.assertEqual(arm.detail, "MAV_RESULT_DENIED")
+        self.assertEqual(self.executor.stats[PRIORITY_NAVIGATION].failed, 1)
+        self.assertFalse(self.vehicle.armed)
+
+        goto = parse_command("GOTO 49.8 -97.1 20")
+        self.assertEqual(await asyncio.wait_for(self.executor.submit(goto), 5), COMMAND_DONE)
+        self.assertEqual(goto.detail.result, mavlink.MAV_RESULT_ACCEPTED)
+        self.assertAlmostEqual(self.vehicle.commands[-1].param5, 49.8, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import math
+import unittest
+
+import numpy as np
+
+from navigation import geodesy
+
+# Flinders Peak to Buninyong, the classic test case for Vincenty's formulae.
+FLINDERS_PEAK = (-(37 + 57 / 60 + 3.72030 / 3600), 144 + 25 / 60 + 29.52440 / 3600)
+BUNINYONG = (-(37 + 39 / 60 + 10.15610 / 3600), 143 + 55 / 60 + 35.38390 / 3600)
+FLINDERS_PEAK_TO_BUNINYONG = 54972.271
+
+HOME = (43.4723, -80.5449, 330.0)
+
+
+class TestGeodesy(unittest.TestCase):
+    def test_degE7_input(self):
+        lat = np.array([434723000, -337000000], dtype=np.int32)
+        np.testing.assert_allclose(geodesy.from_degE7(lat), [43.4723, -33.7])
+        np.testing.assert_array_equal(geodesy.to_degE7(geodesy.from_degE7(lat)), lat)
+        # The unit doesn't depend on the integer type.
+        self.assertAlmostEqual(float(geodesy.from_degE7(498135000)), 49.8135)
+        np.testing.assert_allclose(geodesy.from_degE7(lat.astype(np.int64)), [43.4723, -33.7])
+
+    def test_integer_degrees(self):
+        # Integers are whole degrees, whatever their type.
+        np.testing.assert_array_equal(geodesy.to_degrees([49, -97]), [49.0, -97.0])
+        np.testing.assert_array_equal(
+            geodesy.to_degrees(np.array([49, -97], dtype=np.int32)), [49.0, -97.0]
+        )
+        one_degree = geodesy.EARTH_RADIUS * math.pi / 180
+        self.assertAlmostEqual(geodesy.haversine(49, -97, 50, -97), one_degree)
+        np.testing.assert_array_equal(
+            geodesy.valid_coordinates([49, 91], [-97, -97]), [True, False]
+        )
+
+    def test_valid_coordinates(self):
+        lat = np.array([0.0, 90.0, -90.5, 45.0, np.nan])
+        lon = np.array([180.0, -180.0, 0.0, 180.1, 0.0])
+        np.testing.assert_array_equal(
+            geodesy.valid_coordinates(lat, lon), [True, True, False, False, False]
+        )
+
+    def test_haversine(self):
+        one_degree = geodesy.EARTH_RADIUS * math.pi / 180
+        distances = geodesy.haversine(0.0, 0.0, [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])
+        np.testing.assert_allclose(distances, [0.0, one_degree, one_degree])
+
+    def test_vincenty(self):
+        distance = geodesy.vincenty(*FLINDERS_PEAK, *BUNINYONG)
+        self.assertAlmostEqual(float(distance), FLINDERS_PEAK_TO_BUNINYONG, delta=0.001)
+        # Within half a percent of the spherical distance.
+        self.assertAlmostEqual(
+            float(geodesy.haversine(*FLINDERS_PEAK, *BUNINYONG)) / float(distance), 1, delta=0.005
+        )
+        distances = geodesy.vincenty(0.0, 0.0, [0.0, 0.0, 0.5], [0.0, 1.0, 179.7])
+        self.assertEqual(distances[0], 0.0)
+        # One degree of longitude along the equator.
+        self.assertAlmostEqual(distances[1], geodesy.WGS84_A * math.pi / 180, delta=1e-6)
+        # Nearly antipodal points don't converge.
+        self.assertTrue(np.isnan(distances[2]))
+
+    def test_bearing(self):
+        bearings = geodesy.bearing(0.0, 0.0, [1.0, 0.0, -1.0, 0.0], [0.0, 1.0, 0.0, -1.0])
+        np.testing.assert_allclose(bearings, [0.0, 90.0, 180.0, 270.0], atol=1e-9)
+        # The great-circle bearing is within a few tenths of a degree of the geodesic one.
+        self.assertAlmostEqual(
+            float(geodesy.bearing(*FLINDERS_PEAK, *BUNINYONG)), 306.868, delta=0.2
+        )
+
+    def test_enu_and_ned(self):
+        lat0, lon0, alt0 = HOME
+        north_lat = lat0 + 0.001
+        east, north, up = geodesy.geodetic_to_enu(north_lat, lon0, alt0, lat0, lon0, alt0)
+        self.assertAlmostEqual(float(east), 0.0, delta=1e-6)
+        self.assertAlmostEqual(
+            float(north), float(geodesy.vincenty(lat0, lon0, north_lat, lon0)), 1
+        )
+        self.assertLess(float(up), 0)
+
+        rng = np.random.default_rng(0)
+        lat = lat0 + rng.uniform(-0.05, 0.05, 1000)
+        lon = lon0 + rng.uniform(-0.05, 0.05, 1000)
+        alt = alt0 + rng.uniform(-50, 500, 1000)
+        north, east, down = geodesy.geodetic_to_ned(lat, lon, alt, lat0, lon0, alt0)
+        lat2, lon2, alt2 = geodesy.ned_to_geodetic(north, east, down, lat0, lon0, alt0)
+        np.testing.assert_allclose(lat2, lat, atol=1e-9)
+        np.testing.assert_allclose(lon2, lon, atol=1e-9)
+        np.testing.assert_allclose(alt2, alt, atol=1e-4)
+        # The horizontal distance in the local frame matches the geodesic one to within a metre.
+        np.testing.assert_allclose(
+            np.hypot(north, east), geodesy.vincenty(lat0, lon0, lat, lon), atol=1.0
+        )
+
+    def test_local_frame(self):
+        frame = geodesy.LocalFrame(*HOME)
+        rng = np.random.default_rng(1)
+        lat = HOME[0] + rng.uniform(-0.1, 0.1, 20)
+        lon = HOME[1] + rng.uniform(-0.1, 0.1, 20)
+        east, north, up = frame.enu(lat, lon, 400.0)
+        for i in range(len(lat)):
+            np.testing.assert_allclose(
+                frame.enu_point(lat[i], lon[i], 400.0), (east[i], north[i], up[i]), atol=1e-6
+            )
+        lat2, lon2, alt2 = frame.geodetic(east, north, up)
+        np.testing.assert_allclose(lat2, lat, atol=1e-9)
+        np.testing.assert_allclose(alt2, 400.0, atol=1e-4)
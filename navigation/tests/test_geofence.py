@@ -0,0 +1,203 @@
+import asyncio
+import json
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from pymavlink import mavutil
+
+from navigation.dispatch import MessageDispatcher
+from navigation.geodesy import LocalFrame
+from navigation.geofence import (
+    CircleZone,
+    Geofence,
+    GeofenceBreachError,
+    GeofenceError,
+    GeofenceMonitor,
+    PolygonZone,
+    load_geofence,
+)
+
+mavlink = mavutil.mavlink
+
+HOME = (43.4723, -80.5449)
+SQUARE = [(-100, -100), (100, -100), (100, 100), (-100, 100)]
+
+
+def star_polygon(vertex_count, radius, seed=0):
+    rng = np.random.default_rng(seed)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertex_count))
+    radii = radius * (1 + 0.3 * rng.uniform(-1, 1, vertex_count))
+    return np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.dispatcher = MessageDispatcher()
+
+
+def position(frame, east, north, relative_alt=50.0):
+    lat, lon, _ = frame.geodetic(east, north)
+    return mavlink.MAVLink_global_position_int_message(
+        0,
+        int(round(float(lat) * 1e7)),
+        int(round(float(lon) * 1e7)),
+        0,
+        int(relative_alt * 1000),
+        0,
+        0,
+        0,
+        0,
+    )
+
+
+class TestZones(unittest.TestCase):
+    def test_square(self):
+        zone = PolygonZone(SQUARE + [SQUARE[0]])
+        self.assertEqual(len(zone), 4)
+        self.assertEqual(zone.check_horizontal(0, 0), (True, 100))
+        self.assertEqual(zone.check_horizontal(90, 50), (True, 10))
+        self.assertEqual(zone.check_horizontal(-130, 0), (False, 30))
+        inside, distance = zone.check_horizontal(130, 140)
+        self.assertFalse(inside)
+        self.assertAlmostEqual(distance, 50)
+        # Far outside the indexed area.
+        self.assertEqual(zone.check_horizontal(0, 5000), (False, 4900))
+
+    def test_index_matches_exhaustive_check(self):
+        zone = PolygonZone(star_polygon(3000, 2000))
+        rng = np.random.default_rng(1)
+        for east, north in rng.uniform(-3500, 3500, (500, 2)).tolist():
+            inside, distance = zone.check_horizontal(east, north)
+            expected_inside, expected_distance = zone.check_horizontal_exhaustive(east, north)
+            self.assertEqual(inside, expected_inside)
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_cylinder(self):
+        zone = CircleZone((0, 0), 100, floor=10, ceiling=120)
+        self.assertEqual(zone.check(0, 0, 50), (True, 40))
+        self.assertEqual(zone.check(90, 0, 50), (True, 10))
+        self.assertEqual(zone.check(0, 0, 125), (False, 5))
+        self.assertEqual(zone.check(130, 0, 50), (False, 30))
+        self.assertEqual(zone.check(130, 0, 160), (False, 50))
+
+    def test_invalid_zones(self):
+        with self.assertRaises(GeofenceError):
+            PolygonZone([(0, 0), (1, 1)])
+        with self.assertRaises(GeofenceError):
+            CircleZone((0, 0), 0)
+        with self.assertRaises(GeofenceError):
+            CircleZone((0, 0), 10, floor=50, ceiling=20)
+
+
+class TestGeofence(unittest.TestCase):
+    def setUp(self):
+        self.fence = Geofence(
+            LocalFrame(*HOME),
+            [
+                PolygonZone(SQUARE, name="field"),
+                CircleZone((50, 50), 20, inclusion=False, name="tower"),
+            ],
+        )
+
+    def test_inclusion_and_exclusion(self):
+        result = self.fence.check_local(-50, -50)
+        self.assertFalse(result.breached)
+        self.assertEqual(result.distance, 50)
+        self.assertEqual(result.zone.name, "field")
+
+        result = self.fence.check_local(50, 40)
+        self.assertTrue(result.breached)
+        self.assertEqual(result.zone.name, "tower")
+        self.assertEqual(result.distance, 10)
+
+        result = self.fence.check_local(-150, 0)
+        self.assertTrue(result.breached)
+        self.assertEqual(result.zone.name, "field")
+
+    def test_geodetic_check(self):
+        frame = self.fence.frame
+        lat, lon, _ = frame.geodetic(-50, -50)
+        result = self.fence.check(float(lat), float(lon))
+        self.assertFalse(result.breached)
+        self.assertAlmostEqual(result.distance, 50, places=3)
+
+    def test_integer_origin(self):
+        fence = Geofence(LocalFrame(49, -97), [PolygonZone(SQUARE)])
+        self.assertEqual((fence.frame.lat0, fence.frame.lon0), (49.0, -97.0))
+        result = fence.check(49.0, -97.0)
+        self.assertFalse(result.breached)
+        self.assertAlmostEqual(result.distance, 100, places=3)
+
+    def test_load_plan(self):
+        frame = LocalFrame(*HOME)
+        lat, lon, _ = frame.geodetic(*np.array(SQUARE).T)
+        plan = {
+            "fileType": "Plan",
+            "geoFence": {
+                "circles": [
+                    {
+                        "circle": {"center": list(HOME), "radius": 20},
+                        "inclusion": False,
+                        "version": 1,
+                    }
+                ],
+                "polygons": [
+                    {
+                        "inclusion": True,
+                        "polygon": np.column_stack([lat, lon]).tolist(),
+                        "ceiling": 120,
+                        "version": 1,
+                    }
+                ],
+                "version": 2,
+            },
+            "mission": {"plannedHomePosition": [*HOME, 330]},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fence.plan")
+            with open(path, "w") as plan_file:
+                json.dump(plan, plan_file)
+            fence = load_geofence(path)
+
+            with open(path, "w") as plan_file:
+                plan_file.write("{")
+            with self.assertRaises(GeofenceError):
+                load_geofence(path)
+
+        self.assertEqual(fence.frame.lat0, HOME[0])
+        self.assertEqual([zone.name for zone in fence.zones], ["polygon 0", "circle 0"])
+        self.assertTrue(fence.check(*HOME, 50).breached)
+        result = fence.check_local(-50, -50, 50)
+        self.assertFalse(result.breached)
+        self.assertAlmostEqual(result.distance, 50, places=3)
+        self.assertTrue(fence.check_local(-50, -50, 130).breached)
+
+
+class TestGeofenceMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_breach_raises(self):
+        conn = FakeConnection()
+        frame = LocalFrame(*HOME)
+        breaches = []
+        monitor = GeofenceMonitor(
+            conn, Geofence(frame, [PolygonZone(SQUARE)]), on_breach=breaches.append
+        )
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0)
+
+        await conn.dispatcher.dispatch(position(frame, 0, 0))
+        self.assertFalse(monitor.result.breached)
+        self.assertAlmostEqual(monitor.result.distance, 100, delta=0.01)
+        self.assertFalse(task.done())
+
+        await conn.dispatcher.dispatch(position(frame, 120, 0))
+        await conn.dispatcher.dispatch(position(frame, 130, 0))
+        with self.assertRaises(GeofenceBreachError) as context:
+            await asyncio.wait_for(task, 1)
+        self.assertTrue(context.exception.result.breached)
+        self.assertEqual(len(breaches), 1)
+        self.assertEqual(monitor.checks, 3)
+        self.assertTrue(math.isclose(breaches[0].distance, 20, abs_tol=0.01))
+        self.assertFalse(conn.dispatcher.is_subscribed(mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT))
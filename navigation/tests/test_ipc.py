@@ -0,0 +1,128 @@
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import unittest
+
+from navigation.ipc import FrameError, IpcServer, encode_frame, read_frame, recv_frame
+
+
+class TestFraming(unittest.TestCase):
+    def test_recv_frame(self):
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(encode_frame(b"GOTO 1 2 3") + encode_frame(b""))
+            left.close()
+            self.assertEqual(recv_frame(right), b"GOTO 1 2 3")
+            self.assertEqual(recv_frame(right), b"")
+            self.assertIsNone(recv_frame(right))
+
+    def test_truncated_frame(self):
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(encode_frame(b"LAND")[:-1])
+            left.close()
+            with self.assertRaises(FrameError):
+                recv_frame(right)
+
+    def test_too_long(self):
+        with self.assertRaises(FrameError):
+            encode_frame(bytes(70000))
+
+
+class TestIpcServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "socket")
+        self.handled = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.server = IpcServer(self.path, self.handle, max_pending=4, max_frame_length=1024)
+        self.server_task = asyncio.create_task(self.server.run())
+        while not os.path.exists(self.path):
+            await asyncio.sleep(0.001)
+
+    async def asyncTearDown(self):
+        self.server_task.cancel()
+        await asyncio.gather(self.server_task, return_exceptions=True)
+        self.directory.cleanup()
+
+    async def handle(self, request):
+        self.handled.append(request)
+        if request == b"fail":
+            raise ValueError("no")
+        await self.release.wait()
+        return request.upper()
+
+    async def test_replies_in_order(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        for request in (b"one", b"fail", b"two"):
+            writer.write(encode_frame(request))
+        self.assertEqual(await read_frame(reader), b"ONE")
+        self.assertEqual(await read_frame(reader), b"ERR no")
+        self.assertEqual(await read_frame(reader), b"TWO")
+        self.assertEqual(self.server.stats()["errors"], 1)
+        writer.close()
+
+    async def test_frame_split_across_writes(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        for byte in encode_frame(b"split"):
+            writer.write(bytes([byte]))
+            await writer.drain()
+            await asyncio.sleep(0)
+        self.assertEqual(await read_frame(reader), b"SPLIT")
+        self.assertEqual(self.handled, [b"split"])
+        writer.close()
+
+    async def test_oversized_frame_disconnects(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(struct.pack(">I", 5000))
+        self.assertIsNone(await read_frame(reader))
+        self.assertEqual(self.server.protocol_errors, 1)
+        writer.close()
+
+    async def test_backpressure(self):
+        self.release.clear()
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        for i in range(20):
+            writer.write(encode_frame(b"request %d" % i))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.handled), 4)
+        self.release.set()
+        for i in range(20):
+            self.assertEqual(await read_frame(reader), b"REQUEST %d" % i)
+        writer.close()
+
+    async def test_many_clients(self):
+        async def client(i):
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            writer.write(encode_frame(b"client %d" % i))
+            reply = await read_frame(reader)
+            writer.close()
+            return reply
+
+        replies = await asyncio.gather(*(client(i) for i in range(100)))
+        self.assertEqual(replies, [b"CLIENT %d" % i for i in range(100)])
+        self.assertEqual(self.server.connections, 100)
+
+    async def test_client_going_away(self):
+        self.release.clear()
+        _, writer = await asyncio.open_unix_connection(self.path)
+        writer.write(encode_frame(b"abandoned"))
+        await asyncio.sleep(0.01)
+        writer.close()
+        await asyncio.sleep(0.01)
+        # The request is still handled; its reply then fails and the client is dropped.
+        self.assertEqual(self.server.clients, 1)
+        self.release.set()
+        for _ in range(100):
+            if self.server.clients == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.server.clients, 0)
+        self.assertEqual(self.handled, [b"abandoned"])
+
+
+if __name__ == "__main__":
+    unittest.main()
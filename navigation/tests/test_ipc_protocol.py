@@ -0,0 +1,151 @@
+import asyncio
+import math
+import os
+import tempfile
+import unittest
+
+from pymavlink import mavutil
+
+from navigation import ipc_protocol as protocol
+from navigation.executor import CommandExecutor
+from navigation.ipc import IpcServer
+from navigation.ipc_client import IpcClient, IpcError, get_client
+from navigation.telemetry import TelemetryStore
+from navigation.utils import ATTITUDE, GLOBAL_POSITION_INT
+
+mavlink = mavutil.mavlink
+
+
+class FakeCommands:
+    def __init__(self):
+        self.sent = []
+
+    async def command_long(self, command, *args, **params):
+        self.sent.append((command, args, params))
+        return command
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commands = FakeCommands()
+        self.telemetry = TelemetryStore(capacity=4)
+
+
+class TestProtocol(unittest.TestCase):
+    def test_command_round_trip(self):
+        frame = protocol.encode_command(7, "GOTO", (49.8, -97.1, 20))
+        message = protocol.decode(frame)
+        self.assertEqual(message.message_type, protocol.MSG_COMMAND)
+        self.assertEqual(message.request_id, 7)
+        self.assertEqual(protocol.command_args(message), ("GOTO", (49.8, -97.1, 20.0)))
+
+        message = protocol.decode(protocol.encode_command(8, "MISSION_PLAN", text="é.plan"))
+        self.assertEqual(protocol.command_args(message), ("MISSION_PLAN", ("é.plan",)))
+
+        frame = protocol.encode_command(9, "COMMAND_LONG", (1, 2), mav_command=400)
+        name, args = protocol.command_args(protocol.decode(frame))
+        self.assertEqual(name, "COMMAND_LONG")
+        self.assertEqual(args[:3], (400, 1.0, 2.0))
+        self.assertTrue(math.isnan(args[3]))
+
+    def test_telemetry_is_decoded_in_place(self):
+        frame = bytearray(protocol.encode_telemetry(3, ATTITUDE, 0.25, [0.1, 0.2, 0.3, 0, 0, 0]))
+        message = protocol.decode(frame)
+        self.assertEqual(message.fields, (protocol.TOPIC_CODES[ATTITUDE], 0.25))
+        values = message.values
+        self.assertEqual(values.tolist()[:3], [0.1, 0.2, 0.3])
+        # The values are a view of the frame, not a copy.
+        self.assertIs(values.obj, frame)
+
+    def test_invalid(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(b"\x01\x01")
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(protocol.HEADER.pack(2, protocol.MSG_REPLY, 0, 0))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(protocol.HEADER.pack(1, protocol.MSG_COMMAND, 0, 0) + b"\x08")
+        message = protocol.decode(protocol.encode_command(1, "GOTO", (49.8, math.nan, 20)))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.command_args(message)
+        self.assertFalse(protocol.is_binary(b"GOTO 1 2 3"))
+
+
+class TestIpcClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "socket")
+        self.conn = FakeConnection()
+        self.executor = CommandExecutor(self.conn, lambda conn, reason: None)
+        self.server = IpcServer(
+            self.path,
+            lambda request: protocol.handle_request(self.executor, self.conn, request),
+        )
+        await self.server.start()
+        self.tasks = [
+            asyncio.create_task(self.server.run()),
+            asyncio.create_task(self.executor.run()),
+        ]
+        self.client = IpcClient(self.path)
+
+    async def asyncTearDown(self):
+        self.client.close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.directory.cleanup()
+
+    async def test_command(self):
+        status = await asyncio.to_thread(self.client.command, "GOTO", 49.8, -97.1, 20)
+        self.assertEqual(status, protocol.STATUS_DONE)
+        command, _, params = self.conn.commands.sent[0]
+        self.assertEqual(command, mavlink.MAV_CMD_DO_REPOSITION)
+        self.assertEqual((params["param5"], params["param6"]), (49.8, -97.1))
+
+    async def test_rejected_command(self):
+        with self.assertRaises(IpcError) as raised:
+            await asyncio.to_thread(self.client.command, "GOTO", 49.8, math.inf, 20)
+        self.assertEqual(raised.exception.status, protocol.STATUS_BAD_REQUEST)
+
+    async def test_pipelined_requests(self):
+        def pipeline():
+            command = mavlink.MAV_CMD_USER_1
+            futures = [
+                self.client.submit_command("COMMAND_LONG", (i,), mav_command=command)
+                for i in range(200)
+            ]
+            return [future.result(5) for future in futures]
+
+        replies = await asyncio.to_thread(pipeline)
+        self.assertEqual(len({reply.request_id for reply in replies}), 200)
+        self.assertTrue(all(reply.status == protocol.STATUS_DONE for reply in replies))
+        # One connection for all of them.
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual([args[0] for _, args, _ in self.conn.commands.sent], list(range(200)))
+
+    async def test_telemetry(self):
+        self.assertIsNone(await asyncio.to_thread(self.client.telemetry, GLOBAL_POSITION_INT))
+        message = mavlink.MAVLink_global_position_int_message(
+            0, 498000000, -971000000, 250000, 20000, 0, 0, 0, 9000
+        )
+        self.conn.telemetry.record(message)
+        sample = await asyncio.to_thread(self.client.telemetry, GLOBAL_POSITION_INT)
+        self.assertAlmostEqual(sample["lat"], 49.8)
+        self.assertAlmostEqual(sample["relative_alt"], 20.0)
+        self.assertGreaterEqual(sample["age"], 0)
+
+    async def test_text_requests_still_work(self):
+        reply = await protocol.handle_request(self.executor, self.conn, b"LAND")
+        self.assertEqual(reply, b"OK done")
+
+    async def test_reconnects(self):
+        await asyncio.to_thread(self.client.command, "ARM")
+        self.client.close()
+        await asyncio.to_thread(self.client.command, "DISARM")
+        self.assertEqual(self.server.connections, 2)
+
+    def test_get_client_is_shared(self):
+        self.assertIs(get_client(self.path), get_client(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
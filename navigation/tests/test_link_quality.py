@@ -0,0 +1,83 @@
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.link_quality import LinkQualityMonitor, SenderStats
+
+mavlink = mavutil.mavlink
+
+
+def packed(message, seq, system_id=1):
+    mav = mavlink.MAVLink(None, srcSystem=system_id, srcComponent=1)
+    mav.seq = seq
+    message.pack(mav)
+    return message
+
+
+def heartbeat(seq, system_id=1):
+    return packed(mavlink.MAVLink_heartbeat_message(2, 12, 0, 0, 0, 3), seq, system_id)
+
+
+def attitude(seq):
+    return packed(mavlink.MAVLink_attitude_message(0, 0, 0, 0, 0, 0, 0), seq)
+
+
+class TestSenderStats(unittest.TestCase):
+    def test_loss_from_sequence_gaps(self):
+        sender = SenderStats(1, 1)
+        for seq in (0, 1, 2, 5, 6):
+            sender.record(seq)
+        self.assertEqual(sender.lost, 2)
+        self.assertAlmostEqual(sender.loss, 2 / 7)
+
+    def test_wraparound(self):
+        sender = SenderStats(1, 1)
+        for seq in (254, 255, 0, 2):
+            sender.record(seq)
+        self.assertEqual(sender.lost, 1)
+
+    def test_duplicate_is_not_loss(self):
+        sender = SenderStats(1, 1)
+        for seq in (10, 11, 11, 12):
+            sender.record(seq)
+        self.assertEqual(sender.lost, 0)
+        self.assertEqual(sender.restarts, 1)
+
+
+class TestLinkQualityMonitor(unittest.TestCase):
+    def setUp(self):
+        self.monitor = LinkQualityMonitor()
+
+    def test_senders_tracked_separately(self):
+        self.monitor.record(heartbeat(0, 1), now=0.0)
+        self.monitor.record(heartbeat(0, 2), now=0.1)
+        self.monitor.record(heartbeat(3, 1), now=0.2)
+        self.monitor.record(heartbeat(1, 2), now=0.3)
+        self.assertEqual(self.monitor.senders[(1, 1)].lost, 2)
+        self.assertEqual(self.monitor.senders[(2, 1)].lost, 0)
+
+    def test_rates_and_inter_arrival(self):
+        for i in range(100):
+            self.monitor.record(attitude(i), now=100 + i * 0.1)
+        snapshot = self.monitor.snapshot(now=110.0)
+        self.assertAlmostEqual(snapshot["messages_per_second"], 10)
+        self.assertAlmostEqual(snapshot["bytes_per_second"], 10 * len(attitude(0).get_msgbuf()))
+        stats = self.monitor.message_types[mavlink.MAVLINK_MSG_ID_ATTITUDE]
+        self.assertAlmostEqual(stats.mean_interval, 0.1)
+        # Every interval lands in the (0.05, 0.1] bucket, give or take float rounding.
+        self.assertEqual(sum(stats.histogram[6:8]), 99)
+
+    def test_degraded_on_recent_loss(self):
+        for i in range(0, 200, 4):
+            self.monitor.record(attitude(i % 256), now=100 + i * 0.05)
+        self.assertGreater(self.monitor.recent_loss(now=110.0), 0.5)
+        self.assertTrue(self.monitor.is_degraded(now=110.0))
+        # Old losses age out of the window.
+        self.assertEqual(self.monitor.recent_loss(now=200.0), 0.0)
+
+    def test_smoothed_rtt(self):
+        for rtt in (0.1, 0.1, 0.1, 0.9):
+            self.monitor.record_rtt(rtt)
+        self.assertAlmostEqual(self.monitor.srtt, 0.2)
+        self.assertEqual(self.monitor.rtt_samples, 4)
+        self.assertFalse(self.monitor.is_degraded(now=0))
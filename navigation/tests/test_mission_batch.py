@@ -0,0 +1,140 @@
+import asyncio
+import math
+import unittest
+
+import numpy as np
+from pymavlink import mavutil
+
+from navigation import frames
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission import MissionItem
+from navigation.mission_batch import MissionBatch
+from navigation.mission_loader import Mission, _compile, _waypoint
+from navigation.mission_sync import item_keys
+from navigation.mission_upload import MissionUploader, mission_item_int_message
+from navigation.simulator import SimulatedAutopilot
+
+mavlink = mavutil.mavlink
+
+PORT = 14570
+
+
+class FakeConnection:
+    target_system = 1
+    target_component = 1
+
+
+def make_items(count):
+    return [
+        MissionItem(FakeConnection, seq=i, current=0, lat=49.8 + i * 1e-4, lon=-97.1, alt=20 + i)
+        for i in range(count)
+    ]
+
+
+class TestMissionBatch(unittest.TestCase):
+    def setUp(self):
+        self.mav = mavutil.mavlink.MAVLink(None, srcSystem=255, srcComponent=190)
+
+    def test_frames_match_per_item_encoding(self):
+        items = make_items(20)
+        batch = MissionBatch.from_items(items)
+        bulk = batch.int_frames(self.mav)
+        self.assertEqual(len(bulk), 20)
+        for seq, (item, frame) in enumerate(zip(items, bulk)):
+            # The checksum is only computed when the frame is stamped for sending.
+            expected = frames.encode(self.mav, mission_item_int_message(item))
+            self.assertEqual(bytes(frame[:-2]), bytes(expected[:-2]))
+            self.assertEqual(
+                bytes(frames.restamp(frame, seq)), bytes(frames.restamp(expected, seq))
+            )
+
+    def test_partial_frames(self):
+        batch = MissionBatch.from_items(make_items(10))
+        bulk = batch.int_frames(self.mav, 3, 5)
+        self.assertEqual(len(bulk), 3)
+        expected = frames.encode(self.mav, batch.mission_item_int_message(3))
+        self.assertEqual(bytes(frames.restamp(bulk[0], 0)), bytes(frames.restamp(expected, 0)))
+
+    def test_waypoints(self):
+        batch = MissionBatch.waypoints(FakeConnection, [49.8, 49.9], [-97.1, -97.2], 30)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.payloads["x"].tolist(), [498000000, 499000000])
+        message = batch.mission_item_message(1)
+        self.assertAlmostEqual(message.x, 49.9, places=6)
+        self.assertEqual(message.seq, 1)
+        self.assertTrue(math.isnan(message.param4))
+
+        # degE7 input is taken as it is.
+        lat = np.array([498000000, 499000000], dtype=np.int32)
+        batch = MissionBatch.waypoints(FakeConnection, lat, [-971000000] * 2, 30, degE7=True)
+        self.assertEqual(batch.payloads["x"].tolist(), [498000000, 499000000])
+        self.assertEqual(batch.payloads["y"].tolist(), [-971000000] * 2)
+
+    def test_signed_frames_are_not_restamped(self):
+        frame = bytearray(frames.encode(self.mav, mission_item_int_message(make_items(1)[0])))
+        frames.restamp(frame, 7)
+        self.assertEqual(frame[2], 7)
+        signed = bytearray((frames.MAVLINK2_STX, 1, frames.MAVLINK_IFLAG_SIGNED)) + bytes(22)
+        with self.assertRaises(ValueError):
+            frames.restamp(signed, 7)
+
+    def test_keys_match_items(self):
+        items = make_items(5)
+        self.assertEqual(item_keys(MissionBatch.from_items(items)), item_keys(items))
+
+    def test_from_mission(self):
+        items, _ = _compile([_waypoint(49.8, -97.1, 20, 1), _waypoint(49.9, -97.2, 25, 2)])
+        mission = Mission(items)
+        batch = MissionBatch.from_mission(FakeConnection, mission)
+        self.assertEqual(item_keys(batch), item_keys(mission.mission_items(FakeConnection)))
+        self.assertEqual(batch.payloads["target_system"].tolist(), [1, 1])
+        np.testing.assert_array_equal(batch.payloads["seq"], [0, 1])
+
+    def test_from_mission_non_global_frames(self):
+        change_speed = (
+            mavlink.MAV_CMD_DO_CHANGE_SPEED,
+            mavlink.MAV_FRAME_MISSION,
+            1,
+            1.0,
+            5.0,
+            -1.0,
+            0.0,
+            np.nan,
+            3.0,
+            0.0,
+            2,
+        )
+        items, _ = _compile([_waypoint(49.8, -97.1, 20, 1), change_speed])
+        batch = MissionBatch.from_mission(FakeConnection, Mission(items))
+        self.assertEqual(batch.payloads["x"].tolist(), [498000000, 0])
+        self.assertEqual(batch.payloads["y"].tolist(), [-971000000, 3])
+        self.assertEqual(batch.mission_item_message(1).y, 3.0)
+
+
+class TestMissionBatchUpload(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}")
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    async def test_upload(self):
+        lat = 49.8 + np.arange(50) * 1e-4
+        batch = MissionBatch.waypoints(self.autopilot_conn.conn, lat, np.full(50, -97.1), 20)
+        uploader = MissionUploader(self.autopilot_conn)
+        result = await asyncio.wait_for(uploader.upload(batch), timeout=5)
+        self.assertEqual(result.items, 50)
+        self.assertEqual(
+            [received.x for received in self.vehicle.mission], batch.payloads["x"].tolist()
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from pymavlink import mavutil
+
+from navigation.mission_loader import (
+    MissionFileError,
+    MissionLineError,
+    load_mission,
+    parse_mission,
+)
+
+mavlink = mavutil.mavlink
+
+CSV = """lat,lon,alt
+# The first lap.
+49.8142336,-97.1205414,20
+
+49.8122997,-97.1186914
+49.8121986,-97.12024O0,20
+95.0,-97.1202400,20
+49.8121986,-97.1202400,25.5
+"""
+
+WAYPOINTS = """QGC WPL 110
+0\t1\t0\t16\t0\t0\t0\t0\t49.8135\t-97.1204\t230.0\t1
+1\t0\t3\t22\t0\t0\t0\t0\t0\t0\t15.0\t1
+2\t0\t3\t16\t0\t2\t0\t0\t49.8142336\t-97.1205414\t20.0\t1
+3\t0\t3\t16\t0\t2\t0
+4\t0\t3\t20\t0\t0\t0\t0\t0\t0\t0\t1
+"""
+
+PLAN = {
+    "fileType": "Plan",
+    "mission": {
+        "plannedHomePosition": [49.8135, -97.1204, 230],
+        "items": [
+            {
+                "type": "SimpleItem",
+                "command": 22,
+                "frame": 3,
+                "autoContinue": True,
+                "params": [0, 0, 0, None, 0, 0, 15],
+            },
+            {
+                "type": "ComplexItem",
+                "complexItemType": "survey",
+                "TransectStyleComplexItem": {
+                    "Items": [
+                        {
+                            "type": "SimpleItem",
+                            "command": 16,
+                            "frame": 3,
+                            "autoContinue": True,
+                            "params": [0, 0, 0, None, 49.8142336 + i * 1e-4, -97.1205414, 20],
+                        }
+                        for i in range(3)
+                    ]
+                },
+            },
+            {"type": "SimpleItem", "command": 16, "frame": 3, "params": [0, 0, 0]},
+            {
+                "type": "SimpleItem",
+                "command": 16,
+                "frame": 3,
+                "params": [0, 0, 0, None, 49.81, -197.12, 20],
+            },
+        ],
+    },
+}
+
+
+class FakeConnection:
+    target_system = 1
+    target_component = 1
+
+
+class TestMissionLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as mission_file:
+            mission_file.write(content)
+        return path
+
+    def test_csv(self):
+        mission = parse_mission(self.write("mission.txt", CSV))
+        np.testing.assert_array_equal(mission.items["line"], [3, 8])
+        np.testing.assert_array_equal(mission.items["z"], [20, 25.5])
+        self.assertTrue((mission.items["command"] == mavlink.MAV_CMD_NAV_WAYPOINT).all())
+        self.assertEqual([error.line for error in mission.errors], [5, 6, 7])
+        self.assertIn("invalid coordinates", mission.errors[2].message)
+        self.assertIsNone(mission.home)
+
+    def test_waypoints(self):
+        mission = parse_mission(self.write("mission.waypoints", WAYPOINTS))
+        self.assertEqual(mission.home, (49.8135, -97.1204, 230.0))
+        np.testing.assert_array_equal(
+            mission.items["command"],
+            [mavlink.MAV_CMD_NAV_TAKEOFF, mavlink.MAV_CMD_NAV_WAYPOINT, 20],
+        )
+        self.assertEqual(mission.items["param2"][1], 2)
+        self.assertEqual(mission.errors, [MissionLineError(5, "expected 12 fields, got 7")])
+
+    def test_plan(self):
+        mission = parse_mission(self.write("mission.plan", json.dumps(PLAN)))
+        self.assertEqual(mission.home, (49.8135, -97.1204, 230))
+        np.testing.assert_array_equal(mission.items["line"], [1, 2, 2, 2])
+        np.testing.assert_allclose(mission.items["x"][1:], 49.8142336 + np.arange(3) * 1e-4)
+        self.assertTrue(np.isnan(mission.items["param4"][0]))
+        self.assertEqual([error.line for error in mission.errors], [3, 4])
+
+        with self.assertRaises(MissionFileError):
+            parse_mission(self.write("broken.plan", "{"))
+
+    def test_cache(self):
+        path = self.write("mission.csv", CSV)
+        mission = load_mission(path, self.cache_dir)
+        self.assertFalse(mission.cached)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        cached = load_mission(path, self.cache_dir)
+        self.assertTrue(cached.cached)
+        self.assertEqual(cached.items.tobytes(), mission.items.tobytes())
+        self.assertEqual(cached.errors, mission.errors)
+        self.assertIsNone(cached.home)
+
+        # Different content is a different cache entry.
+        path = self.write("mission.csv", CSV + "49.81,-97.12,30\n")
+        mission = load_mission(path, self.cache_dir)
+        self.assertFalse(mission.cached)
+        self.assertEqual(len(mission), 3)
+
+        # So is the same content parsed as another format.
+        path = self.write("mission.plan", CSV + "49.81,-97.12,30\n")
+        with self.assertRaises(MissionFileError):
+            load_mission(path, self.cache_dir)
+
+        path = self.write("mission.waypoints", WAYPOINTS)
+        load_mission(path, self.cache_dir)
+        self.assertEqual(load_mission(path, self.cache_dir).home, (49.8135, -97.1204, 230.0))
+
+    def test_missing_file(self):
+        with self.assertRaises(MissionFileError):
+            load_mission(os.path.join(self.directory.name, "missing.csv"), self.cache_dir)
+
+    def test_mission_items(self):
+        mission = parse_mission(self.write("mission.waypoints", WAYPOINTS))
+        items = mission.mission_items(FakeConnection())
+        self.assertEqual([item.seq for item in items], [0, 1, 2])
+        self.assertEqual(items[0].command, mavlink.MAV_CMD_NAV_TAKEOFF)
+        self.assertEqual(items[1].x, 49.8142336)
+        self.assertEqual(items[1].param2, 2)
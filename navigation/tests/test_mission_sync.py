@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission import MissionItem
+from navigation.mission_sync import (
+    SYNC_FULL,
+    SYNC_PARTIAL,
+    SYNC_UNCHANGED,
+    MissionSync,
+    diff_range,
+    mission_item_key,
+)
+from navigation.simulator import SimulatedAutopilot
+
+PORT = 14563
+
+
+class TestDiffRange(unittest.TestCase):
+    def test_equal(self):
+        self.assertIsNone(diff_range([1, 2, 3], [1, 2, 3]))
+
+    def test_single_change(self):
+        self.assertEqual(diff_range([1, 2, 3], [1, 5, 3]), (1, 1))
+
+    def test_spread_changes(self):
+        self.assertEqual(diff_range([1, 2, 3, 4, 5], [1, 0, 3, 0, 5]), (1, 3))
+
+
+class TestMissionSync(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}")
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+        self.sync = MissionSync(self.autopilot_conn)
+
+    async def asyncTearDown(self):
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    def make_mission(self, count, offset=0.0):
+        return [
+            MissionItem(
+                self.autopilot_conn.conn,
+                seq=i,
+                current=0,
+                lat=49.8 + i * 1e-4 + offset,
+                lon=-97.1,
+                alt=20,
+            )
+            for i in range(count)
+        ]
+
+    async def test_download(self):
+        mission = self.make_mission(4)
+        await asyncio.wait_for(self.sync.uploader.upload(mission), timeout=5)
+        keys = await asyncio.wait_for(self.sync.download(), timeout=5)
+        self.assertEqual(keys, [mission_item_key(item) for item in mission])
+
+    async def test_sync_sends_only_changed_range(self):
+        mission = self.make_mission(10)
+        result = await asyncio.wait_for(self.sync.sync(mission), timeout=5)
+        self.assertEqual(result.mode, SYNC_FULL)
+
+        result = await asyncio.wait_for(self.sync.sync(mission), timeout=5)
+        self.assertEqual(result.mode, SYNC_UNCHANGED)
+        self.assertEqual(result.items_sent, 0)
+
+        mission[4] = self.make_mission(10, offset=0.01)[4]
+        mission[6] = self.make_mission(10, offset=0.01)[6]
+        result = await asyncio.wait_for(self.sync.sync(mission), timeout=5)
+        self.assertEqual(result.mode, SYNC_PARTIAL)
+        self.assertEqual((result.first, result.last), (4, 6))
+        self.assertEqual(result.upload.requests, 3)
+
+        keys = await asyncio.wait_for(self.sync.download(), timeout=5)
+        self.assertEqual(keys, [mission_item_key(item) for item in mission])
+
+    async def test_sync_uploads_everything_when_length_changes(self):
+        await asyncio.wait_for(self.sync.sync(self.make_mission(3)), timeout=5)
+        result = await asyncio.wait_for(self.sync.sync(self.make_mission(5)), timeout=5)
+        self.assertEqual(result.mode, SYNC_FULL)
+        self.assertEqual(len(self.vehicle.mission), 5)
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission import MissionItem
+from navigation.mission_upload import MissionUploader, MissionUploadError
+from navigation.simulator import SimulatedAutopilot
+
+PORT = 14562
+
+
+class TestMissionUploader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle = None
+
+    async def asyncTearDown(self):
+        self.receive_task.cancel()
+        if self.vehicle is not None:
+            self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    async def start_vehicle(self, **kwargs):
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}", **kwargs)
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+
+    def make_mission(self, count):
+        return [
+            MissionItem(
+                self.autopilot_conn.conn,
+                seq=i,
+                current=0,
+                lat=49.8 + i * 1e-4,
+                lon=-97.1 - i * 1e-4,
+                alt=20,
+            )
+            for i in range(count)
+        ]
+
+    def assert_vehicle_has_mission(self, mission):
+        self.assertEqual(len(self.vehicle.mission), len(mission))
+        for item, received in zip(mission, self.vehicle.mission):
+            self.assertEqual(received.seq, item.seq)
+            self.assertAlmostEqual(received.x / 1e7, item.x, places=6)
+            self.assertAlmostEqual(received.y / 1e7, item.y, places=6)
+
+    async def test_upload(self):
+        await self.start_vehicle()
+        mission = self.make_mission(50)
+        uploader = MissionUploader(self.autopilot_conn)
+        result = await asyncio.wait_for(uploader.upload(mission), timeout=5)
+        self.assertEqual(result.items, 50)
+        self.assertEqual(result.duplicates, 0)
+        self.assertGreater(result.items_per_second, 0)
+        self.assert_vehicle_has_mission(mission)
+
+    async def test_upload_answers_legacy_requests(self):
+        await self.start_vehicle(use_int_requests=False)
+        mission = self.make_mission(5)
+        uploader = MissionUploader(self.autopilot_conn)
+        await asyncio.wait_for(uploader.upload(mission), timeout=5)
+        self.assertEqual(len(self.vehicle.mission), 5)
+        self.assertEqual(self.vehicle.mission[3].get_type(), "MISSION_ITEM")
+        self.assertAlmostEqual(self.vehicle.mission[3].x, mission[3].x, places=5)
+
+    async def test_upload_over_lossy_link(self):
+        await self.start_vehicle(loss=0.2, seed=1, mission_timeout=0.05)
+        mission = self.make_mission(30)
+        uploader = MissionUploader(self.autopilot_conn, timeout=0.1, retries=20)
+        result = await asyncio.wait_for(uploader.upload(mission), timeout=20)
+        self.assertGreater(result.duplicates + result.retransmits, 0)
+        self.assert_vehicle_has_mission(mission)
+
+    async def test_upload_times_out_without_autopilot(self):
+        uploader = MissionUploader(self.autopilot_conn, timeout=0.05, retries=2)
+        with self.assertRaises(MissionUploadError):
+            await asyncio.wait_for(uploader.upload(self.make_mission(3)), timeout=5)
+        self.assertFalse(uploader.busy)
+
+    async def test_ignores_requests_from_other_systems(self):
+        await self.start_vehicle()
+        uploader = MissionUploader(self.autopilot_conn)
+        upload = asyncio.create_task(uploader.upload(self.make_mission(3)))
+        await asyncio.sleep(0)
+        request = mavutil.mavlink.MAVLink_mission_request_int_message(255, 0, 0)
+        request.pack(mavutil.mavlink.MAVLink(None, srcSystem=7, srcComponent=1))
+        requests = uploader._upload.requests
+        uploader._on_request(request)
+        self.assertEqual(uploader._upload.requests, requests)
+        result = await asyncio.wait_for(upload, timeout=5)
+        self.assertEqual(result.items, 3)
+
+    async def test_only_one_upload_at_a_time(self):
+        uploader = MissionUploader(self.autopilot_conn, timeout=0.05, retries=1)
+        first = asyncio.create_task(uploader.upload(self.make_mission(3)))
+        await asyncio.sleep(0)
+        with self.assertRaises(MissionUploadError):
+            await uploader.upload(self.make_mission(3))
+        with self.assertRaises(MissionUploadError):
+            await first
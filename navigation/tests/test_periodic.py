@@ -0,0 +1,102 @@
+import asyncio
+import time
+import unittest
+
+from navigation.periodic import (
+    POLICY_CATCH_UP,
+    POLICY_SKIP,
+    PeriodicScheduler,
+    get_scheduler,
+    run_periodic,
+)
+
+
+class TestPeriodicScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.scheduler = PeriodicScheduler()
+        self.loop = asyncio.get_running_loop()
+
+    async def test_runs_on_absolute_deadlines(self):
+        starts = []
+
+        def callback():
+            starts.append(self.loop.time())
+            # Work done in the callback must not push back later runs.
+            time.sleep(0.004)
+
+        task = self.scheduler.add("work", callback, 50)
+        await asyncio.sleep(0.5)
+        task.cancel()
+        first = starts[0]
+        for i, start in enumerate(starts):
+            self.assertLess(start - (first + i * 0.02), 0.02)
+        self.assertGreaterEqual(len(starts), 20)
+        self.assertEqual(task.stats.runs, len(starts))
+        self.assertEqual(task.stats.overruns, 0)
+
+    async def test_skip_policy_drops_missed_runs(self):
+        runs = []
+        task = self.scheduler.add("skip", lambda: runs.append(self.loop.time()), 100, POLICY_SKIP)
+        await asyncio.sleep(0.015)
+        # Block the loop for ten periods.
+        time.sleep(0.1)
+        await asyncio.sleep(0.015)
+        task.cancel()
+        self.assertGreaterEqual(task.stats.skipped, 8)
+        self.assertLess(len(runs), 8)
+        self.assertGreaterEqual(task.stats.max_jitter, 0.08)
+
+    async def test_catch_up_policy_makes_up_for_missed_runs(self):
+        runs = []
+        task = self.scheduler.add(
+            "catch_up", lambda: runs.append(self.loop.time()), 100, POLICY_CATCH_UP
+        )
+        await asyncio.sleep(0.015)
+        count = len(runs)
+        time.sleep(0.1)
+        await asyncio.sleep(0.005)
+        task.cancel()
+        # At most `max_catch_up` missed runs are made up for, the rest are skipped.
+        self.assertGreaterEqual(len(runs) - count, task.max_catch_up)
+        self.assertGreaterEqual(task.stats.skipped, 4)
+
+    async def test_overrun_counted(self):
+        task = self.scheduler.add("slow", lambda: time.sleep(0.03), 50)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        self.assertGreater(task.stats.overruns, 0)
+        self.assertEqual(task.stats.overruns, task.stats.runs)
+
+    async def test_async_callback_not_run_concurrently(self):
+        active = []
+        overlapping = []
+
+        async def callback():
+            overlapping.append(bool(active))
+            active.append(True)
+            await asyncio.sleep(0.025)
+            active.pop()
+
+        task = self.scheduler.add("async", callback, 100)
+        await asyncio.sleep(0.2)
+        task.cancel()
+        self.assertFalse(any(overlapping))
+        self.assertGreater(task.stats.skipped, 0)
+
+    async def test_exception_stops_task(self):
+        def callback():
+            raise ConnectionError("lost")
+
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(run_periodic("fail", callback, 100, scheduler=self.scheduler), 1)
+        self.assertNotIn("fail", self.scheduler.tasks)
+
+    async def test_shared_scheduler(self):
+        self.assertIs(get_scheduler(), get_scheduler())
+        runner = asyncio.create_task(run_periodic("shared", lambda: None, 10))
+        await asyncio.sleep(0)
+        self.assertIn("shared", get_scheduler().tasks)
+        runner.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await runner
+        self.assertNotIn("shared", get_scheduler().tasks)
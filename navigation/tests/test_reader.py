@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper
+from navigation.reader import MavlinkReader
+
+
+class TestMavlinkReader(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper("udpin:127.0.0.1:14560")
+        self.master = mavutil.mavlink_connection("udpout:127.0.0.1:14560")
+
+    def tearDown(self):
+        self.autopilot_conn.conn.close()
+        self.master.close()
+
+    def send_heartbeats(self, count):
+        for _ in range(count):
+            self.master.mav.heartbeat_send(
+                mavutil.mavlink.MAV_TYPE_HEXAROTOR,
+                mavutil.mavlink.MAV_AUTOPILOT_PX4,
+                0,
+                0,
+                0,
+            )
+
+    async def test_reads_messages_as_a_batch(self):
+        reader = MavlinkReader(self.autopilot_conn)
+        reader.start()
+        self.send_heartbeats(5)
+
+        received = []
+        while len(received) < 5:
+            received.extend(await asyncio.wait_for(reader.read_batch(), timeout=1))
+        reader.stop()
+
+        self.assertEqual(len(received), 5)
+        self.assertTrue(all(msg.get_type() == "HEARTBEAT" for msg in received))
+
+    async def test_batch_size_is_bounded(self):
+        reader = MavlinkReader(self.autopilot_conn, max_batch_size=2)
+        self.send_heartbeats(5)
+        await asyncio.sleep(0.05)
+        reader.start()
+
+        received = []
+        while len(received) < 5:
+            # Give the reader time to drain more than a batch before taking it.
+            await asyncio.sleep(0.01)
+            batch = await asyncio.wait_for(reader.read_batch(), timeout=1)
+            self.assertLessEqual(len(batch), 2)
+            received.extend(batch)
+        reader.stop()
+        self.assertEqual(len(received), 5)
+
+    async def test_reregisters_after_reconnect(self):
+        reader = MavlinkReader(self.autopilot_conn)
+        reader.start()
+        self.autopilot_conn.conn.close()
+        self.autopilot_conn.reconnect()
+        self.send_heartbeats(1)
+
+        batch = await asyncio.wait_for(reader.read_batch(), timeout=1)
+        reader.stop()
+        self.assertEqual(batch[0].get_type(), "HEARTBEAT")
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.recorder import INDEX_SUFFIX, FlightLog, FlightRecorder, ReplayReader
+
+mavlink = mavutil.mavlink
+
+PORT = 14568
+# 100 ms between recorded frames.
+SPACING = 100_000_000
+
+
+def recorded_messages(count):
+    mav = mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            message = mavlink.MAVLink_heartbeat_message(2, 12, 0, 0, 0, 3)
+        else:
+            message = mavlink.MAVLink_attitude_message(i, 0.1, 0.2, 0.3, 0, 0, 0)
+        message.pack(mav)
+        messages.append(message)
+    return messages
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "flight.mavrec")
+        self.messages = recorded_messages(10)
+        recorder = FlightRecorder(self.path)
+        for i, message in enumerate(self.messages):
+            recorder.record(message, timestamp=i * SPACING)
+        recorder.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_frames_and_index(self):
+        log = FlightLog(self.path)
+        self.assertEqual(len(log), 10)
+        for i, message in enumerate(self.messages):
+            self.assertEqual(bytes(log.frame(i)), bytes(message.get_msgbuf()))
+        self.assertEqual(
+            log.message_counts(),
+            {mavlink.MAVLINK_MSG_ID_HEARTBEAT: 5, mavlink.MAVLINK_MSG_ID_ATTITUDE: 5},
+        )
+        log.close()
+
+    def test_seek_and_select(self):
+        log = FlightLog(self.path)
+        self.assertEqual(log.seek(3 * SPACING), 3)
+        self.assertEqual(log.seek(3 * SPACING + 1), 4)
+        positions = log.select(
+            [mavlink.MAVLINK_MSG_ID_ATTITUDE], start=2 * SPACING, end=8 * SPACING
+        )
+        self.assertEqual(positions.tolist(), [3, 5, 7])
+        log.close()
+
+    def test_missing_index_rebuilt_from_log(self):
+        os.remove(self.path + INDEX_SUFFIX)
+        log = FlightLog(self.path)
+        self.assertEqual(len(log), 10)
+        self.assertEqual(log.seek(5 * SPACING), 5)
+        log.close()
+
+    def test_appends_to_existing_recording(self):
+        recorder = FlightRecorder(self.path)
+        recorder.record(self.messages[0], timestamp=10 * SPACING)
+        recorder.close()
+        log = FlightLog(self.path)
+        self.assertEqual(len(log), 11)
+        self.assertEqual(bytes(log.frame(10)), bytes(self.messages[0].get_msgbuf()))
+        log.close()
+
+    def test_recovers_from_a_crash(self):
+        # The recorder died while writing the last record and its index entry.
+        os.truncate(self.path, os.path.getsize(self.path) - 5)
+        with open(self.path + INDEX_SUFFIX, "ab") as index:
+            index.write(b"\x00" * 7)
+        log = FlightLog(self.path)
+        self.assertEqual(len(log), 9)
+        log.close()
+
+        recorder = FlightRecorder(self.path)
+        recorder.record(self.messages[1], timestamp=10 * SPACING)
+        recorder.close()
+        log = FlightLog(self.path)
+        self.assertEqual(len(log), 10)
+        self.assertEqual(bytes(log.frame(9)), bytes(self.messages[1].get_msgbuf()))
+        self.assertEqual(log.end, os.path.getsize(self.path))
+        log.close()
+
+        # A lost index is rebuilt when the recording is reopened.
+        os.remove(self.path + INDEX_SUFFIX)
+        FlightRecorder(self.path).close()
+        log = FlightLog(self.path)
+        self.assertEqual(log.seek(10 * SPACING), 9)
+        log.close()
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "flight.mavrec")
+        recorder = FlightRecorder(path)
+        for i, message in enumerate(recorded_messages(10)):
+            recorder.record(message, timestamp=i * SPACING)
+        recorder.close()
+        self.log = FlightLog(path)
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.received = []
+        for msg_id in (mavlink.MAVLINK_MSG_ID_HEARTBEAT, mavlink.MAVLINK_MSG_ID_ATTITUDE):
+            self.autopilot_conn.dispatcher.subscribe(msg_id, self.received.append)
+
+    async def asyncTearDown(self):
+        self.log.close()
+        self.autopilot_conn.conn.close()
+        self.directory.cleanup()
+
+    async def test_replay_as_fast_as_possible(self):
+        reader = ReplayReader(self.autopilot_conn, self.log, speed=None)
+        await asyncio.wait_for(receive_msg_loop(self.autopilot_conn, reader), timeout=2)
+        self.assertEqual(len(self.received), 10)
+        self.assertEqual(self.autopilot_conn.conn.target_system, 1)
+        self.assertIsNotNone(self.autopilot_conn.telemetry.latest("ATTITUDE"))
+
+    async def test_replay_at_speed(self):
+        reader = ReplayReader(self.autopilot_conn, self.log, speed=4)
+        start = time.monotonic()
+        await asyncio.wait_for(receive_msg_loop(self.autopilot_conn, reader), timeout=2)
+        # 0.9 s of recording at 4x.
+        self.assertAlmostEqual(time.monotonic() - start, 0.225, delta=0.05)
+        self.assertEqual(len(self.received), 10)
+
+    async def test_replay_selection(self):
+        positions = self.log.select([mavlink.MAVLINK_MSG_ID_ATTITUDE])
+        reader = ReplayReader(self.autopilot_conn, self.log, speed=None, positions=positions)
+        await asyncio.wait_for(receive_msg_loop(self.autopilot_conn, reader), timeout=2)
+        self.assertEqual([message.get_type() for message in self.received], ["ATTITUDE"] * 5)
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from navigation import geodesy
+from navigation.route import distance_matrix, plan_route
+
+HOME = (49.8135, -97.1204)
+
+
+class FakeConnection:
+    target_system = 1
+    target_component = 1
+
+
+def circle(count, radius):
+    """Return positions evenly spaced on a circle around home, in order."""
+    frame = geodesy.LocalFrame(*HOME)
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    lat, lon, _ = frame.geodetic(radius * np.cos(angles), radius * np.sin(angles))
+    return lat, lon
+
+
+class TestPlanRoute(unittest.TestCase):
+    def test_distance_matrix(self):
+        lat, lon = circle(5, 100)
+        distances = distance_matrix(lat, lon)
+        self.assertEqual(distances.shape, (5, 5))
+        np.testing.assert_allclose(distances, distances.T)
+        np.testing.assert_allclose(np.diag(distances), 0)
+        self.assertAlmostEqual(distances[0, 1], geodesy.haversine(lat[0], lon[0], lat[1], lon[1]))
+
+    def test_lap_around_a_circle(self):
+        lat, lon = circle(60, 500)
+        shuffle = np.random.default_rng(0).permutation(60)
+        route = plan_route(lat[shuffle], lon[shuffle], 20)
+        # The shortest lap goes around the circle, in either direction.
+        angles = shuffle[route.order]
+        steps = np.diff(np.append(angles, angles[0])) % 60
+        self.assertTrue((steps == 1).all() or (steps == 59).all())
+        perimeter = distance_matrix(lat, lon)[np.arange(60), np.roll(np.arange(60), -1)].sum()
+        self.assertAlmostEqual(route.length, perimeter, places=3)
+        self.assertLessEqual(route.length, route.initial_length)
+
+    def test_open_route_from_home(self):
+        # Waypoints on a line north of home, given in random order.
+        north = np.random.default_rng(1).permutation(np.arange(1, 21)) * 50.0
+        frame = geodesy.LocalFrame(*HOME)
+        lat, lon, _ = frame.geodetic(np.zeros(20), north)
+        route = plan_route(lat, lon, 20, home=HOME, closed=False)
+        np.testing.assert_array_equal(north[route.order], np.arange(1, 21) * 50.0)
+        self.assertAlmostEqual(route.length, 1000, delta=0.5)
+
+    def test_many_waypoints_within_budget(self):
+        rng = np.random.default_rng(2)
+        lat = geodesy.to_degE7(HOME[0] + rng.uniform(-0.01, 0.01, 300))
+        lon = geodesy.to_degE7(HOME[1] + rng.uniform(-0.01, 0.01, 300))
+        route = plan_route(lat, lon, 20, home=HOME, time_budget=0.5, degE7=True)
+        np.testing.assert_array_equal(np.sort(route.order), np.arange(300))
+        self.assertLess(route.length, route.initial_length)
+
+    def test_mission_items(self):
+        lat, lon = circle(4, 100)
+        route = plan_route(lat, lon, [10, 20, 30, 40])
+        items = route.mission_items(FakeConnection(), laps=2, accept_radius=2.0)
+        self.assertEqual([item.seq for item in items], list(range(8)))
+        self.assertEqual([item.z for item in items[:4]], [[10, 20, 30, 40][i] for i in route.order])
+        self.assertEqual(items[4].x, items[0].x)
+        self.assertEqual(items[0].param2, 2.0)
+        self.assertEqual(items[0].target_system, 1)
+
+    def test_invalid_waypoints(self):
+        with self.assertRaises(ValueError):
+            plan_route([91.0, 0.0], [0.0, 0.0], 20)
+        self.assertEqual(len(plan_route([], [], 20)), 0)
+
+    def test_integer_degrees(self):
+        route = plan_route([49, 50, 49], [-97, -97, -96], 20, home=[49, -97], closed=False)
+        self.assertEqual(route.order[0], 0)
+        self.assertEqual(route.lat.tolist(), [49.0, 50.0, 49.0])
@@ -0,0 +1,127 @@
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import ServerConnection
+from navigation.frames import encode, target
+from navigation.router import MessageFilter, RouterLink
+
+mavlink = mavutil.mavlink
+
+
+class FakeConnection:
+    """Stands in for a mavutil connection: hands out queued reads and records writes."""
+
+    def __init__(self):
+        self.reads = []
+        self.written = []
+
+    def recv(self, n=None):
+        return self.reads.pop(0) if self.reads else b""
+
+    def write(self, buf):
+        self.written.append(bytes(buf))
+
+    def close(self):
+        pass
+
+
+def frame(message, system_id, component_id=1):
+    return bytes(encode(mavlink.MAVLink(None, system_id, component_id), message))
+
+
+def heartbeat(system_id, component_id=1):
+    return frame(
+        mavlink.MAVLink_heartbeat_message(mavlink.MAV_TYPE_QUADROTOR, 3, 0, 0, 0, 3),
+        system_id,
+        component_id,
+    )
+
+
+def command_long(target_system, target_component, source_system=255):
+    message = mavlink.MAVLink_command_long_message(
+        target_system, target_component, mavlink.MAV_CMD_NAV_LAND, 0, 0, 0, 0, 0, 0, 0, 0
+    )
+    return frame(message, source_system, 190)
+
+
+class TestServerConnection(unittest.TestCase):
+    def setUp(self):
+        self.router = ServerConnection()
+        self.autopilot = self.router.add_connection("autopilot", FakeConnection())
+        self.gcs = self.router.add_connection("gcs", FakeConnection())
+        self.local = self.router.add_connection("local", FakeConnection())
+
+    def receive(self, link, *data):
+        link.conn.reads.extend(data)
+        while link.conn.reads:
+            for received in link.read_frames():
+                self.router.route(received, link)
+
+    def test_target_offsets(self):
+        self.assertEqual(target(command_long(1, 2)), (1, 2))
+        self.assertEqual(target(heartbeat(1)), (0, 0))
+
+    def test_broadcast_goes_to_every_other_link(self):
+        data = heartbeat(1)
+        self.receive(self.autopilot, data)
+        self.assertEqual(self.gcs.conn.written, [data])
+        self.assertEqual(self.local.conn.written, [data])
+        self.assertEqual(self.autopilot.conn.written, [])
+        self.assertIs(self.router.routes[(1, 1)], self.autopilot)
+
+    def test_addressed_frame_follows_learned_route(self):
+        self.receive(self.autopilot, heartbeat(1))
+        self.receive(self.local, heartbeat(2))
+        command = command_long(1, 1)
+        self.receive(self.gcs, command)
+        self.assertEqual(self.autopilot.conn.written, [heartbeat(2), command])
+        self.assertEqual(self.local.conn.written, [heartbeat(1)])
+
+    def test_unknown_target_is_dropped(self):
+        self.receive(self.gcs, command_long(7, 1))
+        self.assertEqual(self.router.unroutable, 1)
+        self.assertEqual(self.autopilot.conn.written, [])
+
+    def test_component_zero_goes_to_every_link_of_the_system(self):
+        self.receive(self.autopilot, heartbeat(1, 1))
+        command = command_long(1, 0)
+        self.receive(self.gcs, command)
+        self.assertEqual(self.autopilot.conn.written, [command])
+
+    def test_frames_split_across_reads(self):
+        data = heartbeat(1) + heartbeat(1, 2)
+        self.receive(self.autopilot, b"\x00\x01" + data[:5], data[5:20], data[20:])
+        self.assertEqual(self.gcs.conn.written, [heartbeat(1), heartbeat(1, 2)])
+        self.assertEqual(self.autopilot.bytes_discarded, 2)
+
+    def test_frames_with_a_bad_checksum_are_discarded(self):
+        # A start byte inside garbage that claims an empty payload, then a corrupted frame.
+        stray = bytes((0xFE, 0, 1, 2, 3, 4, 5, 6))
+        corrupted = bytearray(heartbeat(1, 2))
+        corrupted[-1] ^= 0xFF
+        self.receive(self.autopilot, stray + bytes(corrupted) + heartbeat(1))
+        self.assertEqual(self.gcs.conn.written, [heartbeat(1)])
+        self.assertEqual(self.autopilot.frames_received, 1)
+        self.assertEqual(self.autopilot.bytes_discarded, len(stray) + len(corrupted))
+
+    def test_unknown_messages_are_forwarded(self):
+        # A vendor message the dialect doesn't have (id 3), whose checksum can't be verified.
+        vendor = bytes((0xFE, 2, 0, 1, 1, 3, 0xAB, 0xCD, 0x12, 0x34))
+        self.receive(self.autopilot, vendor + heartbeat(1))
+        self.assertEqual(self.gcs.conn.written, [vendor, heartbeat(1)])
+        self.assertEqual(self.autopilot.bytes_discarded, 0)
+
+    def test_checksums_not_verified_on_udp(self):
+        conn = mavutil.mavlink_connection("udpin:127.0.0.1:14572")
+        self.addCleanup(conn.close)
+        self.assertFalse(RouterLink("udp", conn).verify_checksums)
+        self.assertTrue(RouterLink("udp", conn, verify_checksums=True).verify_checksums)
+        self.assertTrue(self.autopilot.verify_checksums)
+
+    def test_filter(self):
+        self.local.filter = MessageFilter(block=[mavlink.MAVLINK_MSG_ID_HEARTBEAT])
+        self.receive(self.autopilot, heartbeat(1))
+        self.assertEqual(self.local.conn.written, [])
+        self.assertEqual(self.local.frames_filtered, 1)
+        self.assertEqual(len(self.gcs.conn.written), 1)
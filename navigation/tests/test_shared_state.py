@@ -0,0 +1,103 @@
+import math
+import os
+import threading
+import time
+import unittest
+
+from pymavlink import mavutil
+
+from navigation import shared_state
+from navigation.link_quality import LinkQualityMonitor
+from navigation.shared_state import (
+    STATE_FIELDS,
+    SnapshotError,
+    TelemetryPublisher,
+    TelemetryReader,
+)
+from navigation.telemetry import TelemetryStore
+
+mavlink = mavutil.mavlink
+
+
+class FakeConnection:
+    def __init__(self):
+        self.telemetry = TelemetryStore(capacity=4)
+        self.link_quality = LinkQualityMonitor()
+        self.last_heartbeat = None
+
+
+class TestSharedState(unittest.TestCase):
+    def setUp(self):
+        self.name = f"test_telemetry_{os.getpid()}_{self.id().rsplit('.', 1)[-1]}"
+        self.conn = FakeConnection()
+        self.publisher = TelemetryPublisher(self.conn, self.name)
+        self.reader = TelemetryReader(self.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.publisher.close()
+
+    def test_publish(self):
+        snapshot = self.reader.snapshot()
+        self.assertTrue(all(math.isnan(value) for value in snapshot.values()))
+
+        self.conn.telemetry.record(
+            mavlink.MAVLink_global_position_int_message(
+                0, 498000000, -971000000, 250000, 20000, 0, 0, 0, 9000
+            ),
+            timestamp=5.0,
+        )
+        self.conn.telemetry.record(
+            mavlink.MAVLink_extended_sys_state_message(0, mavlink.MAV_LANDED_STATE_IN_AIR)
+        )
+        self.conn.last_heartbeat = time.time()
+        self.publisher.publish(now=10.0)
+
+        snapshot = self.reader.snapshot()
+        self.assertEqual(snapshot["time"], 10.0)
+        self.assertEqual(snapshot["position_time"], 5.0)
+        self.assertAlmostEqual(snapshot["lat"], 49.8)
+        self.assertAlmostEqual(snapshot["relative_alt"], 20.0)
+        self.assertEqual(snapshot["landed_state"], mavlink.MAV_LANDED_STATE_IN_AIR)
+        self.assertTrue(math.isnan(snapshot["roll"]))
+        self.assertLess(snapshot["heartbeat_age"], 1.0)
+        self.assertEqual(snapshot["degraded"], 0.0)
+        self.assertEqual(self.reader.sequence, 4)
+
+    def test_reads_are_consistent(self):
+        # Every snapshot is written with all values equal, so a torn read would mix two of them.
+        stop = threading.Event()
+
+        def write():
+            value = 0.0
+            while not stop.is_set():
+                value += 1
+                self.publisher.write((value,) * len(STATE_FIELDS))
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(20000):
+                values = self.reader.read()
+                self.assertEqual(len(set(values)), 1)
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_writer_stopped_mid_write(self):
+        shared_state._sequence.pack_into(self.publisher._buffer, 0, 7)
+        with self.assertRaises(SnapshotError):
+            self.reader.read()
+
+    def test_layout_mismatch(self):
+        shared_state.HEADER.pack_into(self.publisher._buffer, 0, 0, 99, len(STATE_FIELDS))
+        with self.assertRaises(SnapshotError):
+            TelemetryReader(self.name)
+
+    def test_missing_block(self):
+        with self.assertRaises(FileNotFoundError):
+            TelemetryReader(f"{self.name}_missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
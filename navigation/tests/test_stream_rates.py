@@ -0,0 +1,168 @@
+import asyncio
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.simulator import SimulatedAutopilot
+from navigation.stream_rates import (
+    PHASE_CRUISE,
+    PHASE_LANDING,
+    PHASE_LOITER,
+    MAX_REREQUESTS,
+    StreamRateController,
+)
+
+mavlink = mavutil.mavlink
+
+PORT = 14569
+POSITION = mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT
+ATTITUDE = mavlink.MAVLINK_MSG_ID_ATTITUDE
+
+
+class TestStreamRateController(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.tasks = [self.receive_task]
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        self.vehicle.stop()
+        self.autopilot_conn.conn.close()
+
+    async def start_vehicle(self, **kwargs):
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}", **kwargs)
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+
+    def interval_commands(self):
+        return [
+            (int(msg.param1), msg.param2)
+            for msg in self.vehicle.commands
+            if msg.command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL
+        ]
+
+    async def start(self, controller):
+        self.tasks.append(asyncio.create_task(controller.run()))
+        await asyncio.sleep(0)
+
+    async def settle(self, controller):
+        while controller._apply_task is not None and not controller._apply_task.done():
+            await asyncio.wait_for(controller._apply_task, 2)
+        await asyncio.sleep(0.05)
+
+    async def test_demands_combined_and_sent_only_on_change(self):
+        await self.start_vehicle()
+        controller = StreamRateController(self.autopilot_conn)
+        await self.start(controller)
+        controller.request("logger", POSITION, 2)
+        controller.request("landing", POSITION, 10)
+        controller.request("landing", ATTITUDE, 4)
+        await self.settle(controller)
+        self.assertEqual(sorted(self.interval_commands()), [(ATTITUDE, 250000), (POSITION, 1e5)])
+        self.assertAlmostEqual(self.vehicle.message_intervals[POSITION], 0.1)
+
+        # A lower demand doesn't change the combined rate.
+        controller.request("logger", POSITION, 5)
+        await self.settle(controller)
+        self.assertEqual(len(self.interval_commands()), 2)
+
+        controller.release("landing")
+        await self.settle(controller)
+        self.assertEqual(sorted(self.interval_commands()[2:]), [(ATTITUDE, -1), (POSITION, 2e5)])
+        self.assertNotIn(ATTITUDE, self.vehicle.message_intervals)
+
+    async def test_intervals_set_one_at_a_time(self):
+        await self.start_vehicle()
+        controller = StreamRateController(self.autopilot_conn)
+        await self.start(controller)
+        commands = self.autopilot_conn.commands
+        command_long = commands.command_long
+        in_flight = []
+
+        async def counted(*args, **kwargs):
+            in_flight.append(commands.in_flight + 1)
+            return await command_long(*args, **kwargs)
+
+        commands.command_long = counted
+        # The simulator doesn't stream VFR_HUD and rejects its interval.
+        controller.request("logger", mavlink.MAVLINK_MSG_ID_VFR_HUD, 1)
+        controller.request("logger", POSITION, 2)
+        controller.request("logger", ATTITUDE, 2)
+        await self.settle(controller)
+        self.assertEqual(in_flight, [1, 1, 1])
+        self.assertFalse(controller.streams[mavlink.MAVLINK_MSG_ID_VFR_HUD].requested)
+        self.assertEqual(controller.streams[POSITION].requested, 2)
+        self.assertEqual(controller.streams[ATTITUDE].requested, 2)
+
+    async def test_follows_mission_phase(self):
+        await self.start_vehicle(telemetry_rate_hz=5)
+        controller = StreamRateController(self.autopilot_conn)
+        await self.start(controller)
+        while controller.phase is None:
+            await asyncio.sleep(0.01)
+        self.assertEqual(controller.phase, PHASE_CRUISE)
+        await self.settle(controller)
+
+        self.vehicle.landed_state = mavlink.MAV_LANDED_STATE_LANDING
+        while controller.phase != PHASE_LANDING:
+            await asyncio.sleep(0.01)
+        await self.settle(controller)
+        self.assertAlmostEqual(self.vehicle.message_intervals[POSITION], 0.05)
+
+        # An explicit phase wins over the landed state.
+        controller.set_phase(PHASE_LOITER)
+        await self.settle(controller)
+        self.assertAlmostEqual(self.vehicle.message_intervals[POSITION], 1.0)
+        await asyncio.sleep(0.3)
+        self.assertEqual(controller.phase, PHASE_LOITER)
+
+    async def test_loiter_follows_ground_speed(self):
+        await self.start_vehicle(telemetry_rate_hz=5)
+        controller = StreamRateController(self.autopilot_conn, loiter_delay=0.5)
+        await self.start(controller)
+        while controller.phase != PHASE_CRUISE:
+            await asyncio.sleep(0.01)
+
+        self.vehicle.holding = True
+        while controller.phase != PHASE_LOITER:
+            await asyncio.sleep(0.01)
+        await self.settle(controller)
+        self.assertAlmostEqual(self.vehicle.message_intervals[POSITION], 1.0)
+
+        self.vehicle.holding = False
+        while controller.phase != PHASE_CRUISE:
+            await asyncio.sleep(0.01)
+        await self.settle(controller)
+        self.assertAlmostEqual(self.vehicle.message_intervals[POSITION], 0.2)
+
+    async def test_nothing_sent_until_run(self):
+        await self.start_vehicle()
+        controller = StreamRateController(self.autopilot_conn)
+        controller.request("logger", POSITION, 2)
+        controller.set_phase(PHASE_CRUISE)
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.interval_commands(), [])
+
+        await self.start(controller)
+        await self.settle(controller)
+        self.assertIn((POSITION, 2e5), self.interval_commands())
+
+    async def test_under_delivery_detected(self):
+        await self.start_vehicle(max_stream_rate_hz=5)
+        controller = StreamRateController(self.autopilot_conn, check_interval=0.25)
+        controller.request("landing", POSITION, 20)
+        await self.start(controller)
+        await asyncio.sleep(0.1)
+        await self.settle(controller)
+        stream = controller.streams[POSITION]
+        while stream.rerequests < MAX_REREQUESTS:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.3)
+        self.assertTrue(stream.under_delivered)
+        self.assertLess(stream.delivered, 10)
+        # Requested once, then again up to MAX_REREQUESTS times.
+        self.assertEqual(len(self.interval_commands()), 1 + MAX_REREQUESTS)
@@ -0,0 +1,94 @@
+import time
+import unittest
+
+from pymavlink import mavutil
+
+from navigation.telemetry import TelemetryBuffer, TelemetryStore
+from navigation.utils import GLOBAL_POSITION_INT, SYS_STATUS
+
+mavlink = mavutil.mavlink
+
+FIELDS = (("value", "value", 1.0, "f8"), ("state", "state", 1, "i4"))
+
+
+def position_msg(relative_alt_m):
+    return mavlink.MAVLink_global_position_int_message(
+        0, 498135199, -971203527, 230000, int(relative_alt_m * 1000), 0, 0, 0, 0
+    )
+
+
+def sys_status_msg(battery_remaining):
+    return mavlink.MAVLink_sys_status_message(
+        0, 0, 0, 0, 12000, 0, battery_remaining, 0, 0, 0, 0, 0, 0
+    )
+
+
+class TestTelemetryBuffer(unittest.TestCase):
+    def test_latest(self):
+        buffer = TelemetryBuffer(FIELDS, capacity=4)
+        self.assertIsNone(buffer.latest())
+        buffer.append(1.0, 10.0, 1)
+        buffer.append(2.0, 20.0, 2)
+        latest = buffer.latest()
+        self.assertEqual(latest["time"], 2.0)
+        self.assertEqual(latest["value"], 20.0)
+        self.assertEqual(latest["state"], 2)
+
+    def test_wraps_around_and_keeps_newest_samples(self):
+        buffer = TelemetryBuffer(FIELDS, capacity=4)
+        for i in range(10):
+            buffer.append(float(i), float(i * 10), i)
+        self.assertEqual(len(buffer), 4)
+        window = buffer.window(0.0, 100.0)
+        self.assertEqual(list(window["time"]), [6.0, 7.0, 8.0, 9.0])
+
+    def test_window(self):
+        buffer = TelemetryBuffer(FIELDS, capacity=8)
+        for i in range(11):
+            buffer.append(float(i), float(i), i)
+        self.assertEqual(list(buffer.window(4.0, 6.0)["time"]), [4.0, 5.0, 6.0])
+        self.assertEqual(list(buffer.window(8.5, 20.0)["time"]), [9.0, 10.0])
+        self.assertEqual(len(buffer.window(20.0, 30.0)), 0)
+        self.assertEqual(len(buffer.window(6.0, 5.0)), 0)
+
+    def test_interpolate(self):
+        buffer = TelemetryBuffer(FIELDS, capacity=3)
+        for i in range(5):
+            buffer.append(float(i), float(i * 10), i)
+        sample = buffer.interpolate(3.25)
+        self.assertAlmostEqual(sample["value"], 32.5)
+        self.assertEqual(sample["state"], 3)
+        self.assertEqual(buffer.interpolate(0.0)["value"], 20.0)
+        self.assertEqual(buffer.interpolate(10.0)["value"], 40.0)
+
+    def test_slope(self):
+        buffer = TelemetryBuffer(FIELDS, capacity=16)
+        for i in range(10):
+            buffer.append(float(i), 100.0 - 2.0 * i, 0)
+        self.assertAlmostEqual(buffer.slope("value", 5.0, now=9.0), -2.0)
+        self.assertIsNone(buffer.slope("value", 0.5, now=9.0))
+
+
+class TestTelemetryStore(unittest.TestCase):
+    def test_records_messages(self):
+        store = TelemetryStore(capacity=16)
+        store.record(position_msg(20.0))
+        store.record(mavlink.MAVLink_heartbeat_message(0, 0, 0, 0, 0, 3))
+        sample = store.latest(GLOBAL_POSITION_INT)
+        self.assertAlmostEqual(sample["lat"], 49.8135199)
+        self.assertAlmostEqual(sample["relative_alt"], 20.0)
+        self.assertIsNone(store.latest(SYS_STATUS))
+
+    def test_latest_max_age(self):
+        store = TelemetryStore(capacity=16)
+        store.record(sys_status_msg(80), timestamp=time.monotonic() - 10)
+        self.assertIsNone(store.latest(SYS_STATUS, max_age=1))
+        self.assertIsNotNone(store.latest(SYS_STATUS))
+
+    def test_trends(self):
+        store = TelemetryStore(capacity=16)
+        for i in range(5):
+            store.record(position_msg(20.0 - i), timestamp=float(i))
+            store.record(sys_status_msg(80 - 2 * i), timestamp=float(i))
+        self.assertAlmostEqual(store.descent_rate(10.0, now=4.0), 1.0)
+        self.assertAlmostEqual(store.battery_slope(10.0, now=4.0), -2.0)
@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.simulator import SimulatedAutopilot
+from navigation.watchdog import (
+    LINK_FAILED,
+    LINK_LOST,
+    LINK_RECONNECTING,
+    LINK_UP,
+    HeartbeatWatchdog,
+)
+
+PORT = 14567
+TIMEOUT = 0.2
+
+
+class TestHeartbeatWatchdog(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.autopilot_conn = AutopilotConnectionWrapper(f"udpin:127.0.0.1:{PORT}")
+        self.receive_task = asyncio.create_task(receive_msg_loop(self.autopilot_conn))
+        self.vehicle = SimulatedAutopilot(f"udpout:127.0.0.1:{PORT}", heartbeat_rate_hz=20)
+        self.vehicle.start()
+        while self.autopilot_conn.conn.target_system != 1:
+            await asyncio.sleep(0.01)
+        self.events = []
+        self.watchdog = HeartbeatWatchdog(
+            self.autopilot_conn,
+            timeout=TIMEOUT,
+            attempts=2,
+            on_lost=lambda: self.events.append(LINK_LOST),
+            on_restored=lambda: self.events.append(LINK_UP),
+        )
+        self.watch_task = asyncio.create_task(self.watchdog.run())
+
+    async def asyncTearDown(self):
+        self.watch_task.cancel()
+        self.receive_task.cancel()
+        self.vehicle.stop()
+        if self.autopilot_conn.conn is not None:
+            self.autopilot_conn.conn.close()
+
+    async def wait_for_state(self, state, timeout=3):
+        async def wait():
+            while self.watchdog.state != state:
+                await asyncio.sleep(0.005)
+
+        await asyncio.wait_for(wait(), timeout)
+
+    async def test_loss_detected_at_timeout(self):
+        await self.wait_for_state(LINK_UP)
+        self.vehicle.silent = True
+        await self.wait_for_state(LINK_LOST)
+        self.assertGreaterEqual(self.watchdog.detection_latency, TIMEOUT)
+        self.assertLess(self.watchdog.detection_latency, TIMEOUT + 0.05)
+        self.assertEqual(self.watchdog.max_detection_latency, self.watchdog.detection_latency)
+        self.assertEqual(self.events, [LINK_UP, LINK_LOST])
+
+    async def test_restored_on_same_link(self):
+        await self.wait_for_state(LINK_UP)
+        self.vehicle.silent = True
+        await self.wait_for_state(LINK_LOST)
+        self.vehicle.silent = False
+        await self.wait_for_state(LINK_UP)
+        self.assertEqual(self.watchdog.reconnects, 0)
+        self.assertIsNotNone(self.watchdog.last_outage)
+
+    async def test_reconnects_without_blocking_the_loop(self):
+        await self.wait_for_state(LINK_UP)
+        old_conn = self.autopilot_conn.conn
+        self.vehicle.silent = True
+        ticks = 0
+        while self.watchdog.state != LINK_RECONNECTING:
+            # The event loop keeps running while the link is down.
+            ticks += 1
+            await asyncio.sleep(0.01)
+        self.assertGreater(ticks, 20)
+        self.vehicle.silent = False
+        await self.wait_for_state(LINK_UP)
+        self.assertIsNot(self.autopilot_conn.conn, old_conn)
+        self.assertGreaterEqual(self.watchdog.reconnects, 1)
+
+    async def test_gives_up(self):
+        await self.wait_for_state(LINK_UP)
+        self.vehicle.silent = True
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(self.watch_task, 3)
+        self.assertEqual(self.watchdog.state, LINK_FAILED)
+        self.assertEqual(self.watchdog.reconnects, 2)
@@ -15,6 +15,17 @@ AUTOPILOT_HEARTBEAT_TIMEOUT = 2.5
 GCS_HEARTBEAT_TIMEOUT = 2.5
 HEARTBEAT_SEND_RATE_HZ = 1
 
+COMMAND_ACK_TIMEOUT = 1.0
+COMMAND_MAX_RETRIES = 3
+# Seconds to wait for the heartbeats to report the vehicle armed or disarmed after the command.
+ARM_STATE_TIMEOUT = 5.0
+# Seconds to wait for the vehicle to report it is on the ground after a land command.
+LANDING_TIMEOUT = 120.0
+# Seconds to wait for HOME_POSITION after setting the home position.
+HOME_POSITION_TIMEOUT = 5.0
+MISSION_ITEM_TIMEOUT = 0.5
+MISSION_MAX_RETRIES = 5
+
 LAT_LON_SCALING_FACTOR = 1.0e7
 ALT_SCALING_FACTOR = 1000.0
 
@@ -27,6 +38,8 @@ BAD_DATA = "BAD_DATA"
 MISSION_ITEM_REACHED = "MISSION_ITEM_REACHED"
 RC_CHANNELS = "RC_CHANNELS"
 SYS_STATUS = "SYS_STATUS"
+ATTITUDE = "ATTITUDE"
+EXTENDED_SYS_STATE = "EXTENDED_SYS_STATE"
 
 BATTERY_THRESHOLD = 70
 
@@ -39,6 +52,12 @@ def valid_latitude_and_longitude(lat, lon):
     return True
 
 
+def build_message(message_class, *args):
+    """Build a MAVLink message, dropping trailing extension fields (e.g. `mission_type`) that the
+    active dialect doesn't define. MAVLink 1 dialects leave extension fields out entirely."""
+    return message_class(*args[: len(message_class.fieldnames)])
+
+
 def get_logging_config():
     nav_dir = get_nav_dir()
 
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+
+from pymavlink import mavutil
+
+logger = logging.getLogger()
+
+LINK_CONNECTING = "connecting"  # No heartbeat received yet.
+LINK_UP = "up"
+LINK_LOST = "lost"  # The heartbeat timed out; waiting for it to come back on the same link.
+LINK_RECONNECTING = "reconnecting"  # The connection was reopened; waiting for a heartbeat.
+LINK_FAILED = "failed"  # Reconnecting was given up.
+
+# Number of times the connection is reopened after a link loss before giving up. None retries
+# forever.
+RECONNECT_ATTEMPTS = 5
+
+
+class HeartbeatWatchdog:
+    """Detects the loss of a link the moment its heartbeat times out and reconnects it.
+
+    Every HEARTBEAT from the vehicle re-arms a timer at an absolute deadline on the event loop's
+    monotonic clock, so a link loss is detected exactly `timeout` seconds after the last heartbeat
+    rather than at the next poll. When the timer fires, a reconnection state machine runs as a
+    task: it first waits one more timeout for the heartbeat to come back on the same link, then
+    reopens the connection up to `attempts` times. It never blocks the event loop.
+
+    `detection_latency` is the time from the last heartbeat to the loss being reported, which
+    is the timeout plus however late the event loop ran the timer. Anything that has to react to a
+    lost link within a time budget (e.g. flight termination) can check `max_detection_latency`
+    against it.
+
+    Args:
+        conn (ClientConnectionWrapper): The connection to watch.
+        timeout (float or None): Seconds without a heartbeat before the link counts as lost.
+            Defaults to the connection's `heartbeat_timeout`.
+        attempts (int or None): Number of times the connection is reopened before giving up.
+        on_lost (callable or None): Called without arguments when the link is lost.
+        on_restored (callable or None): Called without arguments when the link is back.
+    """
+
+    def __init__(
+        self, conn, timeout=None, attempts=RECONNECT_ATTEMPTS, on_lost=None, on_restored=None
+    ):
+        self.conn = conn
+        self.timeout = timeout if timeout is not None else conn.heartbeat_timeout
+        self.attempts = attempts
+        self.on_lost = on_lost
+        self.on_restored = on_restored
+        self.state = LINK_CONNECTING
+        self.last_heartbeat = None
+        self.lost_at = None
+        self.losses = 0
+        self.reconnects = 0
+        self.detection_latency = None
+        self.max_detection_latency = 0.0
+        self.last_outage = None
+        self._loop = None
+        self._handle = None
+        self._reconnect_task = None
+        self._restored = None
+        self._failed = None
+
+    @property
+    def is_up(self):
+        return self.state == LINK_UP
+
+    def start(self):
+        """Start watching heartbeats on the running event loop."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._failed = self._loop.create_future()
+        self.conn.dispatcher.subscribe(mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT, self.feed)
+        # A link that never comes up is lost as well.
+        self._arm(self._loop.time())
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self.conn.dispatcher.unsubscribe(mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT, self.feed)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._loop = None
+
+    async def run(self):
+        """Watch the link until it fails for good.
+
+        Raises:
+            ConnectionError: When the link couldn't be restored.
+        """
+        self.start()
+        try:
+            await asyncio.shield(self._failed)
+        finally:
+            self.stop()
+
+    def feed(self, message):
+        if self._loop is None:
+            return
+        target_system = self.conn.conn.target_system if self.conn.conn else 0
+        if target_system and message.get_srcSystem() != target_system:
+            # Heartbeats of other systems (e.g. a GCS) say nothing about this link.
+            return
+        now = self._loop.time()
+        self.last_heartbeat = now
+        self._arm(now)
+        if self.state != LINK_UP:
+            if self.lost_at is not None:
+                self.last_outage = now - self.lost_at
+                logger.info(f"Link restored after {self.last_outage:.2f} seconds.")
+                self.lost_at = None
+            self.state = LINK_UP
+            if self._restored is not None and not self._restored.done():
+                self._restored.set_result(None)
+            if self.on_restored is not None:
+                self.on_restored()
+
+    def _arm(self, now):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = self._loop.call_at(now + self.timeout, self._expire)
+
+    def _expire(self):
+        self._handle = None
+        now = self._loop.time()
+        if self.last_heartbeat is not None:
+            self.detection_latency = now - self.last_heartbeat
+            self.max_detection_latency = max(self.max_detection_latency, self.detection_latency)
+        self.lost_at = now
+        self.losses += 1
+        self.state = LINK_LOST
+        logger.warning(f"Failed to receive a heartbeat in {self.timeout} seconds.")
+        if self.on_lost is not None:
+            self.on_lost()
+        if self._reconnect_task is None:
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            attempt = 0
+            while True:
+                if await self._wait_restored():
+                    return
+                if self.attempts is not None and attempt >= self.attempts:
+                    break
+                attempt += 1
+                self.state = LINK_RECONNECTING
+                self.reconnects += 1
+                logger.info(f"Reopening the connection (attempt {attempt}).")
+                try:
+                    self.conn.reopen()
+                except Exception as e:
+                    logger.error(f"Failed to reopen the connection: {e}")
+            self.state = LINK_FAILED
+            if not self._failed.done():
+                self._failed.set_exception(
+                    ConnectionError("Failed to re-establish the connection.")
+                )
+        finally:
+            self._reconnect_task = None
+
+    async def _wait_restored(self):
+        """Wait up to one timeout for a heartbeat. Returns whether the link came back."""
+        if self.state == LINK_UP:
+            return True
+        self._restored = self._loop.create_future()
+        try:
+            await asyncio.wait_for(self._restored, self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._restored = None
@@ -2,8 +2,7 @@
 
 import socket
 
-# Set the path for the Unix socket.
-SOCKET_PATH = "/tmp/umuas_socket"
+from navigation.ipc import SOCKET_PATH, encode_frame, recv_frame
 
 # Create the Unix socket client.
 client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
@@ -13,10 +12,10 @@ client.connect(SOCKET_PATH)
 
 # Send a message to the server.
 message = "FT WAYPOINT"
-client.send(message.encode())
+client.sendall(encode_frame(message.encode()))
 
 # Receive a response from the server.
-response = client.recv(1024)
+response = recv_frame(client)
 print(f"Received response: {response.decode()}")
 
 # Close the connection.
@@ -1,23 +1,28 @@
 """A test script for sending waypoints one at a time to the flight controller -
-GOTO commands."""
+GOTO commands.
 
+Each leg is a one-item mission. `MissionSync` only rewrites the item that changed, so the
+mission isn't cleared and re-uploaded before every leg.
+"""
+
+import asyncio
 import io
 import logging
 import logging.config
-import time
 
-# from pymavlink import mavutil
+from pymavlink import mavutil
 
-from navigation.connection import AutopilotConnectionWrapper
-from navigation.mission import (
-    MissionItem,
+from navigation.commands import (
     arm,
     return_to_launch,
-    # set_home,
     start_mission,
     takeoff,
-    upload_mission,
+    wait_armed,
+    wait_for_message,
 )
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission import MissionItem
+from navigation.mission_sync import MissionSync
 from navigation.utils import get_logging_config
 
 # Configure logging.
@@ -26,105 +31,74 @@ logging.config.fileConfig(io.StringIO(logging_config), disable_existing_loggers=
 
 logger = logging.getLogger()
 
-autopilot = AutopilotConnectionWrapper("udpin:localhost:14540")
-
-autopilot.conn.wait_heartbeat()
-logger.info("Heartbeat received from the autopilot.")
-
-
-# Wait for user input.
-while True:
-    user_input = input('Enter "yes" to continue: ')
-    if user_input.lower() == "yes":
-        break
-
-
-# home_lat = 49.8135194947
-# home_lon = -97.120352716196
-# home_alt = 0
-
-# Set the home of the drone.
-# set_home(autopilot.conn, home_lat, home_lon, home_alt, use_curr_location=True)
-
-# Clear all missions.
-autopilot.conn.waypoint_clear_all_send()
-
-# WAYPOINT 1
-m1 = MissionItem(conn=autopilot.conn, seq=0, current=2, lat=49.8142336, lon=-97.1205414, alt=20)
-waypoints = [m1]
-upload_mission(autopilot.conn, waypoints)
-
-# Initial step.
-arm(autopilot.conn)
-takeoff(autopilot.conn)
-
-
-start_mission(autopilot.conn)
-
-for mission in waypoints:
-    msg = autopilot.conn.recv_match(
-        type=["MISSION_ITEM_REACHED"],
-        condition=f"MISSION_ITEM_REACHED.seq == {mission.seq}",
-        blocking=True,
-    )
-    logger.info(msg)
-    logger.info(msg.__dict__)
-
-
-# Hold for a few seconds.
-time.sleep(1)
-
-
-# Re-arm.
-# arm(autopilot.conn)
-
-# WAYPOINT 2
-m2 = MissionItem(conn=autopilot.conn, seq=0, current=2, lat=49.8122997, lon=-97.1186914, alt=20)
-waypoints = [m2]
-upload_mission(autopilot.conn, waypoints)
-start_mission(autopilot.conn)
-for mission in waypoints:
-    msg = autopilot.conn.recv_match(
-        type=["MISSION_ITEM_REACHED"],
-        condition=f"MISSION_ITEM_REACHED.seq == {mission.seq}",
-        blocking=True,
-    )
-    logger.info(msg)
-
-
-# Hold for a few seconds.
-time.sleep(1)
-
-
-# Re-arm.
-# arm(autopilot.conn)
-
-
-# WAYPOINT 3
-m3 = MissionItem(conn=autopilot.conn, seq=0, current=2, lat=49.8121986, lon=-97.1202400, alt=20)
-waypoints = [m3]
-upload_mission(autopilot.conn, waypoints)
-start_mission(autopilot.conn)
-for mission in waypoints:
-    msg = autopilot.conn.recv_match(
-        type=["MISSION_ITEM_REACHED"],
-        condition=f"MISSION_ITEM_REACHED.seq == {mission.seq}",
-        blocking=True,
-    )
-    logger.info(msg)
-
-
-# Hold for a couple seconds.
-time.sleep(2)
-
-return_to_launch(autopilot.conn)
-
-# # TODO: Verify we have returned before landing.
-# land(autopilot.conn)
-
-# # TODO: Verify we have landed before disarming.
-# disarm(autopilot.conn)
-
-
-# NOTE: Clearing missions only at the start and holding once we reach each mission location
-# appears to prevent the "No valid mission ..." error.
+# The (lat, lon) of each leg, flown at ALTITUDE metres.
+LEGS = (
+    (49.8142336, -97.1205414),
+    (49.8122997, -97.1186914),
+    (49.8121986, -97.1202400),
+)
+ALTITUDE = 20
+# Seconds to wait for the vehicle to reach a waypoint.
+WAYPOINT_TIMEOUT = 300
+# Seconds to hold at each waypoint.
+HOLD_TIME = 1
+
+
+async def fly_legs(autopilot):
+    commands = autopilot.commands
+    mission_sync = MissionSync(autopilot)
+    for leg, (lat, lon) in enumerate(LEGS):
+        waypoint = MissionItem(
+            conn=autopilot.conn, seq=0, current=2, lat=lat, lon=lon, alt=ALTITUDE
+        )
+        result = await mission_sync.sync([waypoint])
+        logger.info(f"Leg {leg + 1}: {result.mode} upload, {result.items_sent} item(s) sent.")
+
+        if leg == 0:
+            # Initial step.
+            await arm(commands)
+            await wait_armed(autopilot, True)
+            await takeoff(commands)
+
+        await start_mission(commands)
+        msg = await wait_for_message(
+            autopilot,
+            mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM_REACHED,
+            lambda message: message.seq == waypoint.seq,
+            WAYPOINT_TIMEOUT,
+        )
+        logger.info(msg)
+
+        # Hold for a few seconds.
+        await asyncio.sleep(HOLD_TIME)
+
+    await return_to_launch(commands)
+
+    # # TODO: Verify we have returned before landing.
+    # await land(commands)
+
+    # # TODO: Verify we have landed before disarming.
+    # await disarm(commands)
+
+
+async def main():
+    autopilot = AutopilotConnectionWrapper("udpin:localhost:14540")
+
+    autopilot.conn.wait_heartbeat()
+    logger.info("Heartbeat received from the autopilot.")
+
+    # Wait for user input.
+    while True:
+        user_input = input('Enter "yes" to continue: ')
+        if user_input.lower() == "yes":
+            break
+
+    receive_task = asyncio.create_task(receive_msg_loop(autopilot))
+    try:
+        await fly_legs(autopilot)
+    finally:
+        receive_task.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,7 +7,9 @@ import time
 import cv2
 import serial
 from dotenv import load_dotenv
+from pymavlink import mavutil
 
+from navigation.mission_loader import MissionFileError, load_mission
 from object_detection.src.application.script import ObjectDetection
 
 # Reload environment variables on startup to avoid caching them.
@@ -64,19 +66,17 @@ def send_command(conn, command):
 
 def read_mission():
     try:
-        with open(MISSION_FILE, "r") as file:
-            lines = file.readlines()
-            for line in lines:
-                lat, lon, alt = line.strip().split(",")
-
-                command = f"GOTO {lat.strip()} {lon.strip()} {alt.strip()}"
-                messages.put(command)
-    except FileNotFoundError:
-        print("file was not found")
-        exit(1)
-    except Exception as e:
+        mission = load_mission(MISSION_FILE)
+    except MissionFileError as e:
         print(f"error: {e}")
         exit(1)
+    for error in mission.errors:
+        print(f"Skipping {MISSION_FILE}, {error}")
+
+    waypoints = mission.items[mission.items["command"] == mavutil.mavlink.MAV_CMD_NAV_WAYPOINT]
+    for lat, lon, alt in waypoints[["x", "y", "z"]].tolist():
+        command = f"GOTO {lat} {lon} {alt}"
+        messages.put(command)
 
 
 def establish_connection():
@@ -1,5 +1,67 @@
+import math
+
+from navigation.executor import PRIORITY_MISSION, PRIORITY_NAVIGATION, PRIORITY_TERMINATION
+
+# Types of scheduled work.
+TERMINATION = "TERMINATION"
+OBJECT_DETECTION = "OBJECT_DETECTION"
+MOVE = "MOVE"
+MISSION_PLAN = "MISSION_PLAN"
+
+# Priority of each type of work when none is given. Lower runs first.
+DEFAULT_PRIORITIES = {
+    TERMINATION: PRIORITY_TERMINATION,
+    OBJECT_DETECTION: PRIORITY_NAVIGATION,
+    MOVE: PRIORITY_NAVIGATION,
+    MISSION_PLAN: PRIORITY_MISSION,
+}
+
+
 class ScheduleMessage:
-    def __init__(self, message_type, message, priority):
+    """A unit of work for the `Scheduler`.
+
+    Messages order by priority, then by deadline (earliest first, no deadline last), then by the
+    order they were scheduled in.
+
+    Args:
+        message_type (str): Type of work, which selects the handler that runs it.
+        message (object): What the handler is given.
+        priority (int): Lower runs first. Defaults to the priority of `message_type`.
+        deadline (float or None): `time.monotonic()` time the work should have started by.
+    """
+
+    __slots__ = (
+        "message_type",
+        "message",
+        "priority",
+        "deadline",
+        "sequence",
+        "scheduled_at",
+        "dispatched_at",
+        "cancelled",
+    )
+
+    def __init__(self, message_type, message=None, priority=None, deadline=None):
         self.message_type = message_type
         self.message = message
+        if priority is None:
+            priority = DEFAULT_PRIORITIES.get(message_type, PRIORITY_MISSION)
         self.priority = priority
+        self.deadline = deadline
+        self.sequence = 0
+        self.scheduled_at = None
+        self.dispatched_at = None
+        self.cancelled = False
+
+    def sort_key(self):
+        deadline = math.inf if self.deadline is None else self.deadline
+        return (self.priority, deadline, self.sequence)
+
+    def __lt__(self, other):
+        return self.sort_key() < other.sort_key()
+
+    def __repr__(self):
+        return (
+            f"ScheduleMessage({self.message_type!r}, {self.message!r}, priority={self.priority}, "
+            f"deadline={self.deadline})"
+        )
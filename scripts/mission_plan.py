@@ -1,21 +1,26 @@
 """A test script for sending waypoints all at once to the flight controller -
 A mission."""
 
+import asyncio
 import io
 import logging
 import logging.config
 import sys
 import time
 
-from navigation.connection import AutopilotConnectionWrapper
-from navigation.mission import (
-    MissionItem,
+from pymavlink import mavutil
+
+from navigation.commands import (
     arm,
     return_to_launch,
     start_mission,
     takeoff,
-    upload_mission,
+    wait_armed,
+    wait_for_message,
 )
+from navigation.connection import AutopilotConnectionWrapper, receive_msg_loop
+from navigation.mission_sync import MissionSync
+from navigation.route import plan_route
 from navigation.utils import get_logging_config
 
 # Configure logging.
@@ -24,6 +29,9 @@ logging.config.fileConfig(io.StringIO(logging_config), disable_existing_loggers=
 
 logger = logging.getLogger()
 
+# Seconds to wait for the vehicle to fly the lap.
+LAP_TIMEOUT = 900
+
 autopilot = AutopilotConnectionWrapper("udpin:localhost:14540")
 
 logger.info("Waiting for a heartbeat from the autopilot...")
@@ -73,29 +81,51 @@ home_alt = 0
 # Set the home of the drone.
 # set_home(autopilot.conn, home_lat, home_lon, home_alt, use_curr_location=False)
 
-# Clear all missions.
-autopilot.conn.waypoint_clear_all_send()
+# The lap's waypoints in any order; the route planner decides the order they are flown in.
+lap_lat = [49.8142336, 49.8122997, 49.8121986]
+lap_lon = [-97.1205414, -97.1186914, -97.1202400]
+route = plan_route(lap_lat, lap_lon, alt=20, home=(home_lat, home_lon))
+logger.info(f"Planned a {route.length:.0f} m lap.")
+waypoints = route.mission_items(autopilot.conn)
 
-m1 = MissionItem(conn=autopilot.conn, seq=0, current=0, lat=49.8142336, lon=-97.1205414, alt=20)
-m2 = MissionItem(conn=autopilot.conn, seq=1, current=0, lat=49.8122997, lon=-97.1186914, alt=20)
-m3 = MissionItem(conn=autopilot.conn, seq=2, current=0, lat=49.8121986, lon=-97.1202400, alt=20)
-waypoints = [m1, m2, m3]
 
-upload_mission(autopilot.conn, waypoints)
-arm(autopilot.conn)
-takeoff(autopilot.conn)
-start_mission(autopilot.conn)
+async def fly_lap():
+    commands = autopilot.commands
+    # Only the items that differ from the mission already on the autopilot are sent.
+    result = await MissionSync(autopilot).sync(waypoints)
+    logger.info(f"{result.mode} upload, {result.items_sent} item(s) sent.")
 
-for mission in waypoints:
-    msg = autopilot.conn.recv_match(
-        type=["MISSION_ITEM_REACHED"],
-        condition=f"MISSION_ITEM_REACHED.seq == {mission.seq}",
-        blocking=True,
+    await arm(commands)
+    await wait_armed(autopilot, True)
+    await takeoff(commands)
+    await start_mission(commands)
+
+    reached = autopilot.dispatcher.subscribe(
+        mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM_REACHED, lambda msg: logger.info(msg)
     )
-    logger.info(msg)
+    try:
+        last_seq = waypoints[-1].seq
+        await wait_for_message(
+            autopilot,
+            mavutil.mavlink.MAVLINK_MSG_ID_MISSION_ITEM_REACHED,
+            lambda msg: msg.seq == last_seq,
+            LAP_TIMEOUT,
+        )
+    finally:
+        autopilot.dispatcher.unsubscribe(reached.msg_id, reached.handler)
 
-# Hold for a couple seconds.
-time.sleep(2)
+    # Hold for a couple seconds.
+    await asyncio.sleep(2)
+
+    await return_to_launch(commands)
+
+
+async def main():
+    receive_task = asyncio.create_task(receive_msg_loop(autopilot))
+    try:
+        await fly_lap()
+    finally:
+        receive_task.cancel()
 
 
-return_to_launch(autopilot.conn)
+asyncio.run(main())
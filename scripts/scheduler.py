@@ -1,34 +1,166 @@
-# from message_object import ScheduleMessage
-import queue
+import heapq
+import itertools
+import logging
 import threading
 import time
 
+from scripts.message_object import ScheduleMessage
 
-class Scheduler:
-    # Queue of ScheduleMessage objects
-    waiting_messages = queue.Queue()
-    new_messages = threading.Condition()
+logger = logging.getLogger()
+
+
+class SchedulerStats:
+    """Counters of a `Scheduler`. Latency is the time from scheduling a message to its handler
+    being called."""
 
     def __init__(self):
-        pass
+        self.scheduled = 0
+        self.dispatched = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.unhandled = 0
+        self.missed_deadlines = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def mean_latency(self):
+        if self.dispatched == 0:
+            return 0.0
+        return self.total_latency / self.dispatched
+
+    def to_dict(self):
+        return {
+            "scheduled": self.scheduled,
+            "dispatched": self.dispatched,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "unhandled": self.unhandled,
+            "missed_deadlines": self.missed_deadlines,
+            "mean_latency": self.mean_latency,
+            "max_latency": self.max_latency,
+        }
+
+
+class Scheduler:
+    """Runs scheduled messages in order of priority and deadline, calling the handler registered
+    for each message type.
+
+    Messages wait in a heap. The worker sleeps on a condition until a message is scheduled, so work
+    starts as soon as it is scheduled and nothing is polled. A cancelled message stays in the heap
+    and is skipped when it reaches the top. A message that starts after its deadline still runs,
+    and is counted in `stats.missed_deadlines`.
+
+    `run()` can be called from several threads to handle messages in parallel.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.handlers = {}
+        self.stats = SchedulerStats()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._running = True
 
-    def scheduler(self):
+    def __len__(self):
+        """Number of messages waiting to run."""
+        return self._pending
+
+    def register(self, message_type, handler):
+        """Call `handler(message)` for the messages of `message_type`."""
+        self.handlers[message_type] = handler
+
+    def schedule(self, message_type, message=None, priority=None, timeout=None):
+        """Schedule work and return its `ScheduleMessage`, e.g. to cancel it.
+
+        Args:
+            message_type (str): Selects the handler.
+            message (object): Passed to the handler.
+            priority (int or None): Lower runs first. Defaults to the priority of `message_type`.
+            timeout (float or None): Seconds from now the work should have started by.
+        """
+        now = self.clock()
+        deadline = None if timeout is None else now + timeout
+        task = ScheduleMessage(message_type, message, priority, deadline)
+        with self._condition:
+            task.sequence = next(self._sequence)
+            task.scheduled_at = now
+            heapq.heappush(self._heap, task)
+            self._pending += 1
+            self.stats.scheduled += 1
+            self._condition.notify()
+        return task
+
+    def cancel(self, task):
+        """Cancel a message that hasn't started. Returns whether it was cancelled."""
+        with self._condition:
+            if task.cancelled or task.dispatched_at is not None or task.scheduled_at is None:
+                return False
+            task.cancelled = True
+            self._pending -= 1
+            self.stats.cancelled += 1
+            return True
+
+    def stop(self):
+        """Make `run()` return once the message being handled, if any, is done."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def start(self):
+        """Run the scheduler in a daemon thread and return the thread."""
+        thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self):
+        """Handle messages until `stop()` is called."""
         while True:
-            # message_schedule = None
-            with self.new_messages:
-                self.new_messages.wait()
-                if not self.waiting_messages.empty():
-                    message = self.waiting_messages.get()
-                    # TODO make message a tuple
-                    print(f"Received message: {message}")
-                    if "MISSION_PLAN" in message:
-                        # TODO Make priority an enum
-                        # message_schedule = ScheduleMessage("START_MISSION", message, 1)
-                        pass
-                    elif "OBJECT_DETECTION" in message:
-                        pass
-                    elif message == "MOVE":
-                        # move()
-                        pass
-                self.new_messages.notify_all()
-            time.sleep(1)
+            task = self._next()
+            if task is None:
+                return
+            self._dispatch(task)
+
+    def _next(self):
+        """Wait for the next message to run, or return None when stopped."""
+        with self._condition:
+            while True:
+                if not self._running:
+                    return None
+                while self._heap and self._heap[0].cancelled:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    task = heapq.heappop(self._heap)
+                    self._pending -= 1
+                    self._record_start(task)
+                    return task
+                self._condition.wait()
+
+    def _record_start(self, task):
+        stats = self.stats
+        task.dispatched_at = self.clock()
+        latency = task.dispatched_at - task.scheduled_at
+        stats.dispatched += 1
+        stats.total_latency += latency
+        if latency > stats.max_latency:
+            stats.max_latency = latency
+        if task.deadline is not None and task.dispatched_at > task.deadline:
+            stats.missed_deadlines += 1
+            late = task.dispatched_at - task.deadline
+            logger.warning(f"{task.message_type} started {late * 1000:.1f} ms after its deadline.")
+
+    def _dispatch(self, task):
+        handler = self.handlers.get(task.message_type)
+        if handler is None:
+            with self._condition:
+                self.stats.unhandled += 1
+            logger.warning(f"No handler for {task.message_type}, dropping {task.message!r}.")
+            return
+        try:
+            handler(task.message)
+        except Exception:
+            with self._condition:
+                self.stats.failed += 1
+            logger.exception(f"Handling {task.message_type} failed.")
@@ -1,13 +1,17 @@
 """This script runs on the drone, maintaining a connection with it and acting as a
-server, processing requests from other running processes using Unix domain sockets."""
+server, processing requests from other running processes using Unix domain sockets.
+
+When `GCS_CONN_STRING` is set, the autopilot link is shared with a ground control station through
+a `ServerConnection` router. The router owns the autopilot link and forwards its traffic to the GCS
+and, over a local UDP port, to the server's own autopilot connection.
+"""
 
 import asyncio
 import io
+import json
 import logging
 import logging.config
 import os
-import queue
-import socket
 import sys
 import threading
 
@@ -16,15 +20,19 @@ from dotenv import load_dotenv
 from flight_termination.flight_termination import begin_flight_termination
 from navigation.connection import (
     AutopilotConnectionWrapper,
+    ServerConnection,
     heartbeat_loop,
     receive_msg_loop,
+    stream_rate_loop,
     validate_connection_loop,
 )
+from navigation.executor import CommandExecutor
+from navigation.geofence import GeofenceBreachError, GeofenceMonitor, load_geofence
+from navigation.ipc import SOCKET_PATH, IpcServer, remove_socket_file
+from navigation.ipc_protocol import handle_request
+from navigation.shared_state import TelemetryPublisher
 from navigation.utils import HEARTBEAT, get_logging_config
 
-SOCKET_PATH = "/tmp/umuas_socket"
-MAX_LENGTH = 1024
-
 # Reload environment variables on startup to avoid caching them.
 load_dotenv(verbose=True, override=True)
 
@@ -34,33 +42,78 @@ logging.config.fileConfig(io.StringIO(logging_config), disable_existing_loggers=
 
 logger = logging.getLogger()
 
-message_queue = queue.PriorityQueue()
+# Local UDP port the router forwards the autopilot's traffic to for the server's own connection.
+ROUTER_SERVER_PORT = 14555
 
 
 async def main():
     autopilot_conn_wrapper = None
+    publisher = None
     try:
-        autopilot_conn_wrapper = get_connection_wrapper()
-        setup_server(autopilot_conn_wrapper)
-        await start_async_tasks(autopilot_conn_wrapper)
+        gcs_conn_string = os.getenv("GCS_CONN_STRING")
+        if gcs_conn_string:
+            start_router(gcs_conn_string)
+            autopilot_conn_wrapper = get_connection_wrapper(
+                f"udpin:127.0.0.1:{ROUTER_SERVER_PORT}", None
+            )
+        else:
+            autopilot_conn_wrapper = get_connection_wrapper()
+        executor = CommandExecutor(autopilot_conn_wrapper, begin_flight_termination)
+        ipc_server = setup_server(autopilot_conn_wrapper, executor)
+        publisher = TelemetryPublisher(autopilot_conn_wrapper)
+        await start_async_tasks(autopilot_conn_wrapper, executor, ipc_server, publisher)
     except KeyboardInterrupt:
         logger.info("Exiting...")
-        cleanup(autopilot_conn_wrapper)
+        cleanup(autopilot_conn_wrapper, publisher)
         sys.exit(1)
 
 
-async def start_async_tasks(autopilot_conn_wrapper):
-    receive_task, heartbeat_task, validate_connection_task = get_async_tasks(autopilot_conn_wrapper)
+async def start_async_tasks(autopilot_conn_wrapper, executor, ipc_server, publisher):
+    tasks = get_async_tasks(autopilot_conn_wrapper)
+    tasks.append(asyncio.create_task(executor.run()))
+    tasks.append(asyncio.create_task(ipc_server.run()))
+    tasks.append(asyncio.create_task(publisher.run()))
     try:
-        await asyncio.gather(receive_task, heartbeat_task, validate_connection_task)
-    except ConnectionError as error:
+        await asyncio.gather(*tasks)
+    except (ConnectionError, GeofenceBreachError) as error:
         logger.info(error)
-        begin_flight_termination(autopilot_conn_wrapper)
+        if tasks[0].done():
+            # Flight termination waits for ACKs and telemetry from the receive loop.
+            tasks[0] = asyncio.create_task(receive_msg_loop(autopilot_conn_wrapper))
+        await begin_flight_termination(autopilot_conn_wrapper, error)
+
 
+def start_router(gcs_conn_string):
+    """Route the autopilot link to the GCS and to the server's own connection.
 
-def get_connection_wrapper():
+    The router runs its own event loop in a daemon thread, so forwarding never waits on the
+    server's tasks, or on the blocking wait for the first heartbeat.
+
+    Raises:
+        ConnectionError: If a link can't be opened.
+    """
+    router = ServerConnection()
     autopilot_conn_string = os.getenv("AUTOPILOT_CONN_STRING")
-    autopilot_baudrate = os.getenv("AUTOPILOT_BAUDRATE")
+    router.add_link("autopilot", autopilot_conn_string, os.getenv("AUTOPILOT_BAUDRATE"))
+    router.add_link("gcs", gcs_conn_string)
+    router.add_link("server", f"udpout:127.0.0.1:{ROUTER_SERVER_PORT}")
+    started = threading.Event()
+
+    async def route():
+        router.start()
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(route(),), name="router", daemon=True).start()
+    started.wait()
+    logger.info(f"Routing the autopilot to the GCS on {gcs_conn_string}.")
+    return router
+
+
+def get_connection_wrapper(autopilot_conn_string=None, autopilot_baudrate=None):
+    if autopilot_conn_string is None:
+        autopilot_conn_string = os.getenv("AUTOPILOT_CONN_STRING")
+        autopilot_baudrate = os.getenv("AUTOPILOT_BAUDRATE")
 
     autopilot_conn_wrapper = AutopilotConnectionWrapper(autopilot_conn_string, autopilot_baudrate)
     if not autopilot_conn_wrapper.conn:
@@ -77,102 +130,39 @@ def get_connection_wrapper():
     return autopilot_conn_wrapper
 
 
-def setup_server(autopilot_conn_wrapper):
-    remove_socket_file()
-
-    # Start the server on a new thread.
-    server_thread = threading.Thread(target=start_server)
-    server_thread.daemon = True
-    server_thread.start()
-
-    # Process messages from the queue on a new thread.
-    process_thread = threading.Thread(
-        target=process_messages_from_queue, args=(autopilot_conn_wrapper,)
-    )
-    process_thread.daemon = True
-    process_thread.start()
-
-
-def start_server():
-    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    # server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(SOCKET_PATH)
-    server_socket.listen(5)
-    logger.info(f"Server started on path {SOCKET_PATH}.")
+def setup_server(autopilot_conn_wrapper, executor):
+    """Create the server that answers requests from other processes. It runs in the event loop
+    with the MAVLink tasks."""
 
-    while True:
-        try:
-            client_socket, _ = server_socket.accept()
-            # client_socket.settimeout(60)
-            client_thread = threading.Thread(target=handle_client_thread, args=(client_socket,))
-            client_thread.daemon = True
-            client_thread.start()
-            # logger.info(f"Running {threading.active_count()} thread(s).")
-        except Exception as e:
-            logger.exception("An error occured.")
-            logger.exception(e)
+    async def serve_request(request):
+        if request.strip().upper() == b"STATS":
+            return json.dumps({"queues": executor.metrics(), "server": server.stats()}).encode()
+        return await handle_request(executor, autopilot_conn_wrapper, request)
 
-
-def process_messages_from_queue(autopilot_conn_wrapper):
-    while True:
-        data = message_queue.get()
-        if data:
-            logger.info(f"Received data: {data.decode()}")
-
-
-def send_command(autopilot_conn_wrapper, *args):
-    assert len(args) == 7
-    connection = autopilot_conn_wrapper.conn
-    connection.conn.mav.command_long_send(
-        connection.target_system, connection.target_component, *args
-    )
-
-
-def send_mission_plan(autopilot_conn_wrapper, *args):
-    assert len(args) == 10
-    connection = autopilot_conn_wrapper.conn
-    connection.conn.mav.command_long_send(
-        connection.target_system, connection.target_component, *args
-    )
-
-
-def receive_data(client_socket: socket):
-    while True:
-        data = client_socket.recv(MAX_LENGTH)
-        if not data:
-            break
-        message_queue.put(data)
-    client_socket.close()
-    logger.info("Client gone!")
-
-
-def handle_client_thread(client_socket: socket):
-    receive_data(client_socket)
+    server = IpcServer(SOCKET_PATH, serve_request)
+    return server
 
 
 def get_async_tasks(autopilot_conn_wrapper):
     receive_task = asyncio.create_task(receive_msg_loop(autopilot_conn_wrapper))
     heartbeat_task = asyncio.create_task(heartbeat_loop(autopilot_conn_wrapper))
     validate_connection_task = asyncio.create_task(validate_connection_loop(autopilot_conn_wrapper))
-    return receive_task, heartbeat_task, validate_connection_task
+    stream_rate_task = asyncio.create_task(stream_rate_loop(autopilot_conn_wrapper))
+    tasks = [receive_task, heartbeat_task, validate_connection_task, stream_rate_task]
 
-
-def remove_socket_file():
-    """Remove the socket file if it already exists."""
-    try:
-        os.unlink(SOCKET_PATH)
-    except OSError:
-        # If we encounter an error when attempting to delete the file and it still
-        # exists, raise the exception again.
-        if os.path.exists(SOCKET_PATH):
-            raise
+    geofence_file = os.getenv("GEOFENCE_FILE")
+    if geofence_file:
+        geofence_monitor = GeofenceMonitor(autopilot_conn_wrapper, load_geofence(geofence_file))
+        tasks.append(asyncio.create_task(geofence_monitor.run()))
+    return tasks
 
 
-def cleanup(autopilot_conn_wrapper):
+def cleanup(autopilot_conn_wrapper, publisher=None):
     if autopilot_conn_wrapper is not None and autopilot_conn_wrapper.conn is not None:
         autopilot_conn_wrapper.conn.close()
-    remove_socket_file()
-    # TODO: Close sockets.
+    if publisher is not None:
+        publisher.close()
+    remove_socket_file(SOCKET_PATH)
 
 
 if __name__ == "__main__":
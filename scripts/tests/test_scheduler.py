@@ -0,0 +1,160 @@
+import unittest
+
+from navigation.executor import PRIORITY_MISSION, PRIORITY_NAVIGATION, PRIORITY_TERMINATION
+from scripts.message_object import (
+    MISSION_PLAN,
+    MOVE,
+    OBJECT_DETECTION,
+    TERMINATION,
+    ScheduleMessage,
+)
+from scripts.scheduler import Scheduler
+
+# Handled after everything else, to stop the scheduler once the messages before it ran.
+STOP = "STOP"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduleMessage(unittest.TestCase):
+    def test_default_priorities(self):
+        self.assertEqual(ScheduleMessage(TERMINATION).priority, PRIORITY_TERMINATION)
+        self.assertEqual(ScheduleMessage(OBJECT_DETECTION).priority, PRIORITY_NAVIGATION)
+        self.assertEqual(ScheduleMessage(MOVE).priority, PRIORITY_NAVIGATION)
+        self.assertEqual(ScheduleMessage(MISSION_PLAN).priority, PRIORITY_MISSION)
+        self.assertEqual(ScheduleMessage("OTHER").priority, PRIORITY_MISSION)
+        self.assertEqual(ScheduleMessage(MOVE, priority=5).priority, 5)
+
+    def test_order(self):
+        no_deadline = ScheduleMessage(MOVE)
+        late = ScheduleMessage(MOVE, deadline=20.0)
+        early = ScheduleMessage(MOVE, deadline=10.0)
+        urgent = ScheduleMessage(TERMINATION)
+        early_again = ScheduleMessage(MOVE, deadline=10.0)
+        for sequence, message in enumerate((no_deadline, late, early, urgent, early_again)):
+            message.sequence = sequence
+        self.assertEqual(
+            sorted([no_deadline, late, early_again, urgent, early]),
+            [urgent, early, early_again, late, no_deadline],
+        )
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(self.clock)
+        self.handled = []
+        for message_type in (TERMINATION, MOVE, MISSION_PLAN):
+            self.scheduler.register(message_type, self.handler(message_type))
+        self.scheduler.register(STOP, lambda message: self.scheduler.stop())
+
+    def handler(self, message_type):
+        return lambda message: self.handled.append((message_type, message))
+
+    def run_scheduled(self):
+        """Handle every message scheduled so far, in the test's thread."""
+        self.scheduler.schedule(STOP, priority=1000)
+        self.scheduler.run()
+
+    def test_priority_then_deadline(self):
+        schedule = self.scheduler.schedule
+        schedule(MISSION_PLAN, "plan")
+        schedule(MOVE, "whenever")
+        schedule(MOVE, "later", timeout=20)
+        schedule(MOVE, "sooner", timeout=10)
+        schedule(TERMINATION, "terminate")
+        self.run_scheduled()
+        self.assertEqual(
+            [message for _, message in self.handled],
+            ["terminate", "sooner", "later", "whenever", "plan"],
+        )
+        self.assertEqual(self.scheduler.stats.dispatched, 6)
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_fifo_within_equal_keys(self):
+        for i in range(5):
+            self.scheduler.schedule(MOVE, i)
+        for i in range(5, 10):
+            self.scheduler.schedule(MOVE, i, timeout=1)
+        self.run_scheduled()
+        self.assertEqual([message for _, message in self.handled], [5, 6, 7, 8, 9, 0, 1, 2, 3, 4])
+
+    def test_cancel(self):
+        first = self.scheduler.schedule(MOVE, "first")
+        second = self.scheduler.schedule(MOVE, "second")
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertTrue(self.scheduler.cancel(first))
+        self.assertEqual(len(self.scheduler), 1)
+        # A message is only cancelled once.
+        self.assertFalse(self.scheduler.cancel(first))
+        self.assertEqual(len(self.scheduler), 1)
+        # A message that was never scheduled can't be.
+        self.assertFalse(self.scheduler.cancel(ScheduleMessage(MOVE)))
+
+        self.run_scheduled()
+        self.assertEqual(self.handled, [(MOVE, "second")])
+        # Nor can one that already ran.
+        self.assertFalse(self.scheduler.cancel(second))
+        self.assertEqual(len(self.scheduler), 0)
+        self.assertEqual(self.scheduler.stats.cancelled, 1)
+
+    def test_missed_deadlines(self):
+        self.scheduler.schedule(MOVE, "late", timeout=1)
+        self.scheduler.schedule(MOVE, "in time", timeout=10)
+        self.scheduler.schedule(MOVE, "no deadline")
+        self.clock.now += 5
+        with self.assertLogs(level="WARNING"):
+            self.run_scheduled()
+        self.assertEqual(len(self.handled), 3)
+        stats = self.scheduler.stats
+        self.assertEqual(stats.missed_deadlines, 1)
+        self.assertEqual(stats.max_latency, 5)
+        self.assertEqual(stats.to_dict()["missed_deadlines"], 1)
+
+    def test_unhandled_and_failed(self):
+        def fail(message):
+            raise ValueError(message)
+
+        self.scheduler.register(MISSION_PLAN, fail)
+        self.scheduler.schedule(OBJECT_DETECTION, "nobody handles this")
+        self.scheduler.schedule(MISSION_PLAN, "broken")
+        self.scheduler.schedule(MISSION_PLAN, "broken again")
+        self.scheduler.schedule(MOVE, "still runs", priority=PRIORITY_MISSION)
+        with self.assertLogs(level="WARNING"):
+            self.run_scheduled()
+        self.assertEqual(self.handled, [(MOVE, "still runs")])
+        stats = self.scheduler.stats
+        self.assertEqual(stats.unhandled, 1)
+        self.assertEqual(stats.failed, 2)
+        self.assertEqual(stats.dispatched, 5)
+
+    def test_stop(self):
+        thread = self.scheduler.start()
+        # Stops a worker waiting for work.
+        self.scheduler.stop()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+        # A stopped scheduler leaves what is queued alone.
+        self.scheduler.schedule(MOVE, "queued")
+        self.scheduler.run()
+        self.assertEqual(self.handled, [])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_worker_thread(self):
+        thread = self.scheduler.start()
+        self.scheduler.schedule(MOVE, "from another thread")
+        self.scheduler.schedule(STOP, priority=1000)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.handled, [(MOVE, "from another thread")])
+
+
+if __name__ == "__main__":
+    unittest.main()